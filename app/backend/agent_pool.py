@@ -0,0 +1,110 @@
+# backend/agent_pool.py
+
+import queue
+import threading
+from contextlib import contextmanager
+
+from backend.agents import setup_agents
+
+
+class AgentPoolExhausted(Exception):
+    """
+    Raised when no agent set could be checked out from the pool in time.
+    """
+
+
+def reset_agents(agents: dict) -> None:
+    """
+    Clears per-conversation state (chat history, auto-reply counters, usage summaries)
+    on every AutoGen agent in an agent set so it can be reused by the next request.
+    """
+    for value in agents.values():
+        reset = getattr(value, "reset", None)
+        if callable(reset):
+            reset()
+
+
+class AgentPool:
+    """
+    Fixed-size pool of agent sets (one `setup_agents` AgentSet per slot).
+
+    Each request checks out a whole set, so proxies and assistants are never shared
+    between concurrent requests. Agents are built on a set's first use of them and kept
+    afterwards, so nothing is rebuilt per call. Sets are reset before they go back into
+    the pool, which keeps memory flat across requests.
+
+    Parameters:
+    - llm_config: Config passed to `setup_agents` for every slot
+    - size: Number of agent sets
+    - block: Wait for a free set (True) or reject immediately (False)
+    - timeout: Max seconds to wait when blocking (None = wait forever)
+    - preload: Build every agent of every set now instead of on first use
+    """
+
+    def __init__(self, llm_config, size: int = 4, block: bool = True, timeout: float = None, preload: bool = False):
+        if size < 1:
+            raise ValueError("AgentPool size must be at least 1.")
+
+        self.size = size
+        self.block = block
+        self.timeout = timeout
+
+        self._idle = queue.LifoQueue(maxsize=size)
+        self._lock = threading.Lock()
+        self._checkouts = 0
+        self._rejections = 0
+
+        self._sets = [setup_agents(llm_config) for _ in range(size)]
+        for agents in self._sets:
+            self._idle.put(agents.build_all() if preload else agents)
+
+    def acquire(self, block: bool = None, timeout: float = None) -> dict:
+        """
+        Takes an agent set out of the pool. Raises AgentPoolExhausted if none is free.
+        """
+        block = self.block if block is None else block
+        timeout = self.timeout if timeout is None else timeout
+
+        try:
+            agents = self._idle.get(block=block, timeout=timeout if block else None)
+        except queue.Empty:
+            with self._lock:
+                self._rejections += 1
+            raise AgentPoolExhausted(f"All {self.size} agent sets are busy, please retry later.")
+
+        with self._lock:
+            self._checkouts += 1
+        return agents
+
+    def release(self, agents: dict) -> None:
+        """
+        Resets an agent set and returns it to the pool.
+        """
+        reset_agents(agents)
+        self._idle.put_nowait(agents)
+
+    @contextmanager
+    def checkout(self, block: bool = None, timeout: float = None):
+        """
+        Context manager form of acquire/release:
+
+            with agent_pool.checkout() as agents:
+                run_sleep_agent(data, agents["user_proxy"], agents["sleep_llm"])
+        """
+        agents = self.acquire(block=block, timeout=timeout)
+        try:
+            yield agents
+        finally:
+            self.release(agents)
+
+    def stats(self) -> dict:
+        idle = self._idle.qsize()
+        with self._lock:
+            return {
+                "size": self.size,
+                "idle": idle,
+                "in_use": self.size - idle,
+                "checkouts": self._checkouts,
+                "rejections": self._rejections,
+                "agents_built": sum(len(agents.built()) for agents in self._sets),
+            }
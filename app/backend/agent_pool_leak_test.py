@@ -0,0 +1,66 @@
+# backend/agent_pool_leak_test.py
+#
+# Manual leak check for AgentPool: pushes thousands of requests through pooled
+# agent sets from many threads and verifies traced memory stays flat.
+# Agents are built with llm_config=False, so no API key or network is needed.
+#
+#   python agent_pool_leak_test.py [requests] [threads]
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import contextlib
+import gc
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+from backend.agent_pool import AgentPool
+
+SAMPLE_INPUT = {
+    "heart_rate": 62,
+    "hrv": 55,
+    "skin_temperature": 33.4,
+    "gsr": 1.2,
+    "acceleration": [[0.01, -0.02, 0.98]] * 50,
+}
+
+
+def handle_request(pool):
+    with pool.checkout() as agents:
+        agents["sleep_agent"](SAMPLE_INPUT, agents["user_proxy"], agents["sleep_llm"])
+        agents["stress_agent"](SAMPLE_INPUT, agents["stress_proxy"], agents["stress_llm"])
+
+
+def run_leak_check(total_requests=5000, threads=8, pool_size=4, max_growth_kb=512):
+    pool = AgentPool(llm_config=False, size=pool_size)
+
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            # Warm-up so lazily-created interpreter/AutoGen state is not counted as growth
+            list(executor.map(lambda _: handle_request(pool), range(pool_size * 10)))
+            gc.collect()
+            tracemalloc.start()
+            baseline, _ = tracemalloc.get_traced_memory()
+
+            list(executor.map(lambda _: handle_request(pool), range(total_requests)))
+
+        gc.collect()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    growth_kb = (current - baseline) / 1024
+    print(f"📋 {total_requests} requests, {threads} threads, pool size {pool_size}")
+    print(f"   Memory growth: {growth_kb:.1f} KiB (peak {(peak - baseline) / 1024:.1f} KiB)")
+    print(f"   Pool stats: {pool.stats()}")
+
+    assert pool.stats()["idle"] == pool_size, "Agent sets were not returned to the pool."
+    assert growth_kb < max_growth_kb, f"Memory grew by {growth_kb:.1f} KiB, expected < {max_growth_kb} KiB."
+    print("✅ No leak detected.")
+
+
+if __name__ == "__main__":
+    run_leak_check(
+        total_requests=int(sys.argv[1]) if len(sys.argv) > 1 else 5000,
+        threads=int(sys.argv[2]) if len(sys.argv) > 2 else 8,
+    )
@@ -1,50 +1,111 @@
 # backend/agents.py
 
-from autogen import AssistantAgent, UserProxyAgent
-from core.activity_agent import run_activity_agent
-from core.sleep_agent import run_sleep_agent
-from core.health_summary_agent import run_summary_agent
-from core.stress_agent import run_stress_agent
-from core.abnormaly_agent import run_anomaly_agent
-from core.nutrition_agent import run_nutrition_agent
+import threading
+
+from core.activity_agent import a_run_activity_agent, run_activity_agent
+from core.sleep_agent import a_run_sleep_agent, run_sleep_agent
+from core.health_summary_agent import a_run_summary_agent, run_summary_agent
+from core.stress_agent import a_run_stress_agent, run_stress_agent
+from core.abnormaly_agent import a_run_anomaly_agent, a_run_local_anomaly_agent, run_anomaly_agent, run_local_anomaly_agent
+from core.nutrition_agent import a_run_nutrition_agent, run_nutrition_agent
+
+# GPT assistant agents: setup_agents key -> AssistantAgent kwargs (besides llm_config)
+ASSISTANT_AGENTS = {
+    "activity_llm": {"name": "ActivityAgent"},
+    "sleep_llm": {"name": "SleepAgent"},
+    "stress_llm": {"name": "StressAgent"},
+    "health_summary_llm": {
+        "name": "HealthSummaryAgent",
+        "system_message": "You summarize health based on activity and sleep insights. Provide 1–2 lines of summary and 1 clear suggestion for tomorrow. Be concise and encouraging.",
+    },
+    "abnormaly_detection_llm": {"name": "AbnormalyDetectionAgent"},
+    "nutrition_llm": {"name": "NutritionAgent"},
+}
+
+# User proxies: the shared one, plus dedicated proxies so activity / sleep / stress can be
+# analysed concurrently without sharing one proxy's chat state
+PROXY_AGENTS = {
+    "user_proxy": "UserProxy",
+    "activity_proxy": "ActivityProxy",
+    "sleep_proxy": "SleepProxy",
+    "stress_proxy": "StressProxy",
+}
+
+
+class AgentSet(dict):
+    """
+    Agent dict returned by setup_agents. Runner functions are stored up front; the AutoGen
+    agents (and AutoGen itself) are only built the first time their key is looked up, so a
+    process serving only /analyze_sleep never constructs the other assistants.
+
+    values() / items() hold the agents built so far, which is what reset_agents needs.
+    """
+
+    def __init__(self, llm_config, runners: dict):
+        super().__init__(runners)
+        self.llm_config = llm_config
+        self._lock = threading.Lock()
+
+    def _build(self, key):
+        from autogen import AssistantAgent, UserProxyAgent
+
+        if key in ASSISTANT_AGENTS:
+            return AssistantAgent(llm_config=self.llm_config, **ASSISTANT_AGENTS[key])
+        return UserProxyAgent(name=PROXY_AGENTS[key], human_input_mode="NEVER")
+
+    def __missing__(self, key):
+        if key not in ASSISTANT_AGENTS and key not in PROXY_AGENTS:
+            raise KeyError(key)
+        with self._lock:
+            if not dict.__contains__(self, key):
+                dict.__setitem__(self, key, self._build(key))
+            return dict.__getitem__(self, key)
+
+    def __contains__(self, key):
+        return dict.__contains__(self, key) or key in ASSISTANT_AGENTS or key in PROXY_AGENTS
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    def built(self) -> list:
+        """
+        Keys of the agents constructed so far.
+        """
+        return [key for key in list(self.keys()) if key in ASSISTANT_AGENTS or key in PROXY_AGENTS]
+
+    def build_all(self) -> "AgentSet":
+        """
+        Constructs every agent now (eager start-up, e.g. AGENT_PRELOAD=1).
+        """
+        for key in list(ASSISTANT_AGENTS) + list(PROXY_AGENTS):
+            self[key]
+        return self
+
 
 def setup_agents(llm_config):
     """
-    Initializes all GPT-powered assistant agents and user proxy agent.
+    Initializes all GPT-powered assistant agents and user proxy agents, each on first use
+    (see AgentSet).
     """
 
-    # GPT Assistant Agents
-    activity_agent = AssistantAgent(name="ActivityAgent", llm_config=llm_config)
-    sleep_agent = AssistantAgent(name="SleepAgent", llm_config=llm_config)
-    stress_agent = AssistantAgent(name="StressAgent", llm_config=llm_config)
-    health_summary_agent = AssistantAgent(
-        name="HealthSummaryAgent",
-        system_message="You summarize health based on activity and sleep insights. Provide 1–2 lines of summary and 1 clear suggestion for tomorrow. Be concise and encouraging.",
-        llm_config=llm_config
-    )
-    abnormaly_detection_agent = AssistantAgent(name="AbnormalyDetectionAgent", llm_config=llm_config)
-    nutrition_agent = AssistantAgent(name="NutritionAgent", llm_config=llm_config)
-
-    # User Proxy
-    user_proxy = UserProxyAgent(name="UserProxy", human_input_mode="NEVER")
-
-    return {
+    return AgentSet(llm_config, {
         # Core agents (functions)
         "activity_agent": run_activity_agent,
         "sleep_agent": run_sleep_agent,
         "stress_agent": run_stress_agent,
         "health_summary_agent": run_summary_agent,
         "abnormaly_detection_agent": run_anomaly_agent,
+        "local_anomaly_agent": run_local_anomaly_agent,
         "nutrition_agent": run_nutrition_agent,
 
-        # GPT model instances (LLMs)
-        "activity_llm": activity_agent,
-        "sleep_llm": sleep_agent,
-        "stress_llm": stress_agent,
-        "health_summary_llm": health_summary_agent,
-        "abnormaly_detection_llm": abnormaly_detection_agent,
-        "nutrition_llm": nutrition_agent,
-
-        # Shared Proxy
-        "user_proxy": user_proxy
-    }
+        # Async variants (async serving path; agents and proxies are only read)
+        "a_activity_agent": a_run_activity_agent,
+        "a_sleep_agent": a_run_sleep_agent,
+        "a_stress_agent": a_run_stress_agent,
+        "a_health_summary_agent": a_run_summary_agent,
+        "a_abnormaly_detection_agent": a_run_anomaly_agent,
+        "a_local_anomaly_agent": a_run_local_anomaly_agent,
+        "a_nutrition_agent": a_run_nutrition_agent,
+
+        # GPT model instances (LLMs) and proxies are built lazily: ASSISTANT_AGENTS / PROXY_AGENTS
+    })
@@ -2,98 +2,422 @@
 
 import sys
 import os
+import json
+import math
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from dotenv import load_dotenv
-from flask import Flask, request, jsonify
-from backend.agents import setup_agents
-from backend.group_summary_chat import run_group_health_chat
+from flask import Flask, Response, request, jsonify, stream_with_context
+from backend.agent_pool import AgentPool, AgentPoolExhausted
+from backend.coalescer import configure_coalescer, get_coalescer, request_key
+from backend.group_summary_chat import EXECUTION_MODES, run_group_health_chat
+from backend.http_client import configure_http_client, get_async_http_client
+from backend.rate_limiter import RateLimiter, is_rate_limit_error
+from backend.ingest import StreamIngestor
+from backend.jobs import JobQueue, JobQueueFull, JobStore
+from backend.metrics import REGISTRY, instrument_flask, llm_metrics_observer, record_error
+from backend.stage_store import configure_stage_store, get_stage_store
+from backend.sensor_codec import DEFAULT_MAX_SAMPLES, SensorPayloadError, decode_sensor_request
+from backend.timeseries import ROLLUPS, TimeSeriesError, TimeSeriesStore, summarise_rollups
+from backend.traffic import ReplayStore, TrafficRecorder, record_flask_traffic
+from backend.streaming import stream_group_health_chat
+from core.activity_features import extract_activity_features, format_movement_features
+from core.agent_results import configure_structured_outputs, get_structured_outputs, render_result, result_fields
+from core.abnormaly_agent import anomaly_contexts, phrase_anomalies
+from core.anomaly_engine import CONTEXTS as ANOMALY_CONTEXTS, SIGNALS as VITAL_SIGNALS, configure_anomaly_engine, get_anomaly_engine
+from core.approx_cache import DEFAULT_AGENTS, configure_approx_cache, get_approx_cache
+from core.food_db import DEFAULT_PATH as FOOD_TABLE_PATH, configure_food_database, get_food_database
+from core.llm_cache import configure_llm_cache, get_llm_cache
+from core.local_classifier import configure_local_gate, get_local_gate
+from core.model_router import configure_model_router, get_model_router
 from core.activity_agent import run_activity_agent
 from core.sleep_agent import run_sleep_agent
 
 # Load environment variables
 load_dotenv()
 
+# Client-side limiter around every LLM request: RPM / TPM token buckets, 429-driven
+# AIMD concurrency and jittered retries (OpenAI's own retries are turned off below)
+rate_limiter = RateLimiter(
+    rpm=float(os.getenv("LLM_RPM", "0")) or None,
+    tpm=float(os.getenv("LLM_TPM", "0")) or None,
+    initial_concurrency=int(os.getenv("LLM_INITIAL_CONCURRENCY", "4")),
+    max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", "32")),
+    max_retries=int(os.getenv("LLM_MAX_RETRIES", "5"))
+)
+
+# Traffic replay: TRAFFIC_REPLAY_PATH serves LLM responses from a recording made with
+# TRAFFIC_RECORD_PATH (offline, deterministic load tests; see bench/replay.py)
+traffic_replay = ReplayStore(
+    os.getenv("TRAFFIC_REPLAY_PATH"),
+    latency_scale=float(os.getenv("TRAFFIC_REPLAY_LATENCY_SCALE", "0")),
+    on_miss=os.getenv("TRAFFIC_REPLAY_MISS", "error")
+) if os.getenv("TRAFFIC_REPLAY_PATH") else None
+traffic_recorder = TrafficRecorder(os.getenv("TRAFFIC_RECORD_PATH")) if os.getenv("TRAFFIC_RECORD_PATH") else None
+
+# One pooled keep-alive HTTP client shared by every agent's OpenAI client
+http_client = configure_http_client(
+    rate_limiter=rate_limiter,
+    replay=traffic_replay,
+    pool_size=int(os.getenv("HTTP_POOL_SIZE", "100")),
+    keepalive=int(os.getenv("HTTP_KEEPALIVE_CONNECTIONS", "20")),
+    max_per_host=int(os.getenv("HTTP_MAX_PER_HOST", "20")),
+    keepalive_expiry=float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "60"))
+)
+
 # Define OpenAI / AutoGen LLM config
 llm_config = {
     "config_list": [{
         "model": os.getenv("OPENAI_API_MODEL", "gpt-4o"),
         "api_key": os.getenv("OPENAI_API_KEY"),
         "base_url": os.getenv("OPENAI_API_BASE", "https://api.openai.com/v1"),
-        "api_type": "openai"
+        "api_type": "openai",
+        "http_client": http_client,
+        "max_retries": 0
     }],
     "timeout": 120,
     "max_tokens": 2000
 }
 
+# Token streaming (used for delta events on /group_summary_chat/stream)
+if os.getenv("LLM_STREAM") == "1":
+    llm_config["stream"] = True
+
+# Structured outputs: agents reply with schema-checked JSON parsed into typed results;
+# downstream prompts use their compact fields and text is rendered only in responses
+configure_structured_outputs(enabled=os.getenv("STRUCTURED_OUTPUTS") == "1")
+
+# Per-agent model tiers. LLM_MODEL_PROFILES is a JSON object, e.g.
+#   {"tiers": {"small": {"model": "gpt-4o-mini", "max_tokens": 600, "timeout": 30, "temperature": 0.2}},
+#    "agents": {"stress": ["small", "default"], "sleep": ["small", "default"]}, "latency_aware": true}
+# Listed agents (activity, sleep, stress, anomaly, nutrition, summary, anomaly_phrasing)
+# try their tiers in order and move to the next one only when a reply fails validation;
+# "default" is the llm_config above. Only structured replies can be validated, so tiers
+# require STRUCTURED_OUTPUTS=1 (startup fails otherwise) except for anomaly_phrasing.
+# Per-tier latency and fallback rates are reported on /stats and /metrics.
+model_profiles = json.loads(os.getenv("LLM_MODEL_PROFILES", "{}"))
+configure_model_router(
+    tiers=model_profiles.get("tiers"),
+    agents=model_profiles.get("agents"),
+    latency_aware=bool(model_profiles.get("latency_aware", False)),
+    probe_every=int(model_profiles.get("probe_every", 20)),
+    structured=get_structured_outputs().enabled
+)
+
+# LLM response cache: in-memory LRU, plus a SQLite tier when LLM_CACHE_PATH is set
+configure_llm_cache(
+    memory_size=int(os.getenv("LLM_CACHE_SIZE", "1024")),
+    disk_path=os.getenv("LLM_CACHE_PATH"),
+    ttl=float(os.getenv("LLM_CACHE_TTL", "3600")),
+    disk_max_entries=int(os.getenv("LLM_CACHE_DISK_MAX_ENTRIES", "10000"))
+)
+
+# Local food table: NutritionAgent only picks foods and servings; kcal, macros and menu
+# totals are computed from the table (bundled core/data/foods.csv or NUTRITION_FOOD_TABLE).
+# NUTRITION_FOOD_DB=0 lets the LLM estimate calories itself as before.
+configure_food_database(
+    path=os.getenv("NUTRITION_FOOD_TABLE") or FOOD_TABLE_PATH,
+    enabled=os.getenv("NUTRITION_FOOD_DB", "1") != "0",
+    fuzzy_cutoff=float(os.getenv("NUTRITION_FUZZY_CUTOFF", "0.8"))
+)
+
+# Approximate cache: sensor agent inputs quantized into buckets (HR 5 bpm, temperature
+# 0.2 °C, EDA 0.5 µS, movement features) so near-duplicate readings share an answer.
+# APPROX_CACHE_BUCKETS is a JSON object of per-agent step overrides; tune it with
+# bench/approx_cache_report.py against a traffic recording.
+configure_approx_cache(
+    buckets=json.loads(os.getenv("APPROX_CACHE_BUCKETS", "{}")),
+    agents=[a for a in os.getenv("APPROX_CACHE_AGENTS", ",".join(DEFAULT_AGENTS)).split(",") if a],
+    memory_size=int(os.getenv("APPROX_CACHE_SIZE", "1024")),
+    ttl=float(os.getenv("APPROX_CACHE_TTL", "3600"))
+)
+
+# Group pipeline stage results keyed by the hash of their inputs: re-submissions only
+# recompute the stages downstream of a changed payload (SQLite tier with STAGE_STORE_PATH)
+configure_stage_store(
+    memory_size=int(os.getenv("STAGE_STORE_SIZE", "4096")),
+    disk_path=os.getenv("STAGE_STORE_PATH"),
+    ttl=float(os.getenv("STAGE_STORE_TTL", "86400")),
+    disk_max_entries=int(os.getenv("STAGE_STORE_DISK_MAX_ENTRIES", "100000"))
+)
+
+# Local classifiers answer routine activity / stress / sleep labels without the LLM
+# when their confidence reaches LOCAL_CLASSIFIER_THRESHOLD
+configure_local_gate(
+    threshold=float(os.getenv("LOCAL_CLASSIFIER_THRESHOLD", "0.8")),
+    enabled=os.getenv("LOCAL_CLASSIFIER_ENABLED", "1") != "0"
+)
+
+# Per-agent LLM latency / token / status metrics for GET /metrics
+http_client.transport.add_observer(llm_metrics_observer)
+if traffic_recorder is not None:
+    http_client.transport.add_observer(traffic_recorder.llm_observer)
+
+# Open keep-alive connections to the LLM endpoint before the first request, in a
+# background thread so importing the app never waits on the network.
+# HTTP_WARMUP_CONNECTIONS=0 turns it off.
+if traffic_replay is None:
+    http_client.start_warm_up(
+        llm_config["config_list"][0]["base_url"],
+        connections=int(os.getenv("HTTP_WARMUP_CONNECTIONS", "2"))
+    )
+
 # Set up Flask app
 app = Flask(__name__)
+instrument_flask(app)
+
+# Request size limits: bodies over MAX_REQUEST_BYTES get 413 before being read, and
+# binary sensor arrays are capped at MAX_SENSOR_SAMPLES samples
+app.config["MAX_CONTENT_LENGTH"] = int(os.getenv("MAX_REQUEST_BYTES", str(64 * 1024 * 1024)))
+max_sensor_samples = int(os.getenv("MAX_SENSOR_SAMPLES", str(DEFAULT_MAX_SAMPLES)))
+if traffic_recorder is not None:
+    record_flask_traffic(app, traffic_recorder)
+
+# Pool of agent sets created at launch; each request checks one out.
+# AGENT_POOL_TIMEOUT=0 rejects immediately (503) instead of waiting for a free set.
+# Agents (and AutoGen) are built on first use, which keeps start-up fast for workers
+# serving a few routes; AGENT_PRELOAD=1 builds them all at launch instead.
+agent_pool_timeout = os.getenv("AGENT_POOL_TIMEOUT")
+agent_pool = AgentPool(
+    llm_config,
+    size=int(os.getenv("AGENT_POOL_SIZE", "4")),
+    block=agent_pool_timeout != "0",
+    timeout=float(agent_pool_timeout) if agent_pool_timeout else None,
+    preload=os.getenv("AGENT_PRELOAD") == "1"
+)
+
+def error_status(e):
+    """
+    HTTP status for a failed LLM-backed request: 429 once the rate limiter gave up retrying.
+    The error is also counted in errors_total by exception type.
+    """
+    record_error(e)
+    return 429 if is_rate_limit_error(e) else 500
+
+# Single-flight coalescing: identical concurrent requests (same route, query, cache mode
+# and payload) share one computation and its result. COALESCE_REQUESTS=0 turns it off.
+configure_coalescer(enabled=os.getenv("COALESCE_REQUESTS", "1") != "0")
+
+# Per-user sensor history (memory-mapped columnar files under TIMESERIES_PATH, default
+# in the Flask instance folder)
+timeseries_store = TimeSeriesStore(os.getenv("TIMESERIES_PATH", os.path.join(app.instance_path, "timeseries")))
+
+# Local anomaly engine behind /detect_anomaly and the pipeline's anomaly stage: z-score
+# against the user's time-series baseline (ANOMALY_BASELINE_DAYS) or population norms,
+# robust MAD spikes and absolute limits. ANOMALY_ENGINE=llm restores the LLM-only agent;
+# ANOMALY_LLM_PHRASING=1 lets the LLM word detected anomalies.
+anomaly_baseline_days = float(os.getenv("ANOMALY_BASELINE_DAYS", "28"))
+configure_anomaly_engine(
+    enabled=os.getenv("ANOMALY_ENGINE", "local") != "llm",
+    phrase_with_llm=os.getenv("ANOMALY_LLM_PHRASING") == "1",
+    baseline_provider=lambda user_id: timeseries_store.baseline(user_id, days=anomaly_baseline_days, signals=VITAL_SIGNALS)
+)
 
-# Setup agents once at launch
-agents = setup_agents(llm_config)
+def read_payload():
+    """
+    Route payload as JSON, msgpack or .npy (see backend.sensor_codec); binary sensor
+    arrays arrive as NumPy arrays without a per-sample Python list. A payload of
+    {"user_id", "time_range"} is expanded from the time-series store.
+    """
+    return timeseries_store.resolve_payload(decode_sensor_request(request, max_samples=max_sensor_samples))
+
+@app.errorhandler(SensorPayloadError)
+def sensor_payload_error(e):
+    return jsonify({"error": str(e)}), e.status
+
+@app.errorhandler(TimeSeriesError)
+def timeseries_error(e):
+    return jsonify({"error": str(e)}), 400
+
+def agent_body(key, result):
+    """
+    Body of a single-agent route: rendered text under `key`, plus the typed fields
+    under "structured" in structured-output mode.
+    """
+    body = {key: render_result(result)}
+    fields = result_fields(result)
+    if fields is not None:
+        body["structured"] = fields
+    return body
+
+def agent_response(key, result):
+    return jsonify(agent_body(key, result))
+
+def use_llm_cache():
+    """
+    Per-request cache bypass: `Cache-Control: no-cache` header or `?cache=0`.
+    """
+    if "no-cache" in request.headers.get("Cache-Control", ""):
+        return False
+    return request.args.get("cache", "1") != "0"
+
+def coalesce(data, fn):
+    """
+    Runs fn() once for identical concurrent requests to this route (see backend.coalescer).
+    """
+    return get_coalescer().do(request_key(request.path, request.args, data, use_llm_cache()), fn)
+
+def run_pooled(runner_key, llm_key, *args, **kwargs):
+    """
+    Runs one agent runner with the shared user proxy on a checked-out agent set.
+    """
+    with agent_pool.checkout() as agents:
+        return agents[runner_key](*args, agents["user_proxy"], agents[llm_key], **kwargs)
 
 @app.route('/analyze_activity', methods=['POST'])
 def analyze_activity_route():
-    data = request.get_json()
+    data = read_payload()
     if not data:
         return jsonify({"error": "Missing JSON payload"}), 400
     try:
-        result = agents["activity_agent"](data, agents["user_proxy"], agents["activity_llm"])
-        return jsonify({"activity_analysis": result})
+        result = coalesce(data, lambda: run_pooled("activity_agent", "activity_llm", data, use_cache=use_llm_cache()))
+        return agent_response("activity_analysis", result)
+    except AgentPoolExhausted as e:
+        return jsonify({"error": str(e)}), 503
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        return jsonify({"error": str(e)}), error_status(e)
 
 @app.route('/analyze_sleep', methods=['POST'])
 def analyze_sleep_route():
-    data = request.get_json()
+    data = read_payload()
     if not data:
         return jsonify({"error": "Missing JSON payload"}), 400
     try:
-        result = agents["sleep_agent"](data, agents["user_proxy"], agents["sleep_llm"])
-        return jsonify({"sleep_analysis": result})
+        result = coalesce(data, lambda: run_pooled("sleep_agent", "sleep_llm", data, use_cache=use_llm_cache()))
+        return agent_response("sleep_analysis", result)
+    except AgentPoolExhausted as e:
+        return jsonify({"error": str(e)}), 503
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        return jsonify({"error": str(e)}), error_status(e)
 
 @app.route('/analyze_stress', methods=['POST'])
 def analyze_stress_route():
-    data = request.get_json()
+    data = read_payload()
     if not data:
         return jsonify({"error": "Missing JSON payload"}), 400
     try:
-        result = agents["stress_agent"](data, agents["user_proxy"], agents["stress_llm"])
-        return jsonify({"stress_analysis": result})
+        result = coalesce(data, lambda: run_pooled("stress_agent", "stress_llm", data, use_cache=use_llm_cache()))
+        return agent_response("stress_analysis", result)
+    except AgentPoolExhausted as e:
+        return jsonify({"error": str(e)}), 503
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        return jsonify({"error": str(e)}), error_status(e)
 
 @app.route('/detect_anomaly', methods=['POST'])
 def detect_anomaly_route():
-    data = request.get_json()
+    """
+    Sensor payloads (vitals such as heart_rate / eda at the top level, or activity_data /
+    sleep_data / stress_data) are checked by the local anomaly engine; the LLM is only
+    asked to phrase detected anomalies (?phrase=1, default ANOMALY_LLM_PHRASING).
+    Prose results (activity_result / sleep_result / stress_result) go to AbnormalyDetectionAgent.
+    """
+    data = read_payload() or {}
+    engine = get_anomaly_engine()
+    nested = any(k in data for k in ("activity_data", "sleep_data", "stress_data"))
+    if engine.enabled and (nested or any(k in data for k in VITAL_SIGNALS)):
+        if nested:
+            contexts = anomaly_contexts(data.get("activity_data"), data.get("sleep_data"), data.get("stress_data"))
+        else:
+            context = request.args.get("context") or data.get("context", "day")
+            if context not in ANOMALY_CONTEXTS:
+                return jsonify({"error": f"Unknown context '{context}', expected one of {list(ANOMALY_CONTEXTS)}"}), 400
+            contexts = {context: data}
+        try:
+            result, findings = engine.check(contexts, user_id=data.get("user_id"))
+
+            phrase = request.args.get("phrase")
+            if findings and (engine.phrase_with_llm if phrase is None else phrase == "1"):
+                def phrase_result(detected=result):
+                    with agent_pool.checkout() as agents:
+                        return phrase_anomalies(detected, agents["user_proxy"], agents["abnormaly_detection_llm"],
+                                                use_cache=use_llm_cache())
+                result = coalesce(data, phrase_result)
+        except AgentPoolExhausted as e:
+            return jsonify({"error": str(e)}), 503
+        except Exception as e:
+            return jsonify({"error": str(e)}), error_status(e)
+        return jsonify({
+            "anomaly_analysis": render_result(result),
+            "structured": result.to_dict(),
+            "findings": findings,
+            "engine": "local"
+        })
+
     required_keys = ["stress_result", "sleep_result", "activity_result"]
     if not all(k in data for k in required_keys):
         return jsonify({"error": f"Missing one or more required fields: {required_keys}"}), 400
     try:
-        result = agents["anomaly_agent"](
-            data["stress_result"],
-            data["sleep_result"],
+        result = coalesce(data, lambda: run_pooled(
+            "abnormaly_detection_agent",
+            "abnormaly_detection_llm",
             data["activity_result"],
-            agents["user_proxy"],
-            agents["anomaly_llm"]
-        )
-        return jsonify({"anomaly_analysis": result})
+            data["sleep_result"],
+            data["stress_result"],
+            use_cache=use_llm_cache()
+        ))
+        return agent_response("anomaly_analysis", result)
+    except AgentPoolExhausted as e:
+        return jsonify({"error": str(e)}), 503
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        return jsonify({"error": str(e)}), error_status(e)
 
 @app.route('/analyze_nutrition', methods=['POST'])
 def analyze_nutrition_route():
     try:
-        data = request.get_json()
-        result = agents["nutrition_agent"](data, agents["user_proxy"], agents["nutrition_llm"])
-        return jsonify({"nutrition_analysis": result})
+        data = read_payload()
+        result = coalesce(data, lambda: run_pooled(
+            "nutrition_agent",
+            "nutrition_llm",
+            data.get("activity_result"),
+            data.get("sleep_result"),
+            data.get("stress_result"),
+            use_cache=use_llm_cache()
+        ))
+        return agent_response("nutrition_analysis", result)
+    except AgentPoolExhausted as e:
+        return jsonify({"error": str(e)}), 503
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        return jsonify({"error": str(e)}), error_status(e)
 
 # backend/app.py (只列出 group_summary 部分)
 
+def run_group_health_job(payload, on_stage):
+    """
+    Background job body for `POST /group_summary_chat?async=1`.
+    """
+    with agent_pool.checkout() as agents:
+        return run_group_health_chat(
+            activity_data=payload.get('activity_data'),
+            sleep_data=payload.get('sleep_data'),
+            stress_data=payload.get('stress_data'),
+            llm_config=llm_config,
+            agents=agents,
+            use_cache=payload.get('use_cache', True),
+            mode=payload.get('mode', "pipeline"),
+            on_stage=lambda stage, result, elapsed, error: on_stage(
+                stage, {"result": result, "elapsed": elapsed, "error": error}
+            )
+        )
+
+# Async job queue: jobs persist in SQLite (JOB_DB_PATH, default in the Flask instance
+# folder) and resume after a restart. Submissions without an Idempotency-Key are
+# deduplicated by payload while the job is unfinished or finished less than
+# JOB_DERIVED_KEY_TTL seconds ago.
+os.makedirs(app.instance_path, exist_ok=True)
+job_queue = JobQueue(
+    JobStore(os.getenv("JOB_DB_PATH", os.path.join(app.instance_path, "jobs.sqlite"))),
+    run_group_health_job,
+    workers=int(os.getenv("JOB_WORKERS", "2")),
+    max_pending=int(os.getenv("JOB_MAX_PENDING", "100")),
+    derived_key_ttl=float(os.getenv("JOB_DERIVED_KEY_TTL", "3600"))
+)
+
+def requested_mode(data):
+    """
+    Group pipeline execution mode from `?mode=`, the payload, or GROUP_CHAT_MODE.
+    """
+    return request.args.get('mode') or data.get('mode') or os.getenv("GROUP_CHAT_MODE", "pipeline")
+
 @app.route('/group_summary_chat', methods=['POST'])
 def group_health_chat():
     try:
@@ -104,29 +428,297 @@ def group_health_chat():
         sleep_data = data.get('sleep_data')
         stress_data = data.get('stress_data')
 
-        # 執行 Group Health Chat
-        results = run_group_health_chat(
-            activity_data=activity_data,
-            sleep_data=sleep_data,
-            stress_data=stress_data,
-            llm_config=llm_config
-        )
+        # 執行模式：pipeline（預設）或 groupchat
+        mode = requested_mode(data)
+        if mode not in EXECUTION_MODES:
+            return jsonify({
+                "status": "error",
+                "error": f"Unknown mode '{mode}', expected one of {list(EXECUTION_MODES)}"
+            }), 400
+
+        # async=1：排入背景工作佇列，立即回傳 job id
+        if request.args.get('async') == "1":
+            job, created = job_queue.submit(
+                {
+                    "activity_data": activity_data,
+                    "sleep_data": sleep_data,
+                    "stress_data": stress_data,
+                    "mode": mode,
+                    "use_cache": use_llm_cache()
+                },
+                idempotency_key=request.headers.get("Idempotency-Key")
+            )
+            return jsonify({
+                "status": job["status"],
+                "job_id": job["job_id"],
+                "duplicate": not created,
+                "status_url": f"/jobs/{job['job_id']}"
+            }), 202
+
+        # 執行 Group Health Chat（向 AgentPool 借一組 agent；相同的並行請求共用一次執行）
+        def run():
+            with agent_pool.checkout() as agents:
+                return run_group_health_chat(
+                    activity_data=activity_data,
+                    sleep_data=sleep_data,
+                    stress_data=stress_data,
+                    llm_config=llm_config,
+                    agents=agents,
+                    use_cache=use_llm_cache(),
+                    mode=mode
+                )
+        results = coalesce(data, run)
 
         return jsonify({
             "status": "success",
             "results": results
         })
 
+    except (AgentPoolExhausted, JobQueueFull) as e:
+        return jsonify({
+            "status": "error",
+            "error": str(e)
+        }), 503
     except Exception as e:
         return jsonify({
             "status": "error",
             "error": str(e)
-        }), 500
+        }), error_status(e)
+
+
+
+@app.route('/group_summary_chat/stream', methods=['POST'])
+def group_health_chat_stream():
+    """
+    Streaming variant of /group_summary_chat: one SSE event per finished stage.
+    """
+    data = request.get_json()
+    if not data:
+        return jsonify({"status": "error", "error": "Missing JSON payload"}), 400
+
+    mode = requested_mode(data)
+    if mode not in EXECUTION_MODES:
+        return jsonify({
+            "status": "error",
+            "error": f"Unknown mode '{mode}', expected one of {list(EXECUTION_MODES)}"
+        }), 400
+
+    events = stream_group_health_chat(
+        agent_pool,
+        llm_config,
+        activity_data=data.get('activity_data'),
+        sleep_data=data.get('sleep_data'),
+        stress_data=data.get('stress_data'),
+        use_cache=use_llm_cache(),
+        mode=mode
+    )
+    return Response(
+        stream_with_context(events),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """
+    Status, partial stage results and final output of an async group summary job.
+    """
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": f"Unknown job id: {job_id}"}), 404
+    job.pop("payload")
+    return jsonify(job)
+
+def run_stream_trigger(user_id, trigger, snapshot):
+    """
+    Analysis run when a streaming trigger fires: a stress check on the recent window,
+    plus anomaly detection when the heart rate is extreme at rest.
+    """
+    with agent_pool.checkout() as agents:
+        stress_result = agents["stress_agent"](snapshot, agents["user_proxy"], agents["stress_llm"])
+        result = {"stress_result": stress_result}
+        if trigger == "hr_extreme":
+            movement = format_movement_features(extract_activity_features(snapshot))
+            result["anomaly_result"] = agents["abnormaly_detection_agent"](
+                f"Recent movement (streamed):\n{movement}",
+                "Sleep is not monitored in this stream.",
+                stress_result,
+                agents["user_proxy"],
+                agents["abnormaly_detection_llm"]
+            )
+    return result
+
+# Streaming ingestion: fixed-size per-user rolling windows (INGEST_MAX_USERS users at most);
+# the LLM is only called when a local trigger fires
+stream_ingestor = StreamIngestor(
+    run_stream_trigger,
+    max_users=int(os.getenv("INGEST_MAX_USERS", "1000")),
+    workers=int(os.getenv("INGEST_TRIGGER_WORKERS", "2"))
+)
+
+@app.route('/ingest/<user_id>', methods=['POST'])
+def ingest_stream(user_id):
+    """
+    Chunked NDJSON upload: one JSON record per line, processed as it arrives, e.g.
+    {"ts": 1718000000.0, "heart_rate": 72, "eda": 2.1, "skin_temperature": 33.4, "acceleration": [[x, y, z], ...]}
+    """
+    accepted, rejected, triggers = 0, 0, []
+    for line in request.stream:
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            rejected += 1
+            continue
+        trigger = stream_ingestor.ingest(user_id, record)
+        if trigger is not None:
+            triggers.append({"trigger": trigger, "ts": record.get("ts")})
+        accepted += 1
+
+    return jsonify({
+        "user_id": user_id,
+        "accepted": accepted,
+        "rejected": rejected,
+        "triggers": triggers,
+        "status_url": f"/ingest/{user_id}"
+    })
+
+@app.route('/ingest/<user_id>', methods=['GET'])
+def ingest_state(user_id):
+    """
+    Rolling window statistics, baselines and recent trigger analyses of a streaming user.
+    """
+    state = stream_ingestor.user_state(user_id)
+    if state is None:
+        return jsonify({"error": f"No streamed data for user: {user_id}"}), 404
+    return jsonify(state)
+
+@app.route('/timeseries/<user_id>', methods=['POST'])
+def timeseries_append(user_id):
+    """
+    Appends sensor samples: {"heart_rate": {"ts": [...], "values": [...]}, "acceleration": {...}, ...}
+    (JSON or msgpack with raw arrays).
+    """
+    data = decode_sensor_request(request, max_samples=max_sensor_samples)
+    if not isinstance(data, dict) or not data:
+        return jsonify({"error": "Missing payload"}), 400
+    appended = {}
+    for signal, series in data.items():
+        if not isinstance(series, dict) or "ts" not in series or "values" not in series:
+            raise TimeSeriesError(f"{signal}: expected an object with 'ts' and 'values'")
+        appended[signal] = timeseries_store.append(user_id, signal, series["ts"], series["values"])
+    return jsonify({"user_id": user_id, "appended": appended})
+
+@app.route('/timeseries/<user_id>', methods=['GET'])
+def timeseries_signals(user_id):
+    return jsonify({"user_id": user_id, "signals": timeseries_store.signals(user_id)})
+
+def positive_arg(name, default, cast=float):
+    """
+    Query argument `name` as a positive finite number; a TimeSeriesError (400) otherwise.
+    """
+    raw = request.args.get(name, default)
+    try:
+        value = cast(raw)
+    except (TypeError, ValueError):
+        value = None
+    if value is None or not math.isfinite(value) or value <= 0:
+        raise TimeSeriesError(f"{name} must be a positive number, got {raw!r}")
+    return value
+
+@app.route('/timeseries/<user_id>/baseline', methods=['GET'])
+def timeseries_baseline(user_id):
+    """
+    Per-signal baseline over the last `days` (default 28) before `end` (default now).
+    """
+    days = positive_arg("days", "28")
+    return jsonify({
+        "user_id": user_id,
+        "days": days,
+        "baseline": timeseries_store.baseline(user_id, days=days, end=request.args.get("end"))
+    })
+
+@app.route('/timeseries/<user_id>/<signal>', methods=['GET'])
+def timeseries_query(user_id, signal):
+    """
+    Range query: `?start=&end=` (epoch seconds or ISO 8601) and `resolution=` raw
+    (default, at most `limit` samples) or one of minute / hour / day.
+    """
+    start, end = request.args.get("start"), request.args.get("end")
+    resolution = request.args.get("resolution", "raw")
+    if resolution in ROLLUPS:
+        rows = timeseries_store.rollup(user_id, signal, resolution, start, end)
+        return jsonify({
+            "user_id": user_id,
+            "signal": signal,
+            "resolution": resolution,
+            "summary": summarise_rollups(rows),
+            "buckets": [
+                {"start": float(r["start"]), "count": int(r["count"]), "mean": float(r["sum"]) / int(r["count"]),
+                 "min": float(r["min"]), "max": float(r["max"])}
+                for r in rows
+            ]
+        })
+    if resolution != "raw":
+        raise TimeSeriesError(f"Unknown resolution {resolution!r}, expected raw or one of {list(ROLLUPS)}")
 
+    limit = positive_arg("limit", "10000", int)
+    ts, values = timeseries_store.range(user_id, signal, start, end)
+    return jsonify({
+        "user_id": user_id,
+        "signal": signal,
+        "resolution": "raw",
+        "count": len(ts),
+        "truncated": len(ts) > limit,
+        "ts": ts[:limit].tolist(),
+        "values": values[:limit].tolist()
+    })
 
+@app.route('/stats', methods=['GET'])
+def stats_route():
+    return jsonify({
+        "agent_pool": agent_pool.stats(),
+        "coalescer": get_coalescer().stats(),
+        "llm_cache": get_llm_cache().stats(),
+        "approx_cache": get_approx_cache().stats(),
+        "anomaly_engine": get_anomaly_engine().stats(),
+        "structured_outputs": get_structured_outputs().stats(),
+        "food_database": get_food_database().stats(),
+        "stage_store": get_stage_store().stats(),
+        "local_classifier": get_local_gate().stats(),
+        "model_router": get_model_router().stats(),
+        "http_client": http_client.stats(),
+        "async_http_client": get_async_http_client().stats() if get_async_http_client() is not None else None,
+        "rate_limiter": rate_limiter.stats(),
+        "ingest": stream_ingestor.stats(),
+        "traffic": {
+            "recorder": traffic_recorder.stats() if traffic_recorder is not None else None,
+            "replay": traffic_replay.stats() if traffic_replay is not None else None
+        }
+    })
 
 
+# Component stats exposed as gauges on /metrics, read at scrape time
+REGISTRY.add_stats_collector("agent_pool", agent_pool.stats)
+REGISTRY.add_stats_collector("coalescer", lambda: get_coalescer().stats())
+REGISTRY.add_stats_collector("llm_cache", lambda: get_llm_cache().stats())
+REGISTRY.add_stats_collector("anomaly_engine", lambda: get_anomaly_engine().stats())
+REGISTRY.add_stats_collector("food_database", lambda: get_food_database().stats())
+REGISTRY.add_stats_collector("approx_cache", lambda: get_approx_cache().stats(), label="agent")
+REGISTRY.add_stats_collector("stage_store", lambda: get_stage_store().stats())
+REGISTRY.add_stats_collector("local_classifier", lambda: get_local_gate().stats(), label="agent")
+REGISTRY.add_stats_collector("model_router", lambda: get_model_router().tier_stats(), label="agent_tier")
+REGISTRY.add_stats_collector("http_client", http_client.stats)
+REGISTRY.add_stats_collector("rate_limiter", rate_limiter.stats)
+REGISTRY.add_stats_collector("ingest", stream_ingestor.stats)
 
+@app.route('/metrics', methods=['GET'])
+def metrics_route():
+    """
+    Prometheus text exposition of request, per-agent LLM and component metrics.
+    """
+    return Response(REGISTRY.render(), mimetype="text/plain; version=0.0.4")
 
 # Main server startup
 if __name__ == '__main__':
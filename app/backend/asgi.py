@@ -0,0 +1,431 @@
+# backend/asgi.py
+"""
+Async serving mode: one process holding thousands of in-flight LLM-backed requests.
+
+The LLM-backed routes (/analyze_*, /detect_anomaly, /analyze_nutrition and
+/group_summary_chat[/stream]) run on a Quart app with non-blocking LLM calls
+(core.agent_chat.a_ask_agent over AsyncSharedHttpClient), so a waiting request costs a
+coroutine instead of a thread and a checked-out agent set. Every other route (jobs,
+ingest, timeseries, stats, metrics) is served by the Flask app of backend/app.py through
+Hypercorn's WSGI middleware; configuration, caches and stats are shared with it.
+The JSON contract is the same as the threaded server's.
+
+Run (from app/backend):
+    hypercorn asgi:app --bind 0.0.0.0:5001 --backlog 4096
+"""
+
+import asyncio
+import os
+import sys
+import time
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from hypercorn.middleware import AsyncioWSGIMiddleware
+from quart import Quart, Response, g, jsonify, request
+
+from backend import app as wsgi_backend
+from backend.agent_pool import AgentPoolExhausted
+from backend.agents import setup_agents
+from backend.coalescer import get_coalescer, request_key
+from backend.group_summary_chat import EXECUTION_MODES, a_run_group_health_chat, run_group_health_chat
+from backend.http_client import configure_async_http_client
+from backend.jobs import JobQueueFull
+from backend.metrics import REGISTRY, instrument_quart, llm_metrics_observer, record_error
+from backend.rate_limiter import is_rate_limit_error
+from backend.sensor_codec import SensorPayloadError, decode_sensor_body
+from backend.streaming import a_relay_stream, a_stream_group_health_chat, stream_group_health_chat
+from backend.timeseries import TimeSeriesError
+from backend.traffic import RECORDED_HEADERS
+from core.abnormaly_agent import a_phrase_anomalies, anomaly_contexts
+from core.agent_chat import configure_async_llm, off_loop
+from core.anomaly_engine import CONTEXTS as ANOMALY_CONTEXTS, SIGNALS as VITAL_SIGNALS, get_anomaly_engine
+from core.agent_results import render_result
+
+llm_config = wsgi_backend.llm_config
+agent_pool = wsgi_backend.agent_pool
+timeseries_store = wsgi_backend.timeseries_store
+
+# Async HTTP client for every LLM call of the async routes: same rate limiter (RPM / TPM,
+# AIMD concurrency, retries), replay store and observers as the threaded client
+async_http_client = configure_async_http_client(
+    rate_limiter=wsgi_backend.rate_limiter,
+    replay=wsgi_backend.traffic_replay,
+    pool_size=int(os.getenv("ASYNC_HTTP_POOL_SIZE", "1000")),
+    keepalive=int(os.getenv("ASYNC_HTTP_KEEPALIVE_CONNECTIONS", "100")),
+    max_per_host=int(os.getenv("ASYNC_HTTP_MAX_PER_HOST", "500")),
+    shards=int(os.getenv("ASYNC_HTTP_POOL_SHARDS", "8")),
+    keepalive_expiry=float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "60"))
+)
+async_http_client.transport.add_observer(llm_metrics_observer)
+if wsgi_backend.traffic_recorder is not None:
+    async_http_client.transport.add_observer(wsgi_backend.traffic_recorder.llm_observer)
+configure_async_llm(async_http_client)
+
+# One agent set for all async requests: the async runners only read the agents'
+# llm_config and system messages, so nothing is checked out per request
+agents = setup_agents(llm_config)
+if os.getenv("AGENT_PRELOAD") == "1":
+    agents.build_all()
+
+# Request bodies larger than ASYNC_OFFLOAD_BYTES are decoded and hashed in a worker
+# thread instead of on the event loop (feature extraction always is)
+offload_bytes = int(os.getenv("ASYNC_OFFLOAD_BYTES", "65536"))
+
+# Requests beyond ASYNC_MAX_IN_FLIGHT concurrent async-route requests get 503 instead of
+# queueing without bound (memory stays proportional to the cap)
+max_in_flight = int(os.getenv("ASYNC_MAX_IN_FLIGHT", "4096"))
+serving_stats = {"in_flight": 0, "peak_in_flight": 0, "rejected": 0, "max_in_flight": max_in_flight}
+
+async_app = Quart(__name__)
+async_app.config["MAX_CONTENT_LENGTH"] = wsgi_backend.app.config["MAX_CONTENT_LENGTH"]
+# SSE responses last as long as the pipeline; LLM calls have their own timeouts
+async_app.config["RESPONSE_TIMEOUT"] = None
+instrument_quart(async_app)
+
+
+@async_app.before_request
+async def _admit_request():
+    if serving_stats["in_flight"] >= max_in_flight:
+        serving_stats["rejected"] += 1
+        return jsonify({"error": f"Server busy: {max_in_flight} requests in flight"}), 503
+    g.admitted = True
+    serving_stats["in_flight"] += 1
+    serving_stats["peak_in_flight"] = max(serving_stats["peak_in_flight"], serving_stats["in_flight"])
+
+
+@async_app.teardown_request
+async def _release_request(exc):
+    if g.get("admitted"):
+        serving_stats["in_flight"] -= 1
+
+
+if wsgi_backend.traffic_recorder is not None:
+    @async_app.before_request
+    async def _start_traffic_record():
+        g.traffic_start = time.perf_counter()
+
+    @async_app.after_request
+    async def _record_traffic(response):
+        wsgi_backend.traffic_recorder.record_inbound(
+            method=request.method,
+            route=request.url_rule.rule if request.url_rule is not None else None,
+            path=request.path,
+            query=request.args.to_dict(),
+            headers={k: request.headers[k] for k in RECORDED_HEADERS if k in request.headers},
+            payload=await request.get_json(silent=True),
+            status=response.status_code,
+            elapsed=time.perf_counter() - g.get("traffic_start", time.perf_counter()),
+        )
+        return response
+
+
+@async_app.after_serving
+async def _close_async_http_client():
+    await async_http_client.aclose()
+
+
+def error_status(e):
+    """
+    As backend.app.error_status, counting the error under the current route.
+    """
+    record_error(e, route=request.url_rule.rule if request.url_rule is not None else "unmatched")
+    return 429 if is_rate_limit_error(e) else 500
+
+
+async def read_payload():
+    """
+    As backend.app.read_payload, with the body awaited instead of read from a WSGI stream.
+    Bodies above ASYNC_OFFLOAD_BYTES are decoded (and later hashed for coalescing) in a
+    worker thread, as are time ranges expanded from the memory-mapped store.
+    """
+    body = await request.get_data(cache=True)
+    g.large_payload = len(body) > offload_bytes
+    data = await off_loop(g.large_payload, decode_sensor_body, request.mimetype, body, request.args,
+                          wsgi_backend.max_sensor_samples)
+    return await off_loop(isinstance(data, dict) and "time_range" in data, timeseries_store.resolve_payload, data)
+
+
+def use_llm_cache():
+    """
+    Per-request cache bypass: `Cache-Control: no-cache` header or `?cache=0`.
+    """
+    if "no-cache" in request.headers.get("Cache-Control", ""):
+        return False
+    return request.args.get("cache", "1") != "0"
+
+
+async def coalesce(data, make_coro):
+    """
+    Awaits make_coro() once for identical concurrent requests to this route; the shared
+    computation is cancelled when every one of them has disconnected (see backend.coalescer).
+    """
+    key = await off_loop(g.get("large_payload", False), request_key, request.path, request.args, data, use_llm_cache())
+    return await get_coalescer().a_do(key, make_coro)
+
+
+@async_app.errorhandler(SensorPayloadError)
+async def sensor_payload_error(e):
+    return jsonify({"error": str(e)}), e.status
+
+
+@async_app.errorhandler(TimeSeriesError)
+async def timeseries_error(e):
+    return jsonify({"error": str(e)}), 400
+
+
+@async_app.route('/analyze_activity', methods=['POST'])
+async def analyze_activity_route():
+    data = await read_payload()
+    if not data:
+        return jsonify({"error": "Missing JSON payload"}), 400
+    try:
+        result = await coalesce(data, lambda: agents["a_activity_agent"](
+            data, agents["user_proxy"], agents["activity_llm"], use_cache=use_llm_cache()
+        ))
+        return jsonify(wsgi_backend.agent_body("activity_analysis", result))
+    except Exception as e:
+        return jsonify({"error": str(e)}), error_status(e)
+
+
+@async_app.route('/analyze_sleep', methods=['POST'])
+async def analyze_sleep_route():
+    data = await read_payload()
+    if not data:
+        return jsonify({"error": "Missing JSON payload"}), 400
+    try:
+        result = await coalesce(data, lambda: agents["a_sleep_agent"](
+            data, agents["user_proxy"], agents["sleep_llm"], use_cache=use_llm_cache()
+        ))
+        return jsonify(wsgi_backend.agent_body("sleep_analysis", result))
+    except Exception as e:
+        return jsonify({"error": str(e)}), error_status(e)
+
+
+@async_app.route('/analyze_stress', methods=['POST'])
+async def analyze_stress_route():
+    data = await read_payload()
+    if not data:
+        return jsonify({"error": "Missing JSON payload"}), 400
+    try:
+        result = await coalesce(data, lambda: agents["a_stress_agent"](
+            data, agents["user_proxy"], agents["stress_llm"], use_cache=use_llm_cache()
+        ))
+        return jsonify(wsgi_backend.agent_body("stress_analysis", result))
+    except Exception as e:
+        return jsonify({"error": str(e)}), error_status(e)
+
+
+@async_app.route('/detect_anomaly', methods=['POST'])
+async def detect_anomaly_route():
+    """
+    Same inputs and responses as the threaded /detect_anomaly.
+    """
+    data = await read_payload() or {}
+    engine = get_anomaly_engine()
+    nested = any(k in data for k in ("activity_data", "sleep_data", "stress_data"))
+    if engine.enabled and (nested or any(k in data for k in VITAL_SIGNALS)):
+        if nested:
+            contexts = anomaly_contexts(data.get("activity_data"), data.get("sleep_data"), data.get("stress_data"))
+        else:
+            context = request.args.get("context") or data.get("context", "day")
+            if context not in ANOMALY_CONTEXTS:
+                return jsonify({"error": f"Unknown context '{context}', expected one of {list(ANOMALY_CONTEXTS)}"}), 400
+            contexts = {context: data}
+        try:
+            result, findings = await asyncio.to_thread(engine.check, contexts, data.get("user_id"))
+
+            phrase = request.args.get("phrase")
+            if findings and (engine.phrase_with_llm if phrase is None else phrase == "1"):
+                detected = result
+                result = await coalesce(data, lambda: a_phrase_anomalies(
+                    detected, agents["user_proxy"], agents["abnormaly_detection_llm"], use_cache=use_llm_cache()
+                ))
+        except Exception as e:
+            return jsonify({"error": str(e)}), error_status(e)
+        return jsonify({
+            "anomaly_analysis": render_result(result),
+            "structured": result.to_dict(),
+            "findings": findings,
+            "engine": "local"
+        })
+
+    required_keys = ["stress_result", "sleep_result", "activity_result"]
+    if not all(k in data for k in required_keys):
+        return jsonify({"error": f"Missing one or more required fields: {required_keys}"}), 400
+    try:
+        result = await coalesce(data, lambda: agents["a_abnormaly_detection_agent"](
+            data["activity_result"],
+            data["sleep_result"],
+            data["stress_result"],
+            agents["user_proxy"],
+            agents["abnormaly_detection_llm"],
+            use_cache=use_llm_cache()
+        ))
+        return jsonify(wsgi_backend.agent_body("anomaly_analysis", result))
+    except Exception as e:
+        return jsonify({"error": str(e)}), error_status(e)
+
+
+@async_app.route('/analyze_nutrition', methods=['POST'])
+async def analyze_nutrition_route():
+    try:
+        data = await read_payload()
+        result = await coalesce(data, lambda: agents["a_nutrition_agent"](
+            data.get("activity_result"),
+            data.get("sleep_result"),
+            data.get("stress_result"),
+            agents["user_proxy"],
+            agents["nutrition_llm"],
+            use_cache=use_llm_cache()
+        ))
+        return jsonify(wsgi_backend.agent_body("nutrition_analysis", result))
+    except Exception as e:
+        return jsonify({"error": str(e)}), error_status(e)
+
+
+def requested_mode(data):
+    return request.args.get('mode') or data.get('mode') or os.getenv("GROUP_CHAT_MODE", "pipeline")
+
+
+def run_group_chat_mode(activity_data, sleep_data, stress_data, use_cache):
+    """
+    GroupChat mode runs AutoGen's synchronous speaker-selection loop, so it keeps using
+    a checked-out agent set in a worker thread.
+    """
+    with agent_pool.checkout() as pooled_agents:
+        return run_group_health_chat(
+            activity_data=activity_data,
+            sleep_data=sleep_data,
+            stress_data=stress_data,
+            llm_config=llm_config,
+            agents=pooled_agents,
+            use_cache=use_cache,
+            mode="groupchat"
+        )
+
+
+@async_app.route('/group_summary_chat', methods=['POST'])
+async def group_health_chat():
+    try:
+        data = await request.get_json()
+
+        activity_data = data.get('activity_data')
+        sleep_data = data.get('sleep_data')
+        stress_data = data.get('stress_data')
+
+        mode = requested_mode(data)
+        if mode not in EXECUTION_MODES:
+            return jsonify({
+                "status": "error",
+                "error": f"Unknown mode '{mode}', expected one of {list(EXECUTION_MODES)}"
+            }), 400
+
+        # async=1：交給同一個背景工作佇列（SQLite 寫入放到 worker thread）
+        if request.args.get('async') == "1":
+            job, created = await asyncio.to_thread(
+                wsgi_backend.job_queue.submit,
+                {
+                    "activity_data": activity_data,
+                    "sleep_data": sleep_data,
+                    "stress_data": stress_data,
+                    "mode": mode,
+                    "use_cache": use_llm_cache()
+                },
+                idempotency_key=request.headers.get("Idempotency-Key")
+            )
+            return jsonify({
+                "status": job["status"],
+                "job_id": job["job_id"],
+                "duplicate": not created,
+                "status_url": f"/jobs/{job['job_id']}"
+            }), 202
+
+        if mode == "groupchat":
+            results = await coalesce(data, lambda: asyncio.to_thread(
+                run_group_chat_mode, activity_data, sleep_data, stress_data, use_llm_cache()
+            ))
+        else:
+            results = await coalesce(data, lambda: a_run_group_health_chat(
+                activity_data=activity_data,
+                sleep_data=sleep_data,
+                stress_data=stress_data,
+                agents=agents,
+                use_cache=use_llm_cache()
+            ))
+
+        return jsonify({
+            "status": "success",
+            "results": results
+        })
+
+    except (AgentPoolExhausted, JobQueueFull) as e:
+        return jsonify({
+            "status": "error",
+            "error": str(e)
+        }), 503
+    except Exception as e:
+        return jsonify({
+            "status": "error",
+            "error": str(e)
+        }), error_status(e)
+
+
+@async_app.route('/group_summary_chat/stream', methods=['POST'])
+async def group_health_chat_stream():
+    """
+    Streaming variant of /group_summary_chat: one SSE event per finished stage.
+    """
+    data = await request.get_json()
+    if not data:
+        return jsonify({"status": "error", "error": "Missing JSON payload"}), 400
+
+    mode = requested_mode(data)
+    if mode not in EXECUTION_MODES:
+        return jsonify({
+            "status": "error",
+            "error": f"Unknown mode '{mode}', expected one of {list(EXECUTION_MODES)}"
+        }), 400
+
+    if mode == "groupchat":
+        events = a_relay_stream(stream_group_health_chat(
+            agent_pool,
+            llm_config,
+            activity_data=data.get('activity_data'),
+            sleep_data=data.get('sleep_data'),
+            stress_data=data.get('stress_data'),
+            use_cache=use_llm_cache(),
+            mode=mode
+        ))
+    else:
+        events = a_stream_group_health_chat(
+            agents,
+            activity_data=data.get('activity_data'),
+            sleep_data=data.get('sleep_data'),
+            stress_data=data.get('stress_data'),
+            use_cache=use_llm_cache()
+        )
+    return Response(
+        events,
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+REGISTRY.add_stats_collector("async_http_client", async_http_client.stats)
+REGISTRY.add_stats_collector("async_serving", lambda: dict(serving_stats))
+
+# Async-native routes; everything else is served by the Flask app
+ASYNC_ROUTES = frozenset(rule.rule for rule in async_app.url_map.iter_rules() if rule.endpoint != "static")
+
+wsgi_app = AsyncioWSGIMiddleware(wsgi_backend.app, max_body_size=wsgi_backend.app.config["MAX_CONTENT_LENGTH"])
+
+
+async def app(scope, receive, send):
+    """
+    ASGI entry point: async-native routes (and lifespan events) go to the Quart app,
+    all other HTTP requests to the Flask app.
+    """
+    if scope["type"] == "http" and scope["path"] not in ASYNC_ROUTES:
+        await wsgi_app(scope, receive, send)
+    else:
+        await async_app(scope, receive, send)
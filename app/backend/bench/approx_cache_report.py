@@ -0,0 +1,202 @@
+# backend/bench/approx_cache_report.py
+"""
+Offline hit-rate / quality report for the approximate (quantized-input) cache, computed
+from a traffic recording made with TRAFFIC_RECORD_PATH (no backend or LLM needed).
+
+For every sensor agent payload in the recording (the /analyze_* routes and the branches
+of /group_summary_chat) the cache is simulated in arrival order at several bucket scales.
+For each simulated approximate hit, the answer the cache would have served is compared
+with the answer the LLM actually gave for that request (when it is in the recording):
+
+- label_agreement: same sleep stage + quality / stress level / activity type
+- similarity: difflib ratio of the two answers
+
+Usage (from app/backend):
+    python bench/approx_cache_report.py traffic.jsonl
+    python bench/approx_cache_report.py traffic.jsonl --scales 0.5,1,2,4 --agents sleep,stress,activity
+    python bench/approx_cache_report.py traffic.jsonl --buckets '{"stress": {"heart_rate": 10}}'
+
+Record with LLM_CACHE_SIZE=0 and APPROX_CACHE_AGENTS= so every request reaches the
+LLM and has an answer to compare against.
+"""
+
+import argparse
+import difflib
+import json
+import os
+import re
+import sys
+from collections import OrderedDict
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from core.activity_agent import build_activity_prompt  # noqa: E402
+from core.activity_features import extract_activity_features  # noqa: E402
+from core.approx_cache import DEFAULT_BUCKETS, merge_buckets, quantize_inputs  # noqa: E402
+from core.sleep_agent import build_sleep_prompt  # noqa: E402
+from core.stress_agent import build_stress_prompt  # noqa: E402
+
+PROMPT_BUILDERS = {
+    "activity": build_activity_prompt,
+    "sleep": build_sleep_prompt,
+    "stress": build_stress_prompt,
+}
+
+# Route → [(agent, payload field)]; None means the whole payload
+ROUTE_AGENTS = {
+    "/analyze_activity": [("activity", None)],
+    "/analyze_sleep": [("sleep", None)],
+    "/analyze_stress": [("stress", None)],
+    "/group_summary_chat": [("activity", "activity_data"), ("sleep", "sleep_data"), ("stress", "stress_data")],
+}
+
+# Labels compared between the served and the actual answer
+LABELS = {
+    "activity": [r"\b(Sedentary|Walking|Running)\b"],
+    "sleep": [r"\b(Awake|Light|Deep|REM)\b", r"\b(Good|Fair|Poor)\b"],
+    "stress": [r"\b(Low|Medium|High)\b"],
+}
+
+
+def _completion_text(record: dict):
+    body = record.get("response") or ""
+    if "text/event-stream" in (record.get("content_type") or ""):
+        parts = []
+        for line in body.splitlines():
+            if line.startswith("data:") and line.strip() != "data: [DONE]":
+                try:
+                    choices = json.loads(line[5:]).get("choices") or []
+                except ValueError:
+                    continue
+                for choice in choices:
+                    parts.append((choice.get("delta") or {}).get("content") or "")
+        return "".join(parts) or None
+    try:
+        return json.loads(body)["choices"][0]["message"]["content"]
+    except (ValueError, KeyError, IndexError, TypeError):
+        return None
+
+
+def load_recording(path: str):
+    """
+    Returns (sensor agent requests in arrival order as [(agent, payload)], {prompt: answer}).
+    """
+    inbound, answers = [], {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if record.get("type") == "inbound" and record.get("status") == 200:
+                inbound.append(record)
+            elif record.get("type") == "llm" and record.get("status") == 200:
+                messages = (record.get("request") or {}).get("messages") or []
+                prompt = next((m.get("content") for m in reversed(messages) if m.get("role") == "user"), None)
+                text = _completion_text(record)
+                if isinstance(prompt, str) and text:
+                    answers.setdefault(prompt.strip(), text)
+
+    requests = []
+    for record in sorted(inbound, key=lambda r: r["ts"]):
+        for agent, field in ROUTE_AGENTS.get(record.get("route"), []):
+            payload = record.get("payload") or {}
+            data = payload if field is None else payload.get(field)
+            if isinstance(data, dict):
+                requests.append((agent, data))
+    return requests, answers
+
+
+def scale_buckets(buckets: dict, scale: float) -> dict:
+    scaled = {}
+    for agent, config in buckets.items():
+        scaled[agent] = {field: step * scale for field, step in config.items() if field != "features"}
+        scaled[agent]["features"] = {name: step * scale for name, step in config.get("features", {}).items()}
+    return scaled
+
+
+def _labels(agent: str, text: str) -> tuple:
+    return tuple((m.group(1) if m else None) for m in (re.search(p, text) for p in LABELS[agent]))
+
+
+def simulate(requests: list, answers: dict, buckets: dict, agents: list, size: int) -> dict:
+    """
+    Replays the requests through a per-agent LRU keyed by the quantized inputs.
+    """
+    report = {}
+    for agent in agents:
+        lru = OrderedDict()
+        stats = {"requests": 0, "hits": 0, "exact_hits": 0, "compared": 0, "label_agreement": 0, "similarity": 0.0}
+        for name, data in requests:
+            if name != agent:
+                continue
+            stats["requests"] += 1
+            features = extract_activity_features(data)
+            prompt = PROMPT_BUILDERS[agent](data, features)
+            actual = answers.get(prompt)
+            key = json.dumps(quantize_inputs(data, features, buckets.get(agent, {})), sort_keys=True)
+
+            cached = lru.get(key)
+            if cached is None:
+                lru[key] = (prompt, actual)
+                while len(lru) > size:
+                    lru.popitem(last=False)
+                continue
+
+            lru.move_to_end(key)
+            stats["hits"] += 1
+            served_prompt, served = cached
+            if served_prompt == prompt:
+                stats["exact_hits"] += 1
+            if served and actual:
+                stats["compared"] += 1
+                stats["label_agreement"] += _labels(agent, served) == _labels(agent, actual)
+                stats["similarity"] += difflib.SequenceMatcher(None, served, actual).ratio()
+
+        compared = stats["compared"]
+        report[agent] = {
+            "requests": stats["requests"],
+            "hit_rate": round(stats["hits"] / stats["requests"], 4) if stats["requests"] else 0.0,
+            "exact_hit_rate": round(stats["exact_hits"] / stats["requests"], 4) if stats["requests"] else 0.0,
+            "compared": compared,
+            "label_agreement": round(stats["label_agreement"] / compared, 4) if compared else None,
+            "similarity": round(stats["similarity"] / compared, 4) if compared else None,
+        }
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Approximate cache hit-rate / quality report")
+    parser.add_argument("recording", help="JSONL written with TRAFFIC_RECORD_PATH")
+    parser.add_argument("--agents", default="sleep,stress,activity", help="Comma-separated sensor agents")
+    parser.add_argument("--buckets", default="{}", help="JSON per-agent step overrides (as APPROX_CACHE_BUCKETS)")
+    parser.add_argument("--scales", default="0.5,1,2,4", help="Bucket step multipliers to compare")
+    parser.add_argument("--size", type=int, default=1024, help="LRU size per agent (APPROX_CACHE_SIZE)")
+    parser.add_argument("--output", default=None, help="Report JSON path")
+    args = parser.parse_args(argv)
+
+    agents = [a for a in args.agents.split(",") if a in DEFAULT_BUCKETS]
+    requests, answers = load_recording(args.recording)
+    if not requests:
+        parser.error(f"no sensor agent requests in {args.recording}")
+    buckets = merge_buckets(json.loads(args.buckets))
+
+    report = {"recording": args.recording, "answers_recorded": len(answers), "scales": {}}
+    print(f"{'agent':<10} {'scale':>6} {'requests':>9} {'hit rate':>9} {'exact':>7} {'compared':>9} {'labels':>7} {'similarity':>11}")
+    for scale in (float(s) for s in args.scales.split(",")):
+        results = simulate(requests, answers, scale_buckets(buckets, scale), agents, args.size)
+        report["scales"][str(scale)] = results
+        for agent, r in results.items():
+            labels = "-" if r["label_agreement"] is None else f"{r['label_agreement']:.3f}"
+            similarity = "-" if r["similarity"] is None else f"{r['similarity']:.3f}"
+            print(f"{agent:<10} {scale:>6g} {r['requests']:>9} {r['hit_rate']:>9.3f} {r['exact_hit_rate']:>7.3f} "
+                  f"{r['compared']:>9} {labels:>7} {similarity:>11}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+# backend/bench/concurrency_memory.py
+"""
+Concurrency vs. memory load test for the two serving modes:
+
+- sync: the threaded Flask server (one thread and one checked-out agent set per request)
+- async: backend/asgi.py on Hypercorn (one coroutine per request, shared agent set)
+
+For each mode and level N, a fresh backend is started against the LLM stub (fixed
+latency, so every request stays in flight for the same time), N requests are fired at
+once and the backend's peak RSS and thread count are sampled while they are in flight
+(summed over its process tree: Hypercorn serves from a worker process).
+
+Usage (from app/backend):
+    python bench/concurrency_memory.py --levels 100,500,1000,2000 --output concurrency.json
+    python bench/concurrency_memory.py --modes async --levels 4000 --latency fixed:2
+
+Local classifiers are off (every request reaches the LLM) and requests carry
+`Cache-Control: no-cache`; the LLM concurrency and connection limits are raised to N so
+the backend, not the client-side limiter, holds the requests.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+
+import httpx
+
+from run_bench import BACKEND_DIR, STUB_PATH, git_commit, make_payload, percentile, wait_for
+
+BACKEND_CMDS = {
+    "sync": [sys.executable, "-c", "import app; app.app.run(host='127.0.0.1', port={port}, threaded=True)"],
+    "async": [sys.executable, "-m", "hypercorn", "asgi:app", "--bind", "127.0.0.1:{port}", "--backlog", "4096"],
+}
+
+
+def process_tree(pid: int) -> list:
+    pids, i = [pid], 0
+    while i < len(pids):
+        try:
+            for task in os.listdir(f"/proc/{pids[i]}/task"):
+                with open(f"/proc/{pids[i]}/task/{task}/children") as f:
+                    pids.extend(int(child) for child in f.read().split())
+        except OSError:
+            pass
+        i += 1
+    return pids
+
+
+def read_tree_usage(pid: int) -> tuple:
+    """
+    (RSS in MB, threads) summed over `pid` and its descendants.
+    """
+    rss_kb = threads = 0
+    for member in process_tree(pid):
+        try:
+            with open(f"/proc/{member}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        rss_kb += int(line.split()[1])
+                    elif line.startswith("Threads:"):
+                        threads += int(line.split()[1])
+        except OSError:
+            continue
+    return rss_kb / 1024.0, threads
+
+
+class TreeSampler:
+    """
+    Samples a process tree's RSS and thread count in the background and keeps the peaks.
+    """
+
+    def __init__(self, pid: int, interval: float = 0.05):
+        self.pid = pid
+        self.interval = interval
+        self.peak_rss = 0.0
+        self.peak_threads = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            rss, threads = read_tree_usage(self.pid)
+            self.peak_rss = max(self.peak_rss, rss)
+            self.peak_threads = max(self.peak_threads, threads)
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def backend_env(args, level: int) -> dict:
+    env = dict(os.environ)
+    env.update({
+        "OPENAI_API_KEY": "bench",
+        "OPENAI_API_BASE": f"http://127.0.0.1:{args.stub_port}/v1",
+        "PYTHONPATH": BACKEND_DIR + os.pathsep + env.get("PYTHONPATH", ""),
+        "LOCAL_CLASSIFIER_ENABLED": "0",
+        "LLM_INITIAL_CONCURRENCY": str(level),
+        "LLM_MAX_CONCURRENCY": str(level),
+        "HTTP_POOL_SIZE": str(level),
+        "HTTP_MAX_PER_HOST": str(level),
+        "ASYNC_HTTP_POOL_SIZE": str(level),
+        "ASYNC_HTTP_MAX_PER_HOST": str(level),
+        "AGENT_POOL_SIZE": str(args.sync_pool_size),
+        "HTTP_WARMUP_CONNECTIONS": "0",
+    })
+    for item in args.env:
+        key, _, value = item.partition("=")
+        env[key] = value
+    return env
+
+
+async def fire(base_url: str, route: str, bodies: list, timeout: float) -> list:
+    """
+    Sends every body at once; returns [(status or exception name, seconds)].
+    """
+    limits = httpx.Limits(max_connections=len(bodies), max_keepalive_connections=0)
+    headers = {"Content-Type": "application/json", "Cache-Control": "no-cache"}
+    async with httpx.AsyncClient(timeout=timeout, limits=limits) as client:
+        async def one(body):
+            start = time.perf_counter()
+            try:
+                status = (await client.post(base_url + route, content=body, headers=headers)).status_code
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            return status, time.perf_counter() - start
+
+        return await asyncio.gather(*(one(body) for body in bodies))
+
+
+def run_level(args, mode: str, level: int, workdir: str) -> dict:
+    port = args.backend_port
+    cmd = [part.format(port=port) for part in BACKEND_CMDS[mode]]
+    log = open(os.path.join(workdir, f"backend-{mode}-{level}.log"), "w")
+    # Scratch directory keeps AutoGen's disk cache and the job DB out of the tree
+    backend = subprocess.Popen(cmd, cwd=workdir, env=backend_env(args, level), stdout=log, stderr=subprocess.STDOUT)
+    try:
+        wait_for(f"http://127.0.0.1:{port}/stats")
+        idle_rss, idle_threads = read_tree_usage(backend.pid)
+        bodies = [json.dumps(make_payload(args.route, args.seed + i, args.samples)).encode() for i in range(level)]
+
+        start = time.perf_counter()
+        with TreeSampler(backend.pid) as usage:
+            outcomes = asyncio.run(fire(f"http://127.0.0.1:{port}", args.route, bodies, args.timeout))
+        wall = time.perf_counter() - start
+    finally:
+        backend.terminate()
+        try:
+            backend.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            backend.kill()
+        log.close()
+
+    latencies = sorted(elapsed * 1000 for status, elapsed in outcomes if status == 200)
+    statuses = {}
+    for status, _ in outcomes:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    return {
+        "mode": mode,
+        "level": level,
+        "ok": statuses.get("200", 0),
+        "statuses": statuses,
+        "wall_s": round(wall, 2),
+        "latency_ms": {"p50": round(percentile(latencies, 0.50), 1), "p95": round(percentile(latencies, 0.95), 1),
+                       "max": round(latencies[-1], 1) if latencies else 0.0},
+        "idle_rss_mb": round(idle_rss, 1),
+        "peak_rss_mb": round(usage.peak_rss, 1),
+        "rss_per_request_kb": round((usage.peak_rss - idle_rss) * 1024 / level, 1),
+        "idle_threads": idle_threads,
+        "peak_threads": usage.peak_threads,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Concurrency vs. memory: threaded Flask vs. async Hypercorn")
+    parser.add_argument("--modes", default="sync,async", help="Comma-separated serving modes")
+    parser.add_argument("--levels", default="100,500,1000,2000", help="Simultaneous requests per run")
+    parser.add_argument("--route", default="/analyze_stress")
+    parser.add_argument("--samples", type=int, default=100, help="Accelerometer samples per payload")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--latency", default="fixed:1.0", help="Stub time to first token")
+    parser.add_argument("--timeout", type=float, default=300.0, help="Client timeout per request (s)")
+    parser.add_argument("--sync-pool-size", type=int, default=64, help="AGENT_POOL_SIZE of the threaded server")
+    parser.add_argument("--stub-port", type=int, default=8799)
+    parser.add_argument("--backend-port", type=int, default=5098)
+    parser.add_argument("--env", action="append", default=[], help="KEY=VALUE passed to both backends")
+    parser.add_argument("--output", default=None, help="Results JSON path")
+    args = parser.parse_args(argv)
+
+    modes = [m for m in args.modes.split(",") if m]
+    levels = [int(n) for n in args.levels.split(",") if n]
+    workdir = tempfile.mkdtemp(prefix="health-concurrency-")
+    stub = subprocess.Popen(
+        [sys.executable, STUB_PATH, "--port", str(args.stub_port), "--latency", args.latency, "--tokens-per-second", "0"],
+        stdout=subprocess.DEVNULL, stderr=subprocess.STDOUT
+    )
+
+    results = []
+    try:
+        wait_for(f"http://127.0.0.1:{args.stub_port}/stub/stats")
+        print(f"{'mode':<6} {'N':>5} {'ok':>6} {'p50 ms':>9} {'p95 ms':>9} {'wall s':>7} "
+              f"{'idle MB':>8} {'peak MB':>8} {'KB/req':>7} {'threads':>8}  other statuses")
+        for mode in modes:
+            for level in levels:
+                r = run_level(args, mode, level, workdir)
+                results.append(r)
+                other = {k: v for k, v in r["statuses"].items() if k != "200"}
+                print(f"{mode:<6} {level:>5} {r['ok']:>6} {r['latency_ms']['p50']:>9.1f} {r['latency_ms']['p95']:>9.1f} "
+                      f"{r['wall_s']:>7.1f} {r['idle_rss_mb']:>8.1f} {r['peak_rss_mb']:>8.1f} "
+                      f"{r['rss_per_request_kb']:>7.1f} {r['peak_threads']:>8}  {other or ''}", flush=True)
+    finally:
+        stub.terminate()
+        stub.wait(timeout=10)
+
+    if args.output:
+        report = {
+            **git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "config": {k: v for k, v in vars(args).items() if k != "output"},
+            "results": results,
+        }
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"results written to {args.output} (backend logs in {workdir})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+# backend/bench/replay.py
+"""
+Replays inbound traffic captured with TRAFFIC_RECORD_PATH against a running backend,
+at the recorded pace (--speed 1), faster (--speed 10) or as fast as possible (--speed max).
+
+Start the backend with the same recording as its LLM replay source, so no provider is
+called and every run sees identical LLM responses:
+
+    TRAFFIC_REPLAY_PATH=traffic.jsonl TRAFFIC_REPLAY_LATENCY_SCALE=1 python app.py
+    python bench/replay.py traffic.jsonl --url http://127.0.0.1:5001 --speed 10 --output replay-new.json
+    python bench/replay.py traffic.jsonl --speed max --compare replay-old.json
+
+TRAFFIC_REPLAY_LATENCY_SCALE=1 keeps the recorded LLM latencies (0 answers instantly).
+Restart the backend (and clear AutoGen's .cache) between runs being compared, otherwise
+the second run is served by the warm LLM caches.
+The report has the same shape as run_bench.py's, so --compare works across both.
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from run_bench import compare, git_commit, percentile  # noqa: E402
+
+
+def load_inbound(path: str) -> list:
+    """
+    Inbound records of a recording, ordered by arrival time.
+    """
+    records = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if record.get("type") == "inbound":
+                records.append(record)
+    records.sort(key=lambda r: r["ts"])
+    return records
+
+
+def replay(records: list, base_url: str, speed, max_concurrency: int = 32) -> list:
+    """
+    Sends each record at (recorded offset / speed); speed None sends back to back.
+
+    Returns:
+    - [(record, status, elapsed_seconds), ...]
+    """
+    results = []
+    lock = threading.Lock()
+    t0 = records[0]["ts"] if records else 0.0
+
+    with httpx.Client(timeout=600, limits=httpx.Limits(max_connections=max_concurrency)) as client:
+        def send(record):
+            start = time.perf_counter()
+            try:
+                response = client.request(
+                    record["method"], base_url + record["path"],
+                    params=record.get("query") or None,
+                    headers=record.get("headers") or {},
+                    json=record.get("payload")
+                )
+                status = response.status_code
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            with lock:
+                results.append((record, status, time.perf_counter() - start))
+
+        with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+            started = time.perf_counter()
+            for record in records:
+                if speed is not None:
+                    delay = (record["ts"] - t0) / speed - (time.perf_counter() - started)
+                    if delay > 0:
+                        time.sleep(delay)
+                executor.submit(send, record)
+    return results
+
+
+def summarise(results: list, wall: float) -> list:
+    by_route = {}
+    for record, status, elapsed in results:
+        by_route.setdefault(record.get("route") or record["path"], []).append((record, status, elapsed))
+
+    summaries = []
+    for route, items in sorted(by_route.items()):
+        latencies = sorted(e for _, _, e in items)
+        statuses = {}
+        for _, status, _ in items:
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+        ok = statuses.get("200", 0) + statuses.get("202", 0)
+        recorded = sorted(r["elapsed"] for r, _, _ in items)
+        summaries.append({
+            "route": route,
+            "concurrency": "replay",
+            "requests": len(items),
+            "ok": ok,
+            "status_counts": statuses,
+            "status_mismatches": sum(1 for r, s, _ in items if str(r["status"]) != str(s)),
+            "throughput_rps": round(ok / wall, 3) if wall else 0.0,
+            "latency_ms": {
+                "p50": round(percentile(latencies, 50) * 1000, 1),
+                "p95": round(percentile(latencies, 95) * 1000, 1),
+                "p99": round(percentile(latencies, 99) * 1000, 1),
+                "mean": round(sum(latencies) / len(latencies) * 1000, 1),
+                "max": round(latencies[-1] * 1000, 1),
+            },
+            "recorded_latency_ms": {
+                "p50": round(percentile(recorded, 50) * 1000, 1),
+                "p95": round(percentile(recorded, 95) * 1000, 1),
+            },
+        })
+    return summaries
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay recorded backend traffic")
+    parser.add_argument("recording", help="JSONL written with TRAFFIC_RECORD_PATH")
+    parser.add_argument("--url", default="http://127.0.0.1:5001", help="Backend base URL")
+    parser.add_argument("--speed", default="1", help="Pace multiplier (1, 10, ...) or 'max'")
+    parser.add_argument("--max-concurrency", type=int, default=32)
+    parser.add_argument("--output", default=None, help="Results JSON path")
+    parser.add_argument("--compare", default=None, help="Baseline results JSON to diff against")
+    args = parser.parse_args(argv)
+
+    speed = None if args.speed == "max" else float(args.speed)
+    records = load_inbound(args.recording)
+    if not records:
+        parser.error(f"no inbound records in {args.recording}")
+
+    base_url = args.url.rstrip("/")
+    start = time.perf_counter()
+    results = replay(records, base_url, speed, args.max_concurrency)
+    wall = time.perf_counter() - start
+
+    summaries = summarise(results, wall)
+    for s in summaries:
+        lat = s["latency_ms"]
+        print(f"{s['route']:<28} n={s['requests']:<5} ok={s['ok']:<5} mismatched={s['status_mismatches']:<3} "
+              f"p50 {lat['p50']:>8.1f}  p95 {lat['p95']:>8.1f}  p99 {lat['p99']:>8.1f} ms "
+              f"(recorded p50 {s['recorded_latency_ms']['p50']:.1f})")
+    print(f"\n{len(results)} requests in {wall:.2f}s ({len(results) / wall:.2f} rps) at speed {args.speed}")
+
+    report = {
+        **git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "config": {"recording": args.recording, "speed": args.speed, "max_concurrency": args.max_concurrency},
+        "wall_seconds": round(wall, 3),
+        "results": summaries,
+        "backend_stats": httpx.get(base_url + "/stats").json(),
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"results written to {args.output}")
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
+
+
+if __name__ == "__main__":
+    main()
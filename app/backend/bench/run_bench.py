@@ -0,0 +1,341 @@
+# backend/bench/run_bench.py
+"""
+Backend benchmark: starts the OpenAI-compatible stub and the Flask backend pointed at it
+(OPENAI_API_BASE), drives every route at each concurrency level, and writes JSON results
+tagged with the git commit so runs can be compared across commits.
+
+Usage (from app/backend):
+    python bench/run_bench.py --concurrency 1,4,16 --requests 40 --output bench-new.json
+    python bench/run_bench.py --compare bench-old.json --output bench-new.json
+    python bench/run_bench.py --env LOCAL_CLASSIFIER_ENABLED=0 --stub-arg=--rate-limit-probability=0.05
+    python bench/run_bench.py --env STRUCTURED_OUTPUTS=1 --stub-arg=--structured \
+        --stub-arg=--invalid-json-probability=0.2 --stub-arg=--invalid-json-models=gpt-4o-mini
+
+Payloads are varied per request so neither the LLM cache nor AutoGen's cache answers
+them (use --repeat-payloads to measure the cached path instead).
+"""
+
+import argparse
+import json
+import math
+import os
+import random
+import shlex
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STUB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "stub_server.py")
+
+ROUTES = [
+    "/analyze_activity",
+    "/analyze_sleep",
+    "/analyze_stress",
+    "/detect_anomaly",
+    "/analyze_nutrition",
+    "/group_summary_chat",
+]
+
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+
+# ---------- payloads ----------
+
+def _acceleration(rng: random.Random, samples: int, intensity: float):
+    """
+    Synthetic wrist accelerometer trace: gravity on z plus a walking-like oscillation.
+    """
+    out = []
+    for i in range(samples):
+        phase = 2 * math.pi * 1.8 * i / 50.0
+        out.append([
+            round(intensity * math.sin(phase) + rng.gauss(0, 0.02), 4),
+            round(intensity * 0.5 * math.cos(phase) + rng.gauss(0, 0.02), 4),
+            round(1.0 + intensity * 0.3 * math.sin(2 * phase) + rng.gauss(0, 0.02), 4),
+        ])
+    return out
+
+
+def make_payload(route: str, seed: int, samples: int) -> dict:
+    rng = random.Random(seed)
+    intensity = rng.choice([0.02, 0.15, 0.4, 0.9])
+    activity = {"acceleration": _acceleration(rng, samples, intensity), "sample_rate_hz": 50,
+                "body_weight": rng.randint(50, 95)}
+    sleep = {"heart_rate": rng.randint(48, 75), "hrv": rng.randint(25, 95),
+             "skin_temperature": round(rng.uniform(33.5, 36.5), 1), "gsr": round(rng.uniform(0.1, 2.0), 2),
+             "time_of_night": rng.choice(["early", "middle", "late"]),
+             "acceleration": _acceleration(rng, samples, 0.01)}
+    stress = {"heart_rate": rng.randint(60, 120), "skin_temperature": round(rng.uniform(32.0, 36.0), 1),
+              "eda": round(rng.uniform(0.5, 8.0), 2), "acceleration": _acceleration(rng, samples, intensity)}
+    results = {
+        "activity_result": f"Activity: {rng.choice(['Sedentary', 'Walking', 'Running'])}, {rng.randint(500, 12000)} steps",
+        "sleep_result": f"Sleep stage: {rng.choice(['Light', 'Deep', 'REM'])}, HR {sleep['heart_rate']} bpm, HRV {sleep['hrv']}",
+        "stress_result": f"Stress level: {rng.choice(['Low', 'Medium', 'High'])}, EDA {stress['eda']} uS",
+    }
+
+    if route == "/analyze_activity":
+        return activity
+    if route == "/analyze_sleep":
+        return sleep
+    if route == "/analyze_stress":
+        return stress
+    if route in ("/detect_anomaly", "/analyze_nutrition"):
+        return results
+    return {"activity_data": activity, "sleep_data": sleep, "stress_data": stress}
+
+
+# ---------- process sampling ----------
+
+def read_cpu_seconds(pid: int) -> float:
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(")", 1)[1].split()
+    # utime, stime are fields 14 and 15 of /proc/<pid>/stat (12 and 13 after the comm field)
+    return (int(fields[11]) + int(fields[12])) / CLOCK_TICKS
+
+
+def read_rss_mb(pid: int) -> float:
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024.0
+    return 0.0
+
+
+class RssSampler:
+    """
+    Samples a process's RSS in the background and keeps the peak.
+    """
+
+    def __init__(self, pid: int, interval: float = 0.1):
+        self.pid = pid
+        self.interval = interval
+        self.peak = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.peak = max(self.peak, read_rss_mb(self.pid))
+            except OSError:
+                return
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+# ---------- load generation ----------
+
+def percentile(sorted_values, q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(math.ceil(q / 100.0 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def run_level(client: httpx.Client, base_url: str, route: str, concurrency: int, total: int,
+              samples: int, seed: int, repeat_payloads: bool, headers: dict, pid: int) -> dict:
+    """
+    Sends `total` requests to one route with `concurrency` workers and summarises them.
+    """
+    # Distinct seeds per level too: AutoGen's own disk cache would answer repeated prompts
+    base_seed = seed + concurrency * 1_000_003
+    payloads = [make_payload(route, seed if repeat_payloads else base_seed + i, samples) for i in range(total)]
+    latencies, statuses = [], {}
+    lock = threading.Lock()
+
+    def one(payload):
+        start = time.perf_counter()
+        try:
+            status = client.post(base_url + route, json=payload, headers=headers).status_code
+        except httpx.HTTPError as e:
+            status = type(e).__name__
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.append(elapsed)
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+
+    cpu_start = read_cpu_seconds(pid)
+    wall_start = time.perf_counter()
+    with RssSampler(pid) as rss, ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(one, payloads))
+    wall = time.perf_counter() - wall_start
+    cpu = read_cpu_seconds(pid) - cpu_start
+
+    latencies.sort()
+    ok = statuses.get("200", 0)
+    return {
+        "route": route,
+        "concurrency": concurrency,
+        "requests": total,
+        "ok": ok,
+        "status_counts": statuses,
+        "wall_seconds": round(wall, 3),
+        "throughput_rps": round(ok / wall, 3) if wall else 0.0,
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50) * 1000, 1),
+            "p95": round(percentile(latencies, 95) * 1000, 1),
+            "p99": round(percentile(latencies, 99) * 1000, 1),
+            "mean": round(sum(latencies) / len(latencies) * 1000, 1) if latencies else 0.0,
+            "max": round(latencies[-1] * 1000, 1) if latencies else 0.0,
+        },
+        "backend_cpu_seconds": round(cpu, 3),
+        "backend_cpu_percent": round(100.0 * cpu / wall, 1) if wall else 0.0,
+        "backend_rss_mb_peak": round(rss.peak, 1),
+    }
+
+
+# ---------- processes ----------
+
+def wait_for(url: str, timeout: float = 60.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(url, timeout=2).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout}s")
+
+
+def git_commit() -> dict:
+    def git(*cmd):
+        try:
+            return subprocess.run(["git", *cmd], cwd=BACKEND_DIR, capture_output=True, text=True,
+                                  timeout=30).stdout.strip()
+        except (OSError, subprocess.SubprocessError):
+            return ""
+    return {"commit": git("rev-parse", "HEAD"), "dirty": bool(git("status", "--porcelain", "--untracked-files=no"))}
+
+
+def start_processes(args, workdir: str):
+    stub_cmd = [sys.executable, STUB_PATH, "--port", str(args.stub_port), *args.stub_arg]
+    stub = subprocess.Popen(stub_cmd, stdout=subprocess.DEVNULL, stderr=subprocess.STDOUT)
+
+    env = dict(os.environ)
+    env.update({
+        "OPENAI_API_KEY": "bench",
+        "OPENAI_API_BASE": f"http://127.0.0.1:{args.stub_port}/v1",
+        "PYTHONPATH": BACKEND_DIR + os.pathsep + env.get("PYTHONPATH", ""),
+        "JOB_DB_PATH": os.path.join(workdir, "jobs.sqlite"),
+    })
+    for item in args.env:
+        key, _, value = item.partition("=")
+        env[key] = value
+
+    backend_cmd = args.backend_cmd.format(port=args.backend_port, python=sys.executable)
+    log = open(os.path.join(workdir, "backend.log"), "w")
+    # Run from a scratch directory so AutoGen's disk cache and job DB stay out of the tree
+    backend = subprocess.Popen(shlex.split(backend_cmd), cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT)
+    return stub, backend, log
+
+
+def compare(baseline: dict, current: dict) -> None:
+    """
+    Prints p50 / p95 / throughput changes per (route, concurrency) against a baseline run.
+    """
+    base = {(r["route"], r["concurrency"]): r for r in baseline["results"]}
+    print(f"\nvs {baseline.get('commit', '?')[:10]}:")
+    for r in current["results"]:
+        b = base.get((r["route"], r["concurrency"]))
+        if b is None:
+            continue
+
+        def delta(new, old):
+            return f"{(new - old) / old * 100:+.1f}%" if old else "n/a"
+
+        print(f"  {r['route']:<22} c={r['concurrency']:<3} "
+              f"p50 {delta(r['latency_ms']['p50'], b['latency_ms']['p50']):>8}  "
+              f"p95 {delta(r['latency_ms']['p95'], b['latency_ms']['p95']):>8}  "
+              f"rps {delta(r['throughput_rps'], b['throughput_rps']):>8}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the health backend against a local LLM stub")
+    parser.add_argument("--routes", default=",".join(ROUTES), help="Comma-separated routes")
+    parser.add_argument("--concurrency", default="1,4,16", help="Comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=40, help="Requests per route and level")
+    parser.add_argument("--samples", type=int, default=500, help="Accelerometer samples per payload")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--repeat-payloads", action="store_true", help="Reuse one payload (cache hits)")
+    parser.add_argument("--stub-port", type=int, default=8799)
+    parser.add_argument("--backend-port", type=int, default=5099)
+    parser.add_argument("--backend-cmd",
+                        default="{python} -c \"import app; app.app.run(host='127.0.0.1', port={port}, threaded=True)\"",
+                        help="Command starting the backend; {port} and {python} are substituted")
+    parser.add_argument("--stub-arg", action="append", default=[],
+                        help="Extra stub_server.py argument, e.g. --stub-arg=--latency=fixed:0.2")
+    parser.add_argument("--env", action="append", default=[], help="KEY=VALUE passed to the backend")
+    parser.add_argument("--output", default=None, help="Results JSON path (default bench-<commit>.json)")
+    parser.add_argument("--compare", default=None, help="Baseline results JSON to diff against")
+    args = parser.parse_args(argv)
+
+    routes = [r for r in args.routes.split(",") if r]
+    levels = [int(c) for c in args.concurrency.split(",") if c]
+    headers = {} if args.repeat_payloads else {"Cache-Control": "no-cache"}
+    revision = git_commit()
+
+    workdir = tempfile.mkdtemp(prefix="health-bench-")
+    stub, backend, log = start_processes(args, workdir)
+    base_url = f"http://127.0.0.1:{args.backend_port}"
+    stub_stats = None
+
+    try:
+        wait_for(base_url + "/stats")
+        results = []
+        with httpx.Client(timeout=300, limits=httpx.Limits(max_connections=max(levels) * 2)) as client:
+            for route in routes:
+                for level in levels:
+                    summary = run_level(client, base_url, route, level, args.requests, args.samples,
+                                        args.seed, args.repeat_payloads, headers, backend.pid)
+                    results.append(summary)
+                    lat = summary["latency_ms"]
+                    print(f"{route:<22} c={level:<3} ok={summary['ok']}/{summary['requests']:<4} "
+                          f"{summary['throughput_rps']:>7.2f} rps  p50 {lat['p50']:>8.1f}  p95 {lat['p95']:>8.1f}  "
+                          f"p99 {lat['p99']:>8.1f} ms  cpu {summary['backend_cpu_percent']:>5.1f}%  "
+                          f"rss {summary['backend_rss_mb_peak']:.0f} MB", flush=True)
+            backend_stats = client.get(base_url + "/stats").json()
+            stub_stats = client.get(f"http://127.0.0.1:{args.stub_port}/stub/stats").json()
+    finally:
+        for proc in (backend, stub):
+            proc.terminate()
+            try:
+                proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+        log.close()
+
+    report = {
+        **revision,
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "config": {k: v for k, v in vars(args).items() if k not in ("output", "compare")},
+        "results": results,
+        "backend_stats": backend_stats,
+        "stub_stats": stub_stats,
+    }
+    output = args.output or f"bench-{(revision['commit'] or 'unknown')[:10]}.json"
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nresults written to {output} (backend log: {workdir}/backend.log)")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+# backend/bench/startup.py
+"""
+Cold-start benchmark: how long a new backend process takes to become useful.
+
+- import: `import app` in a fresh interpreter (median of --import-runs), with lazy agents
+  (default) and with AGENT_PRELOAD=1 (every agent of every pool set built at import)
+- serving modes, each started fresh against the LLM stub:
+    flask               threaded Flask server, lazy agents
+    flask-eager         same with AGENT_PRELOAD=1
+    gunicorn            gunicorn.conf.py, master preloads imports before forking
+    gunicorn-nopreload  same with GUNICORN_PRELOAD=0
+  ready_s is spawn → first 200 from /stats; first_ms / second_ms are the latencies of the
+  first two /analyze_sleep requests (the first one builds the agents it needs).
+  For gunicorn, worker_ready_s is the initial worker's fork → app loaded, and
+  scale_up_s the same for a worker added afterwards with SIGTTIN (autoscaling path).
+
+Usage (from app/backend):
+    python bench/startup.py --output startup.json
+    python bench/startup.py --modes gunicorn,gunicorn-nopreload --runs 5
+"""
+
+import argparse
+import json
+import os
+import re
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import httpx
+
+from run_bench import BACKEND_DIR, STUB_PATH, git_commit, make_payload, wait_for
+
+IMPORT_SCRIPT = (
+    "import json, sys, time\n"
+    "start = time.perf_counter()\n"
+    "import app\n"
+    "elapsed = time.perf_counter() - start\n"
+    "print(json.dumps({'import_s': elapsed, 'autogen_imported': 'autogen' in sys.modules,\n"
+    "                  'agents_built': app.agent_pool.stats()['agents_built']}))\n"
+)
+
+MODES = {
+    "flask": ([sys.executable, "-c", "import app; app.app.run(host='127.0.0.1', port={port}, threaded=True)"], {}),
+    "flask-eager": ([sys.executable, "-c", "import app; app.app.run(host='127.0.0.1', port={port}, threaded=True)"],
+                    {"AGENT_PRELOAD": "1"}),
+    "gunicorn": ([sys.executable, "-m", "gunicorn", "-c", os.path.join(BACKEND_DIR, "gunicorn.conf.py"), "app:app"], {}),
+    "gunicorn-nopreload": ([sys.executable, "-m", "gunicorn", "-c", os.path.join(BACKEND_DIR, "gunicorn.conf.py"),
+                            "app:app"], {"GUNICORN_PRELOAD": "0"}),
+}
+
+WORKER_READY = re.compile(r"Worker (\d+) ready in ([0-9.]+)s")
+
+
+def backend_env(args, port: int, extra: dict) -> dict:
+    env = dict(os.environ)
+    env.update({
+        "OPENAI_API_KEY": "bench",
+        "OPENAI_API_BASE": f"http://127.0.0.1:{args.stub_port}/v1",
+        "PYTHONPATH": BACKEND_DIR + os.pathsep + env.get("PYTHONPATH", ""),
+        "PYTHONWARNINGS": "ignore",
+        "LOCAL_CLASSIFIER_ENABLED": "0",
+        "GUNICORN_BIND": f"127.0.0.1:{port}",
+        "WEB_CONCURRENCY": "1",
+    })
+    env.update(extra)
+    for item in args.env:
+        key, _, value = item.partition("=")
+        env[key] = value
+    return env
+
+
+def wait_ready(url: str, process, timeout: float = 60.0) -> float:
+    """
+    Polls `url` every 10 ms; returns the seconds until it answered 200.
+    """
+    start = time.perf_counter()
+    while time.perf_counter() - start < timeout:
+        if process.poll() is not None:
+            raise RuntimeError(f"backend exited with {process.returncode}")
+        try:
+            if httpx.get(url, timeout=1).status_code == 200:
+                return time.perf_counter() - start
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.01)
+    raise RuntimeError(f"{url} did not come up within {timeout}s")
+
+
+def worker_ready_times(log_path: str) -> list:
+    with open(log_path) as f:
+        return [float(m.group(2)) for m in WORKER_READY.finditer(f.read())]
+
+
+def measure_import(args, workdir: str, extra: dict) -> dict:
+    runs = []
+    for _ in range(args.import_runs):
+        out = subprocess.run([sys.executable, "-c", IMPORT_SCRIPT], cwd=workdir, capture_output=True, text=True,
+                             env=backend_env(args, args.backend_port, {"HTTP_WARMUP_CONNECTIONS": "0", **extra}))
+        if out.returncode != 0:
+            raise RuntimeError(out.stderr[-2000:])
+        runs.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    return {
+        "import_s": round(statistics.median(r["import_s"] for r in runs), 3),
+        "autogen_imported": runs[-1]["autogen_imported"],
+        "agents_built": runs[-1]["agents_built"],
+    }
+
+
+def run_mode(args, mode: str, workdir: str, run: int) -> dict:
+    port = args.backend_port
+    cmd, extra = MODES[mode]
+    cmd = [part.format(port=port) for part in cmd]
+    log_path = os.path.join(workdir, f"backend-{mode}-{run}.log")
+    log = open(log_path, "w")
+    base_url = f"http://127.0.0.1:{port}"
+    body = json.dumps(make_payload("/analyze_sleep", args.seed + run, 100)).encode()
+    headers = {"Content-Type": "application/json", "Cache-Control": "no-cache"}
+
+    backend = subprocess.Popen(cmd, cwd=workdir, env=backend_env(args, port, extra), stdout=log, stderr=subprocess.STDOUT)
+    result = {"mode": mode}
+    try:
+        result["ready_s"] = round(wait_ready(base_url + "/stats", backend), 3)
+        for name in ("first_ms", "second_ms"):
+            start = time.perf_counter()
+            response = httpx.post(base_url + "/analyze_sleep", content=body, headers=headers, timeout=60)
+            result[name] = round((time.perf_counter() - start) * 1000, 1)
+            result.setdefault("statuses", []).append(response.status_code)
+
+        if mode.startswith("gunicorn"):
+            log.flush()
+            result["worker_ready_s"] = worker_ready_times(log_path)[0]
+            backend.send_signal(signal.SIGTTIN)
+            deadline = time.monotonic() + 60
+            while len(worker_ready_times(log_path)) < 2 and time.monotonic() < deadline:
+                time.sleep(0.02)
+            ready = worker_ready_times(log_path)
+            result["scale_up_s"] = ready[1] if len(ready) > 1 else None
+    finally:
+        backend.terminate()
+        try:
+            backend.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            backend.kill()
+        log.close()
+    return result
+
+
+def summarise(results: list) -> dict:
+    summary = {}
+    for key in ("ready_s", "first_ms", "second_ms", "worker_ready_s", "scale_up_s"):
+        values = [r[key] for r in results if r.get(key) is not None]
+        if values:
+            summary[key] = round(statistics.median(values), 3)
+    summary["statuses"] = sorted({s for r in results for s in r.get("statuses", [])})
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Backend cold start: import time and first-request latency")
+    parser.add_argument("--modes", default=",".join(MODES), help="Comma-separated serving modes")
+    parser.add_argument("--runs", type=int, default=3, help="Fresh starts per serving mode (medians reported)")
+    parser.add_argument("--import-runs", type=int, default=5, help="Fresh interpreters per import measurement")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--latency", default="fixed:0.05", help="Stub time to first token")
+    parser.add_argument("--stub-port", type=int, default=8799)
+    parser.add_argument("--backend-port", type=int, default=5097)
+    parser.add_argument("--env", action="append", default=[], help="KEY=VALUE passed to every backend")
+    parser.add_argument("--output", default=None, help="Results JSON path")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="health-startup-")
+    stub = subprocess.Popen(
+        [sys.executable, STUB_PATH, "--port", str(args.stub_port), "--latency", args.latency, "--tokens-per-second", "0"],
+        stdout=subprocess.DEVNULL, stderr=subprocess.STDOUT
+    )
+
+    report = {"import": {}, "serving": {}}
+    try:
+        wait_for(f"http://127.0.0.1:{args.stub_port}/stub/stats")
+        for name, extra in (("lazy", {}), ("eager", {"AGENT_PRELOAD": "1"})):
+            r = report["import"][name] = measure_import(args, workdir, extra)
+            print(f"import {name:<6} {r['import_s'] * 1000:>8.1f} ms  autogen imported: {r['autogen_imported']!s:<5}  "
+                  f"agents built: {r['agents_built']}", flush=True)
+
+        print(f"{'mode':<19} {'ready s':>8} {'1st ms':>8} {'2nd ms':>8} {'worker s':>9} {'scale-up s':>11}  statuses")
+        for mode in [m for m in args.modes.split(",") if m]:
+            runs = [run_mode(args, mode, workdir, run) for run in range(args.runs)]
+            s = summarise(runs)
+            report["serving"][mode] = {"summary": s, "runs": runs}
+            print(f"{mode:<19} {s['ready_s']:>8.3f} {s['first_ms']:>8.1f} {s['second_ms']:>8.1f} "
+                  f"{s.get('worker_ready_s', float('nan')):>9.3f} {s.get('scale_up_s', float('nan')):>11.3f}  "
+                  f"{s['statuses']}", flush=True)
+    finally:
+        stub.terminate()
+        stub.wait(timeout=10)
+
+    if args.output:
+        report = {
+            **git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "config": {k: v for k, v in vars(args).items() if k != "output"},
+            **report,
+        }
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"results written to {args.output} (backend logs in {workdir})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,325 @@
+# backend/bench/stub_server.py
+"""
+Local OpenAI-compatible stub for benchmarks: GET /models and POST /chat/completions
+(with or without a /v1 prefix), streaming included.
+
+Usage:
+    python stub_server.py --port 8799 --latency lognormal:0.8,0.4 --tokens-per-second 80 \
+        --completion-tokens 60 --rate-limit-probability 0.02 --retry-after 1
+
+Latency distributions (time to first token, seconds):
+- fixed:S
+- uniform:MIN,MAX
+- normal:MEAN,STDDEV (clamped at 0)
+- lognormal:MEDIAN,SIGMA
+
+429s are injected with probability --rate-limit-probability and/or once more than
+--rpm-limit requests arrived in the last 60 s; both carry Retry-After headers.
+
+With --structured, prompts ending in a JSON instruction (STRUCTURED_OUTPUTS=1, the food
+table's MealSelection) get a JSON object filled in from the requested shape, foods taken
+from the prompt's "Available foods" list; a GroupChat opening with one instruction per
+agent is answered one shape per turn. --invalid-json-probability answers those with
+prose instead, optionally only for --invalid-json-models (e.g. the small tier of
+LLM_MODEL_PROFILES, to exercise validated tier fallback).
+GET /stub/stats returns request counters.
+"""
+
+import argparse
+import collections
+import json
+import math
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+WORDS = (
+    "keep hydrated aim for steady sleep routine balanced meals include protein vegetables "
+    "whole grains short walk after lunch breathing exercise reduce caffeine late evening"
+).split()
+
+
+def parse_latency(spec: str):
+    """
+    Parses a latency spec such as "lognormal:0.8,0.4" into a zero-argument sampler.
+    """
+    name, _, args = spec.partition(":")
+    values = [float(v) for v in args.split(",") if v]
+    if name == "fixed":
+        return lambda: values[0]
+    if name == "uniform":
+        return lambda: random.uniform(values[0], values[1])
+    if name == "normal":
+        return lambda: max(0.0, random.gauss(values[0], values[1]))
+    if name == "lognormal":
+        mu = math.log(values[0])
+        return lambda: random.lognormvariate(mu, values[1])
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+
+# Marker json_instruction() (core/agent_results.py) puts before the requested shape
+JSON_SHAPE_MARKER = "exactly in this shape:\n"
+
+
+def json_shapes(prompt: str) -> list:
+    """
+    The JSON templates a structured-mode prompt asks for, in order.
+    """
+    shapes = []
+    for part in prompt.split(JSON_SHAPE_MARKER)[1:]:
+        try:
+            shapes.append(json.JSONDecoder().raw_decode(part.strip())[0])
+        except ValueError:
+            pass
+    return shapes
+
+
+def reply_shape(messages: list):
+    """
+    (JSON template, message text) the next reply should follow, or (None, None) for prose.
+    The latest message carrying templates is answered one template per turn, so a
+    GroupChat opening briefing several agents gets each agent's shape in speaking order.
+    """
+    for i in range(len(messages) - 1, -1, -1):
+        text = str(messages[i].get("content") or "")
+        shapes = json_shapes(text)
+        if shapes:
+            turn = len(messages) - 1 - i
+            return (shapes[turn], text) if turn < len(shapes) else (None, None)
+    return None, None
+
+
+def prompt_foods(prompt: str) -> list:
+    """
+    Food names of the "Available foods" list in a MealSelection prompt ("- category: a, b").
+    """
+    _, marker, rest = prompt.partition("Available foods")
+    if not marker:
+        return []
+    foods = []
+    for line in rest.splitlines()[1:]:
+        if not line.startswith("- "):
+            break
+        foods.extend(name.strip() for name in line.partition(":")[2].split(",") if name.strip())
+    return foods
+
+
+def phrase(length: int = 6) -> str:
+    return " ".join(random.choice(WORDS) for _ in range(length))
+
+
+def fill_shape(shape, foods: list, key: str = None):
+    """
+    A random reply matching `shape` (a json_template(): "A|B" enums, "<text>" strings,
+    0 numbers, one-element lists standing for any number of entries).
+    """
+    if isinstance(shape, dict):
+        return {k: fill_shape(v, foods, k) for k, v in shape.items()}
+    if isinstance(shape, list):
+        if key == "foods":
+            count = random.randint(2, 3)
+        elif key == "options":
+            count = 2
+        else:
+            count = random.randint(1, 3)
+        return [fill_shape(shape[0], foods, key) for _ in range(count)] if shape else []
+    if isinstance(shape, (int, float)) and not isinstance(shape, bool):
+        if key == "servings":
+            return random.choice((1, 1, 1.5, 2))
+        if key == "step_count":
+            return random.randint(0, 12000)
+        return random.randint(50, 700)
+    if isinstance(shape, str):
+        if "|" in shape:
+            return random.choice(shape.split("|"))
+        if key == "name":
+            return random.choice(foods) if foods else phrase(2)
+        return phrase(3 if key in ("reasons", "anomalies") else 8)
+    return shape
+
+
+class StubState:
+    def __init__(self, args):
+        self.args = args
+        self.sample_latency = parse_latency(args.latency)
+        self.lock = threading.Lock()
+        self.recent = collections.deque()
+        self.invalid_json_models = {m for m in (args.invalid_json_models or "").split(",") if m}
+        self.stats = {"requests": 0, "completions": 0, "streamed": 0, "rate_limited": 0,
+                      "structured": 0, "invalid_json": 0, "prompt_tokens": 0, "completion_tokens": 0}
+
+    def count(self, key, amount=1):
+        with self.lock:
+            self.stats[key] += amount
+
+    def should_throttle(self) -> bool:
+        now = time.monotonic()
+        with self.lock:
+            self.stats["requests"] += 1
+            self.recent.append(now)
+            while self.recent and self.recent[0] < now - 60:
+                self.recent.popleft()
+            over_quota = self.args.rpm_limit and len(self.recent) > self.args.rpm_limit
+        if over_quota or random.random() < self.args.rate_limit_probability:
+            self.count("rate_limited")
+            return True
+        return False
+
+    def structured_reply(self, messages: list, model: str):
+        """
+        JSON reply for a structured-mode conversation, or None to answer with prose.
+        """
+        shape, prompt = reply_shape(messages) if self.args.structured else (None, None)
+        if shape is None:
+            return None
+        if (not self.invalid_json_models or model in self.invalid_json_models) \
+                and random.random() < self.args.invalid_json_probability:
+            self.count("invalid_json")
+            return None
+        self.count("structured")
+        return json.dumps(fill_shape(shape, prompt_foods(prompt)), ensure_ascii=False) + " TERMINATE"
+
+
+def make_handler(state: StubState):
+    args = state.args
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *a):
+            pass
+
+        def _send_json(self, status, body, headers=None):
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _write_chunk(self, text):
+            data = text.encode("utf-8")
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+            self.wfile.flush()
+
+        def do_GET(self):
+            path = self.path.split("?")[0]
+            if path in ("/models", "/v1/models"):
+                self._send_json(200, {"object": "list", "data": [{"id": args.model, "object": "model"}]})
+            elif path == "/stub/stats":
+                with state.lock:
+                    self._send_json(200, dict(state.stats))
+            else:
+                self._send_json(404, {"error": {"message": "not found"}})
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length) or b"{}")
+            if not self.path.rstrip("/").endswith("/chat/completions"):
+                self._send_json(404, {"error": {"message": "not found"}})
+                return
+
+            if state.should_throttle():
+                self._send_json(
+                    429,
+                    {"error": {"message": "Rate limit reached (stub)", "type": "requests", "code": "rate_limit_exceeded"}},
+                    {"Retry-After": str(args.retry_after), "retry-after-ms": str(int(args.retry_after * 1000))}
+                )
+                return
+
+            messages = body.get("messages", [])
+            prompt_chars = sum(len(str(m.get("content") or "")) for m in messages)
+            prompt_tokens = prompt_chars // 4 + 1
+            model = body.get("model", args.model)
+            completion_tokens = min(args.completion_tokens, int(body.get("max_tokens") or args.completion_tokens))
+            content = state.structured_reply(messages, model)
+            if content is None:
+                content = " ".join([random.choice(WORDS) for _ in range(max(1, completion_tokens - 1))] + ["TERMINATE"])
+            words = content.split(" ")
+            token_delay = 1.0 / args.tokens_per_second if args.tokens_per_second else 0.0
+            usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(words),
+                     "total_tokens": prompt_tokens + len(words)}
+            state.count("prompt_tokens", prompt_tokens)
+            state.count("completion_tokens", len(words))
+
+            time.sleep(state.sample_latency())
+
+            if body.get("stream"):
+                state.count("streamed")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                for word in words:
+                    chunk = {"id": "stub", "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+                             "choices": [{"index": 0, "delta": {"content": word + " "}, "finish_reason": None}]}
+                    self._write_chunk("data: " + json.dumps(chunk) + "\n\n")
+                    time.sleep(token_delay)
+                final = {"id": "stub", "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+                         "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}], "usage": usage}
+                self._write_chunk("data: " + json.dumps(final) + "\n\n")
+                self._write_chunk("data: [DONE]\n\n")
+                self.wfile.write(b"0\r\n\r\n")
+                self.wfile.flush()
+                return
+
+            time.sleep(token_delay * len(words))
+            state.count("completions")
+            self._send_json(200, {
+                "id": "stub",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content},
+                             "finish_reason": "stop"}],
+                "usage": usage,
+            })
+
+    return Handler
+
+
+class StubHTTPServer(ThreadingHTTPServer):
+    # Listen backlog large enough for thousands of simultaneous connections (concurrency_memory.py)
+    request_queue_size = 4096
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="OpenAI-compatible stub server for benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8799)
+    parser.add_argument("--model", default="gpt-4o")
+    parser.add_argument("--latency", default="lognormal:0.5,0.3", help="Time-to-first-token distribution")
+    parser.add_argument("--tokens-per-second", type=float, default=100.0, help="Completion token rate (0 = instant)")
+    parser.add_argument("--completion-tokens", type=int, default=40)
+    parser.add_argument("--rate-limit-probability", type=float, default=0.0)
+    parser.add_argument("--rpm-limit", type=int, default=0, help="429 once more requests arrive per minute (0 = off)")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds on injected 429s")
+    parser.add_argument("--structured", action="store_true",
+                        help="Answer prompts carrying a JSON instruction with schema-shaped JSON")
+    parser.add_argument("--invalid-json-probability", type=float, default=0.0,
+                        help="With --structured, chance of answering a JSON prompt with prose instead")
+    parser.add_argument("--invalid-json-models", default="",
+                        help="Comma-separated models --invalid-json-probability applies to (default: all)")
+    parser.add_argument("--seed", type=int, default=None)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.seed is not None:
+        random.seed(args.seed)
+    server = StubHTTPServer((args.host, args.port), make_handler(StubState(args)))
+    server.daemon_threads = True
+    print(f"stub listening on http://{args.host}:{args.port}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+# backend/coalescer.py
+
+import asyncio
+import threading
+from concurrent.futures import Future
+
+from backend.stage_store import content_hash
+
+
+def request_key(route: str, args: dict, payload, *extra) -> str:
+    """
+    Canonical hash of a request: route, query arguments, decoded payload (dict key order
+    and the wire format do not matter; arrays hash by their bytes) and any `extra` inputs
+    such as the cache mode.
+    """
+    return content_hash("request", route, dict(args or {}), payload, list(extra))
+
+
+class _AsyncCall:
+    def __init__(self, task):
+        self.task = task
+        self.waiters = 0
+
+
+class RequestCoalescer:
+    """
+    Single-flight execution of identical concurrent requests (device retries, dashboards
+    refreshing at once): the first request for a key runs the computation and requests
+    arriving while it is in flight attach to it and receive the same result, or the same
+    exception. Finished computations are not remembered; the LLM cache covers later repeats.
+
+    - do(): threaded server. The first caller computes in its own thread and cannot
+      leave before it finishes, so the computation always runs to completion.
+    - a_do(): async server. The computation is a shared task; each waiter awaits it
+      shielded, and the task is cancelled once every waiter has gone (client disconnects).
+
+    Parameters:
+    - enabled: Set False to run every request on its own
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._async_calls = {}
+        self._stats = {"executions": 0, "coalesced": 0, "errors": 0, "cancelled": 0}
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self._stats[key] += 1
+
+    def do(self, key: str, fn):
+        """
+        Returns fn(), or the result of the identical computation already in flight.
+        """
+        if not self.enabled:
+            return fn()
+
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = Future()
+                self._stats["executions"] += 1
+            else:
+                self._stats["coalesced"] += 1
+        if not leader:
+            return call.result()
+
+        try:
+            result = fn()
+        except BaseException as e:
+            with self._lock:
+                self._calls.pop(key, None)
+                self._stats["errors"] += 1
+            call.set_exception(e)
+            raise
+        with self._lock:
+            self._calls.pop(key, None)
+        call.set_result(result)
+        return result
+
+    async def a_do(self, key: str, make_coro):
+        """
+        Async form of do(): awaits make_coro() run as a task shared by identical requests.
+        """
+        if not self.enabled:
+            return await make_coro()
+
+        call = self._async_calls.get(key)
+        if call is None:
+            call = self._async_calls[key] = _AsyncCall(asyncio.ensure_future(make_coro()))
+            call.task.add_done_callback(lambda task: self._finish_async(key, call))
+            self._count("executions")
+        else:
+            self._count("coalesced")
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                # Nobody is left to answer; a later identical request starts afresh
+                if self._async_calls.get(key) is call:
+                    del self._async_calls[key]
+                call.task.cancel()
+                self._count("cancelled")
+
+    def _finish_async(self, key: str, call: _AsyncCall) -> None:
+        if self._async_calls.get(key) is call:
+            del self._async_calls[key]
+        if not call.task.cancelled() and call.task.exception() is not None:
+            self._count("errors")
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["in_flight"] = len(self._calls) + len(self._async_calls)
+        requests = stats["executions"] + stats["coalesced"]
+        stats["coalesced_ratio"] = round(stats["coalesced"] / requests, 4) if requests else 0.0
+        stats["enabled"] = self.enabled
+        return stats
+
+
+# Process-wide coalescer shared by the threaded and async routes
+coalescer = RequestCoalescer()
+
+
+def configure_coalescer(enabled: bool = True) -> RequestCoalescer:
+    global coalescer
+    coalescer = RequestCoalescer(enabled=enabled)
+    return coalescer
+
+
+def get_coalescer() -> RequestCoalescer:
+    return coalescer
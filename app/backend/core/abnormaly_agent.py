@@ -1,9 +1,21 @@
 # core/abnormaly_agent.py
 
-def build_abnormal_prompt(activity_result: str, sleep_result: str, stress_result: str) -> str:
+import asyncio
+
+from core.agent_results import AnomalyResult, get_structured_outputs, json_instruction, prompt_text
+from core.anomaly_engine import get_anomaly_engine
+from core.model_router import AgentRequest, a_run_request, run_request
+
+
+def build_abnormal_prompt(activity_result, sleep_result, stress_result, structured: bool = False) -> str:
     """
     Builds a strict prompt for AbnormalyDetectionAgent focused ONLY on detecting anomalies and rating severity.
+    Upstream results may be prose or typed results (pasted as their compact fields).
+    With `structured`, the reply is requested as an AnomalyResult JSON object.
     """
+    activity_result = prompt_text(activity_result)
+    sleep_result = prompt_text(sleep_result)
+    stress_result = prompt_text(stress_result)
 
     prompt = f"""
 You are a health anomaly detection agent.
@@ -19,7 +31,16 @@ Review the following sensor analysis results:
 ⚠️ Stress Analysis:
 {stress_result}
 ---
+"""
+    if structured:
+        return (prompt + f"""
+List any abnormal indicators in the data (an empty list if none) and classify the overall
+severity. Do not give advice.
+
+{json_instruction(AnomalyResult)}
+""").strip()
 
+    prompt += """
 Your ONLY tasks:
 1. Identify if there are any abnormal indicators based on the data provided.
 2. Classify the overall severity as one of the following levels:
@@ -46,17 +67,121 @@ Stay professional and to the point.
     return prompt.strip()
 
 
-def run_anomaly_agent(activity_result: str, sleep_result: str, stress_result: str, user_proxy, agent) -> str:
+def prepare_anomaly_request(activity_result, sleep_result, stress_result) -> AgentRequest:
+    """
+    AgentRequest shared by run_anomaly_agent and a_run_anomaly_agent.
+    """
+    structured = get_structured_outputs()
+    prompt = build_abnormal_prompt(activity_result, sleep_result, stress_result, structured=structured.enabled)
+    return AgentRequest("anomaly", prompt, AnomalyResult if structured.enabled else None)
+
+
+def run_anomaly_agent(activity_result, sleep_result, stress_result, user_proxy, agent, use_cache: bool = True):
     """
     Executes anomaly analysis by prompting the agent with strictly structured content.
+    Returns prose, or an AnomalyResult in structured-output mode.
+    """
+    request = prepare_anomaly_request(activity_result, sleep_result, stress_result)
+    return run_request(request, user_proxy, agent, use_cache)
+
+
+def anomaly_contexts(activity_data, sleep_data, stress_data) -> dict:
     """
-    prompt = build_abnormal_prompt(activity_result, sleep_result, stress_result)
+    Raw sensor payloads per anomaly engine context: daytime vitals come from the stress
+    payload (with the activity recording's movement when it has none), night vitals from sleep.
+    """
+    day = dict(stress_data) if isinstance(stress_data, dict) else {}
+    if isinstance(activity_data, dict) and "acceleration" not in day and "acceleration_samples" not in day:
+        samples = activity_data.get("acceleration")
+        day["acceleration"] = samples if samples is not None else activity_data.get("acceleration_samples")
+    return {"day": day, "sleep": sleep_data if isinstance(sleep_data, dict) else {}}
+
+
+def build_phrasing_prompt(result: AnomalyResult) -> str:
+    """
+    Short prompt asking the agent to word locally detected anomalies for the user.
+    """
+    findings = "\n".join(f"- {text}" for text in result.anomalies)
+    prompt = f"""
+These wellness anomalies were detected from the user's wearable data (overall severity: {result.severity}):
+{findings}
 
-    user_proxy.initiate_chat(
-        agent,
-        message=prompt,
-        max_turns=1,
-        clear_history=True
-    )
+Rewrite them as one or two short, calm sentences addressed to the user.
+Do not add findings, change the severity, give a diagnosis or recommend actions.
+"""
+    return prompt.strip()
+
+
+def prepare_phrasing_request(result: AnomalyResult):
+    """
+    AgentRequest wording `result` (shared by phrase_anomalies / a_phrase_anomalies), or
+    `result` itself when it has no anomalies.
+    """
+    if not result.anomalies:
+        return result
+    return AgentRequest("anomaly_phrasing", build_phrasing_prompt(result), default="",
+                        finish=lambda text: _phrased(result, text))
 
-    return user_proxy.last_message(agent).get("content", "No response.")
+
+def phrase_anomalies(result: AnomalyResult, user_proxy, agent, use_cache: bool = True) -> AnomalyResult:
+    """
+    LLM wording of detected anomalies (the severity stays the engine's). Results without
+    anomalies are returned unchanged, without calling the LLM.
+    """
+    return run_request(prepare_phrasing_request(result), user_proxy, agent, use_cache)
+
+
+def _phrased(result: AnomalyResult, text: str) -> AnomalyResult:
+    if not text.strip():
+        return result
+    get_anomaly_engine().record_phrasing()
+    return AnomalyResult(anomalies=[text.replace("TERMINATE", "").strip()], severity=result.severity)
+
+
+def run_local_anomaly_agent(activity_data, sleep_data, stress_data, user_proxy, agent, use_cache: bool = True,
+                            phrase: bool = None) -> AnomalyResult:
+    """
+    Anomaly stage on the local statistical engine: detection and severity from the raw
+    signals (user baseline when a payload carries user_id), the LLM only phrasing anomalies
+    when `phrase` (default: the engine's phrase_with_llm) is set.
+    """
+    engine = get_anomaly_engine()
+    result = _check_locally(engine, activity_data, sleep_data, stress_data)
+    if engine.phrase_with_llm if phrase is None else phrase:
+        result = phrase_anomalies(result, user_proxy, agent, use_cache=use_cache)
+    return result
+
+
+def _check_locally(engine, activity_data, sleep_data, stress_data) -> AnomalyResult:
+    user_id = next((d.get("user_id") for d in (stress_data, sleep_data, activity_data)
+                    if isinstance(d, dict) and d.get("user_id") is not None), None)
+    result, _ = engine.check(anomaly_contexts(activity_data, sleep_data, stress_data), user_id=user_id)
+    return result
+
+
+async def a_run_anomaly_agent(activity_result, sleep_result, stress_result, user_proxy, agent, use_cache: bool = True):
+    """
+    Async version of run_anomaly_agent (non-blocking LLM call).
+    """
+    request = prepare_anomaly_request(activity_result, sleep_result, stress_result)
+    return await a_run_request(request, user_proxy, agent, use_cache)
+
+
+async def a_phrase_anomalies(result: AnomalyResult, user_proxy, agent, use_cache: bool = True) -> AnomalyResult:
+    """
+    Async version of phrase_anomalies.
+    """
+    return await a_run_request(prepare_phrasing_request(result), user_proxy, agent, use_cache)
+
+
+async def a_run_local_anomaly_agent(activity_data, sleep_data, stress_data, user_proxy, agent, use_cache: bool = True,
+                                    phrase: bool = None) -> AnomalyResult:
+    """
+    Async version of run_local_anomaly_agent: detection (signal statistics, the user's
+    stored baseline) runs in a worker thread; only phrasing awaits the LLM.
+    """
+    engine = get_anomaly_engine()
+    result = await asyncio.to_thread(_check_locally, engine, activity_data, sleep_data, stress_data)
+    if engine.phrase_with_llm if phrase is None else phrase:
+        result = await a_phrase_anomalies(result, user_proxy, agent, use_cache=use_cache)
+    return result
@@ -1,6 +1,21 @@
 # core/activity_agent.py
 
-def build_activity_prompt(data: dict) -> str:
+import asyncio
+
+from core.activity_features import extract_activity_features, format_activity_features
+from core.agent_results import ActivityResult, get_structured_outputs, json_instruction
+from core.approx_cache import get_approx_cache
+from core.local_classifier import classify_activity, get_local_gate
+from core.model_router import AgentRequest, a_run_request, run_request
+
+FITNESS_COMMENTS = {
+    "Sedentary": "Try a short walk or stretch every hour — small movement breaks add up!",
+    "Walking": "Nice steady walking! Keep it up and try adding a few brisk minutes tomorrow.",
+    "Running": "Great run! Remember to hydrate and stretch so your body recovers well.",
+}
+
+
+def build_activity_prompt(data: dict, features: dict = None, structured: bool = False) -> str:
     """
     Builds a user-friendly prompt for the ActivityAgent to analyze wearable sensor data.
 
@@ -9,18 +24,22 @@ def build_activity_prompt(data: dict) -> str:
     - time_of_day (string, e.g., 'morning', 'evening')
     - body_weight (kg)
     - duration_minutes (minutes)
+    - sample_rate_hz (optional, Hz)
+
+    The whole recording is reduced to compact statistics (steps, cadence, intensity,
+    MET-based kcal) by `extract_activity_features` instead of sending raw samples;
+    pass `features` to reuse an existing extraction. With `structured`, the reply is
+    requested as an ActivityResult JSON object.
     """
     # Parse input
-    acc_samples = data.get("acceleration", []) or data.get("acceleration_samples", [])
     time_of_day = data.get("time_of_day", "unspecified")
     weight = data.get("body_weight", "unknown")
     duration = data.get("duration_minutes", "unknown")
 
-    # Format acceleration samples
-    if isinstance(acc_samples, list) and len(acc_samples) > 0:
-        acc_text = "\n".join([f"  - Sample {i+1}: {sample}" for i, sample in enumerate(acc_samples[:10])])
-    else:
-        acc_text = "No acceleration data available."
+    # Summarize the full acceleration recording
+    if features is None:
+        features = extract_activity_features(data)
+    acc_text = format_activity_features(features)
 
     # Build upgraded prompt
     prompt = f"""
@@ -30,21 +49,28 @@ Sensor Input:
 - Time of Day: {time_of_day}
 - Body Weight: {weight} kg
 - Duration: {duration} minutes
-- Acceleration Samples (showing up to 10):
+- Accelerometer Statistics (computed from the full 3-axis recording, in g-force units):
 {acc_text}
+"""
+    if structured:
+        return (prompt + f"""
+Give the activity type, the measured step count, the MET-based calories (kcal) and one short
+friendly comment encouraging healthy habits. Use the statistics above; do not show calculations.
 
-Each acceleration sample is a 3-axis [X, Y, Z] reading in g-force units, collected at regular intervals.
+{json_instruction(ActivityResult)}
+""").strip()
 
+    prompt += """
 Please respond clearly and directly with:
 1. **Estimated Activity Type**: (Sedentary / Walking / Running)
-2. **Approximate Step Count**: (Give a reasonable number)
-3. **Estimated Calories Burned**: (in kcal)
+2. **Approximate Step Count**: (Use the measured step count)
+3. **Estimated Calories Burned**: (Use the MET-based energy expenditure, in kcal)
 4. **Fitness Comment**: (One short friendly comment encouraging healthy habits.)
 
 Rules:
 - **DO NOT** describe your analysis process or calculations.
 - **DO NOT** write Python code.
-- **JUST** provide final results based on standard assumptions (e.g., MET values for typical activities).
+- **JUST** provide final results based on the statistics above.
 - Keep your response **concise, friendly, and professional**, as if you are advising a real client.
 
 Tone:
@@ -56,7 +82,48 @@ Tone:
     return prompt.strip()
 
 
-def run_activity_agent(user_input: dict, user_proxy, agent) -> str:
+def render_activity_result(result) -> str:
+    """
+    Templated ActivityAgent reply for a confident local classification.
+    """
+    fields = result.fields
+    return "\n".join([
+        f"1. **Estimated Activity Type**: {fields['activity_type']}",
+        f"2. **Approximate Step Count**: {fields['step_count']}",
+        f"3. **Estimated Calories Burned**: {fields['kcal']} kcal",
+        f"4. **Fitness Comment**: {FITNESS_COMMENTS[fields['activity_type']]}",
+    ])
+
+
+def local_activity_reply(local_result, structured: bool = False):
+    """
+    Reply for a confident local classification: templated text, or an ActivityResult in
+    structured-output mode.
+    """
+    if structured:
+        fields = local_result.fields
+        return ActivityResult(activity_type=fields["activity_type"], step_count=fields["step_count"],
+                              kcal=fields["kcal"], comment=FITNESS_COMMENTS[fields["activity_type"]])
+    return render_activity_result(local_result)
+
+
+def prepare_activity_request(user_input: dict, agent):
+    """
+    Shared first step of run_activity_agent / a_run_activity_agent: the local reply when the
+    classifier is confident enough, else the AgentRequest for the LLM.
+    """
+    structured = get_structured_outputs()
+    features = extract_activity_features(user_input)
+    local_result = classify_activity(features)
+    if get_local_gate().accept("activity", local_result):
+        return local_activity_reply(local_result, structured.enabled)
+
+    prompt = build_activity_prompt(user_input, features, structured=structured.enabled)
+    return AgentRequest("activity", prompt, ActivityResult if structured.enabled else None,
+                        approx_key=("activity", get_approx_cache().key("activity", agent, user_input, features)))
+
+
+def run_activity_agent(user_input: dict, user_proxy, agent, use_cache: bool = True) -> str:
     """
     Executes the activity analysis by prompting the GPT-based AssistantAgent via UserProxyAgent.
 
@@ -64,17 +131,21 @@ def run_activity_agent(user_input: dict, user_proxy, agent) -> str:
     - user_input: Dictionary containing activity-related sensor data
     - user_proxy: AutoGen's UserProxyAgent
     - agent: AutoGen's AssistantAgent (ActivityAgent)
+    - use_cache: Set False to bypass the LLM response cache
 
     Returns:
-    - A string response containing GPT's structured analysis
+    - A string response containing GPT's structured analysis, or a templated
+      reply when the local classifier is confident enough to skip the LLM. In
+      structured-output mode an ActivityResult (prose only if the reply does not validate).
     """
-    prompt = build_activity_prompt(user_input)
+    return run_request(prepare_activity_request(user_input, agent), user_proxy, agent, use_cache)
 
-    user_proxy.initiate_chat(
-        agent,
-        message=prompt,
-        max_turns=1,
-        clear_history=True
-    )
 
-    return user_proxy.last_message(agent).get("content", "No response.")
+async def a_run_activity_agent(user_input: dict, user_proxy, agent, use_cache: bool = True):
+    """
+    Async version of run_activity_agent for the async serving path: feature extraction and
+    the local classifier run in a worker thread, then a non-blocking LLM call
+    (`user_proxy` / `agent` are only read).
+    """
+    request = await asyncio.to_thread(prepare_activity_request, user_input, agent)
+    return await a_run_request(request, user_proxy, agent, use_cache)
@@ -0,0 +1,183 @@
+# core/activity_features.py
+
+import numpy as np
+
+GRAVITY_G = 1.0
+DEFAULT_SAMPLE_RATE_HZ = 50.0
+DEFAULT_BODY_WEIGHT_KG = 70.0
+
+# Per-second mean ENMO (Euclidean norm minus one g) cut points in g, with MET values
+# per intensity (Hildebrand et al. 2014 wrist thresholds, Compendium of Physical Activities).
+INTENSITY_BUCKETS = (
+    ("sedentary", 0.0, 0.0458, 1.3),
+    ("light", 0.0458, 0.0932, 2.5),
+    ("moderate", 0.0932, 0.4183, 4.5),
+    ("vigorous", 0.4183, np.inf, 8.0),
+)
+
+MIN_STEP_INTERVAL_S = 0.25   # at most 4 steps per second
+MIN_STEP_PEAK_G = 0.05       # peak height above the gravity-removed baseline
+SMOOTHING_WINDOW_S = 0.1
+
+
+def to_acceleration_array(samples) -> np.ndarray:
+    """
+    Converts [[x, y, z], ...] (list or array) into an (n, 3) float array.
+    Float arrays (e.g. decoded binary payloads) are used as-is without copying.
+    Returns None if the samples are missing, not 3-axis, ragged or non-numeric.
+    """
+    if samples is None or isinstance(samples, (str, bytes)):
+        return None
+    try:
+        acc = np.asarray(samples)
+        if acc.dtype.kind != "f":
+            acc = acc.astype(np.float64)
+    except (TypeError, ValueError):
+        return None
+    if acc.ndim != 2 or acc.shape[1] != 3 or acc.shape[0] == 0:
+        return None
+    return acc
+
+
+def acceleration_samples(data: dict):
+    """
+    The raw "acceleration" samples of a payload, or "acceleration_samples" when those are
+    missing or empty.
+    """
+    samples = data.get("acceleration")
+    if samples is None or (hasattr(samples, "__len__") and len(samples) == 0):
+        samples = data.get("acceleration_samples")
+    return samples
+
+
+def _sample_rate(data: dict, n_samples: int) -> float:
+    rate = data.get("sample_rate_hz")
+    if isinstance(rate, (int, float)) and rate > 0:
+        return float(rate)
+    duration = data.get("duration_minutes")
+    if isinstance(duration, (int, float)) and duration > 0:
+        return n_samples / (duration * 60.0)
+    return DEFAULT_SAMPLE_RATE_HZ
+
+
+def _count_steps(magnitude: np.ndarray, rate: float) -> int:
+    """
+    Counts steps as peaks of the smoothed, gravity-removed magnitude that are the
+    maximum within ±MIN_STEP_INTERVAL_S and rise above an adaptive threshold.
+    """
+    signal = magnitude - magnitude.mean()
+
+    smooth_w = max(1, int(round(SMOOTHING_WINDOW_S * rate)))
+    if smooth_w > 1:
+        signal = np.convolve(signal, np.ones(smooth_w) / smooth_w, mode="same")
+
+    half_w = max(1, int(round(MIN_STEP_INTERVAL_S * rate)))
+    if signal.size < 2 * half_w + 1:
+        return 0
+
+    padded = np.pad(signal, half_w, mode="constant", constant_values=-np.inf)
+    local_max = np.lib.stride_tricks.sliding_window_view(padded, 2 * half_w + 1).max(axis=1)
+
+    threshold = max(MIN_STEP_PEAK_G, 0.5 * signal.std())
+    rising = np.empty(signal.size, dtype=bool)
+    rising[0] = False
+    rising[1:] = signal[1:] > signal[:-1]
+
+    return int(np.count_nonzero((signal == local_max) & rising & (signal > threshold)))
+
+
+def extract_activity_features(data: dict) -> dict:
+    """
+    Summarizes a full accelerometer recording into compact activity statistics.
+
+    Expected input keys in `data`:
+    - acceleration / acceleration_samples ((n, 3) samples in g)
+    - sample_rate_hz (optional; otherwise derived from duration_minutes, else 50 Hz)
+    - body_weight (kg, optional; 70 kg assumed for calories)
+
+    Returns:
+    - Dictionary of statistics, or None when no usable acceleration data was sent
+    """
+    acc = to_acceleration_array(acceleration_samples(data))
+    if acc is None:
+        return None
+
+    n = acc.shape[0]
+    rate = _sample_rate(data, n)
+    duration_min = n / rate / 60.0
+
+    # Magnitude series and dynamic (gravity-free) acceleration
+    magnitude = np.sqrt(np.einsum("ij,ij->i", acc, acc))
+    enmo = np.maximum(magnitude - GRAVITY_G, 0.0)
+
+    # Mean ENMO per one-second epoch (the trailing partial epoch is kept)
+    epoch = max(1, int(round(rate)))
+    epoch_starts = np.arange(0, n, epoch)
+    epoch_mean = np.add.reduceat(enmo, epoch_starts) / np.diff(np.append(epoch_starts, n))
+    epoch_minutes = np.diff(np.append(epoch_starts, n)) / rate / 60.0
+
+    lower = np.array([b[1] for b in INTENSITY_BUCKETS])
+    bucket_idx = np.searchsorted(lower, epoch_mean, side="right") - 1
+    minutes_per_bucket = np.bincount(bucket_idx, weights=epoch_minutes, minlength=len(INTENSITY_BUCKETS))
+
+    weight = data.get("body_weight")
+    weight_assumed = not isinstance(weight, (int, float)) or weight <= 0
+    weight_kg = DEFAULT_BODY_WEIGHT_KG if weight_assumed else float(weight)
+    mets = np.array([b[3] for b in INTENSITY_BUCKETS])
+    kcal = float((mets * minutes_per_bucket).sum() / 60.0 * weight_kg)
+
+    steps = _count_steps(magnitude, rate)
+
+    return {
+        "sample_count": int(n),
+        "sample_rate_hz": round(rate, 2),
+        "duration_minutes": round(duration_min, 2),
+        "magnitude_mean_g": round(float(magnitude.mean()), 3),
+        "magnitude_std_g": round(float(magnitude.std()), 3),
+        "magnitude_max_g": round(float(magnitude.max()), 3),
+        "enmo_mean_g": round(float(enmo.mean()), 4),
+        "step_count": steps,
+        "cadence_spm": round(steps / duration_min, 1) if duration_min > 0 else 0.0,
+        "intensity_minutes": {
+            bucket[0]: round(float(minutes), 2) for bucket, minutes in zip(INTENSITY_BUCKETS, minutes_per_bucket)
+        },
+        "dominant_intensity": INTENSITY_BUCKETS[int(np.argmax(minutes_per_bucket))][0],
+        "estimated_kcal": round(kcal, 1),
+        "body_weight_assumed": weight_assumed,
+    }
+
+
+def format_activity_features(features: dict) -> str:
+    """
+    Renders extracted features as the compact text block used in prompts.
+    """
+    if not features:
+        return "No acceleration data available."
+
+    intensity = ", ".join(f"{name} {minutes} min" for name, minutes in features["intensity_minutes"].items())
+    weight_note = " (assuming 70 kg body weight)" if features["body_weight_assumed"] else ""
+    return "\n".join([
+        f"  - Samples analysed: {features['sample_count']} at {features['sample_rate_hz']} Hz ({features['duration_minutes']} min)",
+        f"  - Acceleration magnitude: mean {features['magnitude_mean_g']} g, std {features['magnitude_std_g']} g, max {features['magnitude_max_g']} g",
+        f"  - Measured step count: {features['step_count']} (cadence {features['cadence_spm']} steps/min)",
+        f"  - Time by intensity: {intensity}",
+        f"  - Dominant intensity: {features['dominant_intensity']}",
+        f"  - MET-based energy expenditure: {features['estimated_kcal']} kcal{weight_note}",
+    ])
+
+
+def format_movement_features(features: dict) -> str:
+    """
+    Renders the movement part of extracted features (no steps / calories) for the
+    sleep and stress prompts.
+    """
+    if not features:
+        return "No acceleration data available."
+
+    intensity = ", ".join(f"{name} {minutes} min" for name, minutes in features["intensity_minutes"].items())
+    return "\n".join([
+        f"  - Samples analysed: {features['sample_count']} at {features['sample_rate_hz']} Hz ({features['duration_minutes']} min)",
+        f"  - Acceleration magnitude: mean {features['magnitude_mean_g']} g, std {features['magnitude_std_g']} g, max {features['magnitude_max_g']} g",
+        f"  - Mean movement intensity (ENMO): {features['enmo_mean_g']} g",
+        f"  - Time by intensity: {intensity}",
+    ])
@@ -0,0 +1,211 @@
+# core/agent_chat.py
+
+import asyncio
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from core.approx_cache import get_approx_cache
+from core.llm_cache import agent_cache_key, get_llm_cache
+
+# Name of the agent whose LLM call is in progress in this context; the HTTP layer reads
+# it to label per-agent metrics
+current_agent = ContextVar("current_agent", default=None)
+
+# Async path: callback(text) receiving streamed completion chunks of the current stage
+# (the threaded path routes them through AutoGen's IOStream instead)
+current_delta_handler = ContextVar("current_delta_handler", default=None)
+
+# Whether the last ask_agent / a_ask_agent reply in this context came from a cache
+# (read by core.model_router so cache hits do not count as model latency)
+reply_from_cache = ContextVar("reply_from_cache", default=False)
+
+# llm_config keys that configure AutoGen / the client rather than the completion request
+CLIENT_CONFIG_KEYS = ("config_list", "timeout", "cache_seed", "cache", "functions", "tools")
+
+
+@contextmanager
+def agent_context(name: str):
+    """
+    Marks LLM calls made inside the block as belonging to agent `name`.
+    """
+    token = current_agent.set(name)
+    try:
+        yield
+    finally:
+        current_agent.reset(token)
+
+
+def ask_agent(user_proxy, agent, prompt: str, default: str = "No response.", use_cache: bool = True,
+              approx_key: tuple = None) -> str:
+    """
+    Sends one prompt to an AssistantAgent and returns its reply (single turn, fresh history).
+
+    Identical requests are answered from the LLM response cache without calling the model;
+    with `approx_key`, near-duplicate requests are answered from the approximate cache.
+
+    Parameters:
+    - user_proxy: AutoGen's UserProxyAgent
+    - agent: AutoGen's AssistantAgent
+    - prompt: Fully built prompt text
+    - default: Returned when the agent produces no content
+    - use_cache: Set False to skip the cache lookups for this request
+    - approx_key: Optional (agent name, key) from ApproxCache.key (key may be None)
+
+    Returns:
+    - The agent's reply content
+    """
+    key, cached = _cached_reply(agent, prompt, use_cache, approx_key)
+    reply_from_cache.set(cached is not None)
+    if cached is not None:
+        return cached
+
+    with agent_context(agent.name):
+        user_proxy.initiate_chat(
+            agent,
+            message=prompt,
+            max_turns=1,
+            clear_history=True
+        )
+
+    content = user_proxy.last_message(agent).get("content")
+    if not content:
+        return default
+    _remember_reply(key, content, approx_key)
+    return content
+
+
+def _cached_reply(agent, prompt: str, use_cache: bool, approx_key: tuple):
+    """
+    Returns (exact cache key, cached reply or None) for ask_agent / a_ask_agent.
+    """
+    cache = get_llm_cache()
+    key = agent_cache_key(agent, prompt)
+    if not use_cache:
+        cache.record_bypass()
+        return key, None
+    cached = cache.get(key)
+    if cached is None and approx_key is not None and approx_key[1] is not None:
+        cached = get_approx_cache().get(*approx_key)
+    return key, cached
+
+
+def _remember_reply(key: str, content: str, approx_key: tuple) -> None:
+    # A bypassed request still refreshes the cached entries
+    get_llm_cache().set(key, content)
+    if approx_key is not None and approx_key[1] is not None:
+        get_approx_cache().set(approx_key[0], approx_key[1], content)
+
+
+async def off_loop(blocking: bool, fn, *args):
+    """
+    Async path: awaits fn(*args) in a worker thread when `blocking` (disk I/O, array
+    work), so one large request does not stall every connection. Otherwise fn runs
+    inline: small in-memory work is cheaper than a thread hop.
+    """
+    if blocking:
+        return await asyncio.to_thread(fn, *args)
+    return fn(*args)
+
+
+class AsyncLLM:
+    """
+    Non-blocking LLM calls for the async serving path: one AsyncOpenAI client per
+    endpoint, all sharing `http_client` (an httpx.AsyncClient, e.g.
+    backend.http_client.AsyncSharedHttpClient).
+
+    Requests are built like AutoGen's for a single-turn chat (agent system message, the
+    prompt sent by `user_proxy`, model / max_tokens from the agent's llm_config), so the
+    LLM cache, traffic recordings and replay keys are shared with the threaded path.
+    """
+
+    def __init__(self, http_client=None):
+        self.http_client = http_client
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    def client(self, config: dict, timeout=None):
+        from openai import AsyncOpenAI
+
+        key = (config.get("base_url"), config.get("api_key"), config.get("max_retries"), timeout)
+        with self._lock:
+            if key not in self._clients:
+                options = {"api_key": config.get("api_key"), "base_url": config.get("base_url"),
+                           "http_client": self.http_client, "timeout": timeout}
+                if config.get("max_retries") is not None:
+                    options["max_retries"] = config["max_retries"]
+                self._clients[key] = AsyncOpenAI(**{k: v for k, v in options.items() if v is not None})
+            return self._clients[key]
+
+    async def complete(self, user_proxy, agent, prompt: str):
+        """
+        One completion of `prompt` by `agent`; returns the reply content (None when empty).
+        Chunks are forwarded to current_delta_handler when llm_config enables "stream".
+        """
+        llm_config = agent.llm_config if isinstance(agent.llm_config, dict) else {}
+        config = (llm_config.get("config_list") or [{}])[0]
+        params = {k: v for k, v in llm_config.items() if k not in CLIENT_CONFIG_KEYS}
+        params["stream"] = bool(params.get("stream"))
+        from openai import AsyncStream
+        from openai.types.chat import ChatCompletion, ChatCompletionChunk
+
+        messages = [
+            {"content": agent.system_message, "role": "system"},
+            {"content": prompt, "role": "user", "name": user_proxy.name},
+        ]
+        client = self.client(config, llm_config.get("timeout"))
+
+        body = {"messages": messages, "model": config.get("model"), **params}
+
+        with agent_context(agent.name):
+            # The body is plain JSON already: posting it directly skips the SDK's per-call
+            # TypedDict transform, a large share of the CPU per request under high concurrency
+            response = await client.post("/chat/completions", body=body, cast_to=ChatCompletion,
+                                         stream=params["stream"], stream_cls=AsyncStream[ChatCompletionChunk])
+            if not params["stream"]:
+                return response.choices[0].message.content if response.choices else None
+
+            on_delta, parts = current_delta_handler.get(), []
+            async for chunk in response:
+                text = chunk.choices[0].delta.content if chunk.choices else None
+                if text:
+                    parts.append(text)
+                    if on_delta is not None:
+                        on_delta(text)
+            return "".join(parts) or None
+
+
+# Process-wide async LLM client (no shared http_client until configured)
+async_llm = AsyncLLM()
+
+
+def configure_async_llm(http_client=None) -> AsyncLLM:
+    global async_llm
+    async_llm = AsyncLLM(http_client=http_client)
+    return async_llm
+
+
+def get_async_llm() -> AsyncLLM:
+    return async_llm
+
+
+async def a_ask_agent(user_proxy, agent, prompt: str, default: str = "No response.", use_cache: bool = True,
+                      approx_key: tuple = None) -> str:
+    """
+    Async version of ask_agent for the async serving path: the same cache lookups, then
+    a non-blocking completion through AsyncLLM instead of AutoGen's synchronous client.
+    `user_proxy` and `agent` are only read, so one agent set can serve any number of
+    concurrent requests.
+    """
+    # The SQLite tier of the LLM cache is read and written in a worker thread
+    on_disk = bool(get_llm_cache().disk_path)
+    key, cached = await off_loop(on_disk, _cached_reply, agent, prompt, use_cache, approx_key)
+    reply_from_cache.set(cached is not None)
+    if cached is not None:
+        return cached
+
+    content = await get_async_llm().complete(user_proxy, agent, prompt)
+    if not content:
+        return default
+    await off_loop(on_disk, _remember_reply, key, content, approx_key)
+    return content
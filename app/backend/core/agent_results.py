@@ -0,0 +1,445 @@
+# core/agent_results.py
+
+import json
+import math
+import re
+import threading
+from collections import namedtuple
+
+
+class StructuredOutputError(ValueError):
+    """
+    Raised when an agent reply is not valid JSON for its result schema.
+    """
+
+
+# One food of a nutrition menu option. LLM-estimated foods carry only name and kcal;
+# foods priced from the local food table (core.food_db) also carry the serving and macros
+MealFood = namedtuple("MealFood", ["name", "kcal", "serving", "grams", "protein_g", "fat_g", "carbs_g"],
+                      defaults=(None, None, None, None, None, None))
+
+# Macro totals added per menu option when every food has them
+MACROS = ("protein_g", "fat_g", "carbs_g")
+
+
+# Field kinds: "str", "int", "number", "list" (of strings), "enum" (one of `choices`),
+# "meals" (nutrition menu options: [{"foods": [{"name", "kcal"}]}]),
+# "portions" (food choices without numbers: [{"foods": [{"name", "servings"}]}])
+def _placeholder(kind, choices):
+    if kind == "enum":
+        return "|".join(choices)
+    if kind == "list":
+        return ["<short phrase>"]
+    if kind in ("int", "number"):
+        return 0
+    if kind == "meals":
+        return [{"foods": [{"name": "<food>", "kcal": 0}]}]
+    if kind == "portions":
+        return [{"foods": [{"name": "<food from the list>", "servings": 1}]}]
+    return "<text>"
+
+
+def _validate(name, kind, choices, value):
+    if kind == "str":
+        if not isinstance(value, str) or not value.strip():
+            raise StructuredOutputError(f"'{name}' must be a non-empty string")
+        return value.strip()
+    if kind in ("int", "number"):
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise StructuredOutputError(f"'{name}' must be a number")
+        try:
+            number = float(value)
+        except OverflowError:
+            number = math.inf
+        if not math.isfinite(number):
+            # NaN / Infinity are accepted by json.loads but have no meaningful value here
+            raise StructuredOutputError(f"'{name}' must be a finite number")
+        return int(round(value)) if kind == "int" else round(number, 1)
+    if kind == "enum":
+        match = next((c for c in choices if isinstance(value, str) and value.strip().lower() == c.lower()), None)
+        if match is None:
+            raise StructuredOutputError(f"'{name}' must be one of {list(choices)}, got {value!r}")
+        return match
+    if kind == "list":
+        if not isinstance(value, list) or not all(isinstance(v, str) for v in value):
+            raise StructuredOutputError(f"'{name}' must be a list of strings")
+        return [v.strip() for v in value if v.strip()]
+    if kind == "meals":
+        if not isinstance(value, list) or not value:
+            raise StructuredOutputError(f"'{name}' must be a non-empty list of menu options")
+        options = []
+        for option in value:
+            foods = option.get("foods") if isinstance(option, dict) else None
+            if not isinstance(foods, list) or not foods:
+                raise StructuredOutputError(f"every '{name}' entry needs a non-empty 'foods' list")
+            options.append([
+                MealFood(_validate("foods.name", "str", None, f.get("name") if isinstance(f, dict) else None),
+                         _validate("foods.kcal", "int", None, f.get("kcal") if isinstance(f, dict) else None))
+                for f in foods
+            ])
+        return options
+    if kind == "portions":
+        if not isinstance(value, list) or not value:
+            raise StructuredOutputError(f"'{name}' must be a non-empty list of menu options")
+        options = []
+        for option in value:
+            foods = option.get("foods") if isinstance(option, dict) else None
+            if not isinstance(foods, list) or not foods or not all(isinstance(f, dict) for f in foods):
+                raise StructuredOutputError(f"every '{name}' entry needs a non-empty 'foods' list")
+            option = [
+                (_validate("foods.name", "str", None, f.get("name")),
+                 _validate("foods.servings", "number", None, f.get("servings", 1)))
+                for f in foods
+            ]
+            if any(servings <= 0 for _, servings in option):
+                raise StructuredOutputError("'foods.servings' must be positive")
+            options.append(option)
+        return options
+    raise ValueError(f"Unknown field kind {kind!r}")
+
+
+def _json_object(text: str) -> dict:
+    """
+    The JSON object in an agent reply (tolerates code fences, a trailing TERMINATE, prose around it).
+    """
+    if not isinstance(text, str):
+        raise StructuredOutputError("Agent reply is empty")
+    start, end = text.find("{"), text.rfind("}")
+    if start < 0 or end < start:
+        raise StructuredOutputError("Agent reply contains no JSON object")
+    try:
+        payload = json.loads(text[start:end + 1])
+    except ValueError as e:
+        raise StructuredOutputError(f"Agent reply is not valid JSON: {e}")
+    if not isinstance(payload, dict):
+        raise StructuredOutputError("Agent reply must be a JSON object")
+    return payload
+
+
+class AgentResult:
+    """
+    Compact typed result of one agent. Subclasses list their fields in FIELDS as
+    (name, kind, choices) and use matching __slots__.
+
+    - from_reply(): parses and validates a JSON reply
+    - compact(): short field summary used in downstream prompts
+    - render(): natural-language text for API responses
+    """
+
+    __slots__ = ()
+    FIELDS = ()
+
+    def __init__(self, **fields):
+        for name, _, _ in self.FIELDS:
+            setattr(self, name, fields.get(name))
+
+    @classmethod
+    def json_template(cls) -> str:
+        return json.dumps({name: _placeholder(kind, choices) for name, kind, choices in cls.FIELDS}, ensure_ascii=False)
+
+    @classmethod
+    def from_reply(cls, text: str):
+        payload = _json_object(text)
+        missing = [name for name, _, _ in cls.FIELDS if name not in payload]
+        if missing:
+            raise StructuredOutputError(f"Agent reply is missing {missing}")
+        return cls(**{name: _validate(name, kind, choices, payload[name]) for name, kind, choices in cls.FIELDS})
+
+    def to_dict(self) -> dict:
+        return {name: getattr(self, name) for name, _, _ in self.FIELDS}
+
+    def compact(self) -> str:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        raise NotImplementedError
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_dict()!r})"
+
+
+class ActivityResult(AgentResult):
+    __slots__ = ("activity_type", "step_count", "kcal", "comment")
+    FIELDS = (
+        ("activity_type", "enum", ("Sedentary", "Walking", "Running")),
+        ("step_count", "int", None),
+        ("kcal", "number", None),
+        ("comment", "str", None),
+    )
+
+    def compact(self) -> str:
+        return f"{self.activity_type}, {self.step_count} steps, {self.kcal:g} kcal"
+
+    def render(self) -> str:
+        return "\n".join([
+            f"1. **Estimated Activity Type**: {self.activity_type}",
+            f"2. **Approximate Step Count**: {self.step_count}",
+            f"3. **Estimated Calories Burned**: {self.kcal:g} kcal",
+            f"4. **Fitness Comment**: {self.comment}",
+        ])
+
+
+class SleepResult(AgentResult):
+    __slots__ = ("sleep_stage", "sleep_quality", "reasons", "suggestion")
+    FIELDS = (
+        ("sleep_stage", "enum", ("Awake", "Light", "Deep", "REM")),
+        ("sleep_quality", "enum", ("Good", "Fair", "Poor")),
+        ("reasons", "list", None),
+        ("suggestion", "str", None),
+    )
+
+    def compact(self) -> str:
+        return f"stage {self.sleep_stage}, quality {self.sleep_quality}; " + "; ".join(self.reasons)
+
+    def render(self) -> str:
+        reasons = "\n".join(f"   - {reason[0].upper()}{reason[1:]}" for reason in self.reasons)
+        return "\n".join([
+            f"1. **Estimated Sleep Stage**: {self.sleep_stage}",
+            f"2. **Sleep Quality**: {self.sleep_quality}",
+            f"3. **Reasoning**:\n{reasons}",
+            f"4. **Suggestion**: {self.suggestion}",
+        ])
+
+
+class StressResult(AgentResult):
+    __slots__ = ("stress_level", "reasons", "suggestion")
+    FIELDS = (
+        ("stress_level", "enum", ("Low", "Medium", "High")),
+        ("reasons", "list", None),
+        ("suggestion", "str", None),
+    )
+
+    def compact(self) -> str:
+        return f"level {self.stress_level}; " + "; ".join(self.reasons)
+
+    def render(self) -> str:
+        return "\n".join([
+            f"1. **Estimated Stress Level**: {self.stress_level}",
+            f"2. **Reasoning**: {'; '.join(r[0].upper() + r[1:] for r in self.reasons)}.",
+            f"3. **Suggestion**: {self.suggestion}",
+        ])
+
+
+class AnomalyResult(AgentResult):
+    __slots__ = ("anomalies", "severity")
+    FIELDS = (
+        ("anomalies", "list", None),
+        ("severity", "enum", ("Mild", "Warning", "Critical")),
+    )
+
+    def compact(self) -> str:
+        found = "; ".join(self.anomalies) if self.anomalies else "no anomaly detected"
+        return f"severity {self.severity}; {found}"
+
+    def render(self) -> str:
+        found = "; ".join(self.anomalies) if self.anomalies else "No anomaly detected"
+        return "\n".join([
+            f"- **Anomaly Detection**: {found}",
+            f"- **Severity Level**: {self.severity}",
+        ])
+
+
+class NutritionResult(AgentResult):
+    __slots__ = ("meal_time", "options", "advice")
+    FIELDS = (
+        ("meal_time", "enum", ("Breakfast", "Lunch", "Dinner")),
+        ("options", "meals", None),
+        ("advice", "str", None),
+    )
+
+    @staticmethod
+    def option_totals(foods) -> dict:
+        """
+        Total kcal of one menu option, plus macro totals when every food has them.
+        """
+        totals = {"total_kcal": sum(food.kcal for food in foods if food.kcal is not None)}
+        if all(food.protein_g is not None for food in foods):
+            totals.update({f"total_{macro}": round(sum(getattr(food, macro) for food in foods), 1) for macro in MACROS})
+        return totals
+
+    def to_dict(self) -> dict:
+        return {
+            "meal_time": self.meal_time,
+            "options": [
+                dict({"foods": [{k: v for k, v in food._asdict().items() if v is not None} for food in foods]},
+                     **self.option_totals(foods))
+                for foods in self.options
+            ],
+            "advice": self.advice,
+        }
+
+    def compact(self) -> str:
+        options = " | ".join(", ".join(food.name for food in foods) for foods in self.options)
+        return f"{self.meal_time}: {options}"
+
+    @staticmethod
+    def _food_line(food) -> str:
+        if food.kcal is None:
+            return f"  - {food.name} – not in the food table"
+        if food.protein_g is None:
+            return f"  - {food.name} – {food.kcal} kcal"
+        return (f"  - {food.name} ({food.serving}, {food.grams:g} g) – {food.kcal} kcal · "
+                f"protein {food.protein_g:g} g · fat {food.fat_g:g} g · carbs {food.carbs_g:g} g")
+
+    def render(self) -> str:
+        lines = [f"- **Meal Time**: {self.meal_time}"]
+        for i, foods in enumerate(self.options, 1):
+            lines.append(f"- **Menu Option {i}**:")
+            lines.extend(self._food_line(food) for food in foods)
+            totals = self.option_totals(foods)
+            if "total_protein_g" in totals:
+                lines.append(f"- **Total**: {totals['total_kcal']} kcal · protein {totals['total_protein_g']:g} g · "
+                             f"fat {totals['total_fat_g']:g} g · carbs {totals['total_carbs_g']:g} g")
+            elif any(food.kcal is None for food in foods):
+                lines.append(f"- **Total Calories**: {totals['total_kcal']} kcal (foods in the table only)")
+            else:
+                lines.append(f"- **Total Calories**: {totals['total_kcal']} kcal")
+        lines.append(f"- **Advice**: {self.advice}")
+        return "\n".join(lines)
+
+
+class MealSelection(AgentResult):
+    """
+    NutritionAgent reply when the local food table is used: foods and servings only.
+    core.food_db turns it into a NutritionResult with kcal and macros computed locally.
+    """
+
+    __slots__ = ("meal_time", "options", "advice")
+    FIELDS = (
+        ("meal_time", "enum", ("Breakfast", "Lunch", "Dinner")),
+        ("options", "portions", None),
+        ("advice", "str", None),
+    )
+
+    def compact(self) -> str:
+        options = " | ".join(", ".join(name for name, _ in foods) for foods in self.options)
+        return f"{self.meal_time}: {options}"
+
+    def render(self) -> str:
+        lines = [f"- **Meal Time**: {self.meal_time}"]
+        for i, foods in enumerate(self.options, 1):
+            lines.append(f"- **Menu Option {i}**:")
+            lines.extend(f"  - {name} × {servings:g}" for name, servings in foods)
+        lines.append(f"- **Advice**: {self.advice}")
+        return "\n".join(lines)
+
+
+class SummaryResult(AgentResult):
+    __slots__ = ("summary", "suggestion")
+    FIELDS = (
+        ("summary", "str", None),
+        ("suggestion", "str", None),
+    )
+
+    def compact(self) -> str:
+        return self.summary
+
+    def render(self) -> str:
+        return f"{self.summary}\n\n**Tomorrow**: {self.suggestion}"
+
+
+RESULT_TYPES = {cls.__name__: cls for cls in (
+    ActivityResult, SleepResult, StressResult, AnomalyResult, NutritionResult, SummaryResult
+)}
+
+
+def json_instruction(result_type) -> str:
+    """
+    Output instruction appended to structured-mode prompts.
+    """
+    return (
+        "Respond with ONLY one JSON object, no markdown and no other text, exactly in this shape:\n"
+        f"{result_type.json_template()}"
+    )
+
+
+def prompt_text(result) -> str:
+    """
+    Text of an upstream result for a downstream prompt: compact fields for typed results
+    and dicts (e.g. structured results posted back by a client), prose unchanged.
+    """
+    if isinstance(result, AgentResult):
+        return result.compact()
+    if isinstance(result, dict):
+        return "; ".join(f"{key}={value}" for key, value in result.items())
+    return result
+
+
+def render_result(result):
+    """
+    Natural-language text of a result, for API responses (prose results unchanged).
+    """
+    return result.render() if isinstance(result, AgentResult) else result
+
+
+def result_fields(result):
+    """
+    Structured fields of a result, or None for prose results.
+    """
+    return result.to_dict() if isinstance(result, AgentResult) else None
+
+
+def dump_result(result):
+    """
+    JSON-serialisable form of a prose or typed result (see load_result).
+    """
+    if isinstance(result, AgentResult):
+        return {"type": type(result).__name__, "fields": result.to_dict()}
+    return result
+
+
+def load_result(value):
+    if isinstance(value, dict) and value.get("type") in RESULT_TYPES:
+        result_type = RESULT_TYPES[value["type"]]
+        fields = value["fields"]
+        if result_type is NutritionResult:
+            fields = dict(fields, options=[
+                [MealFood(**food) for food in option["foods"]] for option in fields["options"]
+            ])
+        return result_type(**fields)
+    return value
+
+
+class StructuredOutputs:
+    """
+    Structured-output mode switch plus per-agent counts of replies that parsed into
+    typed results vs. fell back to prose (invalid JSON).
+    """
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._counts = {}
+
+    def parse(self, agent_name: str, result_type, content: str):
+        """
+        `content` parsed into `result_type`, or the prose `content` itself when it does not validate.
+        """
+        try:
+            result = result_type.from_reply(content)
+            outcome = "parsed"
+        except StructuredOutputError:
+            result = re.sub(r"\s*TERMINATE\s*$", "", content or "")
+            outcome = "invalid"
+        with self._lock:
+            counts = self._counts.setdefault(agent_name, {"parsed": 0, "invalid": 0})
+            counts[outcome] += 1
+        return result
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"enabled": self.enabled, "agents": {name: dict(counts) for name, counts in self._counts.items()}}
+
+
+# Process-wide switch read by the core runners (off: free-form markdown replies)
+structured_outputs = StructuredOutputs()
+
+
+def configure_structured_outputs(enabled: bool = False) -> StructuredOutputs:
+    global structured_outputs
+    structured_outputs = StructuredOutputs(enabled=enabled)
+    return structured_outputs
+
+
+def get_structured_outputs() -> StructuredOutputs:
+    return structured_outputs
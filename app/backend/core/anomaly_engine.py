@@ -0,0 +1,275 @@
+# core/anomaly_engine.py
+
+import threading
+import time
+
+import numpy as np
+
+from core.activity_features import INTENSITY_BUCKETS, acceleration_samples, to_acceleration_array
+from core.agent_results import AnomalyResult
+
+# Vital signals checked, in array order
+SIGNALS = ("heart_rate", "hrv", "skin_temperature", "eda", "gsr")
+SIGNAL_LABELS = {
+    "heart_rate": ("heart rate", "bpm"),
+    "hrv": ("HRV", "ms"),
+    "skin_temperature": ("skin temperature", "°C"),
+    "eda": ("EDA", "µS"),
+    "gsr": ("GSR", "µS"),
+}
+
+SEVERITIES = (None, "Mild", "Warning", "Critical")
+
+# "day": awake readings (user baseline applies); "sleep": night readings
+CONTEXTS = ("day", "sleep")
+
+# Population (mean, std) per context, used when the user has no baseline
+POPULATION_NORMS = {
+    "day": np.array([[72.0, 10.0], [45.0, 18.0], [33.5, 1.0], [2.0, 2.0], [2.0, 2.0]]),
+    "sleep": np.array([[60.0, 8.0], [55.0, 20.0], [34.5, 0.8], [1.5, 1.5], [1.5, 1.5]]),
+}
+
+# |z| from which a deviation is Mild / Warning / Critical
+Z_SEVERITY = np.array([2.5, 3.5, 5.0])
+
+# Absolute limits per signal: (critical low, warning low, warning high, critical high); NaN = no limit
+THRESHOLDS = {
+    "day": np.array([
+        [35.0, 45.0, 120.0, 150.0],
+        [np.nan, np.nan, np.nan, np.nan],
+        [28.0, 30.0, 37.5, 38.5],
+        [np.nan, np.nan, 12.0, 25.0],
+        [np.nan, np.nan, 12.0, 25.0],
+    ]),
+    "sleep": np.array([
+        [30.0, 38.0, 100.0, 130.0],
+        [np.nan, np.nan, np.nan, np.nan],
+        [28.0, 30.0, 37.5, 38.5],
+        [np.nan, np.nan, 12.0, 25.0],
+        [np.nan, np.nan, 12.0, 25.0],
+    ]),
+}
+
+# Robust (median / MAD) spike check inside one submitted series
+MAD_MIN_READINGS = 10
+MAD_SPIKE_Z = 3.5
+MAD_SPIKE_FRACTION = 0.1         # more than this share of readings spiking → Warning
+
+# A user baseline (from the time-series store) is used once it holds this many readings
+BASELINE_MIN_COUNT = 100
+
+# Movement above the sedentary cut point means a high heart rate is explained by exercise
+REST_ENMO_G = INTENSITY_BUCKETS[0][2]
+
+
+def _series(value):
+    """
+    A reading or list / array of readings as a float array (empty when missing or non-numeric).
+    """
+    if value is None or isinstance(value, (bool, str)):
+        return np.empty(0)
+    try:
+        array = np.asarray(value, dtype=np.float64).ravel()
+    except (TypeError, ValueError):
+        return np.empty(0)
+    return array[np.isfinite(array)]
+
+
+def _at_rest(data: dict):
+    """
+    True / False from the mean ENMO of the acceleration samples, None without usable ones
+    (missing, not a sequence, ragged or non-numeric).
+    """
+    acc = to_acceleration_array(acceleration_samples(data))
+    if acc is None:
+        return None
+    magnitude = np.sqrt(np.einsum("ij,ij->i", acc, acc))
+    return float(np.maximum(magnitude - 1.0, 0.0).mean()) < REST_ENMO_G
+
+
+def _describe(signal, value, rule, score, direction, severity, reference):
+    name, unit = SIGNAL_LABELS[signal]
+    if rule == "threshold":
+        side = "above" if direction == "high" else "below"
+        detail = f"{side} the {reference:g} {unit} limit"
+    elif rule == "mad_spikes":
+        detail = f"{int(score)} transient spikes within the recording"
+    else:
+        source = "your baseline" if rule == "baseline_z" else "typical values"
+        detail = f"{abs(score):.1f} SD {'above' if direction == 'high' else 'below'} {source} ({reference:g} {unit})"
+    return f"{name} {value:g} {unit}: {detail} ({severity})"
+
+
+def detect(data: dict, context: str = "day", baseline: dict = None) -> list:
+    """
+    Checks one payload's vital signals; severities are computed for all signals at once.
+
+    Rules, per signal (the most severe finding is kept):
+    - z-score of the median against the user's baseline ({signal: {"count", "mean", "std"}},
+      used when it has BASELINE_MIN_COUNT readings), otherwise against population norms
+    - absolute limits on the 90th / 10th percentile (sustained, not single readings)
+    - robust median / MAD spike count inside the submitted series
+
+    A high heart rate during movement (ENMO above the sedentary cut point) is not flagged.
+
+    Returns:
+    - [{"signal", "value", "rule", "score", "direction", "severity", "text"}, ...]
+    """
+    series = [_series(data.get(signal)) for signal in SIGNALS]
+    present = np.array([s.size > 0 for s in series])
+    if not present.any():
+        return []
+
+    median = np.array([np.median(s) if s.size else np.nan for s in series])
+    high = np.array([np.percentile(s, 90) if s.size else np.nan for s in series])
+    low = np.array([np.percentile(s, 10) if s.size else np.nan for s in series])
+
+    # z-scores: user baseline where available, population norms otherwise
+    norms = POPULATION_NORMS[context].copy()
+    use_baseline = np.zeros(len(SIGNALS), dtype=bool)
+    for i, signal in enumerate(SIGNALS):
+        stats = (baseline or {}).get(signal) or {}
+        if (stats.get("count") or 0) >= BASELINE_MIN_COUNT and stats.get("std"):
+            norms[i] = (stats["mean"], stats["std"])
+            use_baseline[i] = True
+    with np.errstate(invalid="ignore"):
+        z = (median - norms[:, 0]) / norms[:, 1]
+    z_level = np.searchsorted(Z_SEVERITY, np.nan_to_num(np.abs(z)), side="right")
+
+    # Absolute limits
+    limits = THRESHOLDS[context]
+    with np.errstate(invalid="ignore"):
+        high_level = np.where(high >= limits[:, 3], 3, np.where(high >= limits[:, 2], 2, 0))
+        low_level = np.where(low <= limits[:, 0], 3, np.where(low <= limits[:, 1], 2, 0))
+    threshold_level = np.maximum(high_level, low_level)
+
+    # Exercise explains a high heart rate
+    if _at_rest(data) is False:
+        hr = SIGNALS.index("heart_rate")
+        if z[hr] > 0:
+            z_level[hr] = 0
+        high_level[hr] = 0
+        threshold_level[hr] = low_level[hr]
+
+    findings = []
+    for i, signal in enumerate(SIGNALS):
+        if not present[i]:
+            continue
+        candidates = []
+        if z_level[i]:
+            direction = "high" if z[i] > 0 else "low"
+            rule = "baseline_z" if use_baseline[i] else "population_z"
+            candidates.append((int(z_level[i]), rule, round(float(z[i]), 2), direction, round(float(norms[i, 0]), 2)))
+        if threshold_level[i]:
+            direction = "high" if high_level[i] >= low_level[i] else "low"
+            reference = limits[i, 3 if high_level[i] == 3 else 2] if direction == "high" else limits[i, 0 if low_level[i] == 3 else 1]
+            value = high[i] if direction == "high" else low[i]
+            candidates.append((int(threshold_level[i]), "threshold", round(float(value), 2), direction, float(reference)))
+        s = series[i]
+        if s.size >= MAD_MIN_READINGS:
+            mad = np.median(np.abs(s - median[i]))
+            if mad > 0:
+                spikes = int(np.count_nonzero(np.abs(0.6745 * (s - median[i]) / mad) > MAD_SPIKE_Z))
+                if spikes:
+                    level = 2 if spikes / s.size > MAD_SPIKE_FRACTION else 1
+                    candidates.append((level, "mad_spikes", spikes, "high", float(median[i])))
+        if not candidates:
+            continue
+
+        level, rule, score, direction, reference = max(candidates, key=lambda c: c[0])
+        value = round(float(median[i] if rule != "threshold" else score), 2)
+        findings.append({
+            "signal": signal,
+            "context": context,
+            "value": value,
+            "rule": rule,
+            "score": score,
+            "direction": direction,
+            "severity": SEVERITIES[level],
+            "text": _describe(signal, value, rule, score, direction, SEVERITIES[level], reference),
+        })
+    return findings
+
+
+def summarise_findings(findings: list) -> AnomalyResult:
+    """
+    AnomalyResult over all findings: worst severity first, Mild when nothing was found.
+    """
+    ordered = sorted(findings, key=lambda f: SEVERITIES.index(f["severity"]), reverse=True)
+    severity = ordered[0]["severity"] if ordered else "Mild"
+    return AnomalyResult(anomalies=[f["text"] for f in ordered], severity=severity)
+
+
+class AnomalyEngine:
+    """
+    Local statistical anomaly detection for /detect_anomaly and the pipeline's anomaly stage.
+
+    Parameters:
+    - enabled: Set False to keep the LLM-only AbnormalyDetectionAgent
+    - phrase_with_llm: Ask the LLM to phrase detected anomalies (never called when none are found)
+    - baseline_provider: Optional callable(user_id) -> {signal: {"count", "mean", "std"}}
+    """
+
+    def __init__(self, enabled: bool = True, phrase_with_llm: bool = False, baseline_provider=None):
+        self.enabled = enabled
+        self.phrase_with_llm = phrase_with_llm
+        self.baseline_provider = baseline_provider
+        self._lock = threading.Lock()
+        self._stats = {"checks": 0, "anomalies": 0, "phrased": 0, "baseline_used": 0, "total_ms": 0.0}
+
+    def baseline(self, user_id):
+        if user_id is None or self.baseline_provider is None:
+            return None
+        try:
+            return self.baseline_provider(user_id)
+        except (OSError, ValueError):
+            return None
+
+    def check(self, contexts: dict, user_id=None) -> tuple:
+        """
+        Runs detect() for each {context: payload} ("day" payloads use the user's baseline).
+
+        Returns:
+        - (AnomalyResult, findings)
+        """
+        start = time.perf_counter()
+        baseline = self.baseline(user_id)
+        findings = []
+        for context, data in contexts.items():
+            if isinstance(data, dict):
+                findings.extend(detect(data, context, baseline if context == "day" else None))
+        result = summarise_findings(findings)
+
+        with self._lock:
+            self._stats["checks"] += 1
+            self._stats["anomalies"] += bool(findings)
+            self._stats["baseline_used"] += any(
+                (stats or {}).get("count", 0) >= BASELINE_MIN_COUNT for stats in (baseline or {}).values()
+            )
+            self._stats["total_ms"] += (time.perf_counter() - start) * 1000
+        return result, findings
+
+    def record_phrasing(self) -> None:
+        with self._lock:
+            self._stats["phrased"] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+        stats["mean_ms"] = round(stats.pop("total_ms") / stats["checks"], 3) if stats["checks"] else 0.0
+        stats["enabled"] = self.enabled
+        return stats
+
+
+# Process-wide engine (no user baselines until configured)
+anomaly_engine = AnomalyEngine()
+
+
+def configure_anomaly_engine(enabled: bool = True, phrase_with_llm: bool = False, baseline_provider=None) -> AnomalyEngine:
+    global anomaly_engine
+    anomaly_engine = AnomalyEngine(enabled=enabled, phrase_with_llm=phrase_with_llm, baseline_provider=baseline_provider)
+    return anomaly_engine
+
+
+def get_anomaly_engine() -> AnomalyEngine:
+    return anomaly_engine
@@ -0,0 +1,179 @@
+# core/approx_cache.py
+
+import json
+import threading
+
+import numpy as np
+
+from core.llm_cache import LLMCache, agent_cache_key
+
+# Movement feature steps shared by the sleep and stress buckets
+MOVEMENT_FEATURE_BUCKETS = {
+    "duration_minutes": 5.0,
+    "magnitude_mean_g": 0.02,
+    "magnitude_std_g": 0.02,
+    "magnitude_max_g": 0.1,
+    "enmo_mean_g": 0.005,
+    "intensity_minutes": 1.0,
+}
+
+# Per-agent bucket steps: numeric inputs (and lists of them) are rounded to the nearest
+# multiple of their step before keying. Input fields without a step must match exactly;
+# raw acceleration arrays are replaced by the derived movement features listed under
+# "features" (features not listed are left out of the key).
+DEFAULT_BUCKETS = {
+    "sleep": {
+        "heart_rate": 5.0,
+        "hrv": 5.0,
+        "skin_temperature": 0.2,
+        "gsr": 0.5,
+        "features": MOVEMENT_FEATURE_BUCKETS,
+    },
+    "stress": {
+        "heart_rate": 5.0,
+        "skin_temperature": 0.2,
+        "eda": 0.5,
+        "features": MOVEMENT_FEATURE_BUCKETS,
+    },
+    "activity": {
+        "body_weight": 5.0,
+        "duration_minutes": 5.0,
+        "features": dict(MOVEMENT_FEATURE_BUCKETS, step_count=50, cadence_spm=5.0, estimated_kcal=10.0),
+    },
+}
+
+# The activity reply quotes the step count and calories, so near-duplicate answers are
+# visibly off; it is only cached approximately when enabled explicitly
+DEFAULT_AGENTS = ("sleep", "stress")
+
+# Sensor arrays summarised by the movement features
+RAW_ARRAY_FIELDS = ("acceleration", "acceleration_samples")
+
+
+def quantize(value, step):
+    """
+    Rounds a number, a list / array of numbers or a dict of numbers to the nearest
+    multiple of `step` (None leaves the value unchanged). Non-numeric values pass through.
+    """
+    if step is None or value is None or isinstance(value, (bool, str)):
+        return value
+    if isinstance(value, dict):
+        return {k: quantize(v, step) for k, v in value.items()}
+    if isinstance(value, np.ndarray):
+        if value.dtype.kind not in "fiu":
+            return value.tolist()
+        return np.round(np.round(value / step) * step, 6).tolist()
+    if isinstance(value, (list, tuple)):
+        return [quantize(v, step) for v in value]
+    if isinstance(value, (int, float, np.number)):
+        return round(round(float(value) / step) * step, 6)
+    return value
+
+
+def quantize_inputs(data: dict, features: dict, buckets: dict) -> dict:
+    """
+    Bucketed view of one agent's inputs: the fields of `data` (minus raw acceleration)
+    and the movement features named in buckets["features"].
+    """
+    quantized = {
+        field: quantize(value, buckets.get(field))
+        for field, value in (data or {}).items()
+        if field not in RAW_ARRAY_FIELDS
+    }
+    if features:
+        quantized["features"] = {
+            name: quantize(features.get(name), step)
+            for name, step in buckets.get("features", {}).items()
+        }
+    return quantized
+
+
+def merge_buckets(overrides: dict) -> dict:
+    buckets = {agent: dict(config) for agent, config in DEFAULT_BUCKETS.items()}
+    for agent, config in (overrides or {}).items():
+        merged = buckets.setdefault(agent, {})
+        for field, step in config.items():
+            if field == "features":
+                merged["features"] = dict(merged.get("features", {}), **step)
+            else:
+                merged[field] = step
+    return buckets
+
+
+class ApproxCache:
+    """
+    Approximate response cache for the sensor agents (sleep / stress / activity).
+
+    Inputs are quantized into per-agent buckets (e.g. heart rate to 5 bpm) before keying,
+    so near-duplicate readings such as HR 72.1 and 72.3 share one cached answer. Each
+    agent has its own memory-only LLMCache of up to `memory_size` entries; entries
+    expire after `ttl` seconds.
+
+    Parameters:
+    - buckets: Per-agent step overrides merged into DEFAULT_BUCKETS,
+      e.g. {"stress": {"heart_rate": 10, "features": {"enmo_mean_g": 0.01}}}
+    - agents: Agents served approximately (others always return a None key)
+    - memory_size: LRU size per agent
+    - ttl: Entry lifetime in seconds (None = never expire)
+    """
+
+    def __init__(self, buckets: dict = None, agents=DEFAULT_AGENTS, memory_size: int = 1024, ttl: float = 3600):
+        self.buckets = merge_buckets(buckets)
+        self.agents = tuple(agents)
+        self.memory_size = memory_size
+        self.ttl = ttl
+        self._caches = {}
+        self._lock = threading.Lock()
+
+    def key(self, agent_name: str, agent, data: dict, features: dict = None):
+        """
+        Approximate cache key for sending `data` to `agent`, or None when `agent_name`
+        is not served approximately.
+        """
+        if agent_name not in self.agents:
+            return None
+        quantized = quantize_inputs(data, features, self.buckets.get(agent_name, {}))
+        return agent_cache_key(agent, json.dumps(quantized, sort_keys=True, ensure_ascii=False))
+
+    def _cache(self, agent_name: str) -> LLMCache:
+        with self._lock:
+            cache = self._caches.get(agent_name)
+            if cache is None:
+                cache = self._caches[agent_name] = LLMCache(memory_size=self.memory_size, ttl=self.ttl)
+            return cache
+
+    def get(self, agent_name: str, key: str):
+        return self._cache(agent_name).get(key)
+
+    def set(self, agent_name: str, key: str, value: str) -> None:
+        self._cache(agent_name).set(key, value)
+
+    def stats(self) -> dict:
+        with self._lock:
+            caches = dict(self._caches)
+        stats = {}
+        for agent_name, cache in caches.items():
+            counts = cache.stats()
+            stats[agent_name] = {
+                "hits": counts["memory_hits"],
+                "misses": counts["misses"],
+                "stores": counts["stores"],
+                "evictions": counts["evictions"],
+                "entries": counts["memory_entries"],
+                "hit_rate": counts["hit_rate"],
+            }
+        return stats
+
+
+# Process-wide approximate cache shared by the sensor agent runners
+approx_cache = ApproxCache()
+
+
+def configure_approx_cache(buckets: dict = None, agents=DEFAULT_AGENTS, memory_size: int = 1024, ttl: float = 3600) -> ApproxCache:
+    global approx_cache
+    approx_cache = ApproxCache(buckets=buckets, agents=agents, memory_size=memory_size, ttl=ttl)
+    return approx_cache
+
+
+def get_approx_cache() -> ApproxCache:
+    return approx_cache
@@ -0,0 +1,195 @@
+# core/food_db.py
+
+import bisect
+import csv
+import difflib
+import hashlib
+import os
+import re
+import threading
+
+import numpy as np
+
+from core.agent_results import MACROS, MealFood, NutritionResult
+
+# Bundled table: per-100 g values plus one typical serving per food
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "foods.csv")
+
+# Nutrient columns, in array order (per 100 g)
+NUTRIENTS = ("kcal",) + MACROS
+
+# difflib ratio from which a misspelt / reworded name still matches
+DEFAULT_FUZZY_CUTOFF = 0.8
+
+# Resolved names remembered per process (LLM replies reuse a small vocabulary)
+LOOKUP_MEMO_SIZE = 4096
+
+
+def normalize_name(name: str) -> str:
+    """
+    Lookup form of a food name: lower case, punctuation and extra spaces removed.
+    """
+    return " ".join(re.sub(r"[^a-z0-9]+", " ", str(name).lower()).split())
+
+
+class FoodDatabase:
+    """
+    Local food / nutrition table used by NutritionAgent, so the LLM only picks foods
+    and servings while kcal and macros are computed here.
+
+    Rows are held as arrays: `nutrients` (float32, foods × NUTRIENTS, per 100 g) and
+    `serving_g`; names, aliases and categories index into them. Lookups try, in order:
+    - exact name / alias (singular / plural tolerated)
+    - prefix: the shortest known name starting with the query ("blueberr")
+    - fuzzy: closest name with as many words, by difflib ratio of at least `fuzzy_cutoff`
+    Anything else is a miss and keeps the LLM's name without computed values.
+
+    Parameters:
+    - path: CSV with name, aliases (|-separated), category, serving_g, serving, kcal, protein_g, fat_g, carbs_g
+    - enabled: Set False to let the LLM estimate calories itself (previous behaviour)
+    - fuzzy_cutoff: Minimum difflib ratio for fuzzy matches
+    """
+
+    def __init__(self, path: str = DEFAULT_PATH, enabled: bool = True, fuzzy_cutoff: float = DEFAULT_FUZZY_CUTOFF):
+        self.path = path
+        self.enabled = enabled
+        self.fuzzy_cutoff = fuzzy_cutoff
+
+        with open(path, "rb") as f:
+            raw = f.read()
+        self.version = hashlib.sha256(raw).hexdigest()[:16]
+        rows = list(csv.DictReader(raw.decode("utf-8").splitlines()))
+        if not rows:
+            raise ValueError(f"Food table {path} is empty")
+
+        self.names = [row["name"].strip() for row in rows]
+        self.categories = [row["category"].strip() for row in rows]
+        self.servings = [row["serving"].strip() for row in rows]
+        self.serving_g = np.array([float(row["serving_g"]) for row in rows], dtype=np.float32)
+        self.nutrients = np.array([[float(row[n]) for n in NUTRIENTS] for row in rows], dtype=np.float32)
+
+        # Name / alias index (first definition wins) and its sorted keys for prefix search
+        self._index = {}
+        for i, row in enumerate(rows):
+            for name in [row["name"]] + (row.get("aliases") or "").split("|"):
+                key = normalize_name(name)
+                if key:
+                    self._index.setdefault(key, i)
+        self._keys = sorted(self._index)
+
+        self._memo = {}
+        self._catalog = None
+        self._lock = threading.Lock()
+        self._stats = {"lookups": 0, "exact": 0, "prefix": 0, "fuzzy": 0, "misses": 0}
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def _resolve(self, key: str):
+        if not key:
+            return None, "miss"
+        for candidate in (key, key[:-1] if key.endswith("s") else key + "s"):
+            if candidate in self._index:
+                return self._index[candidate], "exact"
+
+        # Shortest known name that starts with the query. The reverse (a known name that
+        # starts the query) is not a match: "apple pie" is not an apple, "potato chips" not a potato
+        start = bisect.bisect_left(self._keys, key)
+        matches = []
+        for known in (self._keys[start:] if len(key) >= 3 else ()):
+            if not known.startswith(key):
+                break
+            matches.append(known)
+        if matches:
+            return self._index[min(matches, key=len)], "prefix"
+
+        # Misspellings only: a close name with a different word count is another dish
+        # ("sweet potato fries" is close to "sweet potato")
+        n_words = len(key.split())
+        for close in difflib.get_close_matches(key, self._keys, n=5, cutoff=self.fuzzy_cutoff):
+            if len(close.split()) == n_words:
+                return self._index[close], "fuzzy"
+        return None, "miss"
+
+    def lookup(self, name: str):
+        """
+        Returns (row, match) with match "exact" / "prefix" / "fuzzy", or (None, "miss").
+        """
+        key = normalize_name(name)
+        with self._lock:
+            resolved = self._memo.get(key)
+        if resolved is None:
+            resolved = self._resolve(key)
+            with self._lock:
+                if len(self._memo) >= LOOKUP_MEMO_SIZE:
+                    self._memo.clear()
+                self._memo[key] = resolved
+        with self._lock:
+            self._stats["lookups"] += 1
+            self._stats["misses" if resolved[1] == "miss" else resolved[1]] += 1
+        return resolved
+
+    def catalog(self) -> str:
+        """
+        Food names grouped by category, one line each, for the NutritionAgent prompt.
+        """
+        if self._catalog is None:
+            groups = {}
+            for name, category in zip(self.names, self.categories):
+                groups.setdefault(category, []).append(name)
+            self._catalog = "\n".join(f"- {category}: {', '.join(names)}" for category, names in groups.items())
+        return self._catalog
+
+    def portions(self, names, servings) -> list:
+        """
+        MealFood entries for `names` eaten in `servings` (multiples of each food's serving),
+        named as in the table. Foods not in the table keep only the given name.
+        """
+        rows = [self.lookup(name)[0] for name in names]
+        found = [i for i, row in enumerate(rows) if row is not None]
+        foods = [MealFood(name) for name in names]
+        if not found:
+            return foods
+
+        index = np.array([rows[i] for i in found])
+        grams = self.serving_g[index] * np.array([servings[i] for i in found], dtype=np.float32)
+        amounts = self.nutrients[index] * (grams / 100.0)[:, None]
+        for i, row, g, amount in zip(found, index, grams, amounts):
+            foods[i] = MealFood(
+                name=self.names[row][0].upper() + self.names[row][1:],
+                kcal=int(round(float(amount[0]))),
+                serving=self.servings[row] if servings[i] == 1 else f"{servings[i]:g} × {self.servings[row]}",
+                grams=round(float(g), 1),
+                **{macro: round(float(value), 1) for macro, value in zip(MACROS, amount[1:])}
+            )
+        return foods
+
+    def meal_plan(self, selection) -> NutritionResult:
+        """
+        NutritionResult for a MealSelection, with kcal and macros computed from the table.
+        """
+        options = [self.portions([name for name, _ in foods], [servings for _, servings in foods])
+                   for foods in selection.options]
+        return NutritionResult(meal_time=selection.meal_time, options=options, advice=selection.advice)
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+        stats["hit_rate"] = round(1 - stats["misses"] / stats["lookups"], 4) if stats["lookups"] else 0.0
+        stats.update(enabled=self.enabled, foods=len(self.names), version=self.version)
+        return stats
+
+
+# Process-wide table (the bundled CSV until configured)
+food_database = FoodDatabase()
+
+
+def configure_food_database(path: str = DEFAULT_PATH, enabled: bool = True,
+                            fuzzy_cutoff: float = DEFAULT_FUZZY_CUTOFF) -> FoodDatabase:
+    global food_database
+    food_database = FoodDatabase(path=path, enabled=enabled, fuzzy_cutoff=fuzzy_cutoff)
+    return food_database
+
+
+def get_food_database() -> FoodDatabase:
+    return food_database
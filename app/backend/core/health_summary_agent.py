@@ -1,10 +1,20 @@
 # core/health_summary_agent.py
 
-def build_summary_prompt(activity_result: str, sleep_result: str, stress_result: str = None, abnormal_result: str = None) -> str:
+from core.agent_results import SummaryResult, get_structured_outputs, json_instruction, prompt_text
+from core.model_router import AgentRequest, a_run_request, run_request
+
+
+def build_summary_prompt(activity_result, sleep_result, stress_result=None, abnormal_result=None, structured: bool = False) -> str:
     """
     Constructs a concise and user-friendly health summary prompt.
-    Accepts outputs from other agents.
+    Accepts outputs from other agents (prose or typed results).
+    With `structured`, the reply is requested as a SummaryResult JSON object.
     """
+    activity_result = prompt_text(activity_result)
+    sleep_result = prompt_text(sleep_result)
+    stress_result = prompt_text(stress_result)
+    abnormal_result = prompt_text(abnormal_result)
+
     prompt = f"""
 You are a health summary assistant. The following insights are collected from individual wellness agents:
 
@@ -19,6 +29,15 @@ You are a health summary assistant. The following insights are collected from in
     if abnormal_result:
         prompt += f"🚨 Anomaly Report:\n{abnormal_result}\n\n"
 
+    if structured:
+        prompt += f"""
+Write a short, warm summary of the user's current health (strengths and areas to improve) and
+one practical action for tomorrow.
+
+{json_instruction(SummaryResult)}
+"""
+        return prompt.strip()
+
     prompt += """
 Please perform the following tasks:
 1. Write a holistic, easy-to-understand summary of the user's current health condition.
@@ -34,17 +53,28 @@ Important:
     return prompt.strip()
 
 
-def run_summary_agent(activity_result: str, sleep_result: str, user_proxy, agent, stress_result: str = None, abnormal_result: str = None) -> str:
+def prepare_summary_request(activity_result, sleep_result, stress_result=None, abnormal_result=None) -> AgentRequest:
+    """
+    AgentRequest shared by run_summary_agent and a_run_summary_agent.
+    """
+    structured = get_structured_outputs()
+    prompt = build_summary_prompt(activity_result, sleep_result, stress_result, abnormal_result, structured=structured.enabled)
+    return AgentRequest("summary", prompt, SummaryResult if structured.enabled else None)
+
+
+def run_summary_agent(activity_result, sleep_result, user_proxy, agent, stress_result=None, abnormal_result=None, use_cache: bool = True):
     """
     Executes the HealthSummaryAgent GPT prompt to generate an overall health summary.
+    Returns prose, or a SummaryResult in structured-output mode.
     """
-    prompt = build_summary_prompt(activity_result, sleep_result, stress_result, abnormal_result)
+    request = prepare_summary_request(activity_result, sleep_result, stress_result, abnormal_result)
+    return run_request(request, user_proxy, agent, use_cache)
 
-    user_proxy.initiate_chat(
-        agent,
-        message=prompt,
-        max_turns=1,
-        clear_history=True
-    )
 
-    return user_proxy.last_message(agent).get("content", "No response.")
+async def a_run_summary_agent(activity_result, sleep_result, user_proxy, agent, stress_result=None, abnormal_result=None,
+                              use_cache: bool = True):
+    """
+    Async version of run_summary_agent (non-blocking LLM call).
+    """
+    request = prepare_summary_request(activity_result, sleep_result, stress_result, abnormal_result)
+    return await a_run_request(request, user_proxy, agent, use_cache)
@@ -0,0 +1,175 @@
+# core/llm_cache.py
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+def make_cache_key(model, system_message, prompt, max_tokens) -> str:
+    """
+    Content-addresses one LLM request: identical (model, system message, prompt,
+    max_tokens) tuples always map to the same key.
+    """
+    payload = json.dumps([model, system_message, prompt, max_tokens], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def agent_cache_key(agent, prompt: str) -> str:
+    """
+    Builds the cache key for sending `prompt` to an AutoGen AssistantAgent.
+    """
+    llm_config = agent.llm_config if isinstance(getattr(agent, "llm_config", None), dict) else {}
+    config_list = llm_config.get("config_list") or [{}]
+    return make_cache_key(
+        config_list[0].get("model"),
+        getattr(agent, "system_message", None),
+        prompt,
+        llm_config.get("max_tokens"),
+    )
+
+
+class LLMCache:
+    """
+    Two-tier response cache for the core agent runners, also the storage of the other
+    keyed caches (backend.stage_store.StageStore, core.approx_cache.ApproxCache).
+
+    - Memory tier: LRU of up to `memory_size` entries.
+    - Disk tier (optional): SQLite file at `disk_path`, capped at `disk_max_entries`
+      rows; least recently used rows are evicted first.
+
+    Entries in both tiers expire `ttl` seconds after they were stored (None = never).
+
+    Parameters:
+    - table: SQLite table of the disk tier, so several caches can share one file
+    - json_values: Values are JSON-serialisable objects rather than strings (kept as
+      objects in memory, JSON-encoded on disk)
+    """
+
+    def __init__(self, memory_size: int = 1024, disk_path: str = None, ttl: float = 3600, disk_max_entries: int = 10000,
+                 table: str = "llm_cache", json_values: bool = False):
+        if not table.isidentifier():
+            raise ValueError(f"Invalid cache table name {table!r}")
+        self.memory_size = memory_size
+        self.disk_path = disk_path
+        self.ttl = ttl
+        self.disk_max_entries = disk_max_entries
+        self.table = table
+        self.json_values = json_values
+
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "bypassed": 0, "stores": 0, "evictions": 0}
+
+        self._db = None
+        if disk_path:
+            self._db = sqlite3.connect(disk_path, check_same_thread=False)
+            self._db.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            self._db.execute(f"CREATE INDEX IF NOT EXISTS {table}_accessed ON {table} (accessed)")
+            self._db.commit()
+
+    def _expired(self, created: float, now: float) -> bool:
+        return self.ttl is not None and now - created > self.ttl
+
+    def get(self, key: str):
+        """
+        Returns the cached response for `key`, or None on a miss.
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                value, created = entry
+                if not self._expired(created, now):
+                    self._memory.move_to_end(key)
+                    self._stats["memory_hits"] += 1
+                    return value
+                del self._memory[key]
+
+            if self._db is not None:
+                row = self._db.execute(f"SELECT value, created FROM {self.table} WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    value, created = row
+                    if not self._expired(created, now):
+                        self._db.execute(f"UPDATE {self.table} SET accessed = ? WHERE key = ?", (now, key))
+                        self._db.commit()
+                        if self.json_values:
+                            value = json.loads(value)
+                        self._remember(key, value, created)
+                        self._stats["disk_hits"] += 1
+                        return value
+                    self._db.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                    self._db.commit()
+
+            self._stats["misses"] += 1
+            return None
+
+    def set(self, key: str, value) -> None:
+        now = time.time()
+        with self._lock:
+            self._remember(key, value, now)
+            self._stats["stores"] += 1
+
+            if self._db is not None:
+                self._db.execute(
+                    f"INSERT OR REPLACE INTO {self.table} (key, value, created, accessed) VALUES (?, ?, ?, ?)",
+                    (key, json.dumps(value, ensure_ascii=False) if self.json_values else value, now, now),
+                )
+                overflow = self._db.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0] - self.disk_max_entries
+                if overflow > 0:
+                    self._db.execute(
+                        f"DELETE FROM {self.table} WHERE key IN "
+                        f"(SELECT key FROM {self.table} ORDER BY accessed ASC LIMIT ?)",
+                        (overflow,),
+                    )
+                    self._stats["evictions"] += overflow
+                self._db.commit()
+
+    def _remember(self, key: str, value, created: float) -> None:
+        # Caller holds the lock
+        self._memory[key] = (value, created)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    def record_bypass(self) -> None:
+        with self._lock:
+            self._stats["bypassed"] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute(f"DELETE FROM {self.table}")
+                self._db.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["memory_entries"] = len(self._memory)
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = round((stats["memory_hits"] + stats["disk_hits"]) / lookups, 4) if lookups else 0.0
+        return stats
+
+
+# Process-wide cache shared by all runners (memory tier only until configured)
+llm_cache = LLMCache()
+
+
+def configure_llm_cache(memory_size: int = 1024, disk_path: str = None, ttl: float = 3600, disk_max_entries: int = 10000) -> LLMCache:
+    """
+    Replaces the process-wide cache, e.g. to enable the SQLite tier at startup.
+    """
+    global llm_cache
+    llm_cache = LLMCache(memory_size=memory_size, disk_path=disk_path, ttl=ttl, disk_max_entries=disk_max_entries)
+    return llm_cache
+
+
+def get_llm_cache() -> LLMCache:
+    return llm_cache
@@ -0,0 +1,204 @@
+# core/local_classifier.py
+
+import threading
+from collections import namedtuple
+
+# Result of a local rule-based classification; `fields` holds values for the templated reply
+LocalClassification = namedtuple("LocalClassification", ["label", "confidence", "fields", "reasons"])
+
+DEFAULT_CONFIDENCE_THRESHOLD = 0.8
+
+# Walking / running cadence boundaries (steps per minute)
+WALKING_CADENCE_SPM = 60
+RUNNING_CADENCE_SPM = 140
+
+# Stress thresholds: (medium from, high from)
+STRESS_HR_BPM = (80, 100)
+STRESS_EDA_US = (2.0, 6.0)
+
+# Sleep thresholds
+SLEEP_AWAKE_HR_BPM = 80
+SLEEP_DEEP_HR_BPM = 60
+SLEEP_DEEP_HRV_MS = 50
+SLEEP_REM_HRV_MS = 30
+SLEEP_MOVEMENT_ENMO_G = 0.05
+
+
+def _number(value):
+    """
+    Returns `value` as a float, or None if it is missing / not numeric.
+    """
+    if isinstance(value, bool):
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _margin(value, boundaries, scale):
+    """
+    0..1 closeness penalty: 1 when `value` is at least `scale` away from every boundary.
+    """
+    distance = min(abs(value - b) for b in boundaries)
+    return min(1.0, 0.5 + 0.5 * distance / scale)
+
+
+def _level(value, thresholds):
+    medium_from, high_from = thresholds
+    if value >= high_from:
+        return "High"
+    if value >= medium_from:
+        return "Medium"
+    return "Low"
+
+
+def classify_activity(features: dict):
+    """
+    Sedentary / Walking / Running from cadence and time per intensity bucket.
+    `features` comes from core.activity_features.extract_activity_features.
+    """
+    if not features:
+        return None
+
+    cadence = features["cadence_spm"]
+    minutes = features["intensity_minutes"]
+    total = sum(minutes.values()) or 1.0
+
+    if cadence >= RUNNING_CADENCE_SPM or minutes["vigorous"] / total >= 0.5:
+        label = "Running"
+        share = (minutes["vigorous"] + minutes["moderate"]) / total
+    elif cadence >= WALKING_CADENCE_SPM:
+        label = "Walking"
+        share = (minutes["light"] + minutes["moderate"]) / total
+    else:
+        label = "Sedentary"
+        share = (minutes["sedentary"] + minutes["light"]) / total
+
+    confidence = share * _margin(cadence, (WALKING_CADENCE_SPM, RUNNING_CADENCE_SPM), 20)
+    reasons = [
+        f"cadence {cadence} steps/min",
+        f"mostly {features['dominant_intensity']} intensity",
+    ]
+    fields = {
+        "activity_type": label,
+        "step_count": features["step_count"],
+        "kcal": features["estimated_kcal"],
+    }
+    return LocalClassification(label, round(confidence, 3), fields, reasons)
+
+
+def classify_stress(data: dict, features: dict = None):
+    """
+    Low / Medium / High stress from heart rate and EDA (both required), discounting
+    readings taken during vigorous movement where HR is explained by exercise.
+    """
+    hr = _number(data.get("heart_rate"))
+    eda = _number(data.get("eda"))
+    if hr is None or eda is None:
+        return None
+
+    hr_level = _level(hr, STRESS_HR_BPM)
+    eda_level = _level(eda, STRESS_EDA_US)
+    reasons = [f"heart rate {hr:g} bpm ({hr_level.lower()})", f"EDA {eda:g} µS ({eda_level.lower()})"]
+
+    if hr_level == eda_level:
+        label = hr_level
+        confidence = 0.95 * min(_margin(hr, STRESS_HR_BPM, 10), _margin(eda, STRESS_EDA_US, 1.0))
+    else:
+        # Signals disagree: take the higher level but let the LLM weigh it in
+        order = ["Low", "Medium", "High"]
+        label = max(hr_level, eda_level, key=order.index)
+        confidence = 0.5
+
+    if features and features["dominant_intensity"] in ("moderate", "vigorous") and label != "Low":
+        reasons.append("elevated readings coincide with physical activity")
+        confidence = min(confidence, 0.4)
+
+    fields = {"stress_level": label, "heart_rate": hr, "eda": eda}
+    return LocalClassification(label, round(confidence, 3), fields, reasons)
+
+
+def classify_sleep(data: dict, features: dict = None):
+    """
+    Awake / Deep / Light / REM from heart rate, HRV and movement (HR and HRV required).
+    REM and Light are hard to separate from these signals, so they score low confidence.
+    """
+    hr = _number(data.get("heart_rate"))
+    hrv = _number(data.get("hrv"))
+    if hr is None or hrv is None:
+        return None
+
+    movement = features["enmo_mean_g"] if features else None
+    moving = movement is not None and movement >= SLEEP_MOVEMENT_ENMO_G
+    still = movement is not None and movement < SLEEP_MOVEMENT_ENMO_G / 2
+
+    reasons = [f"heart rate {hr:g} bpm", f"HRV {hrv:g} ms"]
+    if movement is not None:
+        reasons.append("frequent body movement" if moving else "little body movement")
+
+    if hr >= SLEEP_AWAKE_HR_BPM and moving:
+        label, quality, confidence = "Awake", "Poor", 0.9
+    elif hr >= SLEEP_AWAKE_HR_BPM or moving:
+        label, quality, confidence = "Awake", "Poor", 0.65
+    elif hr < SLEEP_DEEP_HR_BPM and hrv >= SLEEP_DEEP_HRV_MS:
+        label, quality = "Deep", "Good"
+        confidence = 0.9 if still else 0.7
+        confidence *= min(_margin(hr, (SLEEP_DEEP_HR_BPM,), 5), _margin(hrv, (SLEEP_DEEP_HRV_MS,), 10))
+    elif hrv < SLEEP_REM_HRV_MS:
+        label, quality, confidence = "REM", "Fair", 0.55
+    else:
+        label, quality, confidence = "Light", "Fair", 0.6
+
+    fields = {"sleep_stage": label, "sleep_quality": quality}
+    return LocalClassification(label, round(confidence, 3), fields, reasons)
+
+
+class LocalClassifierGate:
+    """
+    Decides whether a local classification is confident enough to skip the LLM,
+    and counts how many requests per agent were served locally vs. by the LLM.
+
+    Parameters:
+    - threshold: Minimum confidence (0..1) to answer locally
+    - thresholds: Optional per-agent overrides, e.g. {"sleep": 0.9}
+    - enabled: Set False to always use the LLM
+    """
+
+    def __init__(self, threshold: float = DEFAULT_CONFIDENCE_THRESHOLD, thresholds: dict = None, enabled: bool = True):
+        self.threshold = threshold
+        self.thresholds = dict(thresholds or {})
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._counts = {}
+
+    def accept(self, agent_name: str, result) -> bool:
+        threshold = self.thresholds.get(agent_name, self.threshold)
+        served_locally = self.enabled and result is not None and result.confidence >= threshold
+
+        with self._lock:
+            counts = self._counts.setdefault(agent_name, {"local": 0, "llm": 0})
+            counts["local" if served_locally else "llm"] += 1
+        return served_locally
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = {}
+            for agent_name, counts in self._counts.items():
+                total = counts["local"] + counts["llm"]
+                stats[agent_name] = dict(counts, local_fraction=round(counts["local"] / total, 4) if total else 0.0)
+            return stats
+
+
+# Process-wide gate shared by all runners
+local_gate = LocalClassifierGate()
+
+
+def configure_local_gate(threshold: float = DEFAULT_CONFIDENCE_THRESHOLD, thresholds: dict = None, enabled: bool = True) -> LocalClassifierGate:
+    global local_gate
+    local_gate = LocalClassifierGate(threshold=threshold, thresholds=thresholds, enabled=enabled)
+    return local_gate
+
+
+def get_local_gate() -> LocalClassifierGate:
+    return local_gate
@@ -0,0 +1,408 @@
+# core/model_router.py
+
+import hashlib
+import json
+import threading
+import time
+import weakref
+from collections import deque, namedtuple
+
+from core.agent_chat import a_ask_agent, ask_agent, reply_from_cache
+from core.agent_results import get_structured_outputs
+
+# Tier name meaning "the agent as configured in llm_config" (no profile applied)
+DEFAULT_TIER = "default"
+
+# Profile keys: completion parameters and where to send them
+PROFILE_KEYS = ("model", "max_tokens", "timeout", "temperature", "base_url", "api_key", "api_type")
+CONFIG_LIST_KEYS = ("model", "base_url", "api_key", "api_type")
+
+# Latency samples (non-cached calls) kept per agent and tier
+LATENCY_WINDOW = 200
+
+# Latency-aware routing only judges a tier once it has this many samples
+MIN_SAMPLES = 20
+
+# Agents whose replies are always prose, so routing them does not need structured outputs
+PROSE_AGENTS = ("anomaly_phrasing",)
+
+
+def _percentile(values: list, q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class _TierStats:
+    def __init__(self):
+        self.calls = 0
+        self.cached = 0
+        self.invalid = 0
+        self.errors = 0
+        self.samples = deque(maxlen=LATENCY_WINDOW)
+
+    def mean_ms(self) -> float:
+        return sum(ms for ms, _ in self.samples) / len(self.samples) if self.samples else 0.0
+
+    def invalid_rate(self) -> float:
+        return sum(not valid for _, valid in self.samples) / len(self.samples) if self.samples else 0.0
+
+    def to_dict(self) -> dict:
+        latencies = [ms for ms, _ in self.samples]
+        return {
+            "calls": self.calls,
+            "cached": self.cached,
+            "invalid": self.invalid,
+            "errors": self.errors,
+            "mean_ms": round(self.mean_ms(), 1),
+            "p50_ms": round(_percentile(latencies, 0.50), 1),
+            "p95_ms": round(_percentile(latencies, 0.95), 1),
+        }
+
+
+class ModelRouter:
+    """
+    Per-agent model tiers: each agent (stage name: activity, sleep, stress, anomaly,
+    nutrition, summary, anomaly_phrasing) is tried on the tiers of its chain in order,
+    moving to the next (bigger) tier only when a reply fails validation (invalid structured
+    JSON, an empty reply). Agents without a chain use llm_config unchanged (DEFAULT_TIER).
+
+    Prose replies can only be checked for being empty, so chains are rejected unless
+    `structured` outputs are on; PROSE_AGENTS (wording of findings made elsewhere) are
+    the exception.
+
+    Tier profiles override model, max_tokens, timeout and temperature (and optionally
+    base_url / api_key / api_type) of the agent's llm_config; the HTTP client, retries and
+    streaming settings are kept.
+
+    With `latency_aware`, a tier is skipped while trying it is expected to be slower than
+    going straight to the rest of the chain (its mean latency + its recent invalid rate ×
+    the rest's expected latency); every `probe_every`-th request still tries the full chain
+    so the estimate recovers.
+
+    Parameters:
+    - tiers: {tier: {"model", "max_tokens", "timeout", "temperature", ...}}
+    - agents: {agent name: [tier, ...]} (cheapest first; DEFAULT_TIER may appear)
+    - latency_aware: Skip tiers that do not pay off on latency
+    - probe_every: Full-chain request interval while a tier is being skipped
+    - structured: Whether structured outputs are enabled
+    """
+
+    def __init__(self, tiers: dict = None, agents: dict = None, latency_aware: bool = False, probe_every: int = 20,
+                 structured: bool = False):
+        self.tiers = {name: dict(profile) for name, profile in (tiers or {}).items()}
+        self.chains = {name: list(chain) for name, chain in (agents or {}).items() if chain}
+        self.latency_aware = latency_aware
+        self.probe_every = max(1, probe_every)
+
+        for name, profile in self.tiers.items():
+            unknown = set(profile) - set(PROFILE_KEYS)
+            if name == DEFAULT_TIER or unknown:
+                raise ValueError(f"Invalid model tier {name!r}" + (f": unknown keys {sorted(unknown)}" if unknown else ""))
+        for name, chain in self.chains.items():
+            missing = [tier for tier in chain if tier != DEFAULT_TIER and tier not in self.tiers]
+            if missing:
+                raise ValueError(f"Agent {name!r} uses undefined model tiers {missing}")
+        unchecked = sorted(name for name in self.chains if name not in PROSE_AGENTS)
+        if unchecked and not structured:
+            raise ValueError(f"Model tiers for {unchecked} need structured outputs (STRUCTURED_OUTPUTS=1)")
+
+        self._lock = threading.Lock()
+        self._variants = weakref.WeakKeyDictionary()
+        self._stats = {}
+        self._requests = {}
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.chains)
+
+    def chain(self, name: str) -> list:
+        return self.chains.get(name) or [DEFAULT_TIER]
+
+    def fingerprint(self, name: str):
+        """
+        Hash of an agent's tier chain and profiles (None when the agent is not routed), for
+        keys of results stored across requests.
+        """
+        if name not in self.chains:
+            return None
+        chain = [[tier, self.tiers.get(tier)] for tier in self.chains[name]]
+        return hashlib.sha256(json.dumps(chain, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def tier_config(self, llm_config: dict, tier: str) -> dict:
+        """
+        `llm_config` with the profile of `tier` applied.
+        """
+        if tier == DEFAULT_TIER:
+            return llm_config
+        profile = self.tiers[tier]
+        config = dict(llm_config)
+        config["config_list"] = [
+            dict(entry, **{k: v for k, v in profile.items() if k in CONFIG_LIST_KEYS})
+            for entry in llm_config.get("config_list") or [{}]
+        ]
+        config.update({k: v for k, v in profile.items() if k not in CONFIG_LIST_KEYS})
+        return config
+
+    def agent_for(self, agent, tier: str):
+        """
+        `agent` on `tier`: an AssistantAgent with the same name and system message, built
+        once per agent (agent sets are checked out per request, so their variants are too).
+        """
+        if tier == DEFAULT_TIER:
+            return agent
+        with self._lock:
+            variant = self._variants.setdefault(agent, {}).get(tier)
+        if variant is None:
+            from autogen import AssistantAgent
+
+            variant = AssistantAgent(name=agent.name, system_message=agent.system_message,
+                                     llm_config=self.tier_config(agent.llm_config, tier))
+            with self._lock:
+                variant = self._variants[agent].setdefault(tier, variant)
+        return variant
+
+    def _tier_stats(self, name: str, tier: str) -> _TierStats:
+        # Caller holds the lock
+        return self._stats.setdefault(name, {}).setdefault(tier, _TierStats())
+
+    def plan(self, name: str) -> list:
+        """
+        Tiers to try for one request of agent `name`, in order.
+        """
+        chain = self.chain(name)
+        with self._lock:
+            counts = self._requests.setdefault(name, {"requests": 0, "fallbacks": 0, "skipped": 0})
+            counts["requests"] += 1
+            if not self.latency_aware or len(chain) == 1 or counts["requests"] % self.probe_every == 0:
+                return chain
+
+            # Expected latency from the end of the chain; unknown until a tier has samples
+            plan, expected = [chain[-1]], None
+            last = self._tier_stats(name, chain[-1])
+            if len(last.samples) >= MIN_SAMPLES:
+                expected = last.mean_ms()
+            for tier in reversed(chain[:-1]):
+                stats = self._tier_stats(name, tier)
+                if expected is None or len(stats.samples) < MIN_SAMPLES:
+                    plan.insert(0, tier)
+                    expected = None
+                    continue
+                via_tier = stats.mean_ms() + stats.invalid_rate() * expected
+                if via_tier <= expected:
+                    plan.insert(0, tier)
+                    expected = via_tier
+            if len(plan) < len(chain):
+                counts["skipped"] += 1
+            return plan
+
+    def record(self, name: str, tier: str, elapsed: float, outcome: str, fallback: bool = False) -> None:
+        """
+        Records one tier attempt: outcome "valid", "invalid", "cached" (answered from the
+        LLM cache, no latency sample) or "error".
+        """
+        with self._lock:
+            stats = self._tier_stats(name, tier)
+            stats.calls += 1
+            if outcome == "cached":
+                stats.cached += 1
+            elif outcome == "error":
+                stats.errors += 1
+            else:
+                stats.invalid += outcome == "invalid"
+                stats.samples.append((elapsed * 1000, outcome == "valid"))
+            if fallback:
+                self._requests.setdefault(name, {"requests": 0, "fallbacks": 0, "skipped": 0})["fallbacks"] += 1
+
+    def run(self, name: str, agent, ask, parse=None, result_type=None, default: str = None):
+        """
+        Runs one request of agent `name` through its tiers.
+
+        Parameters:
+        - agent: The agent as built by setup_agents (DEFAULT_TIER)
+        - ask: callable(tier agent, tier) -> reply content
+        - parse: Optional callable(content) -> result (default: the content)
+        - result_type: Replies are valid when parsed into this class; None: prose, valid
+          unless empty or `default`
+
+        Returns:
+        - The first valid result, else the last tier's result
+        """
+        plan = self.plan(name)
+        for i, tier in enumerate(plan):
+            start = time.perf_counter()
+            reply_from_cache.set(False)
+            try:
+                content = ask(self.agent_for(agent, tier), tier)
+            except Exception:
+                self.record(name, tier, time.perf_counter() - start, "error")
+                raise
+            result, valid = self._judge(name, tier, start, content, parse, result_type, default, i == len(plan) - 1)
+            if valid:
+                break
+        return result
+
+    async def a_run(self, name: str, agent, ask, parse=None, result_type=None, default: str = None):
+        """
+        Async version of run(): `ask` returns an awaitable.
+        """
+        plan = self.plan(name)
+        for i, tier in enumerate(plan):
+            start = time.perf_counter()
+            reply_from_cache.set(False)
+            try:
+                content = await ask(self.agent_for(agent, tier), tier)
+            except Exception:
+                self.record(name, tier, time.perf_counter() - start, "error")
+                raise
+            result, valid = self._judge(name, tier, start, content, parse, result_type, default, i == len(plan) - 1)
+            if valid:
+                break
+        return result
+
+    def _judge(self, name: str, tier: str, start: float, content, parse, result_type, default: str, last: bool):
+        """
+        Parses and validates one tier's reply and records the attempt (run / a_run).
+
+        Returns:
+        - (result, valid)
+        """
+        result = parse(content) if parse is not None else content
+        valid = _is_valid(result, result_type, default)
+        outcome = "cached" if reply_from_cache.get() else "valid" if valid else "invalid"
+        self.record(name, tier, time.perf_counter() - start, outcome, fallback=not valid and not last)
+        return result, valid
+
+    def tier_stats(self) -> dict:
+        """
+        {"<agent>/<tier>": per-tier counts and latency}, for the /metrics collector.
+        """
+        with self._lock:
+            return {f"{name}/{tier}": stats.to_dict() for name, tiers in self._stats.items() for tier, stats in tiers.items()}
+
+    def stats(self) -> dict:
+        with self._lock:
+            agents = {}
+            for name in sorted(set(self._requests) | set(self._stats)):
+                counts = dict(self._requests.get(name, {"requests": 0, "fallbacks": 0, "skipped": 0}))
+                counts["fallback_rate"] = round(counts["fallbacks"] / counts["requests"], 4) if counts["requests"] else 0.0
+                counts["chain"] = self.chain(name)
+                counts["tiers"] = {tier: stats.to_dict() for tier, stats in self._stats.get(name, {}).items()}
+                agents[name] = counts
+        return {
+            "enabled": self.enabled,
+            "latency_aware": self.latency_aware,
+            "tiers": {name: {k: v for k, v in profile.items() if k != "api_key"} for name, profile in self.tiers.items()},
+            "agents": agents,
+        }
+
+
+def _is_valid(result, result_type, default: str) -> bool:
+    if result_type is not None:
+        return isinstance(result, result_type)
+    return bool(result and str(result).strip()) and result != default
+
+
+def _tier_approx_key(approx_key: tuple, tier: str):
+    # Tiers answer differently, so near-duplicate replies are cached per tier
+    if approx_key is None or approx_key[1] is None or tier == DEFAULT_TIER:
+        return approx_key
+    return approx_key[0], f"{approx_key[1]}:{tier}"
+
+
+def _structured_parse(name: str, result_type):
+    if result_type is None:
+        return None
+    structured = get_structured_outputs()
+    return lambda content: structured.parse(name, result_type, content)
+
+
+def ask_routed(name: str, user_proxy, agent, prompt: str, result_type=None, parse=None, default: str = "No response.",
+               use_cache: bool = True, approx_key: tuple = None):
+    """
+    ask_agent through the model tiers of agent `name` (see ModelRouter.run).
+
+    Parameters:
+    - name: Agent / stage name the tier chain is looked up by
+    - result_type: Expected result class; replies are parsed into it by StructuredOutputs
+      (or `parse`) and are valid when they did. None: prose, valid unless empty / `default`
+    - parse: Optional callable(content) -> result replacing the StructuredOutputs parse
+    - default, use_cache, approx_key: As for ask_agent
+    """
+    return get_model_router().run(
+        name, agent,
+        lambda tier_agent, tier: ask_agent(user_proxy, tier_agent, prompt, default=default, use_cache=use_cache,
+                                     approx_key=_tier_approx_key(approx_key, tier)),
+        parse=parse or _structured_parse(name, result_type), result_type=result_type, default=default
+    )
+
+
+async def a_ask_routed(name: str, user_proxy, agent, prompt: str, result_type=None, parse=None,
+                       default: str = "No response.", use_cache: bool = True, approx_key: tuple = None):
+    """
+    Async version of ask_routed (non-blocking LLM calls through a_ask_agent).
+    """
+    return await get_model_router().a_run(
+        name, agent,
+        lambda tier_agent, tier: a_ask_agent(user_proxy, tier_agent, prompt, default=default, use_cache=use_cache,
+                                       approx_key=_tier_approx_key(approx_key, tier)),
+        parse=parse or _structured_parse(name, result_type), result_type=result_type, default=default
+    )
+
+
+# One LLM request prepared by an agent runner (local shortcuts tried, prompt built), run
+# the same way by run_request and a_run_request. `finish`, when set, turns the routed
+# result into the runner's return value.
+AgentRequest = namedtuple("AgentRequest", ["name", "prompt", "result_type", "parse", "default", "approx_key", "finish"],
+                          defaults=(None, None, "No response.", None, None))
+
+
+def run_request(request, user_proxy, agent, use_cache: bool = True):
+    """
+    Runs a prepared AgentRequest through ask_routed. Anything else (a runner's local
+    reply) is returned as is.
+    """
+    if not isinstance(request, AgentRequest):
+        return request
+    result = ask_routed(request.name, user_proxy, agent, request.prompt, request.result_type, parse=request.parse,
+                        default=request.default, use_cache=use_cache, approx_key=request.approx_key)
+    return request.finish(result) if request.finish is not None else result
+
+
+def request_result(request, content: str):
+    """
+    Result of a prepared AgentRequest for a reply obtained outside run_request (e.g. one
+    GroupChat turn): parsed as ask_routed parses it, then finished.
+    """
+    parse = request.parse or _structured_parse(request.name, request.result_type)
+    result = parse(content) if parse is not None else content
+    return request.finish(result) if request.finish is not None else result
+
+
+async def a_run_request(request, user_proxy, agent, use_cache: bool = True):
+    """
+    Async version of run_request (a_ask_routed).
+    """
+    if not isinstance(request, AgentRequest):
+        return request
+    result = await a_ask_routed(request.name, user_proxy, agent, request.prompt, request.result_type,
+                                parse=request.parse, default=request.default, use_cache=use_cache,
+                                approx_key=request.approx_key)
+    return request.finish(result) if request.finish is not None else result
+
+
+# Process-wide router (no tiers: every agent uses llm_config as is)
+model_router = ModelRouter()
+
+
+def configure_model_router(tiers: dict = None, agents: dict = None, latency_aware: bool = False,
+                           probe_every: int = 20, structured: bool = False) -> ModelRouter:
+    global model_router
+    model_router = ModelRouter(tiers=tiers, agents=agents, latency_aware=latency_aware, probe_every=probe_every,
+                               structured=structured)
+    return model_router
+
+
+def get_model_router() -> ModelRouter:
+    return model_router
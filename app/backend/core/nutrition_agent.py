@@ -1,10 +1,19 @@
 # core/nutrition_agent.py
 
-def build_nutrition_prompt(activity_result: str, sleep_result: str, stress_result: str) -> str:
+from core.agent_results import MealSelection, NutritionResult, get_structured_outputs, json_instruction, prompt_text
+from core.food_db import get_food_database
+from core.model_router import AgentRequest, a_run_request, run_request
+
+
+def build_nutrition_prompt(activity_result, sleep_result, stress_result, structured: bool = False) -> str:
     """
     Builds a strong prompt for NutritionAgent to generate structured personalized meal suggestions
-    based on prior agent outputs.
+    based on prior agent outputs (prose or typed results, pasted as their compact fields).
+    With `structured`, the reply is requested as a NutritionResult JSON object.
     """
+    activity_result = prompt_text(activity_result)
+    sleep_result = prompt_text(sleep_result)
+    stress_result = prompt_text(stress_result)
 
     prompt = f"""
 You are a certified nutritionist.
@@ -19,7 +28,16 @@ Based on the user's recent physiological condition, please design a personalized
 
 😟 Stress Summary:
 {stress_result}
+"""
+    if structured:
+        return (prompt + f"""
+Choose ONE meal time and give TWO to THREE meal options of 2–4 foods each, with estimated kcal
+per food, tailored to the user's activity, sleep and stress. Add one simple dietary advice for tomorrow.
+
+{json_instruction(NutritionResult)}
+""").strip()
 
+    prompt += """
 Tasks:
 1. Choose ONE meal time (Breakfast / Lunch / Dinner) to recommend meals for.
 2. Provide **TWO to THREE complete meal options**:
@@ -63,17 +81,83 @@ Important:
     return prompt.strip()
 
 
-def run_nutrition_agent(activity_result: str, sleep_result: str, stress_result: str, user_proxy, agent) -> str:
+def build_meal_selection_prompt(activity_result, sleep_result, stress_result, catalog: str) -> str:
+    """
+    NutritionAgent prompt when the local food table is used: the LLM only chooses foods
+    from `catalog` and their servings; kcal and macros are filled in from the table.
+    """
+    return f"""
+You are a certified nutritionist.
+
+Based on the user's recent physiological condition, please choose a personalized meal plan for today:
+
+🏃 Activity Summary:
+{prompt_text(activity_result)}
+
+😴 Sleep Summary:
+{prompt_text(sleep_result)}
+
+😟 Stress Summary:
+{prompt_text(stress_result)}
+
+Available foods (use these names exactly):
+{catalog}
+
+Choose ONE meal time and TWO to THREE meal options of 2–4 foods each from the list above,
+tailored to the user's activity, sleep and stress. "servings" is a multiple of one standard
+serving (e.g. 1 or 1.5). Do NOT give calories or nutrients; they are computed for you.
+Add one simple, friendly dietary advice for tomorrow.
+
+{json_instruction(MealSelection)}
+""".strip()
+
+
+def complete_meal_plan(content: str, food_db=None):
+    """
+    NutritionResult priced from the food table for a MealSelection reply, or the prose
+    reply itself when it does not validate.
+    """
+    food_db = food_db or get_food_database()
+    selection = get_structured_outputs().parse("nutrition", MealSelection, content)
+    return food_db.meal_plan(selection) if isinstance(selection, MealSelection) else selection
+
+
+def prepare_nutrition_request(activity_result, sleep_result, stress_result) -> AgentRequest:
+    """
+    AgentRequest shared by run_nutrition_agent and a_run_nutrition_agent. With the food
+    table enabled the reply is a MealSelection priced by complete_meal_plan, rendered
+    to prose unless structured outputs are on.
+    """
+    structured = get_structured_outputs()
+    food_db = get_food_database()
+    if food_db.enabled:
+        prompt = build_meal_selection_prompt(activity_result, sleep_result, stress_result, food_db.catalog())
+        return AgentRequest(
+            "nutrition", prompt, NutritionResult,
+            parse=lambda content: complete_meal_plan(content, food_db),
+            default="No nutrition suggestion returned.",
+            finish=lambda result: result if structured.enabled or not isinstance(result, NutritionResult) else result.render()
+        )
+
+    prompt = build_nutrition_prompt(activity_result, sleep_result, stress_result, structured=structured.enabled)
+    return AgentRequest("nutrition", prompt, NutritionResult if structured.enabled else None,
+                        default="No nutrition suggestion returned.")
+
+
+def run_nutrition_agent(activity_result, sleep_result, stress_result, user_proxy, agent, use_cache: bool = True):
     """
     Executes the NutritionAgent GPT prompt based on the user's recent physiological data.
+    With the local food table enabled, the LLM only picks foods and servings and the
+    calories / macros come from the table.
+    Returns prose, or a NutritionResult in structured-output mode.
     """
-    prompt = build_nutrition_prompt(activity_result, sleep_result, stress_result)
+    request = prepare_nutrition_request(activity_result, sleep_result, stress_result)
+    return run_request(request, user_proxy, agent, use_cache)
 
-    user_proxy.initiate_chat(
-        agent,
-        message=prompt,
-        max_turns=1,
-        clear_history=True
-    )
 
-    return user_proxy.last_message(agent).get("content", "No nutrition suggestion returned.")
+async def a_run_nutrition_agent(activity_result, sleep_result, stress_result, user_proxy, agent, use_cache: bool = True):
+    """
+    Async version of run_nutrition_agent (non-blocking LLM call).
+    """
+    request = prepare_nutrition_request(activity_result, sleep_result, stress_result)
+    return await a_run_request(request, user_proxy, agent, use_cache)
@@ -1,6 +1,22 @@
 # core/sleep_agent.py
 
-def build_sleep_prompt(data: dict) -> str:
+import asyncio
+
+from core.activity_features import extract_activity_features, format_movement_features
+from core.agent_results import SleepResult, get_structured_outputs, json_instruction
+from core.approx_cache import get_approx_cache
+from core.local_classifier import classify_sleep, get_local_gate
+from core.model_router import AgentRequest, a_run_request, run_request
+
+SLEEP_SUGGESTIONS = {
+    "Awake": "Try keeping the bedroom dark and cool, and avoid screens for 30 minutes before bed.",
+    "Light": "A consistent bedtime routine can help you settle into deeper sleep.",
+    "Deep": "Great restorative sleep — keep the same bedtime to make it a habit.",
+    "REM": "Keep a regular sleep schedule so you get full, uninterrupted sleep cycles.",
+}
+
+
+def build_sleep_prompt(data: dict, features: dict = None, structured: bool = False) -> str:
     """
     Builds a user-friendly prompt for the SleepAgent to analyze wearable sensor data.
 
@@ -8,23 +24,23 @@ def build_sleep_prompt(data: dict) -> str:
     - heart_rate (HR)
     - hrv (Heart Rate Variability)
     - skin_temperature (TEMP)
-    - acceleration_samples (list of 3-axis lists)
+    - acceleration / acceleration_samples (3-axis samples, list or NumPy array)
     - gsr (Galvanic Skin Response)
     - time_of_night (time)
+
+    With `structured`, the reply is requested as a SleepResult JSON object.
     """
     # 解析輸入
     hr = data.get("heart_rate", "unknown")
     hrv = data.get("hrv", "unknown")
     temp = data.get("skin_temperature", "unknown")
-    acc_samples = data.get("acceleration", []) or data.get("acceleration_samples", [])
     gsr = data.get("gsr", "unknown")
     time_of_night = data.get("time_of_night", "unknown")
 
-    # 把加速度 sample 整理成文字
-    if isinstance(acc_samples, list) and len(acc_samples) > 0:
-        acc_text = "\n".join([f"  - Sample {i+1}: {sample}" for i, sample in enumerate(acc_samples[:10])])
-    else:
-        acc_text = "No acceleration data available."
+    # 把整段加速度資料整理成動作統計
+    if features is None:
+        features = extract_activity_features(data)
+    acc_text = format_movement_features(features)
 
     # 組合 prompt
     prompt = f"""
@@ -35,11 +51,20 @@ You are a sleep analysis expert. The following physiological data was recorded d
 - Skin Temperature: {temp} °C
 - Galvanic Skin Response (GSR): {gsr} µS
 - Time of Night: {time_of_night}
-- Acceleration Samples (showing up to 10):
+- Movement Statistics (computed from the full 3-axis acceleration recording, in g-force units):
 {acc_text}
 
-Each acceleration sample is a 3-axis [X, Y, Z] reading collected during sleep to detect body movements.
+The movement statistics summarize 3-axis [X, Y, Z] acceleration collected during sleep to detect body movements.
+"""
+    if structured:
+        return (prompt + f"""
+Give the estimated sleep stage, the sleep quality, 2–3 short reasons based on the physiological
+data and one friendly suggestion to improve future sleep.
 
+{json_instruction(SleepResult)}
+""").strip()
+
+    prompt += """
 Please provide:
 1. Estimated sleep stage (Awake, Light, Deep, REM)
 2. Sleep quality (Good, Fair, Poor)
@@ -51,7 +76,49 @@ Keep it concise and supportive, like a helpful wellness coach.
     return prompt.strip()
 
 
-def run_sleep_agent(user_input: dict, user_proxy, agent) -> str:
+def render_sleep_result(result) -> str:
+    """
+    Templated SleepAgent reply for a confident local classification.
+    """
+    stage = result.fields["sleep_stage"]
+    reasons = "\n".join(f"   - {reason[0].upper()}{reason[1:]}" for reason in result.reasons)
+    return "\n".join([
+        f"1. **Estimated Sleep Stage**: {stage}",
+        f"2. **Sleep Quality**: {result.fields['sleep_quality']}",
+        f"3. **Reasoning**:\n{reasons}",
+        f"4. **Suggestion**: {SLEEP_SUGGESTIONS[stage]}",
+    ])
+
+
+def local_sleep_reply(local_result, structured: bool = False):
+    """
+    Reply for a confident local classification: templated text, or a SleepResult in
+    structured-output mode.
+    """
+    if structured:
+        stage = local_result.fields["sleep_stage"]
+        return SleepResult(sleep_stage=stage, sleep_quality=local_result.fields["sleep_quality"],
+                           reasons=local_result.reasons, suggestion=SLEEP_SUGGESTIONS[stage])
+    return render_sleep_result(local_result)
+
+
+def prepare_sleep_request(user_input: dict, agent):
+    """
+    Shared first step of run_sleep_agent / a_run_sleep_agent: the local reply when the
+    classifier is confident enough, else the AgentRequest for the LLM.
+    """
+    structured = get_structured_outputs()
+    features = extract_activity_features(user_input)
+    local_result = classify_sleep(user_input, features)
+    if get_local_gate().accept("sleep", local_result):
+        return local_sleep_reply(local_result, structured.enabled)
+
+    prompt = build_sleep_prompt(user_input, features, structured=structured.enabled)
+    return AgentRequest("sleep", prompt, SleepResult if structured.enabled else None,
+                        approx_key=("sleep", get_approx_cache().key("sleep", agent, user_input, features)))
+
+
+def run_sleep_agent(user_input: dict, user_proxy, agent, use_cache: bool = True) -> str:
     """
     Executes the sleep analysis by prompting the GPT-based AssistantAgent via UserProxyAgent.
 
@@ -59,17 +126,21 @@ def run_sleep_agent(user_input: dict, user_proxy, agent) -> str:
     - user_input: Dictionary containing sleep-related sensor data
     - user_proxy: AutoGen's UserProxyAgent
     - agent: AutoGen's AssistantAgent (SleepAgent)
+    - use_cache: Set False to bypass the LLM response cache
 
     Returns:
-    - A string response containing GPT's structured analysis
+    - A string response containing GPT's structured analysis, or a templated
+      reply when the local classifier is confident enough to skip the LLM. In
+      structured-output mode a SleepResult (prose only if the reply does not validate).
     """
-    prompt = build_sleep_prompt(user_input)
+    return run_request(prepare_sleep_request(user_input, agent), user_proxy, agent, use_cache)
 
-    user_proxy.initiate_chat(
-        agent,
-        message=prompt,
-        max_turns=1,
-        clear_history=True
-    )
 
-    return user_proxy.last_message(agent).get("content", "No response.")
+async def a_run_sleep_agent(user_input: dict, user_proxy, agent, use_cache: bool = True):
+    """
+    Async version of run_sleep_agent for the async serving path: feature extraction and
+    the local classifier run in a worker thread, then a non-blocking LLM call
+    (`user_proxy` / `agent` are only read).
+    """
+    request = await asyncio.to_thread(prepare_sleep_request, user_input, agent)
+    return await a_run_request(request, user_proxy, agent, use_cache)
@@ -1,6 +1,21 @@
 # core/stress_agent.py
 
-def build_stress_prompt(data: dict) -> str:
+import asyncio
+
+from core.activity_features import extract_activity_features, format_movement_features
+from core.agent_results import StressResult, get_structured_outputs, json_instruction
+from core.approx_cache import get_approx_cache
+from core.local_classifier import classify_stress, get_local_gate
+from core.model_router import AgentRequest, a_run_request, run_request
+
+STRESS_SUGGESTIONS = {
+    "Low": "You're doing well — keep up the habits that help you stay calm, like regular breaks.",
+    "Medium": "Try a few minutes of slow, deep breathing or a short walk to reset.",
+    "High": "Pause for a moment: breathe slowly for 2–3 minutes and step away from what's stressing you if you can.",
+}
+
+
+def build_stress_prompt(data: dict, features: dict = None, structured: bool = False) -> str:
     """
     Generate a prompt to analyze stress level using HR, TEMP, EDA, and movement data.
     
@@ -8,18 +23,18 @@ def build_stress_prompt(data: dict) -> str:
     - heart_rate
     - skin_temperature
     - eda (Electrodermal Activity)
-    - acceleration_samples (list of 3-axis)
+    - acceleration / acceleration_samples (3-axis samples, list or NumPy array)
+
+    With `structured`, the reply is requested as a StressResult JSON object.
     """
     hr = data.get("heart_rate", "unknown")
     temp = data.get("skin_temperature", "unknown")
     eda = data.get("eda", "unknown")
-    acc_samples = data.get("acceleration", []) or data.get("acceleration_samples", [])
 
-    # Format acceleration samples
-    if isinstance(acc_samples, list) and len(acc_samples) > 0:
-        acc_text = "\n".join([f"  - Sample {i+1}: {sample}" for i, sample in enumerate(acc_samples[:10])])
-    else:
-        acc_text = "No acceleration data available."
+    # Summarize movement over the whole acceleration recording
+    if features is None:
+        features = extract_activity_features(data)
+    acc_text = format_movement_features(features)
 
     prompt = f"""
 You are a stress monitoring assistant. Based on the following wearable sensor readings, assess the user's current stress level:
@@ -27,11 +42,20 @@ You are a stress monitoring assistant. Based on the following wearable sensor re
 - Heart Rate: {hr} bpm
 - Skin Temperature: {temp} °C
 - Electrodermal Activity (EDA): {eda} µS
-- Acceleration Samples (showing up to 10):
+- Movement Statistics (computed from the full 3-axis acceleration recording, in g-force units):
 {acc_text}
 
-Each acceleration sample is a 3-axis [X, Y, Z] vector recorded during the day to monitor movement and restlessness.
+The movement statistics summarize 3-axis [X, Y, Z] acceleration recorded during the day to monitor movement and restlessness.
+"""
+    if structured:
+        return (prompt + f"""
+Give the estimated stress level, 2–3 short reasons based on the physiological signals and one
+friendly, practical suggestion to reduce stress.
 
+{json_instruction(StressResult)}
+""").strip()
+
+    prompt += """
 Please provide:
 1. Estimated stress level (Low, Medium, High)
 2. A short reasoning based on the physiological signals
@@ -42,7 +66,46 @@ Be empathetic, concise, and supportive in your tone.
     return prompt.strip()
 
 
-def run_stress_agent(user_input: dict, user_proxy, agent) -> str:
+def render_stress_result(result) -> str:
+    """
+    Templated StressAgent reply for a confident local classification.
+    """
+    level = result.fields["stress_level"]
+    return "\n".join([
+        f"1. **Estimated Stress Level**: {level}",
+        f"2. **Reasoning**: Based on your {', '.join(result.reasons)}.",
+        f"3. **Suggestion**: {STRESS_SUGGESTIONS[level]}",
+    ])
+
+
+def local_stress_reply(local_result, structured: bool = False):
+    """
+    Reply for a confident local classification: templated text, or a StressResult in
+    structured-output mode.
+    """
+    if structured:
+        level = local_result.fields["stress_level"]
+        return StressResult(stress_level=level, reasons=local_result.reasons, suggestion=STRESS_SUGGESTIONS[level])
+    return render_stress_result(local_result)
+
+
+def prepare_stress_request(user_input: dict, agent):
+    """
+    Shared first step of run_stress_agent / a_run_stress_agent: the local reply when the
+    classifier is confident enough, else the AgentRequest for the LLM.
+    """
+    structured = get_structured_outputs()
+    features = extract_activity_features(user_input)
+    local_result = classify_stress(user_input, features)
+    if get_local_gate().accept("stress", local_result):
+        return local_stress_reply(local_result, structured.enabled)
+
+    prompt = build_stress_prompt(user_input, features, structured=structured.enabled)
+    return AgentRequest("stress", prompt, StressResult if structured.enabled else None,
+                        approx_key=("stress", get_approx_cache().key("stress", agent, user_input, features)))
+
+
+def run_stress_agent(user_input: dict, user_proxy, agent, use_cache: bool = True) -> str:
     """
     Use GPT to analyze stress level from provided physiological input.
 
@@ -50,17 +113,21 @@ def run_stress_agent(user_input: dict, user_proxy, agent) -> str:
     - user_input: Dictionary with stress-related data
     - user_proxy: AutoGen's UserProxyAgent
     - agent: AutoGen's AssistantAgent (StressAgent)
+    - use_cache: Set False to bypass the LLM response cache
 
     Returns:
-    - GPT-generated string with stress analysis
+    - GPT-generated string with stress analysis, or a templated reply when the
+      local classifier is confident enough to skip the LLM. In structured-output
+      mode a StressResult (prose only if the reply does not validate).
     """
-    prompt = build_stress_prompt(user_input)
+    return run_request(prepare_stress_request(user_input, agent), user_proxy, agent, use_cache)
 
-    user_proxy.initiate_chat(
-        agent,
-        message=prompt,
-        max_turns=1,
-        clear_history=True
-    )
 
-    return user_proxy.last_message(agent).get("content", "No response.")
+async def a_run_stress_agent(user_input: dict, user_proxy, agent, use_cache: bool = True):
+    """
+    Async version of run_stress_agent for the async serving path: feature extraction and
+    the local classifier run in a worker thread, then a non-blocking LLM call
+    (`user_proxy` / `agent` are only read).
+    """
+    request = await asyncio.to_thread(prepare_stress_request, user_input, agent)
+    return await a_run_request(request, user_proxy, agent, use_cache)
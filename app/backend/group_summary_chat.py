@@ -1,57 +1,253 @@
 # backend/group_summary_chat.py
 
-from autogen import GroupChat, GroupChatManager
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager, nullcontext
+
 from backend.agents import setup_agents
+from backend.stage_store import content_hash, get_stage_store
+from core.agent_chat import agent_context, current_delta_handler, off_loop
+from core.abnormaly_agent import prepare_anomaly_request
+from core.agent_results import (
+    MealSelection, SummaryResult, dump_result, get_structured_outputs, json_instruction, load_result, prompt_text,
+    render_result, result_fields
+)
+from core.anomaly_engine import get_anomaly_engine
+from core.food_db import get_food_database
+from core.llm_cache import agent_cache_key
+from core.model_router import AgentRequest, a_run_request, get_model_router, request_result, run_request
+from core.nutrition_agent import prepare_nutrition_request
+
+# "pipeline": anomaly → nutrition → summary called directly, one turn each (default)
+# "groupchat": anomaly + nutrition via AutoGen GroupChat with auto speaker selection
+EXECUTION_MODES = ("pipeline", "groupchat")
+DEFAULT_MODE = "pipeline"
+
+# Hard cap on GroupChat rounds: opening message, anomaly, nutrition, one spare turn
+GROUP_CHAT_MAX_ROUND = 4
+
+# (branch, runner key, proxy key, llm key) — each branch owns its proxy and assistant
+ANALYSIS_BRANCHES = [
+    ("activity", "activity_agent", "activity_proxy", "activity_llm"),
+    ("sleep", "sleep_agent", "sleep_proxy", "sleep_llm"),
+    ("stress", "stress_agent", "stress_proxy", "stress_llm"),
+]
+
+# Stage DAG: stage → (upstream stages, llm key). Analysis branches read their sensor
+# payload; every later stage reads the three branch results. A stage's result is keyed
+# by the hash of its inputs, so only stages downstream of a changed input re-run.
+STAGE_DAG = {
+    "activity": ((), "activity_llm"),
+    "sleep": ((), "sleep_llm"),
+    "stress": ((), "stress_llm"),
+    "anomaly": (("activity", "sleep", "stress"), "abnormaly_detection_llm"),
+    "nutrition": (("activity", "sleep", "stress"), "nutrition_llm"),
+    "summary": (("activity", "sleep", "stress"), "health_summary_llm"),
+}
+
+
+class PipelineCancelled(Exception):
+    """
+    Raised between stages once the caller's cancel_event is set (e.g. the client disconnected).
+    """
 
 
+class _StageDeltaStream:
+    """
+    AutoGen IOStream that forwards streamed completion chunks of one stage to `on_delta`.
+    AutoGen prints each chunk with end=""; console chatter and colour codes are dropped.
+    """
 
-def run_group_health_chat(activity_data, sleep_data, stress_data, llm_config):
-    agents = setup_agents(llm_config)
+    def __init__(self, stage, on_delta):
+        self.stage = stage
+        self.on_delta = on_delta
 
-    # 1️⃣ 個別分析 activity, sleep, stress
-    activity_result = agents["activity_agent"](activity_data, agents["user_proxy"], agents["activity_llm"])
-    sleep_result = agents["sleep_agent"](sleep_data, agents["user_proxy"], agents["sleep_llm"])
-    stress_result = agents["stress_agent"](stress_data, agents["user_proxy"], agents["stress_llm"])
+    def print(self, *objects, sep=" ", end="\n", flush=False):
+        if end != "":
+            return
+        text = sep.join(str(o) for o in objects)
+        if text and not text.startswith("\033"):
+            self.on_delta(self.stage, text)
 
-    # 2️⃣ GroupChat 開場訊息
-    opening_message = f"""
-You are now in a group chat.
+    def input(self, prompt="", *, password=False):
+        return ""
 
-🏃 ActivityAgent Result:
-{activity_result}
 
-😴 SleepAgent Result:
-{sleep_result}
+def _stage_io(stage, on_delta):
+    """
+    Routes AutoGen output of the current thread to `on_delta` while a stage runs.
+    """
+    if on_delta is None:
+        return nullcontext()
+    from autogen.io.base import IOStream
+    return IOStream.set_default(_StageDeltaStream(stage, on_delta))
 
-😟 StressAgent Result:
-{stress_result}
 
-🔎 AbnormalyDetectionAgent:
-Your ONLY tasks:
-1. Carefully review the ActivityAgent, SleepAgent, and StressAgent results.
-2. Identify any abnormalities detected based on the data.
-3. Write a very short, concise list of the anomalies found (if any).
-4. Classify the overall severity: Mild / Warning / Critical.
+def _check_cancelled(cancel_event):
+    if cancel_event is not None and cancel_event.is_set():
+        raise PipelineCancelled("Group health pipeline cancelled.")
+
+
+def _run_branch(branch, runner, data, user_proxy, agent, use_cache=True, on_delta=None):
+    """
+    Runs a single analysis branch and reports (result, error, elapsed seconds).
+    """
+    start = time.perf_counter()
+    try:
+        with _stage_io(branch, on_delta):
+            result = runner(data, user_proxy, agent, use_cache=use_cache)
+        return result, None, time.perf_counter() - start
+    except Exception as e:
+        return None, f"{type(e).__name__}: {e}", time.perf_counter() - start
 
-Strict Rules:
-- You MUST ONLY focus on anomaly detection.
-- DO NOT generate any nutrition advice.
-- DO NOT mention meal suggestions or transition to other topics.
-- DO NOT write about NutritionAgent.
-- After you finish, STOP and PASS the turn to NutritionAgent automatically.
-- DO NOT continue writing beyond your assigned task.
 
-Output Format (strictly follow):
+def run_analysis_branches(agents, inputs, use_cache=True, on_stage=None, on_delta=None):
+    """
+    Fans out the activity, sleep and stress analyses concurrently.
+
+    Parameters:
+    - agents: Agent dict from setup_agents (needs the per-branch proxies)
+    - inputs: {"activity": ..., "sleep": ..., "stress": ...} sensor payloads; branches
+      missing from `inputs` are not run
+    - use_cache: Set False to bypass the LLM response cache
+    - on_stage: Optional callback(stage, result, elapsed, error) fired as each branch finishes
+    - on_delta: Optional callback(stage, text) for streamed completion chunks
+
+    Returns:
+    - (results, errors, timings) dicts keyed by branch name; the stage's
+      wall-clock time is reported under timings["analysis_stage"]
+    """
+    start = time.perf_counter()
+    results, errors, timings = {}, {}, {}
+
+    branches = [b for b in ANALYSIS_BRANCHES if b[0] in inputs]
+    if not branches:
+        return results, errors, timings
+
+    with ThreadPoolExecutor(max_workers=len(branches)) as executor:
+        futures = {
+            executor.submit(
+                _run_branch, branch, agents[runner_key], inputs[branch], agents[proxy_key], agents[llm_key],
+                use_cache, on_delta
+            ): branch
+            for branch, runner_key, proxy_key, llm_key in branches
+        }
+
+        for future in as_completed(futures):
+            branch = futures[future]
+            result, error, elapsed = future.result()
+            results[branch] = result if error is None else f"{branch.capitalize()} analysis unavailable."
+            if error is not None:
+                errors[branch] = error
+            timings[branch] = round(elapsed, 3)
+            if on_stage is not None:
+                on_stage(branch, render_result(results[branch]), timings[branch], error)
+
+    timings["analysis_stage"] = round(time.perf_counter() - start, 3)
+
+    return results, errors, timings
+
+
+def run_pipeline_stage(agents, activity_result, sleep_result, stress_result, use_cache=True,
+                       on_stage=None, on_delta=None, cancel_event=None, reused=None, inputs=None):
+    """
+    Default pipeline mode: anomaly detection then nutrition advice, each a single direct
+    turn with only the context it needs (no speaker-selection LLM calls, no shared history).
+    Stages found in `reused` ({stage: result}) are not run again.
+
+    With the local anomaly engine enabled and the raw sensor `inputs` given, anomalies are
+    detected from the signals and the LLM is at most asked to phrase them.
+
+    Returns:
+    - (abnormaly_detection_result, nutrition_result)
+    """
+    outputs = []
+    for stage, runner_key, llm_key in (
+        ("anomaly", "abnormaly_detection_agent", "abnormaly_detection_llm"),
+        ("nutrition", "nutrition_agent", "nutrition_llm"),
+    ):
+        if reused and stage in reused:
+            if on_stage is not None:
+                on_stage(stage, render_result(reused[stage]), 0.0, None)
+            outputs.append(reused[stage])
+            continue
+        _check_cancelled(cancel_event)
+        start = time.perf_counter()
+        if stage == "anomaly" and inputs is not None and get_anomaly_engine().enabled:
+            runner_key, upstream = "local_anomaly_agent", (inputs["activity"], inputs["sleep"], inputs["stress"])
+        else:
+            upstream = (activity_result, sleep_result, stress_result)
+        with _stage_io(stage, on_delta):
+            result = agents[runner_key](
+                *upstream,
+                agents["user_proxy"], agents[llm_key],
+                use_cache=use_cache
+            )
+        if on_stage is not None:
+            on_stage(stage, render_result(result), round(time.perf_counter() - start, 3), None)
+        outputs.append(result)
+
+    abnormaly_detection_result, nutrition_result = outputs
+    return abnormaly_detection_result, nutrition_result
+
+
+def run_group_chat_stage(agents, llm_config, activity_result, sleep_result, stress_result, max_round=GROUP_CHAT_MAX_ROUND):
+    """
+    Opt-in GroupChat mode: anomaly detection and nutrition advice discussed in an AutoGen
+    GroupChat with LLM-based ("auto") speaker selection, capped at `max_round` rounds.
+    Each agent's turn asks for the reply its single-agent runner would (typed JSON in
+    structured-output mode) and is parsed the same way.
+
+    Returns:
+    - (abnormaly_detection_result, nutrition_result)
+    """
+    # 與單一 agent 相同的 AgentRequest：決定回覆格式與解析方式
+    anomaly_request = prepare_anomaly_request(activity_result, sleep_result, stress_result)
+    nutrition_request = prepare_nutrition_request(activity_result, sleep_result, stress_result)
+
+    # 2️⃣ GroupChat 開場訊息
+    activity_result, sleep_result, stress_result = (
+        prompt_text(activity_result), prompt_text(sleep_result), prompt_text(stress_result)
+    )
+    if anomaly_request.result_type is not None:
+        anomaly_format = json_instruction(anomaly_request.result_type)
+    else:
+        anomaly_format = """Output Format (strictly follow):
 - **Anomaly Detection**: (State "No anomaly detected" OR briefly list the anomalies.)
-- **Severity Level**: (Mild / Warning / Critical)
+- **Severity Level**: (Mild / Warning / Critical)"""
+    food_db = get_food_database()
+    if food_db.enabled:
+        # 營養數值由本地食物表計算，LLM 只挑選食物與份量
+        nutrition_task = f"""Please carefully analyze the user's condition based on ActivityAgent, SleepAgent, and StressAgent.
 
-Important:
-- After you finish your response, **pass the conversation to NutritionAgent**.
-- DO NOT terminate the chat yourself.
-- Stay professional and to the point.
+Rules:
+- DO NOT repeat previous activity, sleep, or stress analysis.
+- **Even if AbnormalyDetectionAgent detects no anomaly, you MUST still complete the full meal recommendation.**
+- Choose ONE meal time and TWO to THREE meal options of 2–4 foods each, only from the available foods below.
+- "servings" is a multiple of one standard serving (e.g. 1 or 1.5).
+- Do NOT give calories or nutrients; they are computed for you.
+- After your reply, send a final termination message to GroupChatManager to end the discussion.
 
-🥗 NutritionAgent:
-Please carefully analyze the user's condition based on ActivityAgent, SleepAgent, and StressAgent.
+Available foods (use these names exactly):
+{food_db.catalog()}
+
+{json_instruction(MealSelection)}
+"""
+    elif nutrition_request.result_type is not None:
+        nutrition_task = f"""Please carefully analyze the user's condition based on ActivityAgent, SleepAgent, and StressAgent.
+
+Rules:
+- DO NOT repeat previous activity, sleep, or stress analysis.
+- **Even if AbnormalyDetectionAgent detects no anomaly, you MUST still complete the full meal recommendation.**
+- Choose ONE meal time and TWO to THREE meal options of 2–4 foods each, with estimated kcal per food.
+- Add one simple, friendly dietary advice for tomorrow.
+- After your reply, send a final termination message to GroupChatManager to end the discussion.
+
+{json_instruction(nutrition_request.result_type)}
+"""
+    else:
+        nutrition_task = """Please carefully analyze the user's condition based on ActivityAgent, SleepAgent, and StressAgent.
 
 Rules:
 - DO NOT repeat previous activity, sleep, or stress analysis.
@@ -92,9 +288,49 @@ Tone:
 Important:
 - After completing your full structured response, you may terminate.
 - Until then, please complete all parts as required.
+"""
+
+    opening_message = f"""
+You are now in a group chat.
+
+🏃 ActivityAgent Result:
+{activity_result}
+
+😴 SleepAgent Result:
+{sleep_result}
+
+😟 StressAgent Result:
+{stress_result}
+
+🔎 AbnormalyDetectionAgent:
+Your ONLY tasks:
+1. Carefully review the ActivityAgent, SleepAgent, and StressAgent results.
+2. Identify any abnormalities detected based on the data.
+3. Write a very short, concise list of the anomalies found (if any).
+4. Classify the overall severity: Mild / Warning / Critical.
+
+Strict Rules:
+- You MUST ONLY focus on anomaly detection.
+- DO NOT generate any nutrition advice.
+- DO NOT mention meal suggestions or transition to other topics.
+- DO NOT write about NutritionAgent.
+- After you finish, STOP and PASS the turn to NutritionAgent automatically.
+- DO NOT continue writing beyond your assigned task.
+
+{anomaly_format}
+
+Important:
+- After you finish your response, **pass the conversation to NutritionAgent**.
+- DO NOT terminate the chat yourself.
+- Stay professional and to the point.
+
+🥗 NutritionAgent:
+{nutrition_task}
 """
 
     # 3️⃣ 建立 GroupChat
+    from autogen import GroupChat, GroupChatManager
+
     group_chat = GroupChat(
         agents=[
             agents["user_proxy"],
@@ -102,7 +338,8 @@ Important:
             agents["nutrition_llm"]
         ],
         messages=[],
-        speaker_selection_method="auto"  # 正常使用 auto，讓 agent 自己順序流動
+        speaker_selection_method="auto",  # 正常使用 auto，讓 agent 自己順序流動
+        max_round=max_round  # 硬性上限，避免無限輪
     )
 
     manager = GroupChatManager(
@@ -131,11 +368,11 @@ Important:
 
         # 如果是異常偵測 Agent 的訊息
         if sender == "AbnormalyDetectionAgent" and abnormaly_detection_result is None:
-            abnormaly_detection_result = content.strip()
+            abnormaly_detection_result = request_result(anomaly_request, content.strip())
 
         # 如果是營養建議 Agent 的訊息
         if sender == "NutritionAgent" and nutrition_result is None:
-            nutrition_result = content.strip()
+            nutrition_result = request_result(nutrition_request, content.strip())
 
     # 防止空值
     if abnormaly_detection_result is None:
@@ -144,22 +381,69 @@ Important:
     if nutrition_result is None:
         nutrition_result = "No nutrition suggestion."
 
+    return abnormaly_detection_result, nutrition_result
 
 
+def stage_keys(agents, mode, inputs, results=None):
+    """
+    Content keys of the pipeline stages.
+
+    Parameters:
+    - agents: Agent dict (each stage's model / system message is part of its key)
+    - mode: Execution mode (anomaly / nutrition come from a different stage in groupchat mode)
+    - inputs: {"activity": ..., "sleep": ..., "stress": ...} sensor payloads
+    - results: Branch results; when given, keys of the downstream stages are included
 
-    # 6️⃣ GroupChat結束後，送去 HealthSummaryAgent
-    summary_message = f"""
+    Returns:
+    - {stage: key} for the analysis branches (and anomaly / nutrition / summary)
+    """
+    keys = {}
+    structured = get_structured_outputs().enabled
+    router = get_model_router()
+    for stage, (upstream, llm_key) in STAGE_DAG.items():
+        # What else shapes the answer (model, system message, max_tokens): the LLM cache key without a prompt
+        fingerprint = agent_cache_key(agents[llm_key], None)
+        if router.fingerprint(stage) is not None:
+            # Routed stages answer from their tier chain, so a profile change invalidates them too
+            fingerprint = content_hash(fingerprint, router.fingerprint(stage))
+        if not upstream:
+            keys[stage] = content_hash(stage, structured, fingerprint, inputs.get(stage))
+        elif results is not None:
+            upstream_hashes = [content_hash(dump_result(results[name])) for name in upstream]
+            if stage == "nutrition" and get_food_database().enabled:
+                # Totals come from the food table, so a table change invalidates stored plans
+                fingerprint = content_hash(fingerprint, get_food_database().version)
+            keys[stage] = content_hash(stage, mode if stage != "summary" else None, structured,
+                                       fingerprint, upstream_hashes)
+    return keys
+
+
+def build_summary_message(activity_result, sleep_result, stress_result, structured: bool = False) -> str:
+    """
+    Message sent to HealthSummaryAgent once anomaly detection and nutrition advice are done.
+    With `structured`, the reply is requested as a SummaryResult JSON object.
+    """
+    message = f"""
     🏃 Activity Summary:
-    {activity_result}
+    {prompt_text(activity_result)}
 
     😴 Sleep Summary:
-    {sleep_result}
+    {prompt_text(sleep_result)}
 
     😟 Stress Summary:
-    {stress_result}
+    {prompt_text(stress_result)}
 
     📋 GroupChat Discussion Completed.
+"""
+    if structured:
+        return message + f"""
+Summarize the user's overall health status in a friendly, professional tone (do not repeat
+previous analysis), and suggest ONE specific improvement for tomorrow.
 
+{json_instruction(SummaryResult)}
+"""
+
+    return message + """
     Now summarize the user's overall health status, and suggest ONE specific improvement for tomorrow.
     - Be friendly and professional.
     - Do NOT repeat previous analysis.
@@ -168,29 +452,353 @@ Important:
     - After you complete your reply, you must add a single line TERMINATE at the end. Only after doing so the session will end.
     """
 
-    # 🔥 [重點] 這邊開新的 chat, 但只跑一輪！
-    agents["user_proxy"].initiate_chat(
-        recipient=agents["health_summary_llm"],
-        message=summary_message,
-        max_turns=1,  # <<< 加這個！強制只讓 HealthSummaryAgent 回一次
-        clear_history=True,  # <<< 不帶舊的訊息
-        send_termination_message=True
-    )
 
-    # 🔥 這時候就可以直接收訊息了
-    health_summary_result = agents["user_proxy"].last_message(agents["health_summary_llm"]).get("content", "No health summary.")
+def prepare_group_summary_request(activity_result, sleep_result, stress_result) -> AgentRequest:
+    """
+    AgentRequest of the summary stage, shared by the threaded and async pipelines.
+    """
+    structured = get_structured_outputs()
+    message = build_summary_message(activity_result, sleep_result, stress_result, structured=structured.enabled)
+    return AgentRequest("summary", message, SummaryResult if structured.enabled else None, default="No health summary.")
 
-    # 最後 🔥 強制終止 UserProxy 避免死循環
-    #agents["user_proxy"].stop_replying()
 
-    # 7️⃣ 收集結果
+def collect_results(activity_result, sleep_result, stress_result, abnormaly_detection_result, nutrition_result,
+                    health_summary_result, mode, branch_errors, timings, reused) -> dict:
+    """
+    Response body of a group health run (same shape for the threaded and async paths).
+    """
+    # 結構化結果在這裡才轉成文字；欄位另外放在 "structured"
     results = {
-        "activity_result": activity_result,
-        "sleep_result": sleep_result,
-        "stress_result": stress_result,
-        "abnormaly_detection_result": abnormaly_detection_result,
-        "nutrition_result": nutrition_result,
-        "health_summary_result": health_summary_result
+        "activity_result": render_result(activity_result),
+        "sleep_result": render_result(sleep_result),
+        "stress_result": render_result(stress_result),
+        "abnormaly_detection_result": render_result(abnormaly_detection_result),
+        "nutrition_result": render_result(nutrition_result),
+        "health_summary_result": render_result(health_summary_result),
+        "mode": mode,
+        "errors": branch_errors,
+        "timings": timings,
+        "stages": {
+            "reused": [stage for stage in STAGE_DAG if stage in reused],
+            "recomputed": [stage for stage in STAGE_DAG if stage not in reused]
+        }
     }
+    if get_structured_outputs().enabled:
+        results["structured"] = {
+            "activity": result_fields(activity_result),
+            "sleep": result_fields(sleep_result),
+            "stress": result_fields(stress_result),
+            "anomaly": result_fields(abnormaly_detection_result),
+            "nutrition": result_fields(nutrition_result),
+            "summary": result_fields(health_summary_result)
+        }
 
     return results
+
+
+def run_group_health_chat(activity_data, sleep_data, stress_data, llm_config, agents=None, use_cache=True, mode=DEFAULT_MODE,
+                          on_stage=None, on_delta=None, cancel_event=None, stage_store=None):
+    """
+    Runs the full group health pipeline: activity / sleep / stress analyses, anomaly
+    detection, nutrition advice and the final health summary.
+
+    Parameters:
+    - activity_data, sleep_data, stress_data: Sensor payloads for the three analyses
+    - llm_config: AutoGen LLM config (used to build agents / the GroupChatManager)
+    - agents: Agent set checked out of an AgentPool (built on the fly when None)
+    - use_cache: Set False to bypass the LLM response cache
+    - mode: "pipeline" (default) or "groupchat"
+    - on_stage: Optional callback(stage, result, elapsed, error) fired as each of
+      activity, sleep, stress, anomaly, nutrition and summary finishes
+    - on_delta: Optional callback(stage, text) receiving streamed completion chunks
+      (only produced when llm_config enables "stream")
+    - cancel_event: Optional threading.Event; once set, PipelineCancelled is raised
+      before the next stage starts
+    - stage_store: StageStore of earlier stage results (the process-wide one when None);
+      stages whose inputs are unchanged are reused from it instead of recomputed.
+      use_cache=False recomputes every stage.
+
+    Returns:
+    - Dictionary with every stage's result plus mode, errors, timings and stages
+      ({"reused": [...], "recomputed": [...]})
+    """
+    if mode not in EXECUTION_MODES:
+        raise ValueError(f"Unknown execution mode '{mode}', expected one of {EXECUTION_MODES}.")
+
+    # 沒有從 AgentPool 借用 agent 時才臨時建立
+    if agents is None:
+        agents = setup_agents(llm_config)
+
+    if stage_store is None:
+        stage_store = get_stage_store()
+    reused = {}
+
+    def lookup(stage, key):
+        if use_cache:
+            value = stage_store.get(key)
+            if value is not None:
+                reused[stage] = load_result(value)
+                if on_stage is not None:
+                    on_stage(stage, render_result(reused[stage]), 0.0, None)
+
+    # 1️⃣ 並行分析 activity, sleep, stress（三者互不相依）；輸入沒變的分支直接沿用
+    inputs = {"activity": activity_data, "sleep": sleep_data, "stress": stress_data}
+    keys = stage_keys(agents, mode, inputs)
+    for branch, _, _, _ in ANALYSIS_BRANCHES:
+        lookup(branch, keys[branch])
+    branch_results, branch_errors, timings = run_analysis_branches(agents, {
+        branch: data for branch, data in inputs.items() if branch not in reused
+    }, use_cache=use_cache, on_stage=on_stage, on_delta=on_delta)
+    for branch, result in branch_results.items():
+        if branch not in branch_errors:
+            stage_store.set(keys[branch], dump_result(result))
+    branch_results.update((b, reused[b]) for b, _, _, _ in ANALYSIS_BRANCHES if b in reused)
+    activity_result = branch_results["activity"]
+    sleep_result = branch_results["sleep"]
+    stress_result = branch_results["stress"]
+
+    # 下游 stage 以上游結果的 hash 為 key；有分支失敗時不保存（輸入只是佔位文字）
+    keys = stage_keys(agents, mode, inputs, branch_results)
+    store_downstream = not branch_errors
+    if mode == "groupchat":
+        # GroupChat 一次產生 anomaly 與 nutrition，只能一起沿用
+        groupchat_key = content_hash(keys["anomaly"], keys["nutrition"])
+        stored = stage_store.get(groupchat_key) if use_cache else None
+        if stored is not None:
+            for stage, value in zip(("anomaly", "nutrition"), stored):
+                reused[stage] = load_result(value)
+                if on_stage is not None:
+                    on_stage(stage, render_result(reused[stage]), 0.0, None)
+    else:
+        # 本地異常偵測引擎只需幾毫秒，不經過 stage store
+        if not get_anomaly_engine().enabled:
+            lookup("anomaly", keys["anomaly"])
+        lookup("nutrition", keys["nutrition"])
+
+    # 2️⃣ 異常偵測 → 營養建議（預設 pipeline，GroupChat 為選用模式）
+    _check_cancelled(cancel_event)
+    stage_start = time.perf_counter()
+    if mode == "groupchat" and "anomaly" in reused:
+        abnormaly_detection_result, nutrition_result = reused["anomaly"], reused["nutrition"]
+    elif mode == "groupchat":
+        with _stage_io("groupchat", on_delta), agent_context("GroupChat"):
+            abnormaly_detection_result, nutrition_result = run_group_chat_stage(
+                agents, llm_config, activity_result, sleep_result, stress_result
+            )
+        elapsed = round(time.perf_counter() - stage_start, 3)
+        if on_stage is not None:
+            on_stage("anomaly", render_result(abnormaly_detection_result), elapsed, None)
+            on_stage("nutrition", render_result(nutrition_result), elapsed, None)
+        if store_downstream:
+            stage_store.set(groupchat_key, [dump_result(abnormaly_detection_result), dump_result(nutrition_result)])
+    else:
+        abnormaly_detection_result, nutrition_result = run_pipeline_stage(
+            agents, activity_result, sleep_result, stress_result, use_cache=use_cache,
+            on_stage=on_stage, on_delta=on_delta, cancel_event=cancel_event, reused=reused, inputs=inputs
+        )
+        if store_downstream:
+            for stage, value in (("anomaly", abnormaly_detection_result), ("nutrition", nutrition_result)):
+                if stage not in reused and not (stage == "anomaly" and get_anomaly_engine().enabled):
+                    stage_store.set(keys[stage], dump_result(value))
+    timings["anomaly_nutrition_stage"] = round(time.perf_counter() - stage_start, 3)
+
+    _check_cancelled(cancel_event)
+
+    # 3️⃣ 異常偵測與營養建議完成後，送去 HealthSummaryAgent
+    stage_start = time.perf_counter()
+
+    lookup("summary", keys["summary"])
+    if "summary" in reused:
+        health_summary_result = reused["summary"]
+    else:
+        # 🔥 [重點] 這邊開新的 chat, 但只跑一輪！（模型層級由 ModelRouter 決定，結構化模式回傳 SummaryResult）
+        summary_request = prepare_group_summary_request(activity_result, sleep_result, stress_result)
+        with _stage_io("summary", on_delta):
+            health_summary_result = run_request(summary_request, agents["user_proxy"], agents["health_summary_llm"],
+                                                use_cache)
+        timings["summary_stage"] = round(time.perf_counter() - stage_start, 3)
+        if on_stage is not None:
+            on_stage("summary", render_result(health_summary_result), timings["summary_stage"], None)
+        if store_downstream:
+            stage_store.set(keys["summary"], dump_result(health_summary_result))
+
+    # 最後 🔥 強制終止 UserProxy 避免死循環
+    #agents["user_proxy"].stop_replying()
+
+    # 4️⃣ 收集結果
+    return collect_results(activity_result, sleep_result, stress_result, abnormaly_detection_result, nutrition_result,
+                           health_summary_result, mode, branch_errors, timings, reused)
+
+
+# ---------------------------------------------------------------------------
+# Async serving path (backend/asgi.py): the same stages awaited on one event loop.
+# Agents are only read, so a single agent set serves every concurrent request.
+# ---------------------------------------------------------------------------
+
+@contextmanager
+def _async_stage_io(stage, on_delta):
+    """
+    Routes streamed chunks of the LLM calls awaited in the block to `on_delta`. The
+    context variable is local to the current task, so concurrent stages do not mix.
+    """
+    if on_delta is None:
+        yield
+        return
+    token = current_delta_handler.set(lambda text: on_delta(stage, text))
+    try:
+        yield
+    finally:
+        current_delta_handler.reset(token)
+
+
+async def a_run_analysis_branches(agents, inputs, use_cache=True, on_stage=None, on_delta=None):
+    """
+    Async version of run_analysis_branches: the branches are awaited concurrently on the
+    event loop instead of in worker threads. Same parameters and return value.
+    """
+    start = time.perf_counter()
+    results, errors, timings = {}, {}, {}
+
+    async def run(branch, runner_key, proxy_key, llm_key):
+        branch_start = time.perf_counter()
+        try:
+            with _async_stage_io(branch, on_delta):
+                result = await agents["a_" + runner_key](
+                    inputs[branch], agents[proxy_key], agents[llm_key], use_cache=use_cache
+                )
+            error = None
+        except Exception as e:
+            result, error = f"{branch.capitalize()} analysis unavailable.", f"{type(e).__name__}: {e}"
+        results[branch] = result
+        if error is not None:
+            errors[branch] = error
+        timings[branch] = round(time.perf_counter() - branch_start, 3)
+        if on_stage is not None:
+            on_stage(branch, render_result(result), timings[branch], error)
+
+    branches = [b for b in ANALYSIS_BRANCHES if b[0] in inputs]
+    if not branches:
+        return results, errors, timings
+    await asyncio.gather(*(run(*branch) for branch in branches))
+    timings["analysis_stage"] = round(time.perf_counter() - start, 3)
+
+    return results, errors, timings
+
+
+async def a_run_pipeline_stage(agents, activity_result, sleep_result, stress_result, use_cache=True,
+                               on_stage=None, on_delta=None, reused=None, inputs=None):
+    """
+    Async version of run_pipeline_stage (anomaly detection then nutrition advice).
+    Cancelling the awaiting task stops the pipeline, so there is no cancel_event.
+    """
+    outputs = []
+    for stage, runner_key, llm_key in (
+        ("anomaly", "abnormaly_detection_agent", "abnormaly_detection_llm"),
+        ("nutrition", "nutrition_agent", "nutrition_llm"),
+    ):
+        if reused and stage in reused:
+            if on_stage is not None:
+                on_stage(stage, render_result(reused[stage]), 0.0, None)
+            outputs.append(reused[stage])
+            continue
+        start = time.perf_counter()
+        if stage == "anomaly" and inputs is not None and get_anomaly_engine().enabled:
+            runner_key, upstream = "local_anomaly_agent", (inputs["activity"], inputs["sleep"], inputs["stress"])
+        else:
+            upstream = (activity_result, sleep_result, stress_result)
+        with _async_stage_io(stage, on_delta):
+            result = await agents["a_" + runner_key](
+                *upstream,
+                agents["user_proxy"], agents[llm_key],
+                use_cache=use_cache
+            )
+        if on_stage is not None:
+            on_stage(stage, render_result(result), round(time.perf_counter() - start, 3), None)
+        outputs.append(result)
+
+    abnormaly_detection_result, nutrition_result = outputs
+    return abnormaly_detection_result, nutrition_result
+
+
+async def a_run_group_health_chat(activity_data, sleep_data, stress_data, agents, use_cache=True,
+                                  on_stage=None, on_delta=None, stage_store=None):
+    """
+    Async version of run_group_health_chat, pipeline mode only (GroupChat speaker
+    selection is AutoGen's synchronous loop; the async app runs it in a worker thread).
+
+    Parameters:
+    - activity_data, sleep_data, stress_data: Sensor payloads for the three analyses
+    - agents: Shared agent set from setup_agents (only read, never checked out)
+    - use_cache, on_stage, on_delta, stage_store: As for run_group_health_chat
+
+    Returns:
+    - The same dictionary as run_group_health_chat with mode "pipeline"
+    """
+    mode = "pipeline"
+    if stage_store is None:
+        stage_store = get_stage_store()
+    reused = {}
+    # The SQLite tier of the stage store is read and written in a worker thread
+    on_disk = bool(stage_store.disk_path)
+
+    async def lookup(stage, key):
+        if use_cache:
+            value = await off_loop(on_disk, stage_store.get, key)
+            if value is not None:
+                reused[stage] = load_result(value)
+                if on_stage is not None:
+                    on_stage(stage, render_result(reused[stage]), 0.0, None)
+
+    # 1️⃣ 並行分析 activity, sleep, stress（同一個 event loop 上 await）
+    inputs = {"activity": activity_data, "sleep": sleep_data, "stress": stress_data}
+    keys = stage_keys(agents, mode, inputs)
+    for branch, _, _, _ in ANALYSIS_BRANCHES:
+        await lookup(branch, keys[branch])
+    branch_results, branch_errors, timings = await a_run_analysis_branches(agents, {
+        branch: data for branch, data in inputs.items() if branch not in reused
+    }, use_cache=use_cache, on_stage=on_stage, on_delta=on_delta)
+    for branch, result in branch_results.items():
+        if branch not in branch_errors:
+            await off_loop(on_disk, stage_store.set, keys[branch], dump_result(result))
+    branch_results.update((b, reused[b]) for b, _, _, _ in ANALYSIS_BRANCHES if b in reused)
+    activity_result = branch_results["activity"]
+    sleep_result = branch_results["sleep"]
+    stress_result = branch_results["stress"]
+
+    keys = stage_keys(agents, mode, inputs, branch_results)
+    store_downstream = not branch_errors
+    if not get_anomaly_engine().enabled:
+        await lookup("anomaly", keys["anomaly"])
+    await lookup("nutrition", keys["nutrition"])
+
+    # 2️⃣ 異常偵測 → 營養建議
+    stage_start = time.perf_counter()
+    abnormaly_detection_result, nutrition_result = await a_run_pipeline_stage(
+        agents, activity_result, sleep_result, stress_result, use_cache=use_cache,
+        on_stage=on_stage, on_delta=on_delta, reused=reused, inputs=inputs
+    )
+    if store_downstream:
+        for stage, value in (("anomaly", abnormaly_detection_result), ("nutrition", nutrition_result)):
+            if stage not in reused and not (stage == "anomaly" and get_anomaly_engine().enabled):
+                await off_loop(on_disk, stage_store.set, keys[stage], dump_result(value))
+    timings["anomaly_nutrition_stage"] = round(time.perf_counter() - stage_start, 3)
+
+    # 3️⃣ HealthSummaryAgent：與同步版本相同的單輪 AgentRequest
+    stage_start = time.perf_counter()
+    await lookup("summary", keys["summary"])
+    if "summary" in reused:
+        health_summary_result = reused["summary"]
+    else:
+        summary_request = prepare_group_summary_request(activity_result, sleep_result, stress_result)
+        with _async_stage_io("summary", on_delta):
+            health_summary_result = await a_run_request(summary_request, agents["user_proxy"],
+                                                        agents["health_summary_llm"], use_cache)
+        timings["summary_stage"] = round(time.perf_counter() - stage_start, 3)
+        if on_stage is not None:
+            on_stage("summary", render_result(health_summary_result), timings["summary_stage"], None)
+        if store_downstream:
+            await off_loop(on_disk, stage_store.set, keys["summary"], dump_result(health_summary_result))
+
+    # 4️⃣ 收集結果
+    return collect_results(activity_result, sleep_result, stress_result, abnormaly_detection_result, nutrition_result,
+                           health_summary_result, mode, branch_errors, timings, reused)
@@ -0,0 +1,53 @@
+# backend/gunicorn.conf.py
+"""
+Pre-fork serving mode for horizontally scaled workers.
+
+Run (from app/backend):
+    gunicorn -c gunicorn.conf.py app:app
+
+The master imports the heavy dependencies (openai, autogen, flask, numpy) and the backend
+modules once (backend.preload) before forking, so a new worker starts from an already
+imported interpreter and only runs backend/app.py's own set-up; agents are then built
+on first use. The app module is loaded per worker (no preload_app) because it opens
+SQLite connections, HTTP keep-alive connections and worker threads that must not be
+shared across fork.
+
+Environment:
+- GUNICORN_BIND (default 0.0.0.0:5001), WEB_CONCURRENCY workers (default 2),
+  GUNICORN_THREADS threads per worker (default 8), GUNICORN_TIMEOUT seconds (default 300)
+- GUNICORN_PRELOAD=0 skips the master-side imports (every worker imports everything itself)
+"""
+
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:5001")
+workers = int(os.getenv("WEB_CONCURRENCY", "2"))
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", "8"))
+# Group pipelines wait on several LLM turns (120 s timeout each)
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "300"))
+
+_worker_started = {}
+
+
+def on_starting(server):
+    if os.getenv("GUNICORN_PRELOAD", "1") == "0":
+        return
+    from backend.preload import preload
+
+    timings = preload()
+    server.log.info("Preloaded %d modules in %.2fs", len(timings), sum(timings.values()))
+
+
+def pre_fork(server, worker):
+    _worker_started[worker.age] = time.perf_counter()
+
+
+def post_worker_init(worker):
+    started = _worker_started.get(worker.age)
+    if started is not None:
+        worker.log.info("Worker %s ready in %.3fs", worker.pid, time.perf_counter() - started)
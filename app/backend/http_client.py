@@ -0,0 +1,494 @@
+# backend/http_client.py
+
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+
+from backend.rate_limiter import estimate_request_tokens
+
+
+def _pool_timeout(request: httpx.Request):
+    """
+    Seconds a request may wait for a per-host connection slot: its httpx pool timeout
+    (None waits indefinitely).
+    """
+    return (request.extensions.get("timeout") or {}).get("pool")
+
+
+class _ReleasingStream(httpx.SyncByteStream):
+    """
+    Response body wrapper that frees the per-host connection slot once the body is closed,
+    so streamed completions keep their slot for as long as they hold the connection.
+    """
+
+    def __init__(self, stream, release):
+        self._stream = stream
+        self._release = release
+
+    def __iter__(self):
+        yield from self._stream
+
+    def close(self):
+        try:
+            self._stream.close()
+        finally:
+            self._release()
+
+
+class _ObservedStream(httpx.SyncByteStream):
+    """
+    Response body wrapper that hands the complete body to `on_complete` once it is closed.
+    """
+
+    def __init__(self, stream, on_complete):
+        self._stream = stream
+        self._on_complete = on_complete
+        self._chunks = []
+
+    def __iter__(self):
+        for chunk in self._stream:
+            self._chunks.append(chunk)
+            yield chunk
+
+    def close(self):
+        try:
+            self._stream.close()
+        finally:
+            self._on_complete(b"".join(self._chunks))
+
+
+class PooledTransport(httpx.HTTPTransport):
+    """
+    Keep-alive transport with a per-host concurrent connection limit and connection
+    reuse counters (new TCP connections are detected through httpcore's trace hook).
+    A request waits at most its pool timeout for a free per-host slot, then raises
+    httpx.PoolTimeout.
+    POST requests (LLM calls) go through `rate_limiter` when one is set.
+
+    Observers added with add_observer() are called as
+    `observer(request, response, body, elapsed)` once each POST response body has been
+    read (after retries); `response` is None and `body` empty if the request failed.
+
+    With a `replay` store (backend.traffic.ReplayStore) POST requests are answered from
+    a recording instead of the network.
+    """
+
+    def __init__(self, max_per_host: int = 20, rate_limiter=None, replay=None, **kwargs):
+        super().__init__(**kwargs)
+        self.max_per_host = max_per_host
+        self.rate_limiter = rate_limiter
+        self.replay = replay
+        self._lock = threading.Lock()
+        self._host_slots = {}
+        self._observers = []
+        self._stats = {"requests": 0, "new_connections": 0, "errors": 0, "slot_timeouts": 0}
+
+    def _slots(self, host: str) -> threading.BoundedSemaphore:
+        with self._lock:
+            if host not in self._host_slots:
+                self._host_slots[host] = threading.BoundedSemaphore(self.max_per_host)
+            return self._host_slots[host]
+
+    def add_observer(self, observer) -> None:
+        self._observers.append(observer)
+
+    def _notify(self, request, response, body, elapsed) -> None:
+        for observer in self._observers:
+            try:
+                observer(request, response, body, elapsed)
+            except Exception:
+                pass
+
+    def _trace(self, event_name, info):
+        if event_name == "connection.connect_tcp.complete":
+            with self._lock:
+                self._stats["new_connections"] += 1
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        previous_trace = request.extensions.get("trace")
+
+        def trace(event_name, info):
+            self._trace(event_name, info)
+            if previous_trace is not None:
+                previous_trace(event_name, info)
+
+        request.extensions = {**request.extensions, "trace": trace}
+
+        if request.method != "POST":
+            return self._send(request)
+
+        start = time.perf_counter()
+        try:
+            response = self.replay.respond(request) if self.replay is not None else None
+            if response is None:
+                response = self._send_limited(request)
+        except Exception:
+            self._notify(request, None, b"", time.perf_counter() - start)
+            raise
+
+        if self._observers:
+            response.stream = _ObservedStream(
+                response.stream,
+                lambda body: self._notify(request, response, body, time.perf_counter() - start)
+            )
+        return response
+
+    def _send_limited(self, request: httpx.Request) -> httpx.Response:
+        if self.rate_limiter is None:
+            return self._send(request)
+        return self.rate_limiter.send(lambda: self._send(request), estimate_request_tokens(request.content))
+
+    def _send(self, request: httpx.Request) -> httpx.Response:
+        slots = self._slots(request.url.host)
+        wait = _pool_timeout(request)
+        if not slots.acquire(timeout=wait):
+            with self._lock:
+                self._stats["slot_timeouts"] += 1
+            raise httpx.PoolTimeout(
+                f"No free connection slot for {request.url.host} within {wait}s", request=request
+            )
+
+        released = threading.Event()
+
+        def release():
+            if not released.is_set():
+                released.set()
+                slots.release()
+
+        with self._lock:
+            self._stats["requests"] += 1
+
+        try:
+            response = super().handle_request(request)
+        except Exception:
+            with self._lock:
+                self._stats["errors"] += 1
+            release()
+            raise
+
+        response.stream = _ReleasingStream(response.stream, release)
+        return response
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+        stats["reused_connections"] = max(0, stats["requests"] - stats["new_connections"] - stats["errors"])
+        stats["reuse_ratio"] = round(stats["reused_connections"] / stats["requests"], 4) if stats["requests"] else 0.0
+        return stats
+
+
+class SharedHttpClient(httpx.Client):
+    """
+    Process-wide httpx client injected into every OpenAI client built from llm_config.
+
+    AutoGen deep-copies llm_config for each agent; returning self from __deepcopy__ keeps
+    all agents (and the GroupChatManager) on this one connection pool.
+    """
+
+    def __init__(self, pool_size: int = 100, keepalive: int = 20, max_per_host: int = 20,
+                 keepalive_expiry: float = 60.0, timeout: float = 120.0, rate_limiter=None, replay=None):
+        self.transport = PooledTransport(
+            max_per_host=max_per_host,
+            rate_limiter=rate_limiter,
+            replay=replay,
+            limits=httpx.Limits(
+                max_connections=pool_size,
+                max_keepalive_connections=keepalive,
+                keepalive_expiry=keepalive_expiry,
+            ),
+        )
+        super().__init__(transport=self.transport, timeout=timeout)
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def warm_up(self, base_url: str, connections: int = 2, timeout: float = 5.0) -> int:
+        """
+        Opens `connections` keep-alive connections to the LLM endpoint ahead of the first
+        request (TLS handshake included). Failures are ignored.
+
+        Returns:
+        - Number of warm-up requests that got a response
+        """
+        url = base_url.rstrip("/") + "/models"
+
+        def ping(_):
+            try:
+                self.get(url, timeout=timeout)
+                return 1
+            except httpx.HTTPError:
+                return 0
+
+        with ThreadPoolExecutor(max_workers=max(1, connections)) as executor:
+            return sum(executor.map(ping, range(connections)))
+
+    def start_warm_up(self, base_url: str, connections: int = 2, timeout: float = 5.0):
+        """
+        Runs warm_up() in a daemon thread, so start-up does not wait on the network.
+
+        Returns:
+        - The started thread, or None when `connections` is 0
+        """
+        if connections <= 0:
+            return None
+        thread = threading.Thread(target=self.warm_up, args=(base_url, connections, timeout),
+                                  name="http-warm-up", daemon=True)
+        thread.start()
+        return thread
+
+    def stats(self) -> dict:
+        return self.transport.stats()
+
+
+class _AsyncReleasingStream(httpx.AsyncByteStream):
+    """
+    Async counterpart of _ReleasingStream.
+    """
+
+    def __init__(self, stream, release):
+        self._stream = stream
+        self._release = release
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self):
+        try:
+            await self._stream.aclose()
+        finally:
+            self._release()
+
+
+class _AsyncObservedStream(httpx.AsyncByteStream):
+    """
+    Async counterpart of _ObservedStream.
+    """
+
+    def __init__(self, stream, on_complete):
+        self._stream = stream
+        self._on_complete = on_complete
+        self._chunks = []
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            self._chunks.append(chunk)
+            yield chunk
+
+    async def aclose(self):
+        try:
+            await self._stream.aclose()
+        finally:
+            self._on_complete(b"".join(self._chunks))
+
+
+class AsyncPooledTransport(httpx.AsyncHTTPTransport):
+    """
+    Async counterpart of PooledTransport for the async serving path: the same per-host
+    connection limit (waiting suspends only the calling coroutine), rate limiter
+    (RateLimiter.a_send), observers and replay store.
+
+    Connections are split over `shards` independent httpcore pools (`limits` divided
+    between them), each request going to the least busy one: httpcore matches queued
+    requests to connections with a scan over the whole pool on every event, which gets
+    quadratic with hundreds of connections in one pool.
+    """
+
+    def __init__(self, max_per_host: int = 100, rate_limiter=None, replay=None, shards: int = 1,
+                 limits: httpx.Limits = httpx.Limits(), **kwargs):
+        super().__init__(limits=limits, **kwargs)
+        self.max_per_host = max_per_host
+        self.rate_limiter = rate_limiter
+        self.replay = replay
+        shard_limits = httpx.Limits(
+            max_connections=max(1, limits.max_connections // shards) if limits.max_connections else None,
+            max_keepalive_connections=(max(1, limits.max_keepalive_connections // shards)
+                                       if limits.max_keepalive_connections else limits.max_keepalive_connections),
+            keepalive_expiry=limits.keepalive_expiry,
+        )
+        self._shards = [httpx.AsyncHTTPTransport(limits=shard_limits, **kwargs) for _ in range(max(1, shards))]
+        self._shard_load = [0] * len(self._shards)
+        self._lock = threading.Lock()
+        self._host_slots = {}
+        self._observers = []
+        self._stats = {"requests": 0, "new_connections": 0, "errors": 0, "slot_timeouts": 0}
+
+    def _slots(self, host: str) -> asyncio.Semaphore:
+        with self._lock:
+            if host not in self._host_slots:
+                self._host_slots[host] = asyncio.Semaphore(self.max_per_host)
+            return self._host_slots[host]
+
+    def add_observer(self, observer) -> None:
+        self._observers.append(observer)
+
+    def _notify(self, request, response, body, elapsed) -> None:
+        for observer in self._observers:
+            try:
+                observer(request, response, body, elapsed)
+            except Exception:
+                pass
+
+    async def _trace(self, event_name, info):
+        if event_name == "connection.connect_tcp.complete":
+            with self._lock:
+                self._stats["new_connections"] += 1
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        previous_trace = request.extensions.get("trace")
+
+        async def trace(event_name, info):
+            await self._trace(event_name, info)
+            if previous_trace is not None:
+                await previous_trace(event_name, info)
+
+        request.extensions = {**request.extensions, "trace": trace}
+
+        if request.method != "POST":
+            return await self._send(request)
+
+        start = time.perf_counter()
+        try:
+            response = None
+            if self.replay is not None:
+                # Recorded latency is slept in a worker thread, not on the event loop
+                response = (await asyncio.to_thread(self.replay.respond, request) if self.replay.latency_scale
+                            else self.replay.respond(request))
+            if response is None:
+                response = await self._send_limited(request)
+        except BaseException:
+            self._notify(request, None, b"", time.perf_counter() - start)
+            raise
+
+        if self._observers:
+            response.stream = _AsyncObservedStream(
+                response.stream,
+                lambda body: self._notify(request, response, body, time.perf_counter() - start)
+            )
+        return response
+
+    async def _send_limited(self, request: httpx.Request) -> httpx.Response:
+        if self.rate_limiter is None:
+            return await self._send(request)
+        return await self.rate_limiter.a_send(lambda: self._send(request), estimate_request_tokens(request.content))
+
+    async def _send(self, request: httpx.Request) -> httpx.Response:
+        slots = self._slots(request.url.host)
+        wait = _pool_timeout(request)
+        try:
+            await asyncio.wait_for(slots.acquire(), wait)
+        except asyncio.TimeoutError:
+            with self._lock:
+                self._stats["slot_timeouts"] += 1
+            raise httpx.PoolTimeout(
+                f"No free connection slot for {request.url.host} within {wait}s", request=request
+            ) from None
+
+        with self._lock:
+            self._stats["requests"] += 1
+
+        shard = min(range(len(self._shards)), key=self._shard_load.__getitem__)
+        self._shard_load[shard] += 1
+        released = False
+
+        def release():
+            nonlocal released
+            if not released:
+                released = True
+                self._shard_load[shard] -= 1
+                slots.release()
+
+        try:
+            response = await self._shards[shard].handle_async_request(request)
+        except BaseException:
+            with self._lock:
+                self._stats["errors"] += 1
+            release()
+            raise
+
+        response.stream = _AsyncReleasingStream(response.stream, release)
+        return response
+
+    async def aclose(self) -> None:
+        for shard in self._shards:
+            await shard.aclose()
+        await super().aclose()
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+        stats["reused_connections"] = max(0, stats["requests"] - stats["new_connections"] - stats["errors"])
+        stats["reuse_ratio"] = round(stats["reused_connections"] / stats["requests"], 4) if stats["requests"] else 0.0
+        return stats
+
+
+class AsyncSharedHttpClient(httpx.AsyncClient):
+    """
+    Process-wide async httpx client used by the AsyncOpenAI clients of the async serving
+    path (core.agent_chat.a_ask_agent). Defaults allow far more concurrent connections
+    than the threaded client, since a waiting request costs a coroutine, not a thread.
+    """
+
+    def __init__(self, pool_size: int = 1000, keepalive: int = 100, max_per_host: int = 500,
+                 keepalive_expiry: float = 60.0, timeout: float = 120.0, rate_limiter=None, replay=None,
+                 shards: int = 8):
+        self.transport = AsyncPooledTransport(
+            max_per_host=max_per_host,
+            rate_limiter=rate_limiter,
+            replay=replay,
+            shards=shards,
+            limits=httpx.Limits(
+                max_connections=pool_size,
+                max_keepalive_connections=keepalive,
+                keepalive_expiry=keepalive_expiry,
+            ),
+        )
+        super().__init__(transport=self.transport, timeout=timeout)
+
+    def stats(self) -> dict:
+        return self.transport.stats()
+
+
+_http_client = None
+_http_client_lock = threading.Lock()
+
+
+def configure_http_client(**kwargs) -> SharedHttpClient:
+    """
+    Replaces the process-wide client (closing the old one). See SharedHttpClient for options.
+    """
+    global _http_client
+    with _http_client_lock:
+        if _http_client is not None:
+            _http_client.close()
+        _http_client = SharedHttpClient(**kwargs)
+        return _http_client
+
+
+def get_http_client() -> SharedHttpClient:
+    global _http_client
+    with _http_client_lock:
+        if _http_client is None:
+            _http_client = SharedHttpClient()
+        return _http_client
+
+
+_async_http_client = None
+
+
+def configure_async_http_client(**kwargs) -> AsyncSharedHttpClient:
+    """
+    Creates the process-wide async client (see AsyncSharedHttpClient for options). Call it
+    before the event loop starts serving; the previous client is not closed.
+    """
+    global _async_http_client
+    with _http_client_lock:
+        _async_http_client = AsyncSharedHttpClient(**kwargs)
+        return _async_http_client
+
+
+def get_async_http_client():
+    return _async_http_client
@@ -0,0 +1,345 @@
+# backend/ingest.py
+
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from core.activity_features import INTENSITY_BUCKETS, to_acceleration_array
+
+# Window sizes (fixed per user; see UserStream.memory_bytes)
+VITALS_WINDOW = 900              # HR / EDA / skin temperature readings kept (15 min at 1 Hz)
+ACCELERATION_WINDOW = 15000      # 3-axis samples kept (5 min at 50 Hz)
+
+# Trigger rules: a reading must stay abnormal for TRIGGER_WINDOW_SECONDS while at rest
+TRIGGER_WINDOW_SECONDS = 60
+TRIGGER_MIN_READINGS = 10
+TRIGGER_SUSTAINED_FRACTION = 0.8
+HR_SPIKE_BPM = 20                # above the user's rolling baseline → stress check
+EDA_SPIKE_RATIO = 1.5            # × baseline EDA → stress check
+HR_HIGH_BPM = 130                # absolute, at rest → anomaly check
+HR_LOW_BPM = 40
+REST_ENMO_G = INTENSITY_BUCKETS[0][2]   # below the sedentary cut point = not exercising
+BASELINE_ALPHA = 0.01            # EWMA weight of each non-spike reading in the baseline
+BASELINE_MIN_READINGS = 60
+TRIGGER_COOLDOWN_SECONDS = 600
+EVENTS_KEPT = 20
+
+GRAVITY_G = 1.0
+
+
+class RollingWindow:
+    """
+    Fixed-capacity ring buffer of timestamped float readings with O(1) rolling mean / std
+    (running sum and sum of squares updated on append and eviction).
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.ts = np.zeros(capacity, dtype=np.float64)
+        self.values = np.zeros(capacity, dtype=np.float32)
+        self.size = 0
+        self._next = 0
+        self._sum = 0.0
+        self._sumsq = 0.0
+
+    def append(self, ts: float, value: float) -> None:
+        if self.size == self.capacity:
+            old = float(self.values[self._next])
+            self._sum -= old
+            self._sumsq -= old * old
+        else:
+            self.size += 1
+        self.ts[self._next] = ts
+        self.values[self._next] = value
+        self._sum += value
+        self._sumsq += value * value
+        self._next = (self._next + 1) % self.capacity
+
+    def mean(self):
+        return self._sum / self.size if self.size else None
+
+    def std(self):
+        if not self.size:
+            return None
+        mean = self._sum / self.size
+        return max(0.0, self._sumsq / self.size - mean * mean) ** 0.5
+
+    def last(self):
+        return float(self.values[(self._next - 1) % self.capacity]) if self.size else None
+
+    def since(self, ts: float) -> np.ndarray:
+        """
+        Readings with timestamp >= ts, oldest first.
+        """
+        if not self.size:
+            return self.values[:0]
+        order = np.arange(self._next - self.size, self._next) % self.capacity
+        mask = self.ts[order] >= ts
+        return self.values[order[mask]]
+
+    @property
+    def nbytes(self) -> int:
+        return self.ts.nbytes + self.values.nbytes
+
+
+class AccelerationWindow:
+    """
+    Ring buffer of the latest 3-axis samples plus a rolling window of per-chunk ENMO means.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.samples = np.zeros((capacity, 3), dtype=np.float32)
+        self.size = 0
+        self._next = 0
+        self.enmo = RollingWindow(VITALS_WINDOW)
+
+    def extend(self, ts: float, acc: np.ndarray) -> None:
+        acc = acc[-self.capacity:]
+        n = acc.shape[0]
+        end = self._next + n
+        if end <= self.capacity:
+            self.samples[self._next:end] = acc
+        else:
+            split = self.capacity - self._next
+            self.samples[self._next:] = acc[:split]
+            self.samples[:n - split] = acc[split:]
+        self._next = end % self.capacity
+        self.size = min(self.capacity, self.size + n)
+
+        magnitude = np.sqrt(np.einsum("ij,ij->i", acc, acc))
+        self.enmo.append(ts, float(np.maximum(magnitude - GRAVITY_G, 0.0).mean()))
+
+    def ordered(self) -> np.ndarray:
+        """
+        Copy of the buffered samples, oldest first.
+        """
+        if self.size < self.capacity:
+            return self.samples[:self.size].copy()
+        return np.concatenate([self.samples[self._next:], self.samples[:self._next]])
+
+    @property
+    def nbytes(self) -> int:
+        return self.samples.nbytes + self.enmo.nbytes
+
+
+class UserStream:
+    """
+    Rolling sensor windows, baselines and trigger state of one user.
+
+    Memory is fixed at creation: `memory_bytes` is 223,200 bytes (~218 KiB) with the
+    default window sizes, whatever the upload rate.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.heart_rate = RollingWindow(VITALS_WINDOW)
+        self.eda = RollingWindow(VITALS_WINDOW)
+        self.skin_temperature = RollingWindow(VITALS_WINDOW)
+        self.acceleration = AccelerationWindow(ACCELERATION_WINDOW)
+        self.baseline = {"heart_rate": None, "eda": None}
+        self.baseline_readings = {"heart_rate": 0, "eda": 0}
+        self.last_trigger = 0.0
+        self.last_seen = 0.0
+        self.readings = 0
+        self.events = deque(maxlen=EVENTS_KEPT)
+
+    @property
+    def memory_bytes(self) -> int:
+        return self.heart_rate.nbytes + self.eda.nbytes + self.skin_temperature.nbytes + self.acceleration.nbytes
+
+    def _update_baseline(self, signal: str, value: float, spike: bool) -> None:
+        baseline = self.baseline[signal]
+        if baseline is None:
+            self.baseline[signal] = value
+        elif not spike:
+            self.baseline[signal] = baseline + BASELINE_ALPHA * (value - baseline)
+        self.baseline_readings[signal] += 1
+
+    def add(self, record: dict, now: float) -> None:
+        """
+        Adds one ingested record: {"ts", "heart_rate", "eda", "skin_temperature", "acceleration"},
+        every field optional.
+        """
+        ts = float(record.get("ts") or now)
+        hr = record.get("heart_rate")
+        if isinstance(hr, (int, float)):
+            baseline = self.baseline["heart_rate"]
+            self._update_baseline("heart_rate", hr, baseline is not None and hr > baseline + HR_SPIKE_BPM)
+            self.heart_rate.append(ts, hr)
+        eda = record.get("eda")
+        if isinstance(eda, (int, float)):
+            baseline = self.baseline["eda"]
+            self._update_baseline("eda", eda, baseline is not None and eda > baseline * EDA_SPIKE_RATIO)
+            self.eda.append(ts, eda)
+        temp = record.get("skin_temperature")
+        if isinstance(temp, (int, float)):
+            self.skin_temperature.append(ts, temp)
+        acc = to_acceleration_array(record.get("acceleration"))
+        if acc is not None:
+            self.acceleration.extend(ts, acc)
+        self.readings += 1
+        self.last_seen = ts
+
+    def check_trigger(self, now: float):
+        """
+        Returns "hr_extreme" (→ anomaly check), "stress_spike" (→ stress check) or None.
+        """
+        if now - self.last_trigger < TRIGGER_COOLDOWN_SECONDS:
+            return None
+
+        start = self.last_seen - TRIGGER_WINDOW_SECONDS
+        movement = self.acceleration.enmo.since(start)
+        if movement.size and float(movement.mean()) >= REST_ENMO_G:
+            return None  # elevated vitals while exercising are expected
+
+        def sustained(values, predicate):
+            return values.size >= TRIGGER_MIN_READINGS and float(predicate(values).mean()) >= TRIGGER_SUSTAINED_FRACTION
+
+        hr = self.heart_rate.since(start)
+        if sustained(hr, lambda v: (v >= HR_HIGH_BPM) | (v <= HR_LOW_BPM)):
+            return "hr_extreme"
+
+        hr_base = self.baseline["heart_rate"]
+        if hr_base is not None and self.baseline_readings["heart_rate"] >= BASELINE_MIN_READINGS and \
+                sustained(hr, lambda v: v > hr_base + HR_SPIKE_BPM):
+            return "stress_spike"
+
+        eda_base = self.baseline["eda"]
+        eda = self.eda.since(start)
+        if eda_base and self.baseline_readings["eda"] >= BASELINE_MIN_READINGS and \
+                sustained(eda, lambda v: v > eda_base * EDA_SPIKE_RATIO):
+            return "stress_spike"
+        return None
+
+    def snapshot(self) -> dict:
+        """
+        Current window as an /analyze_stress style payload (recent means + raw acceleration).
+        """
+        start = self.last_seen - TRIGGER_WINDOW_SECONDS
+
+        def recent_mean(window):
+            values = window.since(start)
+            return round(float(values.mean()), 2) if values.size else None
+
+        return {
+            "heart_rate": recent_mean(self.heart_rate),
+            "eda": recent_mean(self.eda),
+            "skin_temperature": self.skin_temperature.last(),
+            "acceleration": self.acceleration.ordered() if self.acceleration.size else None,
+            "baseline_heart_rate": round(self.baseline["heart_rate"], 1) if self.baseline["heart_rate"] else None,
+            "baseline_eda": round(self.baseline["eda"], 2) if self.baseline["eda"] else None,
+        }
+
+    def stats(self) -> dict:
+        def summary(window):
+            mean, std, last = window.mean(), window.std(), window.last()
+            return {"count": window.size, "mean": round(mean, 2) if mean is not None else None,
+                    "std": round(std, 2) if std is not None else None,
+                    "last": round(last, 2) if last is not None else None}
+
+        return {
+            "readings": self.readings,
+            "last_seen": self.last_seen,
+            "heart_rate": summary(self.heart_rate),
+            "eda": summary(self.eda),
+            "skin_temperature": summary(self.skin_temperature),
+            "acceleration_samples": self.acceleration.size,
+            "baseline": {k: round(v, 2) if v is not None else None for k, v in self.baseline.items()},
+            "memory_bytes": self.memory_bytes,
+        }
+
+
+class StreamIngestor:
+    """
+    Keeps per-user rolling windows for streamed sensor chunks and runs an analysis only
+    when a local trigger fires (sustained HR / EDA spike or extreme HR at rest).
+
+    Parameters:
+    - on_trigger: callable(user_id, trigger, snapshot) -> result dict, run in a worker thread
+    - max_users: Users kept in memory; the least recently active user is dropped beyond this,
+      so total memory is bounded by max_users × UserStream.memory_bytes
+    - workers: Concurrent trigger analyses
+    """
+
+    def __init__(self, on_trigger, max_users: int = 1000, workers: int = 2):
+        self.on_trigger = on_trigger
+        self.max_users = max_users
+        self._users = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ingest-trigger")
+        self._stats = {"records": 0, "rejected": 0, "triggers": 0, "analyses_failed": 0, "evicted_users": 0}
+        self.memory_bytes_per_user = UserStream().memory_bytes
+
+    def _user(self, user_id: str) -> UserStream:
+        with self._lock:
+            stream = self._users.get(user_id)
+            if stream is None:
+                stream = self._users[user_id] = UserStream()
+                while len(self._users) > self.max_users:
+                    self._users.popitem(last=False)
+                    self._stats["evicted_users"] += 1
+            else:
+                self._users.move_to_end(user_id)
+            return stream
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self._stats[key] += 1
+
+    def ingest(self, user_id: str, record: dict):
+        """
+        Adds one record for `user_id`. Returns the trigger name if one fired, else None.
+        """
+        if not isinstance(record, dict):
+            self._count("rejected")
+            return None
+
+        now = time.time()
+        stream = self._user(user_id)
+        with stream.lock:
+            try:
+                stream.add(record, now)
+            except (TypeError, ValueError):
+                self._count("rejected")
+                return None
+            trigger = stream.check_trigger(stream.last_seen)
+            if trigger is None:
+                self._count("records")
+                return None
+            stream.last_trigger = stream.last_seen
+            snapshot = stream.snapshot()
+            event = {"trigger": trigger, "ts": stream.last_trigger, "status": "running", "result": None, "error": None}
+            stream.events.append(event)
+
+        self._count("records")
+        self._count("triggers")
+        self._executor.submit(self._analyse, user_id, trigger, snapshot, event)
+        return trigger
+
+    def _analyse(self, user_id, trigger, snapshot, event) -> None:
+        try:
+            event["result"] = self.on_trigger(user_id, trigger, snapshot)
+            event["status"] = "succeeded"
+        except Exception as e:
+            event["error"] = str(e)
+            event["status"] = "failed"
+            self._count("analyses_failed")
+
+    def user_state(self, user_id: str):
+        with self._lock:
+            stream = self._users.get(user_id)
+        if stream is None:
+            return None
+        with stream.lock:
+            return dict(stream.stats(), events=[dict(e) for e in stream.events])
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats, users=len(self._users))
+        stats["memory_bytes_per_user"] = self.memory_bytes_per_user
+        stats["memory_bytes_max"] = self.memory_bytes_per_user * self.max_users
+        return stats
@@ -0,0 +1,219 @@
+# backend/jobs.py
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+JOB_STATUSES = ("queued", "running", "succeeded", "failed")
+
+
+class JobQueueFull(Exception):
+    """
+    Raised when too many jobs are already waiting to run.
+    """
+
+
+def idempotency_key_for(payload: dict) -> str:
+    """
+    Derives an idempotency key from the canonical JSON form of a payload, used when
+    the client does not send an Idempotency-Key header. Such keys only dedup while the
+    job is unfinished or recently finished (JobQueue.derived_key_ttl).
+    """
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return "sha256:" + hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class JobStore:
+    """
+    SQLite-backed job table; jobs, partial stage results and final outputs survive restarts.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, idempotency_key TEXT UNIQUE, status TEXT NOT NULL, "
+            "payload TEXT NOT NULL, stages TEXT NOT NULL DEFAULT '{}', result TEXT, error TEXT, "
+            "created REAL NOT NULL, updated REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status)")
+        self._db.commit()
+
+    @staticmethod
+    def _to_dict(row) -> dict:
+        job_id, key, status, payload, stages, result, error, created, updated = row
+        return {
+            "job_id": job_id,
+            "idempotency_key": key,
+            "status": status,
+            "payload": json.loads(payload),
+            "stages": json.loads(stages),
+            "results": json.loads(result) if result else None,
+            "error": error,
+            "created": created,
+            "updated": updated,
+        }
+
+    def get(self, job_id: str) -> dict:
+        with self._lock:
+            row = self._db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    @staticmethod
+    def _reusable(row, ttl: float, now: float) -> bool:
+        status, updated = row[2], row[8]
+        if status == "failed":
+            return False
+        return ttl is None or status in ("queued", "running") or now - updated < ttl
+
+    def find(self, idempotency_key: str, ttl: float = None) -> dict:
+        """
+        The job a submission with this key would reuse, or None (see get_or_create).
+        """
+        with self._lock:
+            row = self._db.execute("SELECT * FROM jobs WHERE idempotency_key = ?", (idempotency_key,)).fetchone()
+        return self._to_dict(row) if row is not None and self._reusable(row, ttl, time.time()) else None
+
+    def get_or_create(self, idempotency_key: str, payload: dict, ttl: float = None):
+        """
+        Returns (job, created). An existing job with the same key is reused unless it
+        failed, in which case it is reset and queued again. With a `ttl`, a job that
+        finished more than `ttl` seconds ago is not reused either: it keeps its id and
+        results but gives up the key, and a new job is created.
+        """
+        now = time.time()
+        with self._lock:
+            row = self._db.execute("SELECT * FROM jobs WHERE idempotency_key = ?", (idempotency_key,)).fetchone()
+            if row is not None and self._reusable(row, ttl, now):
+                return self._to_dict(row), False
+
+            if row is not None and row[2] != "failed":
+                self._db.execute("UPDATE jobs SET idempotency_key = NULL WHERE id = ?", (row[0],))
+                row = None
+
+            if row is not None:
+                job_id = row[0]
+                self._db.execute(
+                    "UPDATE jobs SET status = 'queued', payload = ?, stages = '{}', result = NULL, error = NULL, "
+                    "updated = ? WHERE id = ?",
+                    (json.dumps(payload), now, job_id),
+                )
+            else:
+                job_id = uuid.uuid4().hex
+                self._db.execute(
+                    "INSERT INTO jobs (id, idempotency_key, status, payload, created, updated) "
+                    "VALUES (?, ?, 'queued', ?, ?, ?)",
+                    (job_id, idempotency_key, json.dumps(payload), now, now),
+                )
+            self._db.commit()
+            row = self._db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_dict(row), True
+
+    def set_status(self, job_id: str, status: str, result: dict = None, error: str = None) -> None:
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, updated = ? WHERE id = ?",
+                (status, json.dumps(result) if result is not None else None, error, time.time(), job_id),
+            )
+            self._db.commit()
+
+    def record_stage(self, job_id: str, stage: str, data: dict) -> None:
+        with self._lock:
+            row = self._db.execute("SELECT stages FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return
+            stages = json.loads(row[0])
+            stages[stage] = data
+            self._db.execute(
+                "UPDATE jobs SET stages = ?, updated = ? WHERE id = ?",
+                (json.dumps(stages), time.time(), job_id),
+            )
+            self._db.commit()
+
+    def unfinished(self) -> list:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT id FROM jobs WHERE status IN ('queued', 'running') ORDER BY created"
+            ).fetchall()
+        return [r[0] for r in rows]
+
+    def count(self, status: str) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM jobs WHERE status = ?", (status,)).fetchone()[0]
+
+
+class JobQueue:
+    """
+    Bounded local worker pool that runs queued jobs from a JobStore.
+
+    Parameters:
+    - store: JobStore holding the jobs
+    - run_job: callable(payload, on_stage) -> results dict; on_stage(stage, data) records
+      partial results as the job progresses
+    - workers: Number of jobs run concurrently
+    - max_pending: Max queued jobs before submit() raises JobQueueFull
+    - derived_key_ttl: Seconds a finished job answers identical submissions sent without
+      an Idempotency-Key (queued / running ones always do); None keeps them forever
+
+    Jobs left queued or running by a previous process are resumed on start-up.
+    """
+
+    def __init__(self, store: JobStore, run_job, workers: int = 2, max_pending: int = 100,
+                 derived_key_ttl: float = 3600.0):
+        self.store = store
+        self.run_job = run_job
+        self.max_pending = max_pending
+        self.derived_key_ttl = derived_key_ttl
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job-worker")
+
+        for job_id in store.unfinished():
+            self._executor.submit(self._execute, job_id)
+
+    def submit(self, payload: dict, idempotency_key: str = None):
+        """
+        Enqueues a job (or returns the existing one for the same idempotency key).
+
+        Returns:
+        - (job dict, created flag)
+        """
+        key = idempotency_key or idempotency_key_for(payload)
+        ttl = None if idempotency_key else self.derived_key_ttl
+
+        # A retried submission gets its job back even when the queue is full
+        job = self.store.find(key, ttl)
+        if job is not None:
+            return job, False
+        if self.store.count("queued") >= self.max_pending:
+            raise JobQueueFull(f"{self.max_pending} jobs are already queued, please retry later.")
+
+        job, created = self.store.get_or_create(key, payload, ttl)
+        if created:
+            self._executor.submit(self._execute, job["job_id"])
+        return job, created
+
+    def get(self, job_id: str) -> dict:
+        return self.store.get(job_id)
+
+    def _execute(self, job_id: str) -> None:
+        job = self.store.get(job_id)
+        if job is None or job["status"] not in ("queued", "running"):
+            return
+
+        self.store.set_status(job_id, "running")
+        try:
+            results = self.run_job(
+                job["payload"],
+                lambda stage, data: self.store.record_stage(job_id, stage, data)
+            )
+            self.store.set_status(job_id, "succeeded", result=results)
+        except Exception as e:
+            self.store.set_status(job_id, "failed", error=str(e))
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._executor.shutdown(wait=wait)
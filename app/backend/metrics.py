@@ -0,0 +1,316 @@
+# backend/metrics.py
+
+import bisect
+import json
+import threading
+import time
+
+from core.agent_chat import current_agent
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, float("inf"))
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=None) -> str:
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(labels.get(name, "") for name in self.labelnames)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = [(key, (list(counts), total, count)) for key, (counts, total, count) in self._values.items()]
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, ("le", _format_value(bound)))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class Registry:
+    """
+    In-process metric registry rendered in the Prometheus text exposition format.
+
+    Metrics are updated on the hot path with one dict update under a lock; stats dicts
+    from other components (cache, pools, limiter) are only read at scrape time.
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text, labelnames=()) -> Counter:
+        return self.register(Counter(name, help_text, labelnames))
+
+    def gauge(self, name, help_text, labelnames=()) -> Gauge:
+        return self.register(Gauge(name, help_text, labelnames))
+
+    def histogram(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help_text, labelnames, buckets))
+
+    def add_stats_collector(self, prefix: str, stats_fn, label: str = "name") -> None:
+        """
+        Exposes a component's stats() dict as gauges named `<prefix>_<key>`; nested dicts
+        (e.g. {agent: {...}} per-agent stats) are labelled with `label`=<outer key>.
+        """
+        self._collectors.append((prefix, stats_fn, label))
+
+    def _collect_stats(self) -> list:
+        lines = []
+        for prefix, stats_fn, label in self._collectors:
+            try:
+                stats = stats_fn()
+            except Exception:
+                continue
+            series = {}
+            for key, value in stats.items():
+                if isinstance(value, dict):
+                    for sub_key, sub_value in value.items():
+                        series.setdefault(f"{prefix}_{sub_key}", []).append(((label, key), sub_value))
+                else:
+                    series.setdefault(f"{prefix}_{key}", []).append((None, value))
+
+            for name, samples in series.items():
+                numeric = [(lbl, v) for lbl, v in samples if isinstance(v, (int, float)) and not isinstance(v, bool)]
+                if not numeric:
+                    continue
+                lines.append(f"# TYPE {name} gauge")
+                for lbl, value in numeric:
+                    lines.append(f"{name}{_format_labels((), (), lbl)} {_format_value(value)}")
+        return lines
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        lines.extend(self._collect_stats())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+HTTP_REQUESTS = REGISTRY.counter(
+    "http_requests_total", "HTTP requests handled, by route, method and status.", ("route", "method", "status"))
+HTTP_LATENCY = REGISTRY.histogram(
+    "http_request_duration_seconds", "HTTP request latency by route.", ("route",))
+HTTP_IN_FLIGHT = REGISTRY.gauge(
+    "http_requests_in_flight", "HTTP requests currently being handled, by route.", ("route",))
+ERRORS = REGISTRY.counter(
+    "errors_total", "Errors raised while handling requests, by route and exception type.", ("route", "type"))
+
+LLM_REQUESTS = REGISTRY.counter(
+    "llm_requests_total", "Outgoing LLM HTTP requests by agent, model and status.", ("agent", "model", "status"))
+LLM_LATENCY = REGISTRY.histogram(
+    "llm_request_duration_seconds", "Outgoing LLM request latency (to end of body) by agent.", ("agent",))
+LLM_PROMPT_TOKENS = REGISTRY.counter(
+    "llm_prompt_tokens_total", "Prompt tokens reported in LLM usage fields.", ("agent", "model"))
+LLM_COMPLETION_TOKENS = REGISTRY.counter(
+    "llm_completion_tokens_total", "Completion tokens reported in LLM usage fields.", ("agent", "model"))
+
+
+def observe_llm_response(agent, model, status, elapsed, usage) -> None:
+    """
+    Records one finished LLM HTTP call (`usage` is the response's usage dict, if any).
+    """
+    agent = agent or "unknown"
+    model = model or "unknown"
+    LLM_REQUESTS.inc(agent=agent, model=model, status=str(status))
+    LLM_LATENCY.observe(elapsed, agent=agent)
+    if usage:
+        LLM_PROMPT_TOKENS.inc(usage.get("prompt_tokens") or 0, agent=agent, model=model)
+        LLM_COMPLETION_TOKENS.inc(usage.get("completion_tokens") or 0, agent=agent, model=model)
+
+
+def _response_usage(response, body: bytes):
+    """
+    The `usage` dict of a chat completion body (JSON, or the last SSE chunk carrying one).
+    """
+    if not body:
+        return None
+    if "text/event-stream" in response.headers.get("content-type", ""):
+        for line in reversed(body.splitlines()):
+            if line.startswith(b"data:") and b'"usage"' in line:
+                try:
+                    return json.loads(line[5:]).get("usage")
+                except ValueError:
+                    return None
+        return None
+    try:
+        return json.loads(body).get("usage")
+    except (ValueError, AttributeError):
+        return None
+
+
+def llm_metrics_observer(request, response, body, elapsed) -> None:
+    """
+    PooledTransport observer feeding the llm_* metrics; the agent label comes from
+    core.agent_chat.current_agent.
+    """
+    try:
+        model = json.loads(request.content or b"{}").get("model")
+    except (ValueError, AttributeError):
+        model = None
+    if response is None:
+        observe_llm_response(current_agent.get(), model, "error", elapsed, None)
+        return
+    usage = _response_usage(response, body) if response.status_code < 400 else None
+    observe_llm_response(current_agent.get(), model, response.status_code, elapsed, usage)
+
+
+def _start_request(g, request) -> None:
+    g.metrics_start = time.perf_counter()
+    g.metrics_route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+    HTTP_IN_FLIGHT.inc(route=g.metrics_route)
+
+
+def _record_request(g, request, response) -> None:
+    route = g.get("metrics_route", "unmatched")
+    HTTP_REQUESTS.inc(route=route, method=request.method, status=str(response.status_code))
+    HTTP_LATENCY.observe(time.perf_counter() - g.get("metrics_start", time.perf_counter()), route=route)
+
+
+def _finish_request(g, exc) -> None:
+    if "metrics_route" in g:
+        HTTP_IN_FLIGHT.dec(route=g.metrics_route)
+        if exc is not None:
+            ERRORS.inc(route=g.metrics_route, type=type(exc).__name__)
+
+
+def instrument_flask(app) -> None:
+    """
+    Adds per-route latency, status and in-flight metrics to a Flask app.
+    """
+    from flask import g, request
+
+    @app.before_request
+    def _start_request_metrics():
+        _start_request(g, request)
+
+    @app.after_request
+    def _record_request_metrics(response):
+        _record_request(g, request, response)
+        return response
+
+    @app.teardown_request
+    def _finish_request_metrics(exc):
+        _finish_request(g, exc)
+
+
+def instrument_quart(app) -> None:
+    """
+    Same metrics for the Quart app of the async serving path (async hooks, so Quart
+    does not push them to a worker thread).
+    """
+    from quart import g, request
+
+    @app.before_request
+    async def _start_request_metrics():
+        _start_request(g, request)
+
+    @app.after_request
+    async def _record_request_metrics(response):
+        _record_request(g, request, response)
+        return response
+
+    @app.teardown_request
+    async def _finish_request_metrics(exc):
+        _finish_request(g, exc)
+
+
+def record_error(e: Exception, route: str = None) -> None:
+    """
+    Counts an exception that a route handled itself (turned into an error response).
+    `route` defaults to the current Flask request's route ("background" outside one).
+    """
+    if route is None:
+        from flask import g, has_request_context
+        route = g.get("metrics_route", "unmatched") if has_request_context() else "background"
+    ERRORS.inc(route=route, type=type(e).__name__)
@@ -0,0 +1,378 @@
+# backend/rate_limiter.py
+
+import asyncio
+import json
+import random
+import sys
+import threading
+import time
+from collections import deque
+from email.utils import parsedate_to_datetime
+
+import httpx
+
+# Statuses retried with backoff; 429 additionally shrinks the concurrency limit
+RETRY_STATUSES = (408, 409, 429, 500, 502, 503, 504)
+
+
+def estimate_request_tokens(content: bytes) -> int:
+    """
+    Rough token cost of a chat completion request: ~4 characters per prompt token plus
+    max_tokens, which is how Azure OpenAI counts a request against its TPM quota.
+    """
+    try:
+        body = json.loads(content or b"{}")
+    except ValueError:
+        return 1
+    chars = sum(len(str(m.get("content") or "")) for m in body.get("messages", []))
+    return chars // 4 + int(body.get("max_tokens") or 0) + 1
+
+
+def is_rate_limit_error(e) -> bool:
+    """
+    True for openai.RateLimitError (a 429 left after the limiter's retries). Checked
+    without importing openai: such an error can only exist once the SDK is loaded.
+    """
+    openai = sys.modules.get("openai")
+    return openai is not None and isinstance(e, openai.RateLimitError)
+
+
+def parse_retry_after(response: httpx.Response):
+    """
+    Seconds to wait from a Retry-After / retry-after-ms header, or None.
+    """
+    retry_after_ms = response.headers.get("retry-after-ms")
+    if retry_after_ms:
+        try:
+            return float(retry_after_ms) / 1000.0
+        except ValueError:
+            pass
+
+    retry_after = response.headers.get("retry-after")
+    if not retry_after:
+        return None
+    try:
+        return max(0.0, float(retry_after))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """
+    Token bucket refilled continuously at `per_minute` units per minute; acquire() blocks
+    the calling thread, a_acquire() only the calling coroutine.
+    """
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _take(self, amount: float) -> float:
+        """
+        Takes `amount` units if available (returns 0), else returns the seconds until they are.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= amount:
+                self._tokens -= amount
+                return 0.0
+            return (amount - self._tokens) / self.rate
+
+    def acquire(self, amount: float = 1.0) -> float:
+        """
+        Takes `amount` units, sleeping until they are available. Returns seconds waited.
+        """
+        amount = min(float(amount), self.capacity)
+        waited = 0.0
+        while True:
+            delay = self._take(amount)
+            if not delay:
+                return waited
+            time.sleep(delay)
+            waited += delay
+
+    async def a_acquire(self, amount: float = 1.0) -> float:
+        amount = min(float(amount), self.capacity)
+        waited = 0.0
+        while True:
+            delay = self._take(amount)
+            if not delay:
+                return waited
+            await asyncio.sleep(delay)
+            waited += delay
+
+
+def _resolve(waiter) -> None:
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+class AIMDConcurrency:
+    """
+    Adaptive concurrency limit: +1/limit per successful call (additive increase),
+    multiplied by `decrease_factor` on a 429 (multiplicative decrease). A 429 only
+    shrinks the limit if its request was sent after the previous decrease, so one
+    burst of 429s from already in-flight requests halves the limit once.
+
+    Threads wait in acquire(), coroutines in a_acquire(); both share one limit.
+    """
+
+    def __init__(self, initial: int = 4, minimum: int = 1, maximum: int = 32,
+                 decrease_factor: float = 0.5):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.decrease_factor = decrease_factor
+        self.in_flight = 0
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+        self._async_waiters = deque()
+
+    def acquire(self) -> float:
+        """
+        Waits for a free slot. Returns the send time to pass back to release().
+        """
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                self._cond.wait()
+            self.in_flight += 1
+            return time.monotonic()
+
+    async def a_acquire(self) -> float:
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._cond:
+                if self.in_flight < int(self.limit):
+                    self.in_flight += 1
+                    return time.monotonic()
+                waiter = loop.create_future()
+                self._async_waiters.append((loop, waiter))
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                with self._cond:
+                    try:
+                        self._async_waiters.remove((loop, waiter))
+                    except ValueError:
+                        # Already woken: pass the wake-up on to the next waiter
+                        self._wake_async(1)
+                raise
+
+    def _wake_async(self, count: int) -> None:
+        # Caller holds the condition
+        while count > 0 and self._async_waiters:
+            loop, waiter = self._async_waiters.popleft()
+            if not waiter.done():
+                loop.call_soon_threadsafe(_resolve, waiter)
+                count -= 1
+
+    def release(self, sent_at: float, throttled: bool = False) -> None:
+        with self._cond:
+            self.in_flight -= 1
+            if throttled:
+                if sent_at >= self._last_decrease:
+                    self.limit = max(self.minimum, self.limit * self.decrease_factor)
+                    self._last_decrease = time.monotonic()
+            else:
+                self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+            self._cond.notify_all()
+            self._wake_async(max(1, int(self.limit) - self.in_flight))
+
+
+class RateLimiter:
+    """
+    Client-side limiter wrapped around every outgoing LLM request.
+
+    - Token buckets for requests per minute (`rpm`) and tokens per minute (`tpm`); None = unlimited
+    - AIMD concurrency driven by 429 responses
+    - Retries on RETRY_STATUSES / connection errors with full-jitter exponential backoff,
+      honouring Retry-After; a 429 pauses *all* callers for the advertised delay so
+      retries do not pile up into a storm
+
+    Parameters:
+    - rpm, tpm: Per-minute quotas
+    - initial_concurrency, max_concurrency: AIMD bounds
+    - max_retries: Retries per request before the last response / error is returned
+    - base_backoff, max_backoff: Backoff range in seconds
+    """
+
+    def __init__(self, rpm: float = None, tpm: float = None, initial_concurrency: int = 4,
+                 max_concurrency: int = 32, max_retries: int = 5, base_backoff: float = 0.5,
+                 max_backoff: float = 30.0):
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.tokens = TokenBucket(tpm) if tpm else None
+        self.concurrency = AIMDConcurrency(initial=initial_concurrency, maximum=max_concurrency)
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+
+        self._lock = threading.Lock()
+        self._paused_until = 0.0
+        self._stats = {"calls": 0, "succeeded": 0, "throttled": 0, "retries": 0, "failed": 0, "queued_seconds": 0.0}
+
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.max_backoff, self.base_backoff * (2 ** attempt)))
+
+    def _pause(self, seconds: float) -> None:
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def _pause_delay(self) -> float:
+        with self._lock:
+            return self._paused_until - time.monotonic()
+
+    def _wait_for_pause(self) -> float:
+        delay = self._pause_delay()
+        if delay > 0:
+            time.sleep(delay)
+            return delay
+        return 0.0
+
+    def _failed_attempt(self, sent_at: float, queued: float, attempt: int, last_attempt: bool):
+        """
+        Books a transport error. Returns the backoff before retrying, or None to give up.
+        """
+        self.concurrency.release(sent_at)
+        self._count("queued_seconds", queued)
+        if last_attempt:
+            self._count("failed")
+            return None
+        return self._backoff(attempt)
+
+    def _answered_attempt(self, response: httpx.Response, sent_at: float, queued: float, attempt: int,
+                          last_attempt: bool):
+        """
+        Books a response. Returns the delay before retrying, or None when `response` is final.
+        """
+        throttled = response.status_code == 429
+        self.concurrency.release(sent_at, throttled=throttled)
+        self._count("queued_seconds", queued)
+        if throttled:
+            self._count("throttled")
+
+        if response.status_code not in RETRY_STATUSES:
+            self._count("succeeded" if response.status_code < 400 else "failed")
+            return None
+        if last_attempt:
+            self._count("failed")
+            return None
+
+        retry_after = parse_retry_after(response)
+        delay = retry_after if retry_after is not None else self._backoff(attempt)
+        if throttled:
+            self._pause(delay)
+        return delay
+
+    def send(self, send_request, estimated_tokens: int = 1) -> httpx.Response:
+        """
+        Sends one request through the limiter.
+
+        Parameters:
+        - send_request: Zero-argument callable performing the HTTP request
+        - estimated_tokens: Cost charged against the TPM bucket
+
+        Returns:
+        - The first non-retryable response, or the last response once retries run out
+        """
+        with self._lock:
+            self._stats["calls"] += 1
+
+        attempt = 0
+        while True:
+            queued = self._wait_for_pause()
+            if self.requests is not None:
+                queued += self.requests.acquire(1)
+            if self.tokens is not None:
+                queued += self.tokens.acquire(estimated_tokens)
+            start = time.monotonic()
+            sent_at = self.concurrency.acquire()
+            queued += sent_at - start
+
+            last_attempt = attempt >= self.max_retries
+            try:
+                response = send_request()
+            except httpx.TransportError:
+                delay = self._failed_attempt(sent_at, queued, attempt, last_attempt)
+                if delay is None:
+                    raise
+            except BaseException:
+                # Unexpected (decoding, replay store, interrupt): free the slot before propagating
+                self.concurrency.release(sent_at)
+                raise
+            else:
+                delay = self._answered_attempt(response, sent_at, queued, attempt, last_attempt)
+                if delay is None:
+                    return response
+                # Drain the body so the keep-alive connection goes back to the pool
+                response.read()
+                response.close()
+
+            self._count("retries")
+            attempt += 1
+            time.sleep(delay)
+
+    async def a_send(self, send_request, estimated_tokens: int = 1) -> httpx.Response:
+        """
+        Coroutine version of send(): `send_request` is a zero-argument coroutine function,
+        and every wait (pause, buckets, concurrency, backoff) only suspends the caller.
+        """
+        with self._lock:
+            self._stats["calls"] += 1
+
+        attempt = 0
+        while True:
+            queued = 0.0
+            pause = self._pause_delay()
+            if pause > 0:
+                await asyncio.sleep(pause)
+                queued += pause
+            if self.requests is not None:
+                queued += await self.requests.a_acquire(1)
+            if self.tokens is not None:
+                queued += await self.tokens.a_acquire(estimated_tokens)
+            start = time.monotonic()
+            sent_at = await self.concurrency.a_acquire()
+            queued += sent_at - start
+
+            last_attempt = attempt >= self.max_retries
+            try:
+                response = await send_request()
+            except httpx.TransportError:
+                delay = self._failed_attempt(sent_at, queued, attempt, last_attempt)
+                if delay is None:
+                    raise
+            except BaseException:
+                # Cancelled (client gone) or unexpected: free the slot before propagating
+                self.concurrency.release(sent_at)
+                raise
+            else:
+                delay = self._answered_attempt(response, sent_at, queued, attempt, last_attempt)
+                if delay is None:
+                    return response
+                await response.aread()
+                await response.aclose()
+
+            self._count("retries")
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    def _count(self, key: str, amount: float = 1) -> None:
+        with self._lock:
+            self._stats[key] += amount
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+        stats["queued_seconds"] = round(stats["queued_seconds"], 3)
+        stats["concurrency_limit"] = round(self.concurrency.limit, 2)
+        stats["in_flight"] = self.concurrency.in_flight
+        return stats
@@ -0,0 +1,169 @@
+# backend/sensor_codec.py
+
+import io
+import json
+
+import numpy as np
+from numpy.lib import format as npy_format
+
+MSGPACK_TYPES = ("application/msgpack", "application/x-msgpack", "application/vnd.msgpack")
+NPY_TYPES = ("application/x-npy", "application/npy")
+
+# Raw array dtypes accepted in binary payloads (little-endian floats only)
+ALLOWED_DTYPES = ("<f4", "<f8")
+
+# Longest accepted sensor array: a full day at 50 Hz
+DEFAULT_MAX_SAMPLES = 50 * 60 * 60 * 24
+
+
+class SensorPayloadError(ValueError):
+    """
+    Raised for a malformed binary sensor payload. `status` is the HTTP status to answer with.
+    """
+
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+
+
+def _check_shape(shape, max_samples: int) -> tuple:
+    if not isinstance(shape, (list, tuple)) or not 1 <= len(shape) <= 2 or \
+            not all(isinstance(d, int) and d >= 0 for d in shape):
+        raise SensorPayloadError(f"Invalid array shape: {shape!r}")
+    if shape[0] > max_samples:
+        raise SensorPayloadError(f"Array of {shape[0]} samples exceeds the limit of {max_samples}", status=413)
+    return tuple(shape)
+
+
+def decode_raw_array(spec: dict, max_samples: int = DEFAULT_MAX_SAMPLES) -> np.ndarray:
+    """
+    Wraps a raw array field {"dtype": "<f4", "shape": [n, 3], "data": <bytes>} as a
+    read-only NumPy array over the received bytes (no copy, no per-sample objects).
+    """
+    dtype = spec.get("dtype", "<f8")
+    if dtype not in ALLOWED_DTYPES:
+        raise SensorPayloadError(f"Unsupported dtype {dtype!r}, expected one of {list(ALLOWED_DTYPES)}")
+    shape = _check_shape(spec.get("shape"), max_samples)
+    data = spec.get("data")
+    if not isinstance(data, (bytes, bytearray, memoryview)):
+        raise SensorPayloadError("Array field is missing its binary 'data'")
+
+    dtype = np.dtype(dtype)
+    expected = int(np.prod(shape)) * dtype.itemsize
+    if len(data) != expected:
+        raise SensorPayloadError(f"Array data is {len(data)} bytes, shape {list(shape)} of {dtype.str} needs {expected}")
+    return np.frombuffer(data, dtype=dtype).reshape(shape)
+
+
+def _is_raw_array(value) -> bool:
+    return isinstance(value, dict) and "data" in value and "shape" in value
+
+
+def _decode_fields(value, max_samples: int):
+    if _is_raw_array(value):
+        return decode_raw_array(value, max_samples)
+    if isinstance(value, dict):
+        return {key: _decode_fields(item, max_samples) for key, item in value.items()}
+    return value
+
+
+def decode_msgpack(body: bytes, max_samples: int = DEFAULT_MAX_SAMPLES) -> dict:
+    """
+    Decodes a msgpack map with the same keys as the JSON payload. Array fields may be
+    plain nested lists or raw arrays ({"dtype", "shape", "data"}, see decode_raw_array).
+    """
+    try:
+        import msgpack
+    except ImportError:
+        raise SensorPayloadError("msgpack payloads need the 'msgpack' package on the server", status=415)
+
+    try:
+        payload = msgpack.unpackb(body, raw=False)
+    except (ValueError, msgpack.UnpackException) as e:
+        raise SensorPayloadError(f"Invalid msgpack payload: {type(e).__name__} {e}".strip())
+    if not isinstance(payload, dict):
+        raise SensorPayloadError("msgpack payload must be a map")
+    return _decode_fields(payload, max_samples)
+
+
+def decode_npy(body: bytes, max_samples: int = DEFAULT_MAX_SAMPLES) -> np.ndarray:
+    """
+    Reads a .npy file body as a read-only array view over `body` (header parsed, data not copied).
+    """
+    stream = io.BytesIO(body)
+    try:
+        version = npy_format.read_magic(stream)
+        if version == (1, 0):
+            shape, fortran_order, dtype = npy_format.read_array_header_1_0(stream)
+        else:
+            shape, fortran_order, dtype = npy_format.read_array_header_2_0(stream)
+    except ValueError as e:
+        raise SensorPayloadError(f"Invalid .npy payload: {e}")
+
+    if dtype.str not in ALLOWED_DTYPES:
+        raise SensorPayloadError(f"Unsupported dtype {dtype.str!r}, expected one of {list(ALLOWED_DTYPES)}")
+    shape = _check_shape(shape, max_samples)
+    count = int(np.prod(shape))
+    offset = stream.tell()
+    if len(body) - offset != count * dtype.itemsize:
+        raise SensorPayloadError("Truncated .npy payload")
+
+    array = np.frombuffer(body, dtype=dtype, count=count, offset=offset)
+    return array.reshape(shape[::-1]).T if fortran_order else array.reshape(shape)
+
+
+def _query_value(value: str):
+    try:
+        return int(value)
+    except ValueError:
+        pass
+    try:
+        return float(value)
+    except ValueError:
+        return value
+
+
+def decode_sensor_request(request, max_samples: int = DEFAULT_MAX_SAMPLES):
+    """
+    Reads an /analyze_* payload in any supported encoding:
+
+    - application/json: the original schema (lists of lists)
+    - msgpack (application/msgpack): same keys, array fields optionally raw little-endian
+    - .npy (application/x-npy): the acceleration array as the body; the other fields
+      (heart_rate, sample_rate_hz, ...) come from the query string
+
+    Returns:
+    - The payload dict (None when empty or not JSON, like request.get_json(silent=True))
+    """
+    content_type = (request.mimetype or "").lower()
+    if content_type in MSGPACK_TYPES or content_type in NPY_TYPES:
+        return decode_sensor_body(content_type, request.get_data(cache=False), request.args, max_samples)
+    return request.get_json(silent=True)
+
+
+def decode_sensor_body(mimetype: str, body: bytes, args, max_samples: int = DEFAULT_MAX_SAMPLES):
+    """
+    decode_sensor_request for an already-read body (the async app awaits the body itself).
+
+    Parameters:
+    - mimetype: Request content type without parameters
+    - body: Raw request body
+    - args: Query string mapping (fields of .npy payloads)
+
+    Returns:
+    - The payload dict (None when empty or not JSON)
+    """
+    content_type = (mimetype or "").lower()
+    if content_type in MSGPACK_TYPES:
+        return decode_msgpack(body, max_samples)
+    if content_type in NPY_TYPES:
+        payload = {key: _query_value(value) for key, value in args.items()
+                   if key not in ("cache", "mode", "async")}
+        payload["acceleration"] = decode_npy(body, max_samples)
+        return payload
+    if content_type != "application/json" and not content_type.endswith("+json"):
+        return None
+    try:
+        return json.loads(body)
+    except ValueError:
+        return None
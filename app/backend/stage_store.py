@@ -0,0 +1,61 @@
+# backend/stage_store.py
+
+import hashlib
+import json
+
+import numpy as np
+
+from core.llm_cache import LLMCache
+
+
+def _canonical(value):
+    # JSON encoder fallback: arrays hash by dtype, shape and raw bytes
+    if isinstance(value, np.ndarray):
+        return {"dtype": value.dtype.str, "shape": list(value.shape),
+                "sha256": hashlib.sha256(np.ascontiguousarray(value).tobytes()).hexdigest()}
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Cannot hash {type(value).__name__}")
+
+
+def content_hash(*parts) -> str:
+    """
+    sha256 of the canonical JSON of `parts` (dict key order does not matter).
+    """
+    payload = json.dumps(parts, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=_canonical)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class StageStore(LLMCache):
+    """
+    Content-addressed store of group pipeline stage results.
+
+    Each stage result is stored under a key derived from the stage name and the hashes
+    of its inputs (sensor payload for the analysis branches, upstream results for the
+    later stages), so a re-submission only recomputes the stages whose inputs changed.
+
+    The memory LRU / SQLite tiers are those of core.llm_cache.LLMCache, with JSON values
+    in their own `stage_cache` table (the file may be shared with the LLM cache).
+    """
+
+    def __init__(self, memory_size: int = 4096, disk_path: str = None, ttl: float = 86400, disk_max_entries: int = 100000):
+        super().__init__(memory_size=memory_size, disk_path=disk_path, ttl=ttl, disk_max_entries=disk_max_entries,
+                         table="stage_cache", json_values=True)
+
+
+# Process-wide store used by run_group_health_chat (memory tier only until configured)
+stage_store = StageStore()
+
+
+def configure_stage_store(memory_size: int = 4096, disk_path: str = None, ttl: float = 86400,
+                          disk_max_entries: int = 100000) -> StageStore:
+    """
+    Replaces the process-wide stage store, e.g. to enable the SQLite tier at startup.
+    """
+    global stage_store
+    stage_store = StageStore(memory_size=memory_size, disk_path=disk_path, ttl=ttl, disk_max_entries=disk_max_entries)
+    return stage_store
+
+
+def get_stage_store() -> StageStore:
+    return stage_store
@@ -0,0 +1,149 @@
+# backend/streaming.py
+
+import asyncio
+import json
+import queue
+import threading
+
+from backend.group_summary_chat import PipelineCancelled, a_run_group_health_chat, run_group_health_chat
+
+# Seconds between keep-alive comments while a stage is running; writing them is
+# also how a dropped client connection gets noticed mid-stage.
+HEARTBEAT_SECONDS = 5
+
+
+def format_sse(event: str, data: dict) -> str:
+    """
+    Formats one Server-Sent Event.
+    """
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def stream_group_health_chat(agent_pool, llm_config, activity_data, sleep_data, stress_data,
+                             use_cache=True, mode="pipeline", heartbeat=HEARTBEAT_SECONDS):
+    """
+    Runs the group health pipeline in a worker thread and yields SSE events:
+
+    - `stage`: {"stage", "result", "elapsed", "error"} as each of activity, sleep, stress,
+      anomaly, nutrition and summary finishes
+    - `delta`: {"stage", "delta"} streamed completion chunks (when LLM streaming is enabled)
+    - `done`: {"status": "success", "results"} with the same results as /group_summary_chat
+    - `error` / `cancelled`: terminal failure events
+
+    When the consumer stops iterating (client disconnect), the remaining stages are cancelled.
+    """
+    events = queue.Queue()
+    cancel_event = threading.Event()
+
+    def on_stage(stage, result, elapsed, error):
+        events.put(("stage", {"stage": stage, "result": result, "elapsed": elapsed, "error": error}))
+
+    def on_delta(stage, text):
+        events.put(("delta", {"stage": stage, "delta": text}))
+
+    def worker():
+        try:
+            with agent_pool.checkout() as agents:
+                results = run_group_health_chat(
+                    activity_data=activity_data,
+                    sleep_data=sleep_data,
+                    stress_data=stress_data,
+                    llm_config=llm_config,
+                    agents=agents,
+                    use_cache=use_cache,
+                    mode=mode,
+                    on_stage=on_stage,
+                    on_delta=on_delta,
+                    cancel_event=cancel_event
+                )
+            events.put(("done", {"status": "success", "results": results}))
+        except PipelineCancelled as e:
+            events.put(("cancelled", {"status": "cancelled", "error": str(e)}))
+        except Exception as e:
+            events.put(("error", {"status": "error", "error": str(e)}))
+        finally:
+            events.put(None)
+
+    threading.Thread(target=worker, name="group-health-stream", daemon=True).start()
+
+    try:
+        while True:
+            try:
+                item = events.get(timeout=heartbeat)
+            except queue.Empty:
+                yield ": keep-alive\n\n"
+                continue
+            if item is None:
+                break
+            yield format_sse(*item)
+    finally:
+        # Normal completion or GeneratorExit from a dropped client: stop remaining stages
+        cancel_event.set()
+
+
+async def a_stream_group_health_chat(agents, activity_data, sleep_data, stress_data, use_cache=True,
+                                     heartbeat=HEARTBEAT_SECONDS):
+    """
+    Async version of stream_group_health_chat (pipeline mode): the pipeline runs as a task
+    on the event loop and the same SSE events are yielded. When the client disconnects,
+    the server stops iterating and the task is cancelled mid-stage.
+    """
+    events = asyncio.Queue()
+
+    def on_stage(stage, result, elapsed, error):
+        events.put_nowait(("stage", {"stage": stage, "result": result, "elapsed": elapsed, "error": error}))
+
+    def on_delta(stage, text):
+        events.put_nowait(("delta", {"stage": stage, "delta": text}))
+
+    async def pipeline():
+        try:
+            results = await a_run_group_health_chat(
+                activity_data=activity_data,
+                sleep_data=sleep_data,
+                stress_data=stress_data,
+                agents=agents,
+                use_cache=use_cache,
+                on_stage=on_stage,
+                on_delta=on_delta
+            )
+            events.put_nowait(("done", {"status": "success", "results": results}))
+        except Exception as e:
+            events.put_nowait(("error", {"status": "error", "error": str(e)}))
+        finally:
+            events.put_nowait(None)
+
+    task = asyncio.create_task(pipeline())
+    try:
+        while True:
+            try:
+                item = await asyncio.wait_for(events.get(), timeout=heartbeat)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            if item is None:
+                break
+            yield format_sse(*item)
+    finally:
+        task.cancel()
+
+
+async def a_relay_stream(events):
+    """
+    Iterates a blocking event generator (stream_group_health_chat in groupchat mode) from
+    worker threads. On disconnect the generator is closed once its pending step returns,
+    which cancels its remaining stages.
+    """
+    pending = None
+    try:
+        while True:
+            pending = asyncio.ensure_future(asyncio.to_thread(next, events, None))
+            item = await asyncio.shield(pending)
+            if item is None:
+                break
+            yield item
+    finally:
+        if pending is not None and not pending.done():
+            pending.add_done_callback(lambda _: events.close())
+        else:
+            events.close()
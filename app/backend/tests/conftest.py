@@ -0,0 +1,105 @@
+# backend/tests/conftest.py
+"""
+Shared fixtures: import paths matching app.py (`backend.x` and `core.x`), an in-process
+OpenAI-compatible stub (bench/stub_server.py) and the Flask app pointed at it, with
+every on-disk store under a temporary directory.
+"""
+
+import os
+import sys
+import threading
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (os.path.dirname(BACKEND_DIR), BACKEND_DIR):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+
+@pytest.fixture(scope="session")
+def llm_stub():
+    """
+    Base URL of a stub answering instantly, with schema-shaped JSON for structured prompts.
+    """
+    from bench.stub_server import StubHTTPServer, StubState, build_parser, make_handler
+
+    args = build_parser().parse_args(["--port", "0", "--structured", "--latency", "fixed:0",
+                                      "--tokens-per-second", "0", "--seed", "1"])
+    server = StubHTTPServer(("127.0.0.1", 0), make_handler(StubState(args)))
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/v1"
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(scope="session")
+def app_module(llm_stub, tmp_path_factory):
+    """
+    The backend's app module, configured through its environment variables.
+    """
+    workdir = tmp_path_factory.mktemp("backend")
+    env = {
+        "OPENAI_API_KEY": "sk-test",
+        "OPENAI_API_BASE": llm_stub,
+        "HTTP_WARMUP_CONNECTIONS": "0",
+        "LOCAL_CLASSIFIER_ENABLED": "0",
+        "JOB_DB_PATH": str(workdir / "jobs.sqlite"),
+        "TIMESERIES_PATH": str(workdir / "timeseries"),
+        "STAGE_STORE_PATH": str(workdir / "stages.sqlite"),
+    }
+    with pytest.MonkeyPatch.context() as mp:
+        for key, value in env.items():
+            mp.setenv(key, value)
+        # AutoGen keeps its own disk cache under ./.cache
+        mp.chdir(workdir)
+        from backend import app
+        yield app
+
+
+@pytest.fixture
+def client(app_module):
+    return app_module.app.test_client()
+
+
+@pytest.fixture(scope="session")
+def asgi_module(app_module):
+    """
+    The async serving app (backend/asgi.py), sharing configuration with app_module.
+    """
+    from backend import asgi
+    return asgi
+
+
+@pytest.fixture
+def async_client(asgi_module):
+    return asgi_module.async_app.test_client()
+
+
+@pytest.fixture
+def structured_outputs():
+    """
+    Structured-output mode for one test (the previous switch is restored afterwards).
+    """
+    from core import agent_results
+
+    previous = agent_results.get_structured_outputs()
+    yield agent_results.configure_structured_outputs(enabled=True)
+    agent_results.structured_outputs = previous
+
+
+@pytest.fixture
+def sensor_payload():
+    """
+    /group_summary_chat body: a short walk, a light night and a mildly stressed afternoon.
+    """
+    walk = [[0.3 * (-1) ** i, 0.1, 1.0] for i in range(200)]
+    still = [[0.0, 0.0, 1.0]] * 200
+    return {
+        "activity_data": {"acceleration": walk, "sample_rate_hz": 50, "body_weight": 70},
+        "sleep_data": {"heart_rate": 58, "hrv": 62, "skin_temperature": 34.1, "gsr": 0.4,
+                       "time_of_night": "middle", "acceleration": still},
+        "stress_data": {"heart_rate": 92, "skin_temperature": 33.8, "eda": 4.2, "acceleration": still},
+    }
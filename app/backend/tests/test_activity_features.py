@@ -0,0 +1,49 @@
+# backend/tests/test_activity_features.py
+
+import numpy as np
+import pytest
+
+from core.activity_features import extract_activity_features, format_activity_features, to_acceleration_array
+
+
+def walking(seconds=60, rate=50, steps_per_second=2.0, amplitude=0.3):
+    t = np.arange(int(seconds * rate)) / rate
+    z = 1.0 + amplitude * np.sin(2 * np.pi * steps_per_second * t)
+    return np.stack([np.zeros_like(t), np.zeros_like(t), z], axis=1)
+
+
+def test_walking_recording():
+    features = extract_activity_features({"acceleration": walking(), "sample_rate_hz": 50, "body_weight": 60})
+
+    assert (features["step_count"], features["cadence_spm"]) == (120, 120.0)
+    assert features["dominant_intensity"] == "moderate"
+    # 4.5 MET for one minute at 60 kg
+    assert (features["estimated_kcal"], features["body_weight_assumed"]) == (4.5, False)
+
+
+def test_still_recording_with_derived_rate():
+    features = extract_activity_features({"acceleration": [[0.0, 0.0, 1.0]] * 600, "duration_minutes": 1})
+
+    assert features["sample_rate_hz"] == 10.0
+    assert (features["step_count"], features["dominant_intensity"]) == (0, "sedentary")
+    assert (features["estimated_kcal"], features["body_weight_assumed"]) == (1.5, True)
+    assert "assuming 70 kg" in format_activity_features(features)
+
+
+def test_acceleration_samples_are_the_fallback_field():
+    features = extract_activity_features({"acceleration": [], "acceleration_samples": walking(seconds=10)})
+
+    assert features["sample_count"] == 500
+
+
+@pytest.mark.parametrize("samples", [None, "[[0, 0, 1]]", [], [[0, 1]], [[0, 0, 1], [0, 1]], [["a", "b", "c"]]])
+def test_unusable_samples(samples):
+    assert to_acceleration_array(samples) is None
+    assert extract_activity_features({"acceleration": samples}) is None
+    assert format_activity_features(None) == "No acceleration data available."
+
+
+def test_float_arrays_are_not_copied():
+    acc = walking(seconds=1).astype(np.float32)
+
+    assert to_acceleration_array(acc) is acc
@@ -0,0 +1,75 @@
+# backend/tests/test_agent_pool.py
+
+import threading
+
+import pytest
+
+from backend.agent_pool import AgentPool, AgentPoolExhausted
+
+
+def test_checkout_returns_the_set_to_the_pool():
+    pool = AgentPool(llm_config=False, size=2)
+
+    with pool.checkout() as agents:
+        assert pool.stats()["in_use"] == 1
+        assert callable(agents["sleep_agent"])
+
+    stats = pool.stats()
+    assert stats["idle"] == 2 and stats["checkouts"] == 1
+
+
+def test_concurrent_checkouts_get_distinct_sets():
+    pool = AgentPool(llm_config=False, size=2)
+    first = pool.acquire()
+    second = pool.acquire()
+    try:
+        assert first is not second
+        assert first["user_proxy"] is not second["user_proxy"]
+    finally:
+        pool.release(first)
+        pool.release(second)
+
+
+def test_exhausted_pool_rejects_without_blocking():
+    pool = AgentPool(llm_config=False, size=1, block=False)
+    agents = pool.acquire()
+    try:
+        with pytest.raises(AgentPoolExhausted):
+            pool.acquire()
+    finally:
+        pool.release(agents)
+
+    assert pool.stats()["rejections"] == 1
+
+
+def test_blocking_checkout_waits_for_a_release():
+    pool = AgentPool(llm_config=False, size=1, timeout=5)
+    agents = pool.acquire()
+    threading.Timer(0.1, pool.release, args=(agents,)).start()
+
+    assert pool.acquire() is agents
+
+
+def test_agents_are_built_on_first_use_and_kept():
+    pool = AgentPool(llm_config=False, size=1)
+    assert pool.stats()["agents_built"] == 0
+
+    with pool.checkout() as agents:
+        proxy = agents["sleep_proxy"]
+    with pool.checkout() as agents:
+        assert agents["sleep_proxy"] is proxy
+
+    assert pool.stats()["agents_built"] == 1
+    assert AgentPool(llm_config=False, size=1, preload=True).stats()["agents_built"] > 1
+
+
+def test_release_clears_chat_history():
+    pool = AgentPool(llm_config=False, size=1)
+
+    with pool.checkout() as agents:
+        agents["user_proxy"].send("hello", agents["sleep_llm"], request_reply=False, silent=True)
+        assert agents["sleep_llm"].chat_messages
+
+    with pool.checkout() as agents:
+        assert not agents["sleep_llm"].chat_messages
+        assert not agents["user_proxy"].chat_messages
@@ -0,0 +1,73 @@
+# backend/tests/test_agent_results.py
+
+import json
+
+import pytest
+
+from core.agent_results import (ActivityResult, AnomalyResult, MealFood, NutritionResult, SleepResult,
+                                StructuredOutputError, StructuredOutputs, SummaryResult, dump_result, load_result,
+                                prompt_text, render_result)
+
+SLEEP = {"sleep_stage": "deep", "sleep_quality": "Good", "reasons": ["low heart rate", " "],
+         "suggestion": " Keep the routine. "}
+
+
+def test_reply_is_parsed_and_normalised():
+    reply = f"```json\n{json.dumps(SLEEP)}\n```\nTERMINATE"
+
+    result = SleepResult.from_reply(reply)
+
+    assert result.to_dict() == {"sleep_stage": "Deep", "sleep_quality": "Good", "reasons": ["low heart rate"],
+                                "suggestion": "Keep the routine."}
+
+
+@pytest.mark.parametrize("reply, message", [
+    ("The user slept well.", "no JSON object"),
+    ("{not json}", "not valid JSON"),
+    (json.dumps(dict(SLEEP, sleep_stage="Dreaming")), "must be one of"),
+    (json.dumps({k: v for k, v in SLEEP.items() if k != "suggestion"}), "missing"),
+    (json.dumps(dict(SLEEP, reasons="none")), "list of strings"),
+    (json.dumps(dict(SLEEP, suggestion="  ")), "non-empty string"),
+])
+def test_invalid_replies_are_rejected(reply, message):
+    with pytest.raises(StructuredOutputError, match=message):
+        SleepResult.from_reply(reply)
+
+
+@pytest.mark.parametrize("kcal", ["NaN", "Infinity", "-Infinity", "1e999", "true", '"200"'])
+def test_numbers_must_be_finite(kcal):
+    reply = f'{{"activity_type": "Walking", "step_count": 4200, "kcal": {kcal}, "comment": "Nice walk."}}'
+
+    with pytest.raises(StructuredOutputError):
+        ActivityResult.from_reply(reply)
+
+
+def test_parse_falls_back_to_prose_and_counts():
+    outputs = StructuredOutputs(enabled=True)
+
+    parsed = outputs.parse("sleep", SleepResult, json.dumps(SLEEP))
+    prose = outputs.parse("sleep", SleepResult, "You slept well.\nTERMINATE")
+
+    assert isinstance(parsed, SleepResult)
+    assert prose == "You slept well."
+    assert outputs.stats()["agents"]["sleep"] == {"parsed": 1, "invalid": 1}
+
+
+@pytest.mark.parametrize("result", [
+    SleepResult.from_reply(json.dumps(SLEEP)),
+    AnomalyResult(anomalies=[], severity="Mild"),
+    SummaryResult(summary="A balanced day.", suggestion="Sleep earlier."),
+    NutritionResult(meal_time="Dinner", options=[[MealFood("Salmon", 312, "1 fillet", 150.0, 30.6, 20.1, 0.0)]],
+                    advice="Eat early."),
+    "Prose result",
+])
+def test_results_round_trip_through_json(result):
+    loaded = load_result(json.loads(json.dumps(dump_result(result))))
+
+    assert type(loaded) is type(result)
+    assert render_result(loaded) == render_result(result)
+    assert prompt_text(loaded) == prompt_text(result)
+
+
+def test_prompt_text_of_posted_structured_fields():
+    assert prompt_text({"stress_level": "Low", "reasons": ["calm"]}) == "stress_level=Low; reasons=['calm']"
@@ -0,0 +1,104 @@
+# backend/tests/test_anomaly_engine.py
+
+import pytest
+
+from core.anomaly_engine import AnomalyEngine, detect, summarise_findings
+
+STILL = [[0.0, 0.0, 1.0]] * 100
+RUNNING = [[1.2 * (-1) ** i, 0.6, 1.0] for i in range(100)]
+
+
+def findings_by_signal(findings):
+    return {f["signal"]: f for f in findings}
+
+
+def test_typical_readings_are_not_flagged():
+    assert detect({"heart_rate": 70, "hrv": 50, "skin_temperature": 33.6, "eda": 2.5}) == []
+
+
+def test_sustained_limit_breach_is_critical():
+    finding = findings_by_signal(detect({"heart_rate": [34, 36, 35], "acceleration": STILL}))["heart_rate"]
+
+    # The z-score alone would only be a Warning
+    assert (finding["rule"], finding["direction"], finding["severity"]) == ("threshold", "low", "Critical")
+    assert "below the 35 bpm limit" in finding["text"]
+
+
+def test_exercise_explains_a_high_heart_rate():
+    assert "heart_rate" not in findings_by_signal(detect({"heart_rate": 160, "acceleration": RUNNING}))
+    # ...but not a low one
+    assert findings_by_signal(detect({"heart_rate": 30, "acceleration": RUNNING}))["heart_rate"]["direction"] == "low"
+
+
+def test_user_baseline_replaces_population_norms():
+    baseline = {"heart_rate": {"count": 500, "mean": 60.0, "std": 5.0}}
+
+    population = findings_by_signal(detect({"heart_rate": 100}))["heart_rate"]
+    personal = findings_by_signal(detect({"heart_rate": 100}, baseline=baseline))["heart_rate"]
+
+    assert (population["rule"], population["severity"]) == ("population_z", "Mild")
+    assert (personal["rule"], personal["severity"]) == ("baseline_z", "Critical")
+    # Too few readings for a baseline
+    sparse = {"heart_rate": dict(baseline["heart_rate"], count=10)}
+    assert findings_by_signal(detect({"heart_rate": 100}, baseline=sparse))["heart_rate"]["rule"] == "population_z"
+
+
+def test_transient_spikes_within_a_series():
+    series = [70, 71, 69, 70, 72, 70, 71, 69, 70, 70] * 3 + [115, 118]
+
+    finding = findings_by_signal(detect({"heart_rate": series, "acceleration": STILL}))["heart_rate"]
+
+    assert (finding["rule"], finding["score"], finding["severity"]) == ("mad_spikes", 2, "Mild")
+
+
+@pytest.mark.parametrize("acceleration", ["garbage", [[0.1, 0.2], [0.3]], [["x", "y", "z"]], {"x": 1}])
+def test_malformed_acceleration_is_ignored(acceleration):
+    finding = findings_by_signal(detect({"heart_rate": 160, "acceleration": acceleration}))["heart_rate"]
+
+    # No usable movement: treated as not exercising
+    assert finding["severity"] == "Critical"
+
+
+def test_non_numeric_signals_are_skipped():
+    assert detect({"heart_rate": "fast", "eda": [None, float("nan")], "hrv": True}) == []
+
+
+def test_summary_orders_by_severity():
+    findings = detect({"heart_rate": 160, "eda": 14, "acceleration": STILL})
+
+    result = summarise_findings(findings)
+
+    assert result.severity == "Critical"
+    assert result.anomalies[0].startswith("heart rate")
+    assert (summarise_findings([]).severity, summarise_findings([]).anomalies) == ("Mild", [])
+
+
+def test_check_uses_baseline_for_day_readings_only():
+    def baseline(user_id):
+        if user_id == "broken":
+            raise OSError("store unavailable")
+        return {"heart_rate": {"count": 500, "mean": 60.0, "std": 5.0}}
+
+    engine = AnomalyEngine(baseline_provider=baseline)
+
+    result, findings = engine.check({"day": {"heart_rate": 100}, "sleep": {"heart_rate": 58}}, user_id="u1")
+    assert [f["rule"] for f in findings] == ["baseline_z"]
+    assert result.severity == "Critical"
+
+    _, findings = engine.check({"day": {"heart_rate": 100}}, user_id="broken")
+    assert [f["rule"] for f in findings] == ["population_z"]
+    assert engine.stats()["baseline_used"] == 1
+
+
+def test_detect_anomaly_route_runs_locally(client):
+    response = client.post("/detect_anomaly", json={"heart_rate": 160, "acceleration": STILL})
+
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body["engine"] == "local"
+    assert body["structured"]["severity"] == "Critical"
+
+
+def test_detect_anomaly_route_errors(client):
+    assert client.post("/detect_anomaly?context=nap", json={"heart_rate": 70}).status_code == 400
+    assert client.post("/detect_anomaly", json={"sleep_result": "ok"}).status_code == 400
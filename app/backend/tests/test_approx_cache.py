@@ -0,0 +1,80 @@
+# backend/tests/test_approx_cache.py
+
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from core.approx_cache import ApproxCache, merge_buckets, quantize, quantize_inputs
+
+AGENT = SimpleNamespace(llm_config={"config_list": [{"model": "gpt-4o"}], "max_tokens": 300},
+                        system_message="You are a stress coach.")
+
+
+@pytest.mark.parametrize("value, step, expected", [
+    (72.3, 5.0, 70.0),
+    (73.0, 5.0, 75.0),
+    (33.87, 0.2, 33.8),
+    ([71, 74.9], 5.0, [70.0, 75.0]),
+    (np.array([0.013, 0.021]), 0.02, [0.02, 0.02]),
+    ({"mean": 4.26}, 0.5, {"mean": 4.5}),
+    ("middle", 5.0, "middle"),
+    (True, 5.0, True),
+    (72.3, None, 72.3),
+])
+def test_quantize(value, step, expected):
+    assert quantize(value, step) == expected
+
+
+def test_quantized_inputs_drop_raw_acceleration():
+    data = {"heart_rate": 91.2, "eda": 4.1, "acceleration": [[0.0, 0.0, 1.0]] * 50, "note": "after lunch"}
+
+    quantized = quantize_inputs(data, {"enmo_mean_g": 0.0123, "step_count": 40},
+                                merge_buckets(None)["stress"])
+
+    assert quantized == {"heart_rate": 90.0, "eda": 4.0, "note": "after lunch",
+                         "features": {**{name: None for name in merge_buckets(None)["stress"]["features"]},
+                                      "enmo_mean_g": 0.01}}
+
+
+def test_near_duplicate_readings_share_a_key():
+    cache = ApproxCache()
+
+    key = cache.key("stress", AGENT, {"heart_rate": 72.1, "skin_temperature": 33.81, "eda": 4.1})
+
+    assert key == cache.key("stress", AGENT, {"heart_rate": 72.3, "skin_temperature": 33.79, "eda": 4.2})
+    assert key != cache.key("stress", AGENT, {"heart_rate": 80.0, "skin_temperature": 33.81, "eda": 4.1})
+    # Activity is only served approximately when enabled
+    assert cache.key("activity", AGENT, {"body_weight": 70}) is None
+
+
+def test_bucket_overrides_are_merged():
+    buckets = merge_buckets({"stress": {"heart_rate": 10, "features": {"enmo_mean_g": 0.01}}})
+
+    assert buckets["stress"]["heart_rate"] == 10
+    assert buckets["stress"]["features"]["enmo_mean_g"] == 0.01
+    assert buckets["stress"]["features"]["duration_minutes"] == 5.0
+    assert buckets["sleep"]["heart_rate"] == 5.0
+
+
+def test_entries_are_kept_per_agent():
+    cache = ApproxCache(memory_size=1)
+    key = cache.key("sleep", AGENT, {"heart_rate": 58})
+    cache.set("sleep", key, "Restful night.")
+    cache.set("stress", key, "Calm afternoon.")
+
+    assert cache.get("sleep", key) == "Restful night."
+    assert cache.get("stress", key) == "Calm afternoon."
+    assert cache.stats()["sleep"]["hits"] == 1
+
+
+def test_route_answers_near_duplicates_from_the_cache(client, app_module, sensor_payload):
+    sleep = dict(sensor_payload["sleep_data"], hrv=71.1)
+    before = app_module.get_approx_cache().stats().get("sleep", {}).get("hits", 0)
+
+    first = client.post("/analyze_sleep", json=sleep)
+    second = client.post("/analyze_sleep", json=dict(sleep, hrv=71.4))
+
+    assert first.status_code == second.status_code == 200
+    assert second.get_json() == first.get_json()
+    assert app_module.get_approx_cache().stats()["sleep"]["hits"] == before + 1
@@ -0,0 +1,120 @@
+# backend/tests/test_coalescer.py
+
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from backend.coalescer import RequestCoalescer, request_key
+
+
+def test_request_key_ignores_key_order_and_hashes_arrays():
+    payload = {"heart_rate": 60, "acceleration": np.zeros((4, 3))}
+
+    assert request_key("/sleep", {}, payload) == request_key("/sleep", {}, dict(reversed(payload.items())))
+    assert request_key("/sleep", {}, payload) != request_key("/stress", {}, payload)
+    assert request_key("/sleep", {}, payload) != request_key("/sleep", {}, payload, False)
+    assert request_key("/sleep", {}, payload) != request_key("/sleep", {}, dict(payload, acceleration=np.ones((4, 3))))
+
+
+def test_concurrent_identical_calls_share_one_execution():
+    coalescer = RequestCoalescer()
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return {"result": "ok"}
+
+    with ThreadPoolExecutor(4) as pool:
+        leader = pool.submit(coalescer.do, "key", compute)
+        started.wait(5)
+        followers = [pool.submit(coalescer.do, "key", compute) for _ in range(3)]
+        while coalescer.stats()["coalesced"] < 3:
+            threading.Event().wait(0.01)
+        release.set()
+        results = [leader.result()] + [f.result() for f in followers]
+
+    assert len(calls) == 1
+    assert all(result is results[0] for result in results)
+    stats = coalescer.stats()
+    assert (stats["executions"], stats["coalesced"], stats["in_flight"]) == (1, 3, 0)
+
+
+def test_errors_reach_every_waiter_and_are_not_remembered():
+    coalescer = RequestCoalescer()
+
+    def fail():
+        raise ValueError("bad payload")
+
+    with pytest.raises(ValueError):
+        coalescer.do("key", fail)
+
+    assert coalescer.do("key", lambda: "ok") == "ok"
+    assert coalescer.stats()["errors"] == 1
+
+
+def test_disabled_coalescer_runs_every_call():
+    coalescer = RequestCoalescer(enabled=False)
+    calls = []
+
+    coalescer.do("key", lambda: calls.append(1))
+    coalescer.do("key", lambda: calls.append(1))
+
+    assert len(calls) == 2
+
+
+def test_async_waiters_share_one_task():
+    coalescer = RequestCoalescer()
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "ok"
+
+    async def main():
+        return await asyncio.gather(*(coalescer.a_do("key", compute) for _ in range(3)))
+
+    assert asyncio.run(main()) == ["ok"] * 3
+    assert len(calls) == 1 and coalescer.stats()["coalesced"] == 2
+
+
+def test_async_task_is_cancelled_once_every_waiter_left():
+    coalescer = RequestCoalescer()
+
+    async def main():
+        done = asyncio.Event()
+
+        async def compute():
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                done.set()
+                raise
+
+        waiters = [asyncio.ensure_future(coalescer.a_do("key", compute)) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        waiters[0].cancel()
+        await asyncio.sleep(0.01)
+        assert not done.is_set()
+        waiters[1].cancel()
+        await asyncio.wait_for(done.wait(), 1)
+
+    asyncio.run(main())
+    stats = coalescer.stats()
+    assert (stats["cancelled"], stats["in_flight"]) == (1, 0)
+
+
+def test_routes_run_through_the_coalescer(client, app_module, sensor_payload):
+    coalescer = app_module.get_coalescer()
+    before = coalescer.stats()["executions"]
+
+    response = client.post("/analyze_sleep", json=sensor_payload["sleep_data"], headers={"Cache-Control": "no-cache"})
+
+    assert response.status_code == 200
+    assert coalescer.stats()["executions"] == before + 1
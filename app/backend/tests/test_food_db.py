@@ -0,0 +1,86 @@
+# backend/tests/test_food_db.py
+
+import json
+
+import pytest
+
+from core.agent_results import MealSelection
+from core.food_db import FoodDatabase, normalize_name
+
+
+@pytest.fixture(scope="module")
+def foods():
+    return FoodDatabase()
+
+
+@pytest.mark.parametrize("query, name, match", [
+    ("Grilled Salmon", "salmon", "exact"),
+    ("banana", "banana", "exact"),
+    ("Bananas", "banana", "exact"),
+    ("blueberr", "blueberries", "prefix"),
+    ("sweet potatoe", "sweet potato", "fuzzy"),
+])
+def test_lookup_matches(foods, query, name, match):
+    row, found = foods.lookup(query)
+
+    assert (foods.names[row], found) == (name, match)
+
+
+@pytest.mark.parametrize("query", ["apple pie", "potato chips", "sweet potato fries", "ap", ""])
+def test_other_dishes_are_misses(foods, query):
+    assert foods.lookup(query) == (None, "miss")
+
+
+def test_normalize_name():
+    assert normalize_name("  Greek-Yogurt (plain)! ") == "greek yogurt plain"
+
+
+def test_portions_compute_kcal_and_macros(foods):
+    salmon, banana, pie = foods.portions(["grilled salmon", "banana", "apple pie"], [1, 2, 1])
+
+    assert (salmon.name, salmon.kcal, salmon.grams, salmon.protein_g) == ("Salmon", 312, 150.0, 30.6)
+    assert (banana.kcal, banana.grams, banana.serving) == (210, 236.0, "2 × 1 medium")
+    # Unknown foods keep the LLM's name without numbers
+    assert (pie.name, pie.kcal) == ("apple pie", None)
+
+
+def test_meal_plan_prices_every_option(foods):
+    selection = MealSelection.from_reply(json.dumps({
+        "meal_time": "Dinner",
+        "options": [{"foods": [{"name": "salmon", "servings": 1}, {"name": "brown rice", "servings": 1}]},
+                    {"foods": [{"name": "oatmeal", "servings": 1}]}],
+        "advice": "Eat early.",
+    }))
+
+    plan = foods.meal_plan(selection)
+
+    assert plan.meal_time == "Dinner" and plan.advice == "Eat early."
+    assert [[food.kcal for food in option] for option in plan.options] == [[312, 218], [166]]
+
+
+def test_catalog_lists_foods_by_category(foods):
+    lines = foods.catalog().splitlines()
+
+    assert all(line.startswith("- ") for line in lines)
+    assert sum(len(line.split(": ", 1)[1].split(", ")) for line in lines) == len(foods)
+
+
+def test_lookups_are_counted(tmp_path):
+    path = tmp_path / "foods.csv"
+    path.write_text("name,aliases,category,serving_g,serving,kcal,protein_g,fat_g,carbs_g\n"
+                    "tofu,bean curd,protein,100,100 g,76,8.0,4.8,1.9\n")
+    foods = FoodDatabase(str(path))
+    foods.lookup("bean curd")
+    foods.lookup("bean curd")
+    foods.lookup("tempeh")
+
+    stats = foods.stats()
+    assert (stats["lookups"], stats["exact"], stats["misses"], stats["foods"]) == (3, 2, 1, 1)
+
+
+def test_empty_table_is_rejected(tmp_path):
+    path = tmp_path / "foods.csv"
+    path.write_text("name,aliases,category,serving_g,serving,kcal,protein_g,fat_g,carbs_g\n")
+
+    with pytest.raises(ValueError, match="empty"):
+        FoodDatabase(str(path))
@@ -0,0 +1,138 @@
+# backend/tests/test_group_summary_chat.py
+
+import asyncio
+import json
+
+import pytest
+
+from backend.group_summary_chat import prepare_group_summary_request, run_group_chat_stage
+from core import food_db
+from core.agent_results import AnomalyResult, NutritionResult, SummaryResult
+
+NO_CACHE = {"Cache-Control": "no-cache"}
+
+def sse_events(body: str) -> list:
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines() if not line.startswith(":"))
+        if "event" in lines:
+            events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+UPSTREAM = ("Walking, 4200 steps, 180 kcal", "stage Light, quality Fair; late bedtime", "level Medium; elevated EDA")
+
+
+@pytest.fixture
+def without_food_table():
+    previous = food_db.get_food_database()
+    yield food_db.configure_food_database(enabled=False)
+    food_db.food_database = previous
+
+
+@pytest.fixture
+def agents(app_module):
+    with app_module.agent_pool.checkout() as agents:
+        yield agents
+
+
+def test_structured_groupchat_turns_are_typed(app_module, agents, structured_outputs):
+    anomaly, nutrition = run_group_chat_stage(agents, app_module.llm_config, *UPSTREAM)
+
+    assert isinstance(anomaly, AnomalyResult)
+    # Priced from the food table
+    assert isinstance(nutrition, NutritionResult)
+    assert all(food.protein_g is not None for foods in nutrition.options for food in foods)
+
+
+def test_structured_groupchat_without_food_table(app_module, agents, structured_outputs, without_food_table):
+    anomaly, nutrition = run_group_chat_stage(agents, app_module.llm_config, *UPSTREAM)
+
+    assert isinstance(anomaly, AnomalyResult)
+    assert isinstance(nutrition, NutritionResult)
+
+
+def test_prose_groupchat_returns_text(app_module, agents, without_food_table):
+    anomaly, nutrition = run_group_chat_stage(agents, app_module.llm_config, *UPSTREAM)
+
+    assert isinstance(anomaly, str) and isinstance(nutrition, str)
+
+
+def test_summary_request_follows_the_output_mode(structured_outputs):
+    request = prepare_group_summary_request(*UPSTREAM)
+    assert request.result_type is SummaryResult
+    assert '"suggestion"' in request.prompt
+
+    structured_outputs.enabled = False
+    request = prepare_group_summary_request(*UPSTREAM)
+    assert request.result_type is None
+    assert "TERMINATE" in request.prompt
+
+
+def test_structured_run_returns_typed_summary(client, structured_outputs, without_food_table, sensor_payload):
+    response = client.post("/group_summary_chat", json=sensor_payload, headers=NO_CACHE)
+
+    assert response.status_code == 200, response.get_data(as_text=True)
+    results = response.get_json()["results"]
+    assert set(results["structured"]["summary"]) == {"summary", "suggestion"}
+    assert results["structured"]["anomaly"] is not None
+    assert "**Tomorrow**" in results["health_summary_result"]
+
+
+def test_async_structured_run_returns_typed_summary(async_client, structured_outputs, without_food_table,
+                                                    sensor_payload):
+    async def post():
+        response = await async_client.post("/group_summary_chat", json=sensor_payload, headers=NO_CACHE)
+        return response.status_code, await response.get_json()
+
+    status, body = asyncio.run(post())
+
+    assert status == 200, body
+    assert set(body["results"]["structured"]["summary"]) == {"summary", "suggestion"}
+
+
+@pytest.mark.parametrize("mode", ["pipeline", "groupchat"])
+def test_structured_run_is_stored_and_reused(client, structured_outputs, sensor_payload, mode):
+    first = client.post(f"/group_summary_chat?mode={mode}", json=sensor_payload)
+    assert first.status_code == 200, first.get_data(as_text=True)
+    results = first.get_json()["results"]
+    assert isinstance(results["nutrition_result"], str)
+    assert results["structured"]["nutrition"]["options"]
+
+    second = client.post(f"/group_summary_chat?mode={mode}", json=sensor_payload)
+    assert second.status_code == 200, second.get_data(as_text=True)
+    again = second.get_json()["results"]
+    assert {"nutrition", "summary"} <= set(again["stages"]["reused"])
+    assert again["structured"] == results["structured"]
+    assert again["nutrition_result"] == results["nutrition_result"]
+
+
+def check_stream(events):
+    stages = {data["stage"]: data["result"] for event, data in events if event == "stage"}
+    assert set(stages) == {"activity", "sleep", "stress", "anomaly", "nutrition", "summary"}
+    assert all(isinstance(result, str) for result in stages.values())
+    assert events[-1][0] == "done", events[-1]
+    assert events[-1][1]["results"]["nutrition_result"] == stages["nutrition"]
+
+
+@pytest.mark.parametrize("mode", ["pipeline", "groupchat"])
+def test_structured_stream_sends_rendered_stages(client, structured_outputs, sensor_payload, mode):
+    response = client.post(f"/group_summary_chat/stream?mode={mode}", json=sensor_payload, headers=NO_CACHE)
+
+    check_stream(sse_events(response.get_data(as_text=True)))
+
+
+@pytest.mark.parametrize("mode", ["pipeline", "groupchat"])
+def test_async_structured_stream_sends_rendered_stages(async_client, structured_outputs, sensor_payload, mode):
+    async def post():
+        response = await async_client.post(f"/group_summary_chat/stream?mode={mode}", json=sensor_payload,
+                                           headers=NO_CACHE)
+        return await response.get_data(as_text=True)
+
+    check_stream(sse_events(asyncio.run(post())))
+
+
+def test_unknown_mode_is_rejected(client, sensor_payload):
+    response = client.post("/group_summary_chat?mode=roundtable", json=sensor_payload)
+
+    assert response.status_code == 400
@@ -0,0 +1,85 @@
+# backend/tests/test_http_client.py
+
+import asyncio
+import copy
+import socket
+
+import httpx
+import pytest
+
+from backend.http_client import AsyncSharedHttpClient, SharedHttpClient
+from backend.rate_limiter import RateLimiter
+
+BODY = {"model": "gpt-4o", "messages": [{"role": "user", "content": "Summarize the user's day."}]}
+
+
+def closed_port_url():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    return f"http://127.0.0.1:{port}/v1"
+
+
+def test_requests_reuse_one_keep_alive_connection(llm_stub):
+    client = SharedHttpClient()
+
+    for _ in range(5):
+        client.post(f"{llm_stub}/chat/completions", json=BODY).raise_for_status()
+
+    stats = client.stats()
+    assert (stats["requests"], stats["new_connections"], stats["reuse_ratio"]) == (5, 1, 0.8)
+    # AutoGen deep-copies llm_config per agent; every copy must share the pool
+    assert copy.deepcopy({"http_client": client})["http_client"] is client
+
+
+def test_open_stream_holds_its_slot_until_closed(llm_stub):
+    client = SharedHttpClient(max_per_host=1)
+    url = f"{llm_stub}/chat/completions"
+
+    with client.stream("POST", url, json=dict(BODY, stream=True)):
+        with pytest.raises(httpx.PoolTimeout, match="No free connection slot"):
+            client.post(url, json=BODY, timeout=httpx.Timeout(5.0, pool=0.1))
+
+    assert client.post(url, json=BODY, timeout=httpx.Timeout(5.0, pool=0.1)).status_code == 200
+    assert client.stats()["slot_timeouts"] == 1
+
+
+def test_failed_connection_frees_its_slot():
+    client = SharedHttpClient(max_per_host=1)
+    url = closed_port_url()
+
+    for _ in range(2):
+        with pytest.raises(httpx.ConnectError):
+            client.post(f"{url}/chat/completions", json=BODY, timeout=httpx.Timeout(5.0, pool=0.1))
+
+    assert (client.stats()["errors"], client.stats()["slot_timeouts"]) == (2, 0)
+
+
+def test_observers_see_the_body_and_failures(llm_stub):
+    seen = []
+    client = SharedHttpClient(rate_limiter=RateLimiter(max_retries=0))
+    client.transport.add_observer(lambda request, response, body, elapsed: seen.append((response, body)))
+
+    client.post(f"{llm_stub}/chat/completions", json=BODY)
+    with pytest.raises(httpx.ConnectError):
+        client.post(f"{closed_port_url()}/chat/completions", json=BODY)
+
+    assert seen[0][0].status_code == 200 and b"choices" in seen[0][1]
+    assert seen[1] == (None, b"")
+    assert client.transport.rate_limiter.stats()["calls"] == 2
+
+
+def test_async_requests_reuse_connections(llm_stub):
+    async def run():
+        client = AsyncSharedHttpClient(shards=2)
+        responses = await asyncio.gather(*(client.post(f"{llm_stub}/chat/completions", json=BODY)
+                                           for _ in range(4)))
+        for _ in range(4):
+            await client.post(f"{llm_stub}/chat/completions", json=BODY)
+        await client.aclose()
+        return responses, client.stats()
+
+    responses, stats = asyncio.run(run())
+
+    assert all(response.status_code == 200 for response in responses)
+    assert stats["requests"] == 8 and stats["new_connections"] <= 4
@@ -0,0 +1,129 @@
+# backend/tests/test_jobs.py
+
+import threading
+import time
+
+import pytest
+
+from backend.jobs import JobQueue, JobQueueFull, JobStore, idempotency_key_for
+
+
+def wait_for(get_job, job_id, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = get_job(job_id)
+        if job["status"] in ("succeeded", "failed"):
+            return job
+        time.sleep(0.02)
+    raise AssertionError(f"job {job_id} did not finish")
+
+
+def run_job(payload, on_stage):
+    if payload.get("fail"):
+        raise RuntimeError("pipeline failed")
+    on_stage("sleep", {"result": "Restful night."})
+    return {"echo": payload["n"]}
+
+
+@pytest.fixture
+def store(tmp_path):
+    return JobStore(str(tmp_path / "jobs.sqlite"))
+
+
+def test_derived_key_ignores_key_order():
+    assert idempotency_key_for({"a": 1, "b": 2}) == idempotency_key_for({"b": 2, "a": 1})
+    assert idempotency_key_for({"a": 1}) != idempotency_key_for({"a": 2})
+
+
+def test_job_runs_and_records_stages(store):
+    queue = JobQueue(store, run_job)
+
+    job, created = queue.submit({"n": 1})
+    done = wait_for(queue.get, job["job_id"])
+
+    assert created and job["status"] == "queued"
+    assert done["results"] == {"echo": 1}
+    assert done["stages"] == {"sleep": {"result": "Restful night."}}
+    queue.shutdown()
+
+
+def test_identical_submissions_share_a_job(store):
+    queue = JobQueue(store, run_job)
+
+    first, _ = queue.submit({"n": 2})
+    second, created = queue.submit({"n": 2})
+    keyed, _ = queue.submit({"n": 3}, idempotency_key="client-key")
+    again, keyed_created = queue.submit({"n": 4}, idempotency_key="client-key")
+
+    assert second["job_id"] == first["job_id"] and not created
+    assert again["job_id"] == keyed["job_id"] and not keyed_created
+    queue.shutdown()
+
+
+def test_failed_job_is_retried_under_its_id(store):
+    queue = JobQueue(store, run_job)
+    job, _ = queue.submit({"n": 5, "fail": True}, idempotency_key="retry")
+    assert wait_for(queue.get, job["job_id"])["error"] == "pipeline failed"
+
+    retried, created = queue.submit({"n": 5}, idempotency_key="retry")
+
+    assert created and retried["job_id"] == job["job_id"]
+    assert wait_for(queue.get, job["job_id"])["results"] == {"echo": 5}
+    queue.shutdown()
+
+
+def test_derived_keys_expire_after_the_job_finished(store):
+    queue = JobQueue(store, run_job, derived_key_ttl=0)
+    first, _ = queue.submit({"n": 6})
+    wait_for(queue.get, first["job_id"])
+
+    second, created = queue.submit({"n": 6})
+
+    assert created and second["job_id"] != first["job_id"]
+    # The earlier job keeps its results
+    assert queue.get(first["job_id"])["results"] == {"echo": 6}
+    queue.shutdown()
+
+
+def test_full_queue_rejects_new_jobs_but_not_retries(store):
+    gate = threading.Event()
+
+    def blocked(payload, on_stage):
+        gate.wait(10)
+        return {}
+
+    queue = JobQueue(store, blocked, workers=1, max_pending=1)
+    queue.submit({"n": 1})
+    while store.count("running") == 0:
+        time.sleep(0.01)
+    queued, _ = queue.submit({"n": 2})
+
+    with pytest.raises(JobQueueFull):
+        queue.submit({"n": 3})
+    assert queue.submit({"n": 2})[0]["job_id"] == queued["job_id"]
+    gate.set()
+    queue.shutdown()
+
+
+def test_unfinished_jobs_resume_after_a_restart(tmp_path):
+    path = str(tmp_path / "jobs.sqlite")
+    job, _ = JobStore(path).get_or_create("left-over", {"n": 7})
+
+    queue = JobQueue(JobStore(path), run_job)
+
+    assert wait_for(queue.get, job["job_id"])["results"] == {"echo": 7}
+    queue.shutdown()
+
+
+def test_async_route_queues_a_job(client, sensor_payload):
+    response = client.post("/group_summary_chat?async=1", json=sensor_payload,
+                           headers={"Idempotency-Key": "test-async-route"})
+    assert response.status_code == 202
+    body = response.get_json()
+
+    job = wait_for(lambda job_id: client.get(f"/jobs/{job_id}").get_json(), body["job_id"])
+
+    assert job["status"] == "succeeded", job["error"]
+    assert "payload" not in job
+    assert job["results"]["health_summary_result"]
+    assert client.get("/jobs/unknown").status_code == 404
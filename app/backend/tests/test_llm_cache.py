@@ -0,0 +1,85 @@
+# backend/tests/test_llm_cache.py
+
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from core.llm_cache import LLMCache, agent_cache_key, make_cache_key
+
+
+def test_key_covers_every_request_field():
+    key = make_cache_key("gpt-4o", "You are a sleep coach.", "prompt", 300)
+
+    assert key == make_cache_key("gpt-4o", "You are a sleep coach.", "prompt", 300)
+    assert len({key,
+                make_cache_key("gpt-4o-mini", "You are a sleep coach.", "prompt", 300),
+                make_cache_key("gpt-4o", "You are a stress coach.", "prompt", 300),
+                make_cache_key("gpt-4o", "You are a sleep coach.", "prompt!", 300),
+                make_cache_key("gpt-4o", "You are a sleep coach.", "prompt", 400)}) == 5
+
+
+def test_agent_key_reads_the_llm_config():
+    agent = SimpleNamespace(llm_config={"config_list": [{"model": "gpt-4o"}], "max_tokens": 300},
+                            system_message="You are a sleep coach.")
+
+    assert agent_cache_key(agent, "prompt") == make_cache_key("gpt-4o", "You are a sleep coach.", "prompt", 300)
+    # Agents without an LLM (user proxies) still get a key
+    assert agent_cache_key(SimpleNamespace(llm_config=False), "prompt")
+
+
+def test_memory_tier_is_an_lru():
+    cache = LLMCache(memory_size=2)
+    cache.set("a", "1")
+    cache.set("b", "2")
+    cache.get("a")
+    cache.set("c", "3")
+
+    assert (cache.get("a"), cache.get("b"), cache.get("c")) == ("1", None, "3")
+    stats = cache.stats()
+    assert (stats["memory_hits"], stats["misses"], stats["evictions"]) == (3, 1, 1)
+
+
+def test_disk_tier_survives_a_restart(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    LLMCache(disk_path=path).set("key", "reply")
+
+    cache = LLMCache(disk_path=path)
+
+    assert cache.get("key") == "reply"
+    assert cache.get("key") == "reply"
+    assert (cache.stats()["disk_hits"], cache.stats()["memory_hits"]) == (1, 1)
+
+
+def test_disk_tier_evicts_least_recently_used_rows(tmp_path):
+    cache = LLMCache(memory_size=1, disk_path=str(tmp_path / "cache.sqlite"), disk_max_entries=2)
+    cache.set("a", "1")
+    cache.set("b", "2")
+    cache.get("a")
+    cache.set("c", "3")
+
+    assert cache.get("b") is None
+    assert cache.get("a") == "1"
+
+
+def test_entries_expire(tmp_path):
+    cache = LLMCache(disk_path=str(tmp_path / "cache.sqlite"), ttl=0.05)
+    cache.set("key", "reply")
+    time.sleep(0.1)
+
+    assert cache.get("key") is None
+    assert cache._db.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0] == 0
+
+
+def test_tables_and_json_values_share_a_file(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    text = LLMCache(disk_path=path)
+    objects = LLMCache(disk_path=path, table="stage_cache", json_values=True)
+    text.set("key", "reply")
+    objects.set("key", {"summary": "ok", "scores": [1, 2]})
+
+    assert LLMCache(disk_path=path).get("key") == "reply"
+    assert LLMCache(disk_path=path, table="stage_cache", json_values=True).get("key") == {"summary": "ok",
+                                                                                           "scores": [1, 2]}
+    with pytest.raises(ValueError):
+        LLMCache(table="stage_cache; DROP TABLE llm_cache")
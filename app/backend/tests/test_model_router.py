@@ -0,0 +1,104 @@
+# backend/tests/test_model_router.py
+
+import threading
+
+import pytest
+
+from bench.stub_server import StubHTTPServer, StubState, build_parser, make_handler
+from backend.group_summary_chat import prepare_group_summary_request
+from core import model_router
+from core.agent_results import SummaryResult
+from core.model_router import DEFAULT_TIER, ModelRouter, configure_model_router, run_request
+
+TIERS = {"small": {"model": "gpt-4o-mini", "max_tokens": 300}}
+
+
+@pytest.fixture(scope="module")
+def prose_stub():
+    """
+    Stub answering every prompt with prose, i.e. invalid JSON for structured requests.
+    """
+    args = build_parser().parse_args(["--latency", "fixed:0", "--tokens-per-second", "0"])
+    server = StubHTTPServer(("127.0.0.1", 0), make_handler(StubState(args)))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/v1"
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def routed(request):
+    """
+    configure_model_router(**request.param) for one test; the previous router is restored.
+    """
+    previous = model_router.get_model_router()
+    yield configure_model_router(**request.param)
+    model_router.model_router = previous
+
+
+def test_tiers_need_structured_outputs():
+    with pytest.raises(ValueError, match="structured outputs"):
+        ModelRouter(TIERS, {"summary": ["small", DEFAULT_TIER]})
+
+    assert ModelRouter(TIERS, {"summary": ["small", DEFAULT_TIER]}, structured=True).enabled
+    # Phrasing only words findings made locally, so its prose replies may be routed
+    assert ModelRouter(TIERS, {"anomaly_phrasing": ["small", DEFAULT_TIER]}).enabled
+
+
+def test_undefined_tiers_and_unknown_keys_are_rejected():
+    with pytest.raises(ValueError, match="undefined model tiers"):
+        ModelRouter(TIERS, {"sleep": ["large"]}, structured=True)
+    with pytest.raises(ValueError, match="unknown keys"):
+        ModelRouter({"small": {"model": "m", "top_k": 3}})
+
+
+def test_tier_config_overrides_the_profile_keys():
+    router = ModelRouter(TIERS)
+    llm_config = {"config_list": [{"model": "gpt-4o", "api_key": "k", "http_client": object()}], "max_tokens": 2000}
+
+    config = router.tier_config(llm_config, "small")
+
+    assert config["config_list"][0]["model"] == "gpt-4o-mini"
+    assert config["config_list"][0]["http_client"] is llm_config["config_list"][0]["http_client"]
+    assert config["max_tokens"] == 300 and llm_config["max_tokens"] == 2000
+    assert router.tier_config(llm_config, DEFAULT_TIER) is llm_config
+
+
+def test_fingerprint_tracks_the_chain_and_profiles():
+    router = ModelRouter(TIERS, {"sleep": ["small", DEFAULT_TIER]}, structured=True)
+    changed = ModelRouter({"small": dict(TIERS["small"], max_tokens=400)}, {"sleep": ["small", DEFAULT_TIER]},
+                          structured=True)
+
+    assert router.fingerprint("stress") is None
+    assert router.fingerprint("sleep") != changed.fingerprint("sleep")
+
+
+def test_latency_aware_plan_skips_a_slow_unreliable_tier():
+    router = ModelRouter(TIERS, {"sleep": ["small", DEFAULT_TIER]}, latency_aware=True, probe_every=5,
+                         structured=True)
+    for _ in range(20):
+        router.record("sleep", "small", 1.0, "invalid")
+        router.record("sleep", DEFAULT_TIER, 0.2, "valid")
+
+    plans = [router.plan("sleep") for _ in range(5)]
+
+    assert plans[:4] == [[DEFAULT_TIER]] * 4
+    # Every probe_every-th request still tries the whole chain
+    assert plans[4] == ["small", DEFAULT_TIER]
+
+
+@pytest.mark.parametrize("routed", [{"tiers": {"small": {"model": "gpt-4o-mini"}},
+                                     "agents": {"summary": ["small", DEFAULT_TIER]}, "structured": True}],
+                         indirect=True)
+def test_invalid_summary_escalates_to_the_next_tier(app_module, routed, structured_outputs, prose_stub):
+    routed.tiers["small"]["base_url"] = prose_stub
+    request = prepare_group_summary_request("Walking, 4200 steps", "stage Light, quality Fair", "level Low")
+
+    with app_module.agent_pool.checkout() as agents:
+        result = run_request(request, agents["user_proxy"], agents["health_summary_llm"], use_cache=False)
+
+    assert isinstance(result, SummaryResult)
+    stats = routed.stats()["agents"]["summary"]
+    assert stats["fallbacks"] == 1
+    assert stats["tiers"]["small"]["invalid"] == 1 and stats["tiers"][DEFAULT_TIER]["invalid"] == 0
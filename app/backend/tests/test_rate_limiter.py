@@ -0,0 +1,126 @@
+# backend/tests/test_rate_limiter.py
+
+import asyncio
+
+import httpx
+import pytest
+
+from backend.rate_limiter import AIMDConcurrency, RateLimiter, TokenBucket, estimate_request_tokens, parse_retry_after
+
+REQUEST = httpx.Request("POST", "http://llm.test/v1/chat/completions")
+
+
+def respond(status, headers=None):
+    return httpx.Response(status, headers=headers, request=REQUEST)
+
+
+def replies(*outcomes):
+    """
+    send_request callable returning / raising `outcomes` in order.
+    """
+    outcomes = list(outcomes)
+
+    def send_request():
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, BaseException):
+            raise outcome
+        return outcome
+    return send_request
+
+
+def test_retries_a_429_after_retry_after():
+    limiter = RateLimiter(initial_concurrency=4, base_backoff=0)
+
+    response = limiter.send(replies(respond(429, {"retry-after-ms": "10"}), respond(200)))
+
+    assert response.status_code == 200
+    stats = limiter.stats()
+    assert (stats["throttled"], stats["retries"], stats["succeeded"], stats["in_flight"]) == (1, 1, 1, 0)
+    assert stats["concurrency_limit"] < 4
+
+
+def test_gives_up_on_transport_errors_after_max_retries():
+    limiter = RateLimiter(max_retries=2, base_backoff=0)
+    error = httpx.ConnectError("refused", request=REQUEST)
+
+    with pytest.raises(httpx.ConnectError):
+        limiter.send(replies(error, error, error))
+
+    stats = limiter.stats()
+    assert (stats["retries"], stats["failed"], stats["in_flight"]) == (2, 1, 0)
+
+
+@pytest.mark.parametrize("error", [httpx.DecodingError("bad body", request=REQUEST), RuntimeError("replay miss"),
+                                   KeyboardInterrupt()])
+def test_unexpected_errors_free_the_concurrency_slot(error):
+    limiter = RateLimiter(initial_concurrency=1, max_concurrency=1)
+
+    with pytest.raises(type(error)):
+        limiter.send(replies(error))
+
+    assert limiter.stats()["in_flight"] == 0
+    # With the slot leaked this would wait forever
+    assert limiter.send(replies(respond(200))).status_code == 200
+
+
+def test_a_send_frees_the_slot_when_cancelled():
+    limiter = RateLimiter(initial_concurrency=1, max_concurrency=1)
+
+    async def hang():
+        await asyncio.sleep(10)
+
+    async def main():
+        task = asyncio.ensure_future(limiter.a_send(hang))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+        async def ok():
+            return respond(200)
+        return await asyncio.wait_for(limiter.a_send(ok), 1)
+
+    assert asyncio.run(main()).status_code == 200
+    assert limiter.stats()["in_flight"] == 0
+
+
+def test_a_burst_of_429s_shrinks_the_limit_once():
+    concurrency = AIMDConcurrency(initial=8)
+    sent = [concurrency.acquire() for _ in range(4)]
+
+    for sent_at in sent:
+        concurrency.release(sent_at, throttled=True)
+
+    assert concurrency.limit == 4
+
+
+def test_successes_grow_the_limit_up_to_the_maximum():
+    concurrency = AIMDConcurrency(initial=2, maximum=3)
+
+    for _ in range(20):
+        concurrency.release(concurrency.acquire())
+
+    assert concurrency.limit == 3
+
+
+def test_parse_retry_after_headers():
+    assert parse_retry_after(respond(429, {"retry-after-ms": "250"})) == 0.25
+    assert parse_retry_after(respond(429, {"retry-after": "2"})) == 2.0
+    assert parse_retry_after(respond(429)) is None
+
+
+def test_request_token_estimate_counts_prompt_and_max_tokens():
+    body = b'{"messages": [{"content": "' + b"x" * 400 + b'"}], "max_tokens": 50}'
+
+    assert estimate_request_tokens(body) == 151
+    assert estimate_request_tokens(b"not json") == 1
+
+
+def test_token_bucket_waits_once_the_burst_is_spent():
+    bucket = TokenBucket(per_minute=600)
+    assert bucket.acquire(600) == 0.0
+
+    # 600 per minute refills one unit every 0.1 s
+    waited = bucket.acquire(1)
+
+    assert 0.05 < waited < 0.5
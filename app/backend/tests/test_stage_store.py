@@ -0,0 +1,65 @@
+# backend/tests/test_stage_store.py
+
+import numpy as np
+import pytest
+
+from backend.group_summary_chat import run_group_health_chat
+from backend.stage_store import StageStore, content_hash
+
+ANALYSES = {"activity", "sleep", "stress"}
+
+
+def test_content_hash_is_canonical():
+    assert content_hash({"a": 1, "b": [1, 2]}) == content_hash({"b": [1, 2], "a": 1})
+    assert content_hash("sleep", {"a": 1}) != content_hash("stress", {"a": 1})
+    assert content_hash(np.arange(6, dtype=np.float32)) == content_hash(np.arange(6, dtype=np.float32))
+    assert content_hash(np.arange(6, dtype=np.float32)) != content_hash(np.arange(6, dtype=np.float64))
+    assert content_hash(np.arange(6).reshape(2, 3)) != content_hash(np.arange(6).reshape(3, 2))
+    assert content_hash(np.float32(1.5)) == content_hash(1.5)
+    with pytest.raises(TypeError):
+        content_hash(object())
+
+
+def test_results_survive_a_restart(tmp_path):
+    path = str(tmp_path / "stages.sqlite")
+    StageStore(disk_path=path).set("key", {"meal_time": "Dinner", "options": [[["Salmon", 1]]]})
+
+    assert StageStore(disk_path=path).get("key") == {"meal_time": "Dinner", "options": [[["Salmon", 1]]]}
+
+
+@pytest.fixture
+def run(app_module, sensor_payload):
+    store = StageStore()
+
+    def run(use_cache=True, **changes):
+        data = {name: dict(sensor_payload[f"{name}_data"], **changes.get(name, {})) for name in ANALYSES}
+        with app_module.agent_pool.checkout() as agents:
+            return run_group_health_chat(data["activity"], data["sleep"], data["stress"], app_module.llm_config,
+                                         agents=agents, use_cache=use_cache, stage_store=store)["stages"]
+
+    return run
+
+
+def test_unchanged_submission_reuses_stored_stages(run):
+    assert run()["reused"] == []
+
+    stages = run()
+
+    # The local anomaly engine takes milliseconds and is not stored
+    assert stages["recomputed"] == ["anomaly"]
+    assert len(stages["reused"]) == 5
+
+
+def test_changed_branch_is_recomputed(run):
+    run()
+
+    stages = run(stress={"heart_rate": 118})
+
+    assert {"activity", "sleep"} <= set(stages["reused"])
+    assert "stress" in stages["recomputed"]
+
+
+def test_cache_bypass_recomputes_everything(run):
+    run()
+
+    assert run(use_cache=False)["reused"] == []
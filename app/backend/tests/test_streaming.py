@@ -0,0 +1,95 @@
+# backend/tests/test_streaming.py
+
+import asyncio
+import threading
+import time
+from contextlib import contextmanager
+
+from backend.group_summary_chat import PipelineCancelled
+from backend.streaming import a_relay_stream, format_sse, stream_group_health_chat
+from tests.test_group_summary_chat import sse_events
+
+STAGES = ["activity", "sleep", "stress", "anomaly", "nutrition", "summary"]
+
+
+class SlowPool:
+    """
+    Agent pool whose checkout takes `delay` seconds and records how the checkout ended.
+    """
+
+    def __init__(self, pool, delay):
+        self.pool = pool
+        self.delay = delay
+        self.outcome = None
+        self.released = threading.Event()
+
+    @contextmanager
+    def checkout(self):
+        time.sleep(self.delay)
+        try:
+            with self.pool.checkout() as agents:
+                yield agents
+            self.outcome = "completed"
+        except PipelineCancelled:
+            self.outcome = "cancelled"
+            raise
+        finally:
+            self.released.set()
+
+
+def stream(app_module, pool=None, mode="pipeline", heartbeat=5, payload=None):
+    return stream_group_health_chat(pool or app_module.agent_pool, app_module.llm_config,
+                                    payload["activity_data"], payload["sleep_data"], payload["stress_data"],
+                                    use_cache=False, mode=mode, heartbeat=heartbeat)
+
+
+def test_format_sse_keeps_unicode():
+    assert format_sse("stage", {"result": "睡眠 ok"}) == 'event: stage\ndata: {"result": "睡眠 ok"}\n\n'
+
+
+def test_every_stage_then_done(app_module, sensor_payload):
+    events = sse_events("".join(stream(app_module, payload=sensor_payload)))
+
+    stage_events = [data["stage"] for event, data in events if event == "stage"]
+    assert sorted(stage_events) == sorted(STAGES)
+    assert stage_events[-1] == "summary"
+    assert events[-1][0] == "done" and events[-1][1]["status"] == "success"
+
+
+def test_unknown_mode_ends_with_an_error_event(app_module, sensor_payload):
+    events = sse_events("".join(stream(app_module, mode="roundtable", payload=sensor_payload)))
+
+    assert [event for event, _ in events] == ["error"]
+    assert "roundtable" in events[0][1]["error"]
+
+
+def test_heartbeats_while_waiting_and_cancel_on_disconnect(app_module, sensor_payload):
+    pool = SlowPool(app_module.agent_pool, delay=0.3)
+    events = stream(app_module, pool=pool, heartbeat=0.05, payload=sensor_payload)
+
+    assert next(events) == ": keep-alive\n\n"
+    # Client gone before the pipeline got past its first stage
+    events.close()
+
+    assert pool.released.wait(10)
+    assert pool.outcome == "cancelled"
+
+
+def test_relay_closes_the_blocking_generator_on_disconnect():
+    closed = threading.Event()
+
+    def events():
+        try:
+            for i in range(100):
+                yield f": {i}\n\n"
+        finally:
+            closed.set()
+
+    async def read_two():
+        relay = a_relay_stream(events())
+        items = [await relay.__anext__(), await relay.__anext__()]
+        await relay.aclose()
+        return items
+
+    assert asyncio.run(read_two()) == [": 0\n\n", ": 1\n\n"]
+    assert closed.wait(5)
@@ -0,0 +1,72 @@
+# backend/tests/test_stub_server.py
+
+import json
+
+import httpx
+import pytest
+
+from bench.stub_server import StubState, build_parser, prompt_foods, reply_shape
+from core.agent_results import RESULT_TYPES, MealSelection, json_instruction
+from core.food_db import DEFAULT_PATH, FoodDatabase
+from core.nutrition_agent import build_meal_selection_prompt
+
+
+def complete(base_url, prompt, model="gpt-4o", stream=False):
+    body = {"model": model, "messages": [{"role": "user", "content": prompt}], "stream": stream}
+    response = httpx.post(f"{base_url}/chat/completions", json=body)
+    response.raise_for_status()
+    if not stream:
+        return response.json()["choices"][0]["message"]["content"]
+    chunks = [json.loads(line[6:]) for line in response.text.splitlines()
+              if line.startswith("data: ") and line != "data: [DONE]"]
+    return "".join(c["choices"][0]["delta"].get("content", "") for c in chunks)
+
+
+@pytest.mark.parametrize("result_type", sorted(RESULT_TYPES.values(), key=lambda t: t.__name__))
+def test_structured_prompts_get_schema_shaped_json(llm_stub, result_type):
+    reply = complete(llm_stub, f"Analyse this.\n\n{json_instruction(result_type)}")
+
+    assert isinstance(result_type.from_reply(reply), result_type)
+
+
+def test_streamed_json_reply_parses(llm_stub):
+    reply = complete(llm_stub, json_instruction(MealSelection), stream=True)
+
+    assert isinstance(MealSelection.from_reply(reply), MealSelection)
+
+
+def test_meal_selection_uses_the_prompt_foods(llm_stub):
+    food_db = FoodDatabase(DEFAULT_PATH)
+    prompt = build_meal_selection_prompt("walked", "slept well", "low", food_db.catalog())
+
+    selection = MealSelection.from_reply(complete(llm_stub, prompt))
+
+    names = set(prompt_foods(prompt))
+    assert names and all(name in names for foods in selection.options for name, _ in foods)
+
+
+def test_prose_prompts_get_prose(llm_stub):
+    assert reply_shape([{"content": "Summarize the user's day."}]) == (None, None)
+    assert complete(llm_stub, "Summarize the user's day.").endswith("TERMINATE")
+
+
+def test_group_briefing_is_answered_in_speaking_order():
+    briefing = {"role": "user", "content": f"Anomaly agent:\n{json_instruction(RESULT_TYPES['AnomalyResult'])}\n\n"
+                                           f"Nutrition agent:\n{json_instruction(MealSelection)}"}
+    anomaly_reply = {"role": "user", "name": "AbnormalyDetectionAgent", "content": "{}"}
+    nutrition_reply = {"role": "user", "name": "NutritionAgent", "content": "{}"}
+
+    assert "severity" in reply_shape([briefing])[0]
+    assert "options" in reply_shape([briefing, anomaly_reply])[0]
+    assert reply_shape([briefing, anomaly_reply, nutrition_reply]) == (None, None)
+
+
+def test_invalid_json_only_for_listed_models():
+    args = build_parser().parse_args(["--structured", "--invalid-json-probability", "1",
+                                      "--invalid-json-models", "gpt-4o-mini"])
+    state = StubState(args)
+    messages = [{"role": "user", "content": json_instruction(RESULT_TYPES["StressResult"])}]
+
+    assert state.structured_reply(messages, "gpt-4o-mini") is None
+    assert state.structured_reply(messages, "gpt-4o") is not None
+    assert (state.stats["invalid_json"], state.stats["structured"]) == (1, 1)
@@ -0,0 +1,110 @@
+# backend/tests/test_timeseries.py
+
+import numpy as np
+import pytest
+
+from backend.timeseries import TimeSeriesError, TimeSeriesStore, parse_time
+
+DAY = 1_700_006_400.0  # 2023-11-15T00:00:00Z
+
+
+@pytest.fixture
+def store(tmp_path):
+    return TimeSeriesStore(str(tmp_path / "timeseries"))
+
+
+def test_parse_time():
+    assert parse_time("2023-11-15T00:00:00Z") == DAY
+    assert parse_time("2023-11-15T00:00:00") == DAY
+    assert parse_time(str(DAY)) == parse_time(DAY) == DAY
+    with pytest.raises(TimeSeriesError):
+        parse_time("yesterday")
+
+
+def test_range_reads_what_was_appended(store):
+    store.append("u1", "heart_rate", [DAY + 2, DAY, DAY + 1], [62, 60, 61])
+    store.append("u1", "heart_rate", [DAY + 3], [63])
+
+    ts, values = store.range("u1", "heart_rate", DAY + 1, DAY + 3)
+
+    assert ts.tolist() == [DAY + 1, DAY + 2]
+    assert values.tolist() == [61, 62]
+    assert store.signals("u1")["heart_rate"] == {"samples": 4, "first": DAY, "last": DAY + 3}
+
+
+def test_rollups_merge_across_appends(store):
+    store.append("u1", "heart_rate", [DAY, DAY + 10], [60, 70])
+    store.append("u1", "heart_rate", [DAY + 20, DAY + 70], [80, 90])
+
+    minutes = store.rollup("u1", "heart_rate", "minute")
+
+    assert minutes["start"].tolist() == [DAY, DAY + 60]
+    assert minutes["count"].tolist() == [3, 1]
+    assert minutes["sum"].tolist() == [210, 90]
+    assert store.rollup("u1", "heart_rate", "hour")["count"].tolist() == [4]
+
+
+def test_acceleration_rollups_use_the_magnitude(store):
+    store.append("u1", "acceleration", [DAY, DAY + 1], [[0, 0, 1], [0.6, 0.8, 0]])
+
+    assert store.range("u1", "acceleration")[1].shape == (2, 3)
+    assert store.rollup("u1", "acceleration", "minute")["sum"].tolist() == pytest.approx([2.0])
+
+
+def test_baseline_pools_hourly_rollups(store):
+    hours = DAY + 3600 * np.arange(48)
+    store.append("u1", "heart_rate", hours, np.where(np.arange(48) % 2, 70, 60))
+
+    baseline = store.baseline("u1", days=1, end=DAY + 48 * 3600, signals=["heart_rate", "hrv"])
+
+    assert baseline["heart_rate"] == {"count": 24, "mean": 65.0, "std": 5.0, "min": 60.0, "max": 70.0}
+    assert baseline["hrv"]["count"] == 0
+
+
+@pytest.mark.parametrize("user_id, signal, ts, values", [
+    ("../etc", "heart_rate", [DAY], [60]),
+    ("u1", "blood_pressure", [DAY], [120]),
+    ("u1", "heart_rate", [DAY, DAY + 1], [60]),
+    ("u1", "acceleration", [DAY], [[0, 1]]),
+])
+def test_invalid_appends_are_rejected(store, user_id, signal, ts, values):
+    with pytest.raises(TimeSeriesError):
+        store.append(user_id, signal, ts, values)
+
+
+def test_out_of_order_append_is_rejected(store):
+    store.append("u1", "eda", [DAY + 10], [2.0])
+
+    with pytest.raises(TimeSeriesError, match="before the last stored sample"):
+        store.append("u1", "eda", [DAY + 5], [2.1])
+
+
+def test_payload_resolves_from_stored_data(store):
+    store.append("u1", "heart_rate", [DAY, DAY + 30], [60, 64])
+    store.append("u1", "acceleration", [DAY, DAY + 0.02, DAY + 0.04], [[0, 0, 1]] * 3)
+
+    payload = store.resolve_payload({"user_id": "u1", "time_range": {"start": DAY, "end": DAY + 60}, "hrv": 50})
+
+    assert payload["heart_rate"] == 62.0
+    assert payload["hrv"] == 50 and payload["user_id"] == "u1"
+    assert payload["sample_rate_hz"] == 50.0 and len(payload["acceleration"]) == 3
+    assert store.resolve_payload({"heart_rate": 70}) == {"heart_rate": 70}
+
+
+@pytest.mark.parametrize("days", ["0", "-3", "nan", "inf", "week"])
+def test_baseline_route_rejects_invalid_days(client, days):
+    response = client.get(f"/timeseries/u1/baseline?days={days}")
+
+    assert response.status_code == 400
+
+
+def test_routes_append_and_query(client):
+    response = client.post("/timeseries/route-user", json={"heart_rate": {"ts": [DAY, DAY + 1], "values": [60, 62]}})
+    assert response.get_json()["appended"] == {"heart_rate": 2}
+
+    raw = client.get("/timeseries/route-user/heart_rate?limit=1").get_json()
+    minute = client.get("/timeseries/route-user/heart_rate?resolution=minute").get_json()
+
+    assert (raw["count"], raw["truncated"], raw["values"]) == (2, True, [60])
+    assert minute["summary"]["mean"] == 61.0
+    assert client.get("/timeseries/route-user/heart_rate?resolution=week").status_code == 400
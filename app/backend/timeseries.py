@@ -0,0 +1,318 @@
+# backend/timeseries.py
+
+import os
+import re
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+import numpy as np
+
+# Signal name → values per sample (acceleration is 3-axis)
+SIGNALS = {
+    "heart_rate": 1,
+    "hrv": 1,
+    "skin_temperature": 1,
+    "eda": 1,
+    "gsr": 1,
+    "acceleration": 3,
+}
+
+ROLLUPS = {"minute": 60, "hour": 3600, "day": 86400}
+
+# One row per bucket; acceleration rollups summarise the magnitude
+ROLLUP_DTYPE = np.dtype([
+    ("start", "<f8"), ("count", "<i8"), ("sum", "<f8"), ("sumsq", "<f8"), ("min", "<f4"), ("max", "<f4"),
+])
+
+TS_DTYPE = np.dtype("<f8")
+VALUE_DTYPE = np.dtype("<f4")
+
+USER_ID_PATTERN = re.compile(r"^[A-Za-z0-9_.-]{1,64}$")
+
+# Memory maps kept open (each holds a file descriptor); least recently used are dropped
+MAX_OPEN_MAPS = 512
+
+
+class TimeSeriesError(ValueError):
+    """
+    Raised for an invalid store request (unknown signal, bad user id or time range, out-of-order data).
+    """
+
+
+def parse_time(value) -> float:
+    """
+    Epoch seconds from a number or an ISO 8601 string (naive times are UTC).
+    """
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        try:
+            return float(value)
+        except ValueError:
+            pass
+        try:
+            parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            raise TimeSeriesError(f"Invalid time: {value!r}")
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=timezone.utc)
+        return parsed.timestamp()
+    raise TimeSeriesError(f"Invalid time: {value!r}")
+
+
+def _rollup_rows(ts: np.ndarray, magnitude: np.ndarray, resolution: int) -> np.ndarray:
+    """
+    Aggregates sorted samples into ROLLUP_DTYPE rows, one per `resolution`-second bucket.
+    """
+    buckets = np.floor(ts / resolution) * resolution
+    starts, first = np.unique(buckets, return_index=True)
+    values = magnitude.astype(np.float64)
+    rows = np.zeros(len(starts), dtype=ROLLUP_DTYPE)
+    rows["start"] = starts
+    rows["count"] = np.diff(np.append(first, len(ts)))
+    rows["sum"] = np.add.reduceat(values, first)
+    rows["sumsq"] = np.add.reduceat(values * values, first)
+    rows["min"] = np.minimum.reduceat(values, first)
+    rows["max"] = np.maximum.reduceat(values, first)
+    return rows
+
+
+def _merge_rows(a, b):
+    merged = np.zeros((), dtype=ROLLUP_DTYPE)
+    merged["start"] = a["start"]
+    merged["count"] = a["count"] + b["count"]
+    merged["sum"] = a["sum"] + b["sum"]
+    merged["sumsq"] = a["sumsq"] + b["sumsq"]
+    merged["min"] = min(a["min"], b["min"])
+    merged["max"] = max(a["max"], b["max"])
+    return merged
+
+
+def summarise_rollups(rows: np.ndarray) -> dict:
+    """
+    Count / mean / std / min / max over rollup rows (pooled from their sums).
+    """
+    count = int(rows["count"].sum()) if len(rows) else 0
+    if not count:
+        return {"count": 0, "mean": None, "std": None, "min": None, "max": None}
+    total = float(rows["sum"].sum())
+    mean = total / count
+    variance = max(0.0, float(rows["sumsq"].sum()) / count - mean * mean)
+    return {
+        "count": count,
+        "mean": round(mean, 3),
+        "std": round(variance ** 0.5, 3),
+        "min": round(float(rows["min"].min()), 3),
+        "max": round(float(rows["max"].max()), 3),
+    }
+
+
+class TimeSeriesStore:
+    """
+    Per-user sensor streams kept as append-only columnar files, memory-mapped for reads.
+
+    Layout under `root`: <user_id>/<signal>.ts (float64 epoch seconds, non-decreasing),
+    <signal>.values (float32, 3 per sample for acceleration) and <signal>.<minute|hour|day>
+    rollups (ROLLUP_DTYPE rows, updated on every append). Range queries binary-search
+    the timestamp column, so they cost O(log n) plus the size of the returned slice.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self._locks = {}
+        self._maps = OrderedDict()
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    # ---------- paths / files ----------
+
+    def _user_dir(self, user_id: str) -> str:
+        if not isinstance(user_id, str) or not USER_ID_PATTERN.match(user_id):
+            raise TimeSeriesError(f"Invalid user id: {user_id!r}")
+        return os.path.join(self.root, user_id)
+
+    @staticmethod
+    def _check_signal(signal: str) -> None:
+        if signal not in SIGNALS:
+            raise TimeSeriesError(f"Unknown signal {signal!r}, expected one of {list(SIGNALS)}")
+
+    def _user_lock(self, user_id: str) -> threading.Lock:
+        with self._lock:
+            return self._locks.setdefault(user_id, threading.Lock())
+
+    def _map(self, path: str, dtype, width: int = 1) -> np.ndarray:
+        """
+        Read-only memmap of the complete rows currently in `path` (re-mapped after the file grows).
+        """
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return np.zeros((0, width) if width > 1 else 0, dtype=dtype)
+        rows = size // (dtype.itemsize * width)
+        with self._lock:
+            cached = self._maps.get(path)
+            if cached is not None and cached[0] == rows:
+                self._maps.move_to_end(path)
+                return cached[1]
+        if rows == 0:
+            array = np.zeros((0, width) if width > 1 else 0, dtype=dtype)
+        else:
+            array = np.memmap(path, dtype=dtype, mode="r", shape=(rows, width) if width > 1 else (rows,))
+        with self._lock:
+            self._maps[path] = (rows, array)
+            self._maps.move_to_end(path)
+            while len(self._maps) > MAX_OPEN_MAPS:
+                self._maps.popitem(last=False)
+        return array
+
+    def _columns(self, user_id: str, signal: str):
+        base = os.path.join(self._user_dir(user_id), signal)
+        ts = self._map(base + ".ts", TS_DTYPE)
+        values = self._map(base + ".values", VALUE_DTYPE, SIGNALS[signal])
+        n = min(len(ts), len(values))  # a concurrent append may have written only one column
+        return ts[:n], values[:n]
+
+    # ---------- writes ----------
+
+    def append(self, user_id: str, signal: str, ts, values) -> int:
+        """
+        Appends samples (timestamps must not go back before the stored data) and updates
+        the minute / hour / day rollups.
+
+        Returns:
+        - Number of samples appended
+        """
+        self._check_signal(signal)
+        width = SIGNALS[signal]
+        try:
+            ts = np.asarray(ts, dtype=TS_DTYPE)
+        except (TypeError, ValueError):
+            ts = np.asarray([parse_time(t) for t in ts], dtype=TS_DTYPE)
+        try:
+            values = np.asarray(values, dtype=VALUE_DTYPE)
+            if width > 1:
+                values = values.reshape(-1, width) if values.size else values.reshape(0, width)
+        except (TypeError, ValueError):
+            raise TimeSeriesError(f"{signal}: values must be numbers ({width} per sample)")
+        if ts.ndim != 1 or len(ts) != len(values):
+            raise TimeSeriesError(f"{signal}: {len(ts)} timestamps for {len(values)} samples")
+        if not len(ts):
+            return 0
+
+        order = np.argsort(ts, kind="stable")
+        ts, values = ts[order], values[order]
+
+        user_dir = self._user_dir(user_id)
+        with self._user_lock(user_id):
+            os.makedirs(user_dir, exist_ok=True)
+            stored_ts, _ = self._columns(user_id, signal)
+            if len(stored_ts) and ts[0] < stored_ts[-1]:
+                raise TimeSeriesError(f"{signal}: data starts before the last stored sample")
+
+            base = os.path.join(user_dir, signal)
+            with open(base + ".ts", "ab") as f:
+                f.write(ts.tobytes())
+            with open(base + ".values", "ab") as f:
+                f.write(np.ascontiguousarray(values).tobytes())
+
+            magnitude = np.sqrt(np.einsum("ij,ij->i", values, values)) if width > 1 else values
+            for name, resolution in ROLLUPS.items():
+                self._append_rollup(f"{base}.{name}", _rollup_rows(ts, magnitude, resolution))
+        return len(ts)
+
+    def _append_rollup(self, path: str, rows: np.ndarray) -> None:
+        existing = self._map(path, ROLLUP_DTYPE)
+        mode = "r+b" if os.path.exists(path) else "wb"
+        with open(path, mode) as f:
+            if len(existing) and existing[-1]["start"] == rows[0]["start"]:
+                # The first new bucket continues the last stored one: rewrite it in place
+                f.seek((len(existing) - 1) * ROLLUP_DTYPE.itemsize)
+                f.write(_merge_rows(existing[-1], rows[0]).tobytes())
+                rows = rows[1:]
+            else:
+                f.seek(0, os.SEEK_END)
+            f.write(rows.tobytes())
+        with self._lock:
+            self._maps.pop(path, None)
+
+    # ---------- reads ----------
+
+    def range(self, user_id: str, signal: str, start=None, end=None):
+        """
+        Samples with start <= ts < end as (timestamps, values) memmap views.
+        """
+        self._check_signal(signal)
+        ts, values = self._columns(user_id, signal)
+        lo = int(np.searchsorted(ts, parse_time(start), side="left")) if start is not None else 0
+        hi = int(np.searchsorted(ts, parse_time(end), side="left")) if end is not None else len(ts)
+        return ts[lo:hi], values[lo:hi]
+
+    def rollup(self, user_id: str, signal: str, resolution: str, start=None, end=None) -> np.ndarray:
+        """
+        Rollup rows whose bucket starts in [start, end).
+        """
+        self._check_signal(signal)
+        if resolution not in ROLLUPS:
+            raise TimeSeriesError(f"Unknown resolution {resolution!r}, expected one of {list(ROLLUPS)}")
+        rows = self._map(os.path.join(self._user_dir(user_id), f"{signal}.{resolution}"), ROLLUP_DTYPE)
+        starts = rows["start"]
+        lo = int(np.searchsorted(starts, parse_time(start), side="left")) if start is not None else 0
+        hi = int(np.searchsorted(starts, parse_time(end), side="left")) if end is not None else len(rows)
+        return rows[lo:hi]
+
+    def baseline(self, user_id: str, days: float = 28, end=None, signals=None) -> dict:
+        """
+        Per-signal statistics over the `days` before `end` (default: now), from hourly rollups.
+        """
+        end_ts = parse_time(end) if end is not None else datetime.now(timezone.utc).timestamp()
+        start_ts = end_ts - days * 86400
+        return {
+            signal: summarise_rollups(self.rollup(user_id, signal, "hour", start_ts, end_ts))
+            for signal in (signals or SIGNALS)
+        }
+
+    def resolve_payload(self, data: dict) -> dict:
+        """
+        Expands {"user_id", "time_range": {"start", "end"}} into an analyze payload built
+        from stored data: mean vitals over the range (to minute resolution) and the raw
+        acceleration samples as a memmap view.
+        Keys sent explicitly in `data` take precedence; user_id is kept (per-user baselines).
+        Other payloads are returned unchanged.
+        """
+        if not isinstance(data, dict) or "user_id" not in data or "time_range" not in data:
+            return data
+        time_range = data["time_range"] or {}
+        if not isinstance(time_range, dict):
+            raise TimeSeriesError("time_range must be an object with start and end")
+        start, end = time_range.get("start"), time_range.get("end")
+        user_id = data["user_id"]
+
+        payload = {}
+        for signal in SIGNALS:
+            if signal == "acceleration":
+                ts, values = self.range(user_id, signal, start, end)
+                if len(ts):
+                    payload["acceleration"] = values
+                    span = float(ts[-1] - ts[0])
+                    if span > 0:
+                        payload["sample_rate_hz"] = round((len(ts) - 1) / span, 2)
+                continue
+            # Vitals: averaged from minute rollups instead of scanning raw samples
+            stats = summarise_rollups(self.rollup(user_id, signal, "minute", start, end))
+            if stats["mean"] is not None:
+                payload[signal] = round(stats["mean"], 2)
+
+        payload.update({k: v for k, v in data.items() if k != "time_range"})
+        return payload
+
+    def signals(self, user_id: str) -> dict:
+        """
+        Stored sample count and time span per signal of a user.
+        """
+        info = {}
+        for signal in SIGNALS:
+            ts, _ = self._columns(user_id, signal)
+            if len(ts):
+                info[signal] = {"samples": len(ts), "first": float(ts[0]), "last": float(ts[-1])}
+        return info
@@ -0,0 +1,190 @@
+# backend/traffic.py
+
+import hashlib
+import json
+import threading
+import time
+import uuid
+
+import httpx
+
+from core.agent_chat import current_agent
+
+
+def llm_request_key(content: bytes) -> str:
+    """
+    Replay key of an outgoing LLM request: sha256 of its canonical JSON body.
+    """
+    try:
+        canonical = json.dumps(json.loads(content or b"{}"), sort_keys=True, separators=(",", ":"))
+    except ValueError:
+        canonical = (content or b"").decode("utf-8", "replace")
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def _json_or_text(content: bytes):
+    try:
+        return json.loads(content)
+    except ValueError:
+        return content.decode("utf-8", "replace")
+
+
+class TrafficRecorder:
+    """
+    Appends captured traffic to a JSONL file, one record per line:
+
+    - {"type": "inbound", ...}: route payloads received by the backend (with status and timing)
+    - {"type": "llm", ...}: outgoing LLM requests and their responses (with timing)
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, "a", encoding="utf-8")
+        self._records = 0
+
+    def write(self, record: dict) -> None:
+        line = json.dumps(record, ensure_ascii=False, separators=(",", ":"))
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+            self._records += 1
+
+    def record_inbound(self, method, route, path, query, headers, payload, status, elapsed) -> None:
+        self.write({
+            "type": "inbound",
+            "id": uuid.uuid4().hex,
+            "ts": time.time(),
+            "method": method,
+            "route": route,
+            "path": path,
+            "query": query,
+            "headers": headers,
+            "payload": payload,
+            "status": status,
+            "elapsed": round(elapsed, 4),
+        })
+
+    def llm_observer(self, request, response, body, elapsed) -> None:
+        """
+        PooledTransport observer recording each LLM request/response pair.
+        """
+        self.write({
+            "type": "llm",
+            "ts": time.time(),
+            "agent": current_agent.get(),
+            "key": llm_request_key(request.content),
+            "url": str(request.url),
+            "request": _json_or_text(request.content),
+            "status": response.status_code if response is not None else None,
+            "content_type": response.headers.get("content-type") if response is not None else None,
+            "response": body.decode("utf-8", "replace"),
+            "elapsed": round(elapsed, 4),
+        })
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"path": self.path, "records": self._records}
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+
+
+# Request headers kept in inbound records (they change how the route behaves)
+RECORDED_HEADERS = ("Cache-Control", "Idempotency-Key", "Content-Type")
+
+
+def record_flask_traffic(app, recorder: TrafficRecorder) -> None:
+    """
+    Records every POST handled by a Flask app (payload, status, latency) to `recorder`.
+    """
+    from flask import g, request
+
+    @app.before_request
+    def _start_traffic_record():
+        g.traffic_start = time.perf_counter()
+
+    @app.after_request
+    def _record_traffic(response):
+        if request.method == "POST":
+            recorder.record_inbound(
+                method=request.method,
+                route=request.url_rule.rule if request.url_rule is not None else None,
+                path=request.path,
+                query=request.args.to_dict(),
+                headers={k: request.headers[k] for k in RECORDED_HEADERS if k in request.headers},
+                payload=request.get_json(silent=True),
+                status=response.status_code,
+                elapsed=time.perf_counter() - g.get("traffic_start", time.perf_counter()),
+            )
+        return response
+
+
+class ReplayStore:
+    """
+    Serves recorded LLM responses instead of calling the provider.
+
+    Responses are looked up by llm_request_key(); identical requests recorded several
+    times are answered with their recorded responses in turn.
+
+    Parameters:
+    - path: Recording written by TrafficRecorder
+    - latency_scale: Sleep recorded_elapsed * latency_scale before answering (0 = instant)
+    - on_miss: "error" answers unknown requests with 404; "passthrough" sends them upstream
+    """
+
+    def __init__(self, path: str, latency_scale: float = 0.0, on_miss: str = "error"):
+        self.path = path
+        self.latency_scale = latency_scale
+        self.on_miss = on_miss
+        self._responses = {}
+        self._next = {}
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0}
+
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                if record.get("type") == "llm" and record.get("status") is not None:
+                    self._responses.setdefault(record["key"], []).append(record)
+
+    def respond(self, request: httpx.Request):
+        """
+        Recorded httpx.Response for `request`, or None on a miss with on_miss="passthrough".
+        """
+        key = llm_request_key(request.content)
+        with self._lock:
+            recorded = self._responses.get(key)
+            if recorded:
+                index = self._next.get(key, 0)
+                self._next[key] = (index + 1) % len(recorded)
+                record = recorded[index]
+                self._stats["hits"] += 1
+            else:
+                record = None
+                self._stats["misses"] += 1
+
+        if record is None:
+            if self.on_miss == "passthrough":
+                return None
+            return httpx.Response(
+                404,
+                json={"error": {"message": f"No recorded LLM response for request {key[:12]}", "type": "replay_miss"}},
+                request=request,
+            )
+
+        if self.latency_scale:
+            time.sleep(record["elapsed"] * self.latency_scale)
+        return httpx.Response(
+            record["status"],
+            headers={"content-type": record.get("content_type") or "application/json"},
+            content=record["response"].encode("utf-8"),
+            request=request,
+        )
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._stats, recorded_requests=len(self._responses))